@@ -2,6 +2,7 @@ import os
 import sys
 
 import environ
+from celery.schedules import crontab
 from pathlib import Path
 
 VERSION = "1.0.0"
@@ -49,7 +50,22 @@ env = environ.Env(DEBUG=(bool, True),
                   FLOWBACK_SCORE_VOTE_FLOOR=(int, 0),
                   FLOWBACK_KANBAN_PRIORITY_LIMIT=(int, 5),
                   FLOWBACK_PREDICTION_VOTE_ON_RESULT_PHASE=(bool, False),
-                  FLOWBACK_KANBAN_LANES=(list, ['Backlog', 'Chosen For Execution', 'In Progress', 'Evaluation', 'Finished'])
+                  FLOWBACK_KANBAN_LANES=(list, ['Backlog', 'Chosen For Execution', 'In Progress', 'Evaluation', 'Finished']),
+                  FLOWBACK_COMMENT_TREE_CACHE_TIMEOUT=(int, 3600),
+                  FLOWBACK_TASK_TRACE_MEMORY=(bool, False),
+                  FLOWBACK_TASK_PROFILE_THRESHOLD=(float, 0),
+                  FLOWBACK_TASK_PROFILER=(str, 'cprofile'),
+                  FLOWBACK_TASK_PROFILE_DIR=(str, None),
+                  FLOWBACK_SCHEDULE_EVENT_LOOKAHEAD=(int, 3600),
+                  FLOWBACK_SCHEDULE_CALENDAR_FEED_DAYS=(int, 90),
+                  FLOWBACK_FILE_UPLOAD_WORKERS=(int, 4),
+                  FLOWBACK_FILE_COLLECTION_LIMIT=(int, 10),
+                  FLOWBACK_FILE_UPLOAD_MAX_SIZE=(int, 5 * 1024 ** 3),
+                  FLOWBACK_FILE_UPLOAD_PART_SIZE=(int, 8 * 1024 ** 2),
+                  FLOWBACK_FILE_UPLOAD_MIN_PART_SIZE=(int, 5 * 1024 ** 2),
+                  FLOWBACK_FILE_UPLOAD_EXPIRY=(int, 24),
+                  FLOWBACK_IMAGE_DERIVATIVE_SIZES=(list, [64, 256, 1024]),
+                  FLOWBACK_IMAGE_DERIVATIVE_QUALITY=(int, 80)
                   )
 
 
@@ -72,6 +88,15 @@ if TESTING:
     MIGRATION_MODULES = DisableMigrations()
 
 
+# Shared cache, tests use a local memory cache to stay isolated in between runs
+if TESTING:
+    CACHES = {'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}}
+
+else:
+    CACHES = {'default': {'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+                          'LOCATION': f"redis://{env('FLOWBACK_REDIS_HOST')}:{env('FLOWBACK_REDIS_PORT')}/2"}}
+
+
 # Django Secret Key. If it's missing, it'll be generated and stored in .env
 SECRET_KEY = env('DJANGO_SECRET', default=None)
 
@@ -156,6 +181,29 @@ INSTALLED_APPS = [
 
 CELERY_BROKER_URL = f"redis://{env('FLOWBACK_REDIS_HOST')}:{env('FLOWBACK_REDIS_PORT')}/0"
 
+# Periodic tasks, installed into django_celery_beat by the DatabaseScheduler
+CELERY_BEAT_SCHEDULE = {
+    'poll_phase_job_sweep': dict(task='flowback.poll.tasks.poll_phase_job_sweep',
+                                 schedule=crontab()),
+    'poll_phase_sweep': dict(task='flowback.poll.tasks.poll_phase_sweep',
+                             schedule=crontab()),
+    'schedule_event_sweep': dict(task='flowback.schedule.tasks.schedule_event_sweep',
+                                 schedule=crontab()),
+    'poll_counter_reconcile': dict(task='flowback.poll.tasks.poll_counter_reconcile',
+                                   schedule=crontab(minute='0', hour='3')),
+    'group_thread_counter_reconcile': dict(task='flowback.group.tasks.group_thread_counter_reconcile',
+                                           schedule=crontab(minute='10', hour='3')),
+    'comment_vote_counter_reconcile': dict(task='flowback.comment.tasks.comment_vote_counter_reconcile',
+                                           schedule=crontab(minute='20', hour='3')),
+    'poll_schedule_preliminary_score_reconcile': dict(
+        task='flowback.poll.tasks.poll_schedule_preliminary_score_reconcile',
+        schedule=crontab(minute='30', hour='3')),
+    'group_member_counter_reconcile': dict(task='flowback.group.tasks.group_member_counter_reconcile',
+                                           schedule=crontab(minute='40', hour='3')),
+    'file_upload_sweep': dict(task='flowback.files.tasks.file_upload_sweep',
+                              schedule=crontab(minute='50')),
+}
+
 REST_FRAMEWORK = {
     'DEFAULT_SCHEMA_CLASS': 'flowback.common.documentation.CustomAutoSchema',
     'DEFAULT_AUTHENTICATION_CLASSES': [
@@ -337,6 +385,9 @@ FLOWBACK_ALLOW_DYNAMIC_POLL = env('FLOWBACK_ALLOW_DYNAMIC_POLL')
 FLOWBACK_PREDICTION_VOTE_ON_RESULT_PHASE = env('FLOWBACK_PREDICTION_VOTE_ON_RESULT_PHASE')
 FLOWBACK_PREDICTION_HISTORY_LIMIT = env('FLOWBACK_PREDICTION_HISTORY_LIMIT')
 
+# Comment related settings
+FLOWBACK_COMMENT_TREE_CACHE_TIMEOUT = env('FLOWBACK_COMMENT_TREE_CACHE_TIMEOUT')
+
 # Group related settings
 FLOWBACK_ALLOW_GROUP_CREATION = env('FLOWBACK_ALLOW_GROUP_CREATION')
 FLOWBACK_GROUP_ADMIN_USER_LIST_ACCESS_ONLY = env('FLOWBACK_GROUP_ADMIN_USER_LIST_ACCESS_ONLY')
@@ -345,6 +396,35 @@ FLOWBACK_GROUP_ADMIN_USER_LIST_ACCESS_ONLY = env('FLOWBACK_GROUP_ADMIN_USER_LIST
 FLOWBACK_KANBAN_PRIORITY_LIMIT = env('FLOWBACK_KANBAN_PRIORITY_LIMIT')
 FLOWBACK_KANBAN_LANES = env('FLOWBACK_KANBAN_LANES')
 
+# Schedule related settings, recurring events are notified of this many seconds ahead of their next occurrence
+FLOWBACK_SCHEDULE_EVENT_LOOKAHEAD = env('FLOWBACK_SCHEDULE_EVENT_LOOKAHEAD')
+
+# Events that ended more than this many days ago are left out of the iCalendar feeds
+FLOWBACK_SCHEDULE_CALENDAR_FEED_DAYS = env('FLOWBACK_SCHEDULE_CALENDAR_FEED_DAYS')
+
+# File related settings, the number of files of a collection uploaded to the storage at the same time
+# and the number of files a collection may hold
+FLOWBACK_FILE_UPLOAD_WORKERS = env('FLOWBACK_FILE_UPLOAD_WORKERS')
+FLOWBACK_FILE_COLLECTION_LIMIT = env('FLOWBACK_FILE_COLLECTION_LIMIT')
+
+# Resumable uploads (in bytes), parts other than the last must be at least the minimum part size (5 MiB for S3).
+# Uploads not completed within the expiry (in hours) are removed along with their parts
+FLOWBACK_FILE_UPLOAD_MAX_SIZE = env('FLOWBACK_FILE_UPLOAD_MAX_SIZE')
+FLOWBACK_FILE_UPLOAD_PART_SIZE = env('FLOWBACK_FILE_UPLOAD_PART_SIZE')
+FLOWBACK_FILE_UPLOAD_MIN_PART_SIZE = env('FLOWBACK_FILE_UPLOAD_MIN_PART_SIZE')
+FLOWBACK_FILE_UPLOAD_EXPIRY = env('FLOWBACK_FILE_UPLOAD_EXPIRY')
+
+# Images are served as WebP derivatives fitting within these sizes (in pixels), encoded at this quality
+FLOWBACK_IMAGE_DERIVATIVE_SIZES = [int(size) for size in env('FLOWBACK_IMAGE_DERIVATIVE_SIZES')]
+FLOWBACK_IMAGE_DERIVATIVE_QUALITY = env('FLOWBACK_IMAGE_DERIVATIVE_QUALITY')
+
+# Task related settings, a profile threshold (in seconds) of 0 disables profiling. Profiler is cprofile or pyinstrument
+# Memory tracing is a diagnostic switch, tracemalloc slows down every task considerably and is best left off in production
+FLOWBACK_TASK_TRACE_MEMORY = env('FLOWBACK_TASK_TRACE_MEMORY')
+FLOWBACK_TASK_PROFILE_THRESHOLD = env('FLOWBACK_TASK_PROFILE_THRESHOLD')
+FLOWBACK_TASK_PROFILER = env('FLOWBACK_TASK_PROFILER')
+FLOWBACK_TASK_PROFILE_DIR = env('FLOWBACK_TASK_PROFILE_DIR') or os.path.join(BASE_DIR, 'profiles')
+
 
 # Logging
 if env('LOGGING') in ['DEBUG', 'INFO', 'WARNING', 'ERROR', 'CRITICAL']:
@@ -364,6 +444,11 @@ if env('LOGGING') in ['DEBUG', 'INFO', 'WARNING', 'ERROR', 'CRITICAL']:
                 "level": env('LOGGING'),
                 "propagate": True,
             },
+            "flowback": {
+                "handlers": ["file"],
+                "level": env('LOGGING'),
+                "propagate": True,
+            },
         },
     }
 
@@ -11,6 +11,7 @@ from flowback.chat.urls import chat_patterns
 from flowback.notification.urls import notification_patterns
 from flowback.server.urls import server_patterns
 from flowback.schedule.urls import schedule_patterns
+from flowback.files.urls import files_patterns
 from django.conf.urls.static import static
 
 
@@ -23,6 +24,7 @@ api_urlpatterns = [
     path('notification/', include((notification_patterns, 'notification'))),
     path('server/', include((server_patterns, 'server'))),
     path('schedule/', include((schedule_patterns, 'schedule'))),
+    path('files/', include((files_patterns, 'files'))),
 
     path('home/polls', PollListApi.as_view(), name='home_polls'),
     path('poll/user/schedule', PollUserScheduleListAPI.as_view(), name='poll_user_schedule'),
@@ -6,7 +6,7 @@ from asgiref.sync import async_to_sync
 from channels.layers import get_channel_layer
 from backend.settings import TESTING
 from flowback.common.services import get_object, model_update
-from flowback.files.services import upload_collection
+from flowback.files.services import upload_collection, file_upload_attach
 from flowback.user.models import User
 from flowback.user.serializers import BasicUserSerializer
 
@@ -79,14 +79,27 @@ def message_delete(*, user_id: int, message_id: int):
     return message
 
 
-def message_files_upload(*, user_id: int, channel_id: int, files: list) -> MessageFileCollection:
+def message_files_upload(*, user_id: int, channel_id: int, files: list = None,
+                         upload_ids: list[int] = None) -> MessageFileCollection:
+    """
+    Collects files for a message of the channel, either uploaded directly or the files of completed resumable uploads
+    (see file_upload_complete). The id of the collection is passed as attachments_id when sending the message.
+    """
     user = get_object(User, id=user_id)
     channel = get_object(MessageChannel, id=channel_id)
     get_object(MessageChannelParticipant, user=user, channel=channel, active=True)
     upload_to = f"{MessageFileCollection.attachments_upload_to}/{channel.origin_name}"
 
-    file_collection = upload_collection(user_id=user_id, file=files,
-                                        upload_to=upload_to)
+    if not (files or upload_ids):
+        raise ValidationError("Either files or upload_ids must be given")
+
+    file_collection = None
+    if files:
+        file_collection = upload_collection(user_id=user_id, file=files,
+                                            upload_to=upload_to)
+
+    if upload_ids:
+        file_collection = file_upload_attach(user_id=user_id, upload_ids=upload_ids, collection=file_collection)
 
     message_collection = MessageFileCollection(user=user, channel=channel, file_collection=file_collection)
     message_collection.full_clean()
@@ -148,7 +148,9 @@ class MessageChannelParticipantListAPI(APIView):
 
 class MessageFileCollectionUploadAPI(APIView):
     class InputSerializer(serializers.Serializer):
-        files = serializers.ListField(child=serializers.FileField())
+        files = serializers.ListField(child=serializers.FileField(), required=False)
+        upload_ids = serializers.ListField(child=serializers.IntegerField(), required=False,
+                                           help_text='Ids of completed file uploads to attach')
 
     class OutputSerializer(serializers.Serializer):
         id = serializers.IntegerField()
@@ -0,0 +1,37 @@
+# Generated by Django 4.2.17 on 2026-10-19 06:53
+
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def populate_comment_votes(apps, schema_editor):
+    Comment = apps.get_model('comment', 'Comment')
+    CommentVote = apps.get_model('comment', 'CommentVote')
+
+    def total(vote: bool):
+        return Coalesce(Subquery(CommentVote.objects.filter(comment_id=OuterRef('id'), vote=vote)
+                                 .values('comment_id').annotate(total=Count('*')).values('total')[:1]), 0)
+
+    Comment.objects.update(upvotes=total(True), downvotes=total(False))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('comment', '0012_alter_comment_message'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='comment',
+            name='downvotes',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='comment',
+            name='upvotes',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.RunPython(populate_comment_votes, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,35 @@
+# Generated by Django 4.2.17 on 2026-10-19 07:14
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('comment', '0013_comment_downvotes_comment_upvotes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='comment',
+            name='path',
+            field=models.TextField(blank=True, default=''),
+        ),
+        migrations.RunSQL(
+            sql="""
+            WITH RECURSIVE tree(id, path) AS (
+                SELECT id, lpad(id::text, 10, '0') || '/'
+                FROM comment_comment WHERE parent_id IS NULL
+                UNION ALL
+                SELECT c.id, tree.path || lpad(c.id::text, 10, '0') || '/'
+                FROM comment_comment c JOIN tree ON c.parent_id = tree.id
+            )
+            UPDATE comment_comment SET path = tree.path FROM tree WHERE comment_comment.id = tree.id;
+            """,
+            reverse_sql=migrations.RunSQL.noop,
+        ),
+        migrations.AddIndex(
+            model_name='comment',
+            index=models.Index(fields=['comment_section', 'path'], name='comment_section_path_idx', opclasses=['int8_ops', 'text_pattern_ops']),
+        ),
+    ]
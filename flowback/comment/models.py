@@ -1,19 +1,67 @@
-from math import sqrt
-
-from django.db import models
-from django.db.models import Q, Count
+from django.apps import apps
+from django.core.cache import cache
+from django.db import models, transaction
+from django.db.models import Q, F, Case, When, Value, OuterRef
+from django.db.models.functions import Cast, Sqrt, Coalesce
+from django.db.models.lookups import Exact
 from django.db.models.signals import post_save, post_delete
 from tree_queries.models import TreeNode
 
-from flowback.common.models import BaseModel
+from flowback.common.models import BaseModel, CounterModel
+from flowback.common.services import count_subquery
 from flowback.common.validators import FieldNotBlankValidator
 
 
+# Lower bound of the Wilson score interval (80% confidence) as a database expression.
+# Evaluated inside the UPDATE that changes the vote counters, comments with as many downvotes as upvotes score 0.
+def comment_wilson_score(upvotes, downvotes, z: float = 1.281551565545) -> Case:
+    n = Cast(upvotes + downvotes, models.FloatField())
+    p = Cast(upvotes, models.FloatField()) / n
+
+    left = p + z * z / (2.0 * n)
+    right = z * Sqrt(p * (1.0 - p) / n + z * z / (4.0 * n * n))
+    under = 1.0 + z * z / n
+
+    return Case(When(Exact(upvotes, downvotes), then=Value(0.0)),
+                default=(left - right) / under,
+                output_field=models.FloatField())
+
+
 class CommentSection(BaseModel):
     active = models.BooleanField(default=True)
 
+    # Models owning a comment section, each one keeps track of its active comments in a comment_count column
+    counter_models = ['poll.Poll', 'group.GroupThread']
+
+    # Sibling orderings of the cached tree skeleton, see comment_tree_skeleton
+    tree_orderings = dict(score_asc=('score', 'id'),
+                          score_desc=('-score', 'id'),
+                          created_at_asc=('created_at', 'id'),
+                          created_at_desc=('-created_at', '-id'))
+
+    @classmethod
+    def comment_count_update(cls, comment_section_id: int, delta: int):
+        for model in cls.counter_models:
+            (apps.get_model(model).objects.filter(comment_section_id=comment_section_id)
+             .update(comment_count=F('comment_count') + delta))
+
+    @staticmethod
+    def tree_cache_key(comment_section_id: int, order_by: str) -> str:
+        return f'comment_section_tree:{comment_section_id}:{order_by}'
+
+    @classmethod
+    def tree_cache_clear(cls, comment_section_id: int, score_only: bool = False):
+        keys = [cls.tree_cache_key(comment_section_id, order_by)
+                for order_by in cls.tree_orderings if not score_only or order_by.startswith('score')]
+
+        # Cleared again after commit, in case another request cached the tree before this transaction was visible
+        cache.delete_many(keys)
+        transaction.on_commit(lambda: cache.delete_many(keys))
+
+
+class Comment(BaseModel, CounterModel, TreeNode):
+    COUNTER_FIELDS = ('upvotes', 'downvotes')
 
-class Comment(BaseModel, TreeNode):
     comment_section = models.ForeignKey(CommentSection, on_delete=models.CASCADE)
     author = models.ForeignKey("user.User", on_delete=models.CASCADE)
     message = models.TextField(max_length=10000, null=True, blank=True, validators=[FieldNotBlankValidator])
@@ -21,45 +69,83 @@ class Comment(BaseModel, TreeNode):
     edited = models.BooleanField(default=False)
     active = models.BooleanField(default=True)
     score = models.DecimalField(default=0, max_digits=17, decimal_places=10)
+    upvotes = models.IntegerField(default=0)
+    downvotes = models.IntegerField(default=0)
+
+    # Materialized path of zero padded ancestor ids including self, e.g. "0000000012/0000000045/"
+    path = models.TextField(blank=True, default='')
+
+    # Keeps track of the stored active state, used for keeping comment counters in sync
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance._loaded_active = instance.__dict__.get('active')
+        return instance
+
+    @staticmethod
+    def path_ids(path: str) -> list[int]:
+        return [int(i) for i in path.split('/') if i]
 
     @classmethod
     def comment_save(cls, instance, created, *args, **kwargs):
         if created:
+            parent_path = instance.parent.path if instance.parent_id else ''
+            instance.path = f'{parent_path}{instance.id:010d}/'
+            Comment.objects.filter(id=instance.id).update(path=instance.path)
+            CommentSection.tree_cache_clear(instance.comment_section_id)
+
             CommentVote.objects.create(comment=instance, created_by=instance.author, vote=True)
 
-    # Updates score based on Wilson score interval when creating/deleting comment votes
+        loaded_active = False if created else getattr(instance, '_loaded_active', instance.active)
+        if instance.active != loaded_active:
+            CommentSection.comment_count_update(instance.comment_section_id, 1 if instance.active else -1)
+
+        instance._loaded_active = instance.active
+
     @classmethod
-    def comment_score_update(cls, instance, *args, **kwargs):
-        comment = Comment.objects.filter(id=instance.comment.id
-                                         ).annotate(upvotes=Count('commentvote',
-                                                                  filter=Q(commentvote__vote=True)),
-                                                    downvotes=Count('commentvote',
-                                                                    filter=Q(commentvote__vote=False))
-                                                    ).first()
+    def comment_delete(cls, instance, *args, **kwargs):
+        CommentSection.tree_cache_clear(instance.comment_section_id)
 
-        n = comment.upvotes + comment.downvotes
+        if instance.active:
+            CommentSection.comment_count_update(instance.comment_section_id, -1)
 
-        if n == 0 or comment.upvotes - comment.downvotes == 0:
-            return 0
+    # Applies the change between the old and new state of a CommentVote to the vote counters and score
+    @classmethod
+    def vote_count_update(cls, comment_id: int, old_vote: bool | None, new_vote: bool | None):
+        if old_vote == new_vote:
+            return
 
-        z = 1.281551565545
-        p = float(comment.upvotes) / n
+        delta = dict(upvotes=0, downvotes=0)
+        if old_vote is not None:
+            delta['upvotes' if old_vote else 'downvotes'] -= 1
 
-        left = p + 1 / (2 * n) * z * z
-        right = z * sqrt(p * (1 - p) / n + z * z / (4 * n * n))
-        under = 1 + 1 / n * z * z
+        if new_vote is not None:
+            delta['upvotes' if new_vote else 'downvotes'] += 1
 
-        comment.score = (left - right) / under
-        comment.save()
+        upvotes, downvotes = F('upvotes') + delta['upvotes'], F('downvotes') + delta['downvotes']
+        cls.objects.filter(id=comment_id).update(upvotes=upvotes,
+                                                 downvotes=downvotes,
+                                                 score=comment_wilson_score(upvotes, downvotes))
+
+    # Recounts votes and scores from CommentVote in a single UPDATE, used after bulk writes bypassing signals
+    @classmethod
+    def vote_recount(cls, queryset: models.QuerySet = None) -> int:
+        queryset = cls.objects.all() if queryset is None else queryset
+        upvotes, downvotes = (Coalesce(count_subquery(CommentVote.objects.filter(comment_id=OuterRef('id'), vote=vote),
+                                                      'comment_id'), 0) for vote in (True, False))
+
+        return queryset.update(upvotes=upvotes, downvotes=downvotes, score=comment_wilson_score(upvotes, downvotes))
 
     class Meta:
         constraints = [models.CheckConstraint(check=Q(attachments__isnull=False) | Q(message__isnull=False),
                                               name='temp_comment_data_check')]
+        indexes = [models.Index(fields=['comment_section', 'path'],
+                                name='comment_section_path_idx',
+                                opclasses=['int8_ops', 'text_pattern_ops'])]
 
 
 post_save.connect(Comment.comment_save, sender=Comment)
-post_save.connect(Comment.comment_score_update, sender="comment.CommentVote")
-post_delete.connect(Comment.comment_score_update, sender="comment.CommentVote")
+post_delete.connect(Comment.comment_delete, sender=Comment)
 
 
 class CommentVote(BaseModel):
@@ -67,10 +153,34 @@ class CommentVote(BaseModel):
     created_by = models.ForeignKey("user.User", on_delete=models.CASCADE)
     vote = models.BooleanField()
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance._loaded_vote = instance.__dict__.get('vote')
+        return instance
+
+    @classmethod
+    def post_save(cls, instance, created, *args, **kwargs):
+        old_vote = None if created else getattr(instance, '_loaded_vote', instance.vote)
+        Comment.vote_count_update(instance.comment_id, old_vote=old_vote, new_vote=instance.vote)
+        instance._loaded_vote = instance.vote
+
+        if old_vote != instance.vote:
+            CommentSection.tree_cache_clear(instance.comment.comment_section_id, score_only=True)
+
+    @classmethod
+    def post_delete(cls, instance, *args, **kwargs):
+        Comment.vote_count_update(instance.comment_id, old_vote=instance.vote, new_vote=None)
+        CommentSection.tree_cache_clear(instance.comment.comment_section_id, score_only=True)
+
     class Meta:
         constraints = [models.UniqueConstraint(fields=['comment', 'created_by'], name='comment_vote_unique')]
 
 
+post_save.connect(CommentVote.post_save, sender=CommentVote)
+post_delete.connect(CommentVote.post_delete, sender=CommentVote)
+
+
 def comment_section_create(*, active: bool = True) -> CommentSection:
     comments = CommentSection(active=active)
     comments.full_clean()
@@ -1,24 +1,16 @@
 import django_filters
-from django.db.models import OuterRef, Subquery, Sum, Case, When, Q, Count
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import OuterRef, Subquery, F
 
-from flowback.comment.models import Comment, CommentVote
+from flowback.comment.models import Comment, CommentSection, CommentVote
+from flowback.common.filters import ExistsFilter
+from flowback.common.services import get_object
 from flowback.user.models import User
 
 
 class BaseCommentFilter(django_filters.FilterSet):
-    order_by = django_filters.OrderingFilter(
-        fields=(('created_at', 'created_at_asc'),
-                ('-created_at', 'created_at_desc'),
-                ('score', 'score_asc'),
-                ('-score', 'score_desc')),
-        method='order_siblings')
-
-    has_attachments = django_filters.BooleanFilter(method='has_attachments_filter')
-
-    # Orders the tree correctly
-    def order_siblings(self, queryset, name, value):
-        order_by = [self.filters['order_by'].param_map[x] for x in value]
-        return queryset.order_siblings_by(*order_by)
+    has_attachments = ExistsFilter(field_name='attachments')
 
     class Meta:
         model = Comment
@@ -28,33 +20,174 @@ class BaseCommentFilter(django_filters.FilterSet):
                       score=['gt', 'lt'])
 
 
-# TODO group parents together
 def comment_list(*, fetched_by: User, comment_section_id: int, filters=None):
+    """
+    Lists the comments of a comment section (or the subtree of id) depth first, siblings ordered by order_by.
+    The order is read off the cached tree skeleton and the subtree off the materialized path, so unlike the
+    recursive CTE this used to run, only the page being read is fetched.
+    """
     filters = filters or {}
+    order_by = filters.pop('order_by', None) or 'score_desc'
 
     user_vote = CommentVote.objects.filter(comment_id=OuterRef('id'), created_by=fetched_by).values('vote')
+    qs = (Comment.objects.filter(comment_section_id=comment_section_id)
+          .select_related('author', 'attachments')
+          .annotate(user_vote=Subquery(user_vote),
+                    raw_score=F('upvotes') - F('downvotes')))
+
+    root = None
+    if comment_id := filters.pop('id', None):
+        root = get_object(Comment, comment_section_id=comment_section_id, id=comment_id)
+
+    filtered = BaseCommentFilter(filters, qs).qs if any(value is not None for value in filters.values()) else None
+
+    # Orderings the skeleton isn't kept for fall back to the path, which is depth first in order of creation
+    if order_by not in CommentSection.tree_orderings:
+        if root:
+            qs = qs.filter(path__startswith=root.path)
 
-    if comment_id := filters.get('id'):
-        filters.pop('id')
-        qs = Comment.objects.get(id=comment_id).descendants(include_self=True).all()
+        return (qs if filtered is None else qs.filter(id__in=filtered.values('id'))).order_by('path')
 
-    else:
-        qs = Comment.objects.filter(comment_section_id=comment_section_id)
+    skeleton = comment_tree_skeleton(comment_section_id=comment_section_id, order_by=order_by)
+    ids = comment_tree_order(skeleton=skeleton, root_id=root.id if root else 0)
 
-    qs = qs.annotate(user_vote=Subquery(user_vote),
-                     raw_score=Count('commentvote', filter=Q(commentvote__vote=True)) -
-                               Count('commentvote', filter=Q(commentvote__vote=False))).all()
-    return BaseCommentFilter(filters, qs).qs
+    if filtered is not None:
+        matching = set(filtered.values_list('id', flat=True))
+        ids = [comment_id for comment_id in ids if comment_id in matching]
+
+    return CommentSequence(ids=ids, queryset=qs)
 
 
 def comment_ancestor_list(*, fetched_by: User, comment_section_id: int, comment_id: int):
     user_vote = CommentVote.objects.filter(comment_id=OuterRef('id'), created_by=fetched_by).values('vote')
 
-    qs = (Comment.objects.get(comment_section_id=comment_section_id, id=comment_id)
-          .ancestors(include_self=True)
-          .reverse()
+    comment = Comment.objects.get(comment_section_id=comment_section_id, id=comment_id)
+
+    # Ancestors are read off the materialized path, deeper paths sort after their prefix
+    qs = (Comment.objects.filter(comment_section_id=comment_section_id, id__in=Comment.path_ids(comment.path))
+          .order_by('-path')
           .annotate(user_vote=Subquery(user_vote),
-                    raw_score=Count('commentvote', filter=Q(commentvote__vote=True)) -
-                              Count('commentvote', filter=Q(commentvote__vote=False))).all())
+                    raw_score=F('upvotes') - F('downvotes')).all())
 
     return qs
+
+
+def comment_tree_skeleton(*, comment_section_id: int, order_by: str = 'score_desc') -> dict[int, list[int]]:
+    """
+    Returns the sorted tree skeleton of a comment section, mapping each parent id (0 for top level) to its
+    ordered children ids. Built from a single flat query and cached until a comment or vote is written.
+    """
+    key = CommentSection.tree_cache_key(comment_section_id, order_by)
+    skeleton = cache.get(key)
+
+    if skeleton is None:
+        skeleton = {}
+        for comment_id, parent_id in (Comment.objects.filter(comment_section_id=comment_section_id)
+                                      .order_by(*CommentSection.tree_orderings[order_by])
+                                      .values_list('id', 'parent_id')):
+            skeleton.setdefault(parent_id or 0, []).append(comment_id)
+
+        cache.set(key, skeleton, settings.FLOWBACK_COMMENT_TREE_CACHE_TIMEOUT)
+
+    return skeleton
+
+
+def comment_tree_order(*, skeleton: dict[int, list[int]], root_id: int = 0) -> list[int]:
+    """
+    Flattens a tree skeleton depth first, starting at root_id (included unless it's 0, the top level).
+    """
+    ids = [root_id] if root_id else []
+    stack = list(reversed(skeleton.get(root_id, [])))
+
+    while stack:
+        comment_id = stack.pop()
+        ids.append(comment_id)
+        stack += reversed(skeleton.get(comment_id, []))
+
+    return ids
+
+
+class CommentSequence:
+    """
+    Lazy, sliceable list of comments in the given order of ids, each slice hydrated in a single query.
+    """
+    def __init__(self, *, ids: list[int], queryset):
+        self.ids = ids
+        self.queryset = queryset
+
+    def __len__(self):
+        return len(self.ids)
+
+    def __iter__(self):
+        return iter(self[:])
+
+    def __getitem__(self, item):
+        if not isinstance(item, slice):
+            return self[item:item + 1][0]
+
+        ids = self.ids[item]
+        comments = self.queryset.in_bulk(ids)
+
+        return [comments[comment_id] for comment_id in ids if comment_id in comments]
+
+
+class CommentTree:
+    """
+    Lazy, sliceable view of a cached tree skeleton. Slicing returns the sliced children of parent_id,
+    each followed by its first `replies` children, hydrated in a single query.
+    """
+    def __init__(self, *, skeleton: dict[int, list[int]], queryset, parent_id: int = None, replies: int = 3):
+        self.skeleton = skeleton
+        self.queryset = queryset
+        self.parent_id = parent_id or 0
+        self.replies = replies
+
+    def __len__(self):
+        return len(self.skeleton.get(self.parent_id, []))
+
+    def __iter__(self):
+        return iter(self[:])
+
+    def __getitem__(self, item):
+        if not isinstance(item, slice):
+            return self[item:item + 1][0]
+
+        ids = []
+        for comment_id in self.skeleton.get(self.parent_id, [])[item]:
+            ids.append(comment_id)
+            ids += self.skeleton.get(comment_id, [])[:self.replies]
+
+        comments = self.queryset.in_bulk(ids)
+        for comment in comments.values():
+            comment.total_replies = len(self.skeleton.get(comment.id, []))
+
+        return [comments[comment_id] for comment_id in ids if comment_id in comments]
+
+
+def comment_tree_list(*, fetched_by: User, comment_section_id: int, parent_id: int = None, filters=None):
+    """
+    Paginates the top level comments (or replies to parent_id) of a comment section, with their first replies.
+    """
+    filters = filters or {}
+
+    if parent_id:
+        get_object(Comment, comment_section_id=comment_section_id, id=parent_id)
+
+    user_vote = CommentVote.objects.filter(comment_id=OuterRef('id'), created_by=fetched_by).values('vote')
+    qs = (Comment.objects.filter(comment_section_id=comment_section_id)
+          .select_related('author', 'attachments')
+          .annotate(user_vote=Subquery(user_vote),
+                    raw_score=F('upvotes') - F('downvotes')))
+
+    return CommentTree(skeleton=comment_tree_skeleton(comment_section_id=comment_section_id,
+                                                      order_by=filters.get('order_by', 'score_desc')),
+                       queryset=qs,
+                       parent_id=parent_id,
+                       replies=filters.get('replies', 3))
+
+
+def comment_reply_list(*, fetched_by: User, comment_section_id: int, comment_id: int, filters=None):
+    return comment_tree_list(fetched_by=fetched_by,
+                             comment_section_id=comment_section_id,
+                             parent_id=comment_id,
+                             filters=filters)
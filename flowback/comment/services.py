@@ -1,6 +1,7 @@
+from django.db import transaction
 from rest_framework.exceptions import ValidationError
 
-from flowback.comment.models import Comment, CommentVote
+from flowback.comment.models import Comment, CommentSection, CommentVote
 from flowback.common.services import model_update, get_object
 from flowback.files.services import upload_collection, update_collection
 from flowback.user.models import User
@@ -100,3 +101,24 @@ def comment_vote(*, fetched_by: int, comment_section_id: int, comment_id: int, v
             raise ValidationError("User haven't voted on this comment")
 
     CommentVote.objects.update_or_create(defaults=dict(vote=vote), created_by=user, comment=comment)
+
+
+def comment_vote_import(*, comment_section_id: int, votes: list[dict]) -> int:
+    """
+    Imports votes in bulk, each vote being a dict of comment_id, created_by_id and vote.
+    Existing votes from the same user are overwritten, counters and scores are recomputed in one UPDATE afterward.
+    """
+    comment_ids = {vote['comment_id'] for vote in votes}
+
+    if Comment.objects.filter(id__in=comment_ids).exclude(comment_section_id=comment_section_id).exists():
+        raise ValidationError("Comment doesn't belong to the comment section")
+
+    with transaction.atomic():
+        CommentVote.objects.bulk_create([CommentVote(**vote) for vote in votes],
+                                        batch_size=1000,
+                                        update_conflicts=True,
+                                        unique_fields=['comment', 'created_by'],
+                                        update_fields=['vote'])
+
+        CommentSection.tree_cache_clear(comment_section_id, score_only=True)
+        return Comment.vote_recount(Comment.objects.filter(id__in=comment_ids))
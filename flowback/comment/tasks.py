@@ -0,0 +1,26 @@
+from celery import shared_task
+from django.db.models import OuterRef, Q, F
+from django.db.models.functions import Coalesce
+
+from flowback.comment.models import Comment, CommentVote
+from flowback.common.instrumentation import instrumented_task, task_rows
+from flowback.common.services import count_subquery
+
+
+@shared_task
+@instrumented_task
+def comment_vote_counter_reconcile():
+    """
+    Corrects drifted upvote/downvote counters and their score, e.g. after writes that bypassed signals.
+    """
+    drifted = Comment.objects.alias(
+        actual_upvotes=Coalesce(count_subquery(CommentVote.objects.filter(comment_id=OuterRef('id'), vote=True),
+                                               'comment_id'), 0),
+        actual_downvotes=Coalesce(count_subquery(CommentVote.objects.filter(comment_id=OuterRef('id'), vote=False),
+                                                 'comment_id'), 0)
+    ).filter(~Q(upvotes=F('actual_upvotes')) | ~Q(downvotes=F('actual_downvotes')))
+
+    reconciled = Comment.vote_recount(Comment.objects.filter(id__in=drifted.values('id')))
+    task_rows(reconciled)
+
+    return reconciled
@@ -1,16 +1,27 @@
+import time
+from math import sqrt
+
+from django.core.cache import cache
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
 from rest_framework.exceptions import ValidationError
 from rest_framework import status
 from rest_framework.test import APIRequestFactory, force_authenticate, APITestCase
 
-from flowback.comment.models import Comment
-from flowback.comment.services import comment_delete, comment_update
+from flowback.comment.models import Comment, CommentVote
+from flowback.comment.selectors import comment_list, comment_tree_skeleton
+from flowback.comment.services import comment_delete, comment_update, comment_vote, comment_vote_import
+from flowback.comment.tasks import comment_vote_counter_reconcile
 from flowback.comment.tests.factories import CommentSectionFactory, CommentFactory, CommentVoteFactory
-from flowback.comment.views import CommentListAPI, CommentVoteAPI, CommentAncestorListAPI
+from flowback.comment.views import CommentListAPI, CommentVoteAPI, CommentAncestorListAPI, CommentTreeListAPI, \
+    CommentReplyListAPI
+from flowback.user.models import User
 from flowback.user.tests.factories import UserFactory
 
 
 class CommentSectionTest(APITestCase):
     def setUp(self):
+        cache.clear()
         self.comment_section = CommentSectionFactory()
 
     # Tests if the comment_list API gives a tree structure that's ordered properly
@@ -76,6 +87,82 @@ class CommentSectionTest(APITestCase):
                         'Comments are not ordered by ancestors')
 
 
+    def test_comment_path(self):
+        comment = CommentFactory(comment_section=self.comment_section)
+        reply = CommentFactory(comment_section=self.comment_section, parent=comment)
+        reply_two = CommentFactory(comment_section=self.comment_section, parent=reply)
+
+        reply_two.refresh_from_db()
+        self.assertEqual(reply_two.path, f'{comment.id:010d}/{reply.id:010d}/{reply_two.id:010d}/')
+        self.assertEqual(Comment.path_ids(reply_two.path), [comment.id, reply.id, reply_two.id])
+
+    def test_comment_tree_list(self):
+        comment = CommentFactory(comment_section=self.comment_section, post__score=2)
+        comment_b = CommentFactory(comment_section=self.comment_section, post__score=10)
+        comment_c = CommentFactory(comment_section=self.comment_section, post__score=1)
+
+        replies = [CommentFactory(comment_section=self.comment_section, parent=comment, post__score=score)
+                   for score in (1, 5, 3, 4)]
+        reply_reply = CommentFactory(comment_section=self.comment_section, parent=replies[1])
+
+        factory = APIRequestFactory()
+        view = CommentTreeListAPI.as_view()
+
+        request = factory.get('', data=dict(limit=2, replies=2))
+        force_authenticate(request, user=comment.author)
+        response = view(request, comment_section_id=self.comment_section.id)
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['count'], 3)
+        self.assertEqual([x['id'] for x in response.data['results']],
+                         [comment_b.id, comment.id, replies[1].id, replies[3].id])
+        self.assertEqual([x['total_replies'] for x in response.data['results']], [0, 4, 1, 0])
+
+        request = factory.get('', data=dict(limit=2, offset=2, order_by='created_at_asc'))
+        force_authenticate(request, user=comment.author)
+        response = view(request, comment_section_id=self.comment_section.id)
+
+        self.assertEqual([x['id'] for x in response.data['results']], [comment_c.id])
+
+        # Lazily expand the remaining replies
+        view = CommentReplyListAPI.as_view()
+        request = factory.get('', data=dict(offset=2))
+        force_authenticate(request, user=comment.author)
+        response = view(request, comment_section_id=self.comment_section.id, comment_id=comment.id)
+
+        self.assertEqual(response.data['count'], 4)
+        self.assertEqual([x['id'] for x in response.data['results']], [replies[2].id, replies[0].id])
+
+        request = factory.get('', data=dict(replies=1))
+        force_authenticate(request, user=comment.author)
+        response = view(request, comment_section_id=self.comment_section.id, comment_id=replies[1].id)
+
+        self.assertEqual([x['id'] for x in response.data['results']], [reply_reply.id])
+
+    def test_comment_tree_cache(self):
+        comment = CommentFactory(comment_section=self.comment_section)
+        comment_two = CommentFactory(comment_section=self.comment_section)
+
+        skeleton = comment_tree_skeleton(comment_section_id=self.comment_section.id)
+        with self.assertNumQueries(0):
+            self.assertEqual(comment_tree_skeleton(comment_section_id=self.comment_section.id), skeleton)
+
+        # Votes reorder the score skeletons
+        CommentVoteFactory.create_batch(3, comment=comment_two, vote=True)
+        self.assertEqual(comment_tree_skeleton(comment_section_id=self.comment_section.id)[0],
+                         [comment_two.id, comment.id])
+
+        # New comments are picked up by every ordering
+        created_at = comment_tree_skeleton(comment_section_id=self.comment_section.id, order_by='created_at_asc')
+        reply = CommentFactory(comment_section=self.comment_section, parent=comment)
+
+        self.assertNotEqual(comment_tree_skeleton(comment_section_id=self.comment_section.id,
+                                                  order_by='created_at_asc'), created_at)
+        self.assertEqual(comment_tree_skeleton(comment_section_id=self.comment_section.id)[comment.id], [reply.id])
+
+        reply.delete()
+        self.assertNotIn(comment.id, comment_tree_skeleton(comment_section_id=self.comment_section.id))
+
     def test_comment_update(self):
         user_one = UserFactory()
         user_two = UserFactory()
@@ -134,3 +221,122 @@ class CommentSectionTest(APITestCase):
         comment.refresh_from_db()
 
         self.assertLess(comment.score, previous_comment_score)
+
+    def test_comment_vote_counters(self):
+        comment = CommentFactory(comment_section=self.comment_section)  # Author upvotes by default
+        votes = [CommentVoteFactory(comment=comment, vote=x) for x in (True, True, False, False)]
+
+        comment_vote(fetched_by=votes[0].created_by_id,
+                     comment_section_id=self.comment_section.id,
+                     comment_id=comment.id,
+                     vote=False)
+        comment_vote(fetched_by=votes[2].created_by_id,
+                     comment_section_id=self.comment_section.id,
+                     comment_id=comment.id)
+
+        comment.refresh_from_db()
+        self.assertEqual((comment.upvotes, comment.downvotes), (2, 2))
+        self.assertEqual(comment.upvotes, CommentVote.objects.filter(comment=comment, vote=True).count())
+
+        Comment.objects.filter(id=comment.id).update(upvotes=0, downvotes=10)
+        self.assertEqual(comment_vote_counter_reconcile(), 1)
+
+        comment.refresh_from_db()
+        self.assertEqual((comment.upvotes, comment.downvotes), (2, 2))
+
+    def test_comment_list_query_plan(self):
+        CommentVoteFactory.create_batch(5, comment__comment_section=self.comment_section)
+        comments = comment_list(fetched_by=UserFactory(), comment_section_id=self.comment_section.id)
+
+        self.assertNotIn('Aggregate', comments.queryset.explain())
+
+        # Pages are fetched by id, without walking the tree in a recursive query
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(len(comments[:3]), 3)
+
+        self.assertEqual(len(queries), 1)
+        self.assertNotIn('RECURSIVE', queries[0]['sql'])
+
+    def test_comment_list_filters(self):
+        parent = CommentFactory(comment_section=self.comment_section)
+        replies = CommentFactory.create_batch(3, comment_section=self.comment_section, parent=parent)
+        nested = CommentFactory(comment_section=self.comment_section, parent=replies[0], message='Nested reply')
+        CommentFactory(comment_section=self.comment_section, message='Nested reply')
+
+        def ids(**filters):
+            return [comment.id for comment in comment_list(fetched_by=parent.author,
+                                                           comment_section_id=self.comment_section.id,
+                                                           filters=filters)]
+
+        for order_by in ('score_desc', 'created_at_asc', 'total_replies_desc'):
+            subtree = ids(id=parent.id, order_by=order_by)
+            self.assertEqual(subtree[0], parent.id)
+            self.assertEqual(len(subtree), 5)
+            self.assertEqual(subtree[subtree.index(replies[0].id) + 1], nested.id)
+            self.assertEqual(ids(id=parent.id, order_by=order_by, message__icontains='nested'), [nested.id])
+            self.assertEqual(ids(parent_id=parent.id, order_by=order_by),
+                             [comment_id for comment_id in subtree if comment_id in {reply.id for reply in replies}])
+
+        self.assertEqual(len(ids(has_attachments=False)), 6)
+
+    @staticmethod
+    def wilson_score(upvotes: int, downvotes: int, z: float = 1.281551565545) -> float:
+        n = upvotes + downvotes
+        if upvotes == downvotes:
+            return 0
+
+        p = upvotes / n
+        return (p + z * z / (2 * n) - z * sqrt(p * (1 - p) / n + z * z / (4 * n * n))) / (1 + z * z / n)
+
+    def test_comment_vote_score(self):
+        comment = CommentFactory(comment_section=self.comment_section)
+        votes = CommentVoteFactory.create_batch(3, comment=comment, vote=False)
+
+        comment.refresh_from_db()
+        self.assertAlmostEqual(float(comment.score), self.wilson_score(1, 3))
+
+        # Score returns to zero once votes are balanced again
+        votes[0].delete()
+        votes[1].delete()
+        comment.refresh_from_db()
+        self.assertEqual(float(comment.score), 0)
+
+    def test_comment_vote_benchmark(self):
+        comment = CommentFactory(comment_section=self.comment_section)
+        users = User.objects.bulk_create([User(username=f'comment_vote_benchmark_{i}',
+                                               email=f'comment_vote_benchmark_{i}@example.com')
+                                          for i in range(10000)])
+
+        # Bulk import, counters and scores are recomputed by a single UPDATE
+        with CaptureQueriesContext(connection) as queries:
+            start = time.perf_counter()
+            comment_vote_import(comment_section_id=self.comment_section.id,
+                                votes=[dict(comment_id=comment.id, created_by_id=user.id, vote=i % 3 != 0)
+                                       for i, user in enumerate(users)])
+            print(f'comment_vote_import: 10000 votes in {(time.perf_counter() - start) * 1000:.2f}ms, '
+                  f'{len(queries)} queries')
+
+        comment.refresh_from_db()
+        self.assertEqual((comment.upvotes, comment.downvotes), (6667, 3334))  # Including the authors upvote
+        self.assertAlmostEqual(float(comment.score), self.wilson_score(6667, 3334))
+
+        # Individual votes on a comment with 10k votes don't aggregate, making every vote cost the same
+        query_counts = []
+        start = time.perf_counter()
+        for user in [user for i, user in enumerate(users) if i % 3 != 0][:100]:  # Flips upvotes to downvotes
+            with CaptureQueriesContext(connection) as queries:
+                comment_vote(fetched_by=user.id,
+                             comment_section_id=self.comment_section.id,
+                             comment_id=comment.id,
+                             vote=False)
+
+            query_counts.append(len(queries))
+            self.assertFalse(any('COUNT(' in query['sql'] for query in queries))
+
+        print(f'comment_vote: 100 votes in {(time.perf_counter() - start) * 1000:.2f}ms')
+        self.assertEqual(len(set(query_counts)), 1)
+
+        comment.refresh_from_db()
+        self.assertEqual(CommentVote.objects.filter(comment=comment, vote=True).count(), 6567)
+        self.assertEqual((comment.upvotes, comment.downvotes), (6567, 3434))
+        self.assertAlmostEqual(float(comment.score), self.wilson_score(6567, 3434))
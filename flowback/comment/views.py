@@ -4,10 +4,10 @@ from rest_framework import serializers, status
 from rest_framework.response import Response
 from rest_framework.views import APIView
 
-from flowback.comment.selectors import comment_list, comment_ancestor_list
+from flowback.comment.selectors import comment_list, comment_ancestor_list, comment_tree_list, comment_reply_list
 from flowback.comment.services import comment_create, comment_update, comment_delete, comment_vote
 from flowback.common.pagination import LimitOffsetPagination, get_paginated_response
-from flowback.files.serializers import FileSerializer, FileCollectionCreateSerializerMixin, \
+from flowback.files.serializers import ImageDerivativeField, FileSerializer, FileCollectionCreateSerializerMixin, \
     FileCollectionUpdateSerializerMixin, FileCollectionListSerializerMixin
 
 
@@ -38,7 +38,7 @@ class CommentListAPI(APIView):
         id = serializers.IntegerField()
         author_id = serializers.IntegerField()
         author_name = serializers.CharField(source='author.username')
-        author_profile_image = serializers.ImageField(source='author.profile_image')
+        author_profile_image = ImageDerivativeField(size=64, source='author.profile_image')
         parent_id = serializers.IntegerField(allow_null=True)
         created_at = serializers.DateTimeField()
         edited = serializers.BooleanField()
@@ -83,6 +83,45 @@ class CommentAncestorListAPI(APIView):
                                       view=self)
 
 
+# Returns top level comments with their first replies, reading from the cached tree skeleton
+class CommentTreeListAPI(APIView):
+    lazy_action = comment_tree_list
+
+    class Pagination(LimitOffsetPagination):
+        default_limit = 20
+        max_limit = 100
+
+    class FilterSerializer(serializers.Serializer):
+        order_by = serializers.ChoiceField(choices=['created_at_asc',
+                                                    'created_at_desc',
+                                                    'score_asc',
+                                                    'score_desc'], default='score_desc')
+        replies = serializers.IntegerField(default=3, min_value=0, max_value=20)
+
+    class OutputSerializer(CommentListAPI.OutputSerializer):
+        total_replies = serializers.IntegerField()
+
+    def get(self, request, *args, **kwargs):
+        serializer = self.FilterSerializer(data=request.query_params)
+        serializer.is_valid(raise_exception=True)
+
+        comments = self.lazy_action.__func__(fetched_by=request.user,
+                                             filters=serializer.validated_data,
+                                             *args,
+                                             **kwargs)
+
+        return get_paginated_response(pagination_class=self.Pagination,
+                                      serializer_class=self.OutputSerializer,
+                                      queryset=comments,
+                                      request=request,
+                                      view=self)
+
+
+# Expands the replies of a comment, with their first replies
+class CommentReplyListAPI(CommentTreeListAPI):
+    lazy_action = comment_reply_list
+
+
 class CommentCreateAPI(APIView):
     lazy_action = comment_create
 
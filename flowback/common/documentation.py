@@ -1,6 +1,8 @@
 from rest_framework import serializers
 from drf_spectacular.openapi import AutoSchema
 
+from flowback.common.pagination import CursorPagination
+
 
 # Modified automatic schema generation for generating the API documentation
 class CustomAutoSchema(AutoSchema):
@@ -17,10 +19,19 @@ class CustomAutoSchema(AutoSchema):
         if 'Pagination' in dir(view.__class__):
             pagination_class = view.__class__.Pagination
 
-            class FilterSerializer(serializer_class if serializer_class is not None else serializers.Serializer):
-                limit = serializers.IntegerField(default=pagination_class.default_limit,
-                                                 max_value=pagination_class.max_limit)
-                offset = serializers.IntegerField(required=False)
+            if issubclass(pagination_class, CursorPagination):
+                class FilterSerializer(serializer_class if serializer_class is not None else serializers.Serializer):
+                    limit = serializers.IntegerField(default=pagination_class.default_limit,
+                                                     max_value=pagination_class.max_limit)
+                    cursor = serializers.CharField(required=False)
+
+            else:
+                class FilterSerializer(serializer_class if serializer_class is not None else serializers.Serializer):
+                    limit = serializers.IntegerField(default=pagination_class.default_limit,
+                                                     max_value=pagination_class.max_limit)
+                    offset = serializers.IntegerField(required=False)
+                    count = serializers.BooleanField(default=True,
+                                                     help_text='Set to false to skip counting, count is null then')
 
             serializer_class = FilterSerializer
 
@@ -43,10 +54,23 @@ class CustomAutoSchema(AutoSchema):
             if 'OutputSerializer' in dir(view.__class__):
                 serializer_class = view.__class__.OutputSerializer
 
-                if 'Pagination' in dir(view.__class__):
+                if 'Pagination' in dir(view.__class__) and issubclass(view.__class__.Pagination, CursorPagination):
                     class OutputSerializer(serializer_class if serializer_class is not None
                                            else serializers.Serializer):
-                        count = serializers.IntegerField()
+                        next = serializers.URLField(allow_null=True)
+                        previous = serializers.URLField(allow_null=True)
+
+                        if 'Meta' in dir(serializer_class):
+                            class Meta(serializer_class.Meta):
+                                fields = serializer_class.Meta.fields + ('next', 'previous')
+
+                elif 'Pagination' in dir(view.__class__):
+                    estimated = getattr(view.__class__.Pagination, 'count_mode', 'exact') == 'estimate'
+
+                    class OutputSerializer(serializer_class if serializer_class is not None
+                                           else serializers.Serializer):
+                        count = serializers.IntegerField(allow_null=True,
+                                                         help_text='Estimated row count' if estimated else None)
                         next = serializers.URLField()
                         previous = serializers.URLField()
                         total_page = serializers.IntegerField()
@@ -55,6 +79,7 @@ class CustomAutoSchema(AutoSchema):
                             class Meta(serializer_class.Meta):
                                 fields = serializer_class.Meta.fields + ('count', 'next', 'previous', 'total_page')
 
+                if 'Pagination' in dir(view.__class__):
                     OutputSerializer.__qualname__ = serializer_class.__qualname__
                     OutputSerializer.__module__ = serializer_class.__module__
                     OutputSerializer.__name__ = serializer_class.__name__
@@ -0,0 +1,264 @@
+import cProfile
+import functools
+import logging
+import math
+import os
+import threading
+import time
+import tracemalloc
+from contextlib import ExitStack
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connection
+from django.utils import timezone
+
+logger = logging.getLogger(__name__)
+
+# Upper bounds of the task wall time histogram, in seconds
+TASK_DURATION_BUCKETS = (0.1, 0.5, 1, 5, 15, 60, 300, math.inf)
+TASK_METRICS_CACHE_PREFIX = 'task_metrics'
+
+# Celery names of every instrumented task, in the order they were decorated
+INSTRUMENTED_TASKS = []
+
+# Runs of the current thread, innermost last. Tasks may call each other directly (e.g. poll_phase_job_sweep)
+_local = threading.local()
+
+
+class TaskRun:
+    def __init__(self, name: str):
+        self.name = name
+        self.started = time.perf_counter()
+        self.wall_time = 0.0
+        self.db_queries = 0
+        self.db_time = 0.0
+        self.rows = 0
+        self.memory_start = 0
+        self.peak_memory = None
+        self.failed = False
+        self.profile = None
+
+
+def _task_runs() -> list[TaskRun]:
+    if not hasattr(_local, 'runs'):
+        _local.runs = []
+
+    return _local.runs
+
+
+def task_rows(count: int) -> None:
+    """
+    Adds to the rows processed by the innermost running task, does nothing outside of an instrumented task.
+    """
+    if runs := _task_runs():
+        runs[-1].rows += count or 0
+
+
+def _db_execute(execute, sql, params, many, context):
+    start = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+
+    finally:
+        elapsed = time.perf_counter() - start
+
+        # Queries of a nested task are part of every task that (indirectly) called it
+        for run in _task_runs():
+            run.db_queries += 1
+            run.db_time += elapsed
+
+
+def _memory_absorb(runs: list[TaskRun]) -> None:
+    # Folds the traced peak into every active run, so that it can be reset for a nested run
+    current, peak = tracemalloc.get_traced_memory()
+    for run in runs:
+        run.peak_memory = max(run.peak_memory or 0, peak - run.memory_start)
+
+
+def _profiler_start():
+    if settings.FLOWBACK_TASK_PROFILER == 'pyinstrument':
+        try:
+            from pyinstrument import Profiler
+
+            profiler = Profiler()
+            profiler.start()
+            return profiler
+
+        except ModuleNotFoundError:
+            logger.warning('pyinstrument is not installed, falling back to cProfile')
+
+    profiler = cProfile.Profile()
+    try:
+        profiler.enable()
+
+    except ValueError:
+        # Another profiler (e.g. a debugger or coverage) is already active
+        return None
+
+    return profiler
+
+
+def _profiler_stop(profiler, run: TaskRun) -> None:
+    if isinstance(profiler, cProfile.Profile):
+        profiler.disable()
+
+    else:
+        profiler.stop()
+
+    if run.wall_time < settings.FLOWBACK_TASK_PROFILE_THRESHOLD:
+        return
+
+    os.makedirs(settings.FLOWBACK_TASK_PROFILE_DIR, exist_ok=True)
+    path = os.path.join(settings.FLOWBACK_TASK_PROFILE_DIR,
+                        f'{run.name}-{timezone.now():%Y%m%dT%H%M%S%f}-{os.getpid()}')
+
+    if isinstance(profiler, cProfile.Profile):
+        run.profile = f'{path}.prof'
+        profiler.dump_stats(run.profile)
+
+    else:
+        run.profile = f'{path}.html'
+        with open(run.profile, 'w') as file:
+            file.write(profiler.output_html())
+
+
+def task_run_record(run: TaskRun) -> None:
+    """
+    Adds a finished run to the task metrics in the shared cache, exposed by task_metrics_exposition.
+    Counters are incremented atomically, durations are stored in microseconds.
+    """
+    prefix = f'{TASK_METRICS_CACHE_PREFIX}:{run.name}'
+    bucket = next(i for i, bound in enumerate(TASK_DURATION_BUCKETS) if run.wall_time <= bound)
+    counters = {'runs_failure' if run.failed else 'runs_success': 1,
+                f'duration_bucket:{bucket}': 1,
+                'duration_us': round(run.wall_time * 10 ** 6),
+                'db_queries': run.db_queries,
+                'db_time_us': round(run.db_time * 10 ** 6),
+                'rows': run.rows}
+
+    try:
+        for key, value in counters.items():
+            cache.add(f'{prefix}:{key}', 0, timeout=None)
+            cache.incr(f'{prefix}:{key}', value)
+
+        if run.peak_memory is not None:
+            cache.set(f'{prefix}:peak_memory', run.peak_memory, timeout=None)
+
+    except Exception:
+        # Metrics are never worth failing a task over
+        logger.exception(f'Unable to record metrics of task {run.name}')
+
+    message = (f'Task {run.name} {"failed" if run.failed else "succeeded"} in {run.wall_time:.3f}s, '
+               f'{run.db_queries} queries in {run.db_time:.3f}s, {run.rows} rows'
+               f'{"" if run.peak_memory is None else f", peak memory {run.peak_memory} bytes"}'
+               f'{"" if run.profile is None else f", profile written to {run.profile}"}')
+
+    if run.profile:
+        logger.warning(message)
+
+    else:
+        logger.info(message)
+
+
+def instrumented_task(func):
+    """
+    Records wall time, database queries and their time, rows processed (see task_rows) and, with
+    FLOWBACK_TASK_TRACE_MEMORY, peak traced memory of every run of a task. Runs slower than
+    FLOWBACK_TASK_PROFILE_THRESHOLD seconds dump their profile into FLOWBACK_TASK_PROFILE_DIR.
+    Goes beneath @shared_task, the task keeps its name.
+    """
+    name = f'{func.__module__}.{func.__name__}'
+    INSTRUMENTED_TASKS.append(name)
+
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        runs = _task_runs()
+        run = TaskRun(name=name)
+        profiler = None
+
+        with ExitStack() as stack:
+            # Only the outermost run hooks into the database, memory tracing and profiler, nested runs share them
+            if not runs:
+                stack.enter_context(connection.execute_wrapper(_db_execute))
+
+                if settings.FLOWBACK_TASK_TRACE_MEMORY and not tracemalloc.is_tracing():
+                    tracemalloc.start()
+                    stack.callback(tracemalloc.stop)
+
+                if settings.FLOWBACK_TASK_PROFILE_THRESHOLD:
+                    profiler = _profiler_start()
+
+            if tracemalloc.is_tracing():
+                _memory_absorb(runs)
+                tracemalloc.reset_peak()
+                run.memory_start = tracemalloc.get_traced_memory()[0]
+
+            runs.append(run)
+            run.started = time.perf_counter()
+
+            try:
+                return func(*args, **kwargs)
+
+            except Exception:
+                run.failed = True
+                raise
+
+            finally:
+                run.wall_time = time.perf_counter() - run.started
+                if tracemalloc.is_tracing():
+                    _memory_absorb(runs)
+
+                runs.pop()
+                if profiler:
+                    _profiler_stop(profiler, run)
+
+                task_run_record(run)
+
+    return wrapper
+
+
+def task_metrics_exposition() -> str:
+    """
+    Renders the task metrics in the Prometheus text exposition format.
+    """
+    labels = {name: f'task="{name}"' for name in dict.fromkeys(INSTRUMENTED_TASKS)}
+    keys = ['runs_success', 'runs_failure', 'duration_us', 'db_queries', 'db_time_us', 'rows', 'peak_memory']
+    keys += [f'duration_bucket:{i}' for i in range(len(TASK_DURATION_BUCKETS))]
+    values = cache.get_many([f'{TASK_METRICS_CACHE_PREFIX}:{name}:{key}' for name in labels for key in keys])
+
+    def value(name: str, key: str, default=0):
+        return values.get(f'{TASK_METRICS_CACHE_PREFIX}:{name}:{key}', default)
+
+    def family(metric: str, metric_type: str, description: str, samples: list[str]) -> list[str]:
+        return [f'# HELP {metric} {description}', f'# TYPE {metric} {metric_type}'] + samples
+
+    lines = family('flowback_task_runs_total', 'counter', 'Finished task runs',
+                   [f'flowback_task_runs_total{{{label},state="{state}"}} {value(name, f"runs_{state}")}'
+                    for name, label in labels.items() for state in ('success', 'failure')])
+
+    duration = []
+    for name, label in labels.items():
+        total = 0
+        for i, bound in enumerate(TASK_DURATION_BUCKETS):
+            total += value(name, f'duration_bucket:{i}')
+            le = '+Inf' if math.isinf(bound) else f'{bound:g}'
+            duration.append(f'flowback_task_duration_seconds_bucket{{{label},le="{le}"}} {total}')
+
+        duration += [f'flowback_task_duration_seconds_sum{{{label}}} {value(name, "duration_us") / 10 ** 6}',
+                     f'flowback_task_duration_seconds_count{{{label}}} {total}']
+
+    lines += family('flowback_task_duration_seconds', 'histogram', 'Wall time of task runs', duration)
+    lines += family('flowback_task_db_queries_total', 'counter', 'Database queries run by tasks',
+                    [f'flowback_task_db_queries_total{{{label}}} {value(name, "db_queries")}'
+                     for name, label in labels.items()])
+    lines += family('flowback_task_db_time_seconds_total', 'counter', 'Time tasks spent on database queries',
+                    [f'flowback_task_db_time_seconds_total{{{label}}} {value(name, "db_time_us") / 10 ** 6}'
+                     for name, label in labels.items()])
+    lines += family('flowback_task_rows_total', 'counter', 'Rows processed by tasks',
+                    [f'flowback_task_rows_total{{{label}}} {value(name, "rows")}' for name, label in labels.items()])
+    lines += family('flowback_task_peak_memory_bytes', 'gauge', 'Peak traced memory of the latest task run',
+                    [f'flowback_task_peak_memory_bytes{{{label}}} {value(name, "peak_memory")}'
+                     for name, label in labels.items() if value(name, 'peak_memory', None) is not None])
+
+    return '\n'.join(lines) + '\n'
@@ -12,6 +12,48 @@ class BaseModel(models.Model):
         abstract = True
 
 
+class SaveExcludedModel(models.Model):
+    """
+    A plugin for models with fields only written by targeted updates (e.g. sweepers or Celery tasks), listed in
+    SAVE_EXCLUDED_FIELDS. Saving an existing instance leaves them alone, so stale in-memory values never overwrite
+    them. Plugins extend save_excluded_fields with the fields they manage themselves.
+    """
+    SAVE_EXCLUDED_FIELDS: tuple[str, ...] = ()
+
+    @classmethod
+    def save_excluded_fields(cls) -> tuple[str, ...]:
+        return cls.SAVE_EXCLUDED_FIELDS
+
+    def save(self, *args, **kwargs):
+        if not (args or self._state.adding or kwargs.get('force_insert') or kwargs.get('update_fields') is not None):
+            deferred_fields = self.get_deferred_fields()
+            excluded_fields = self.save_excluded_fields()
+            kwargs['update_fields'] = [field.name for field in self._meta.concrete_fields
+                                       if not field.primary_key
+                                       and field.attname not in deferred_fields
+                                       and field.name not in excluded_fields]
+
+        super().save(*args, **kwargs)
+
+    class Meta:
+        abstract = True
+
+
+class CounterModel(SaveExcludedModel):
+    """
+    A plugin for models with denormalized counters, the COUNTER_FIELDS are only written by F() updates
+    and are left alone when saving an existing instance (see SaveExcludedModel).
+    """
+    COUNTER_FIELDS: tuple[str, ...] = ()
+
+    @classmethod
+    def save_excluded_fields(cls) -> tuple[str, ...]:
+        return super().save_excluded_fields() + cls.COUNTER_FIELDS
+
+    class Meta:
+        abstract = True
+
+
 # Generates a query where only one of the fields is allowed to be set, while all other fields must be null
 def generate_exclusive_q(*fields: str) -> Q:
     queryset_merge = None
@@ -1,7 +1,18 @@
+import base64
+import binascii
+import datetime
+import json
 from collections import OrderedDict
 
-from rest_framework.pagination import LimitOffsetPagination as _LimitOffsetPagination
+from django.core.exceptions import ImproperlyConfigured
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db.models import Q, QuerySet
+from rest_framework.exceptions import ValidationError
+from rest_framework.fields import BooleanField
+from rest_framework.pagination import LimitOffsetPagination as _LimitOffsetPagination, BasePagination, \
+    _positive_int
 from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
 
 
 # Default pagination getter for list views
@@ -19,11 +30,69 @@ def get_paginated_response(*, pagination_class, serializer_class, queryset, requ
     return Response(data=serializer.data)
 
 
+# Row estimate from the query planner, avoids running COUNT(*) over expensive querysets
+def queryset_count_estimate(queryset) -> int:
+    if not isinstance(queryset, QuerySet):
+        return len(queryset)
+
+    return int(json.loads(queryset.explain(format='json'))[0]['Plan']['Plan Rows'])
+
+
 # Default pagination class for list views
 class LimitOffsetPagination(_LimitOffsetPagination):
+    """
+    Views may set count_mode to 'estimate' (planner estimate) or 'none' (count is null) to skip COUNT(*),
+    clients can skip it as well by passing count=false.
+    """
     default_limit = 10
     max_limit = 50
 
+    count_mode = 'exact'
+    count_query_param = 'count'
+
+    def get_count_mode(self, request) -> str:
+        count = request.query_params.get(self.count_query_param)
+        if count is not None and count.lower() in BooleanField.FALSE_VALUES:
+            return 'none'
+
+        return self.count_mode
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.has_next = None
+        count_mode = self.get_count_mode(request)
+
+        if count_mode == 'exact':
+            return super().paginate_queryset(queryset, request, view=view)
+
+        if count_mode not in ('estimate', 'none'):
+            raise ImproperlyConfigured(f'Unknown count_mode {count_mode}')
+
+        self.request = request
+        self.limit = self.get_limit(request)
+        if self.limit is None:
+            return None
+
+        self.offset = self.get_offset(request)
+        self.count = queryset_count_estimate(queryset) if count_mode == 'estimate' else None
+
+        # Fetching one extra row tells whether there's a next page without counting
+        page = list(queryset[self.offset:self.offset + self.limit + 1])
+        self.has_next = len(page) > self.limit
+
+        return page[:self.limit]
+
+    def get_next_link(self):
+        if self.has_next is None:
+            return super().get_next_link()
+
+        if not self.has_next:
+            return None
+
+        url = self.request.build_absolute_uri()
+        url = replace_query_param(url, self.limit_query_param, self.limit)
+
+        return replace_query_param(url, self.offset_query_param, self.offset + self.limit)
+
     def get_paginated_data(self, data):
         return OrderedDict([
             ('limit', self.limit),
@@ -46,4 +115,139 @@ class LimitOffsetPagination(_LimitOffsetPagination):
             ('next', self.get_next_link()),
             ('previous', self.get_previous_link()),
             ('results', data)
-        ]))
\ No newline at end of file
+        ]))
+
+
+# DjangoJSONEncoder cuts datetimes down to milliseconds, cursors must compare equal to the rows they were taken from
+class CursorJSONEncoder(DjangoJSONEncoder):
+    def default(self, o):
+        if isinstance(o, datetime.datetime):
+            return o.isoformat()
+
+        return super().default(o)
+
+
+# Keyset pagination for list views, no COUNT(*) and no OFFSET scans
+class CursorPagination(BasePagination):
+    """
+    Pages through the queryset ordering (or `ordering` when the queryset is unordered), which must consist of
+    non-null field or annotation names. The primary key is appended as a tiebreaker, making the ordering stable.
+    """
+    default_limit = 10
+    max_limit = 50
+    ordering = ('-created_at',)
+
+    limit_query_param = 'limit'
+    cursor_query_param = 'cursor'
+
+    def get_limit(self, request) -> int:
+        try:
+            return _positive_int(request.query_params[self.limit_query_param], strict=True, cutoff=self.max_limit)
+
+        except (KeyError, ValueError):
+            return self.default_limit
+
+    def get_ordering(self, queryset) -> list[str]:
+        ordering = list(queryset.query.order_by) or list(self.ordering)
+
+        if not all(isinstance(field, str) for field in ordering):
+            raise ImproperlyConfigured('CursorPagination only supports orderings by field names')
+
+        if not any(field.lstrip('-') in ('pk', 'id') for field in ordering):
+            ordering.append('-id' if ordering and ordering[-1].startswith('-') else 'id')
+
+        return ordering
+
+    @staticmethod
+    def get_value(row, field: str):
+        for name in field.lstrip('-').split('__'):
+            name = 'id' if name == 'pk' else name
+            row = row[name] if isinstance(row, dict) else getattr(row, name)
+
+        return row
+
+    def encode_cursor(self, row, reverse: bool) -> str:
+        position = dict(values=[self.get_value(row, field) for field in self.ordering_fields], reverse=reverse)
+        cursor = base64.urlsafe_b64encode(json.dumps(position, cls=CursorJSONEncoder).encode()).decode()
+
+        return replace_query_param(self.base_url, self.cursor_query_param, cursor)
+
+    def decode_cursor(self, request) -> tuple[list | None, bool]:
+        cursor = request.query_params.get(self.cursor_query_param)
+        if not cursor:
+            return None, False
+
+        try:
+            position = json.loads(base64.urlsafe_b64decode(cursor.encode()).decode())
+            values, reverse = position['values'], bool(position['reverse'])
+
+        except (binascii.Error, UnicodeDecodeError, ValueError, KeyError, TypeError):
+            raise ValidationError('Invalid cursor')
+
+        if not isinstance(values, list) or len(values) != len(self.ordering_fields):
+            raise ValidationError('Invalid cursor')
+
+        return values, reverse
+
+    def get_keyset_filter(self, values: list, reverse: bool) -> Q:
+        # (a, b) > (x, y) expands into a > x OR (a = x AND b > y), with each comparison following its direction
+        keyset, equal = Q(), Q()
+        for field, value in zip(self.ordering_fields, values):
+            name = field.lstrip('-')
+            lookup = 'lt' if field.startswith('-') != reverse else 'gt'
+
+            keyset |= equal & Q(**{f'{name}__{lookup}': value})
+            equal &= Q(**{name: value})
+
+        return keyset
+
+    def paginate_queryset(self, queryset, request, view=None):
+        def fetch(*, ordering: list[str], keyset: Q, limit: int) -> list:
+            return list(queryset.order_by(*ordering).filter(keyset)[:limit])
+
+        return self.paginate_rows(fetch, request, ordering=self.get_ordering(queryset), view=view)
+
+    def paginate_rows(self, fetch, request, *, ordering: list[str], view=None) -> list:
+        """
+        Pages through rows of any source, fetch(ordering=..., keyset=..., limit=...) returns up to limit rows
+        (dicts or objects) matching the keyset filter in the given ordering, which must end in a unique field.
+        """
+        self.limit = self.get_limit(request)
+        self.base_url = request.build_absolute_uri()
+        self.ordering_fields = list(ordering)
+
+        values, reverse = self.decode_cursor(request)
+        ordering = self.ordering_fields
+        if reverse:
+            ordering = [field[1:] if field.startswith('-') else f'-{field}' for field in ordering]
+
+        keyset = self.get_keyset_filter(values, reverse) if values is not None else Q()
+
+        page = fetch(ordering=ordering, keyset=keyset, limit=self.limit + 1)
+        has_more = len(page) > self.limit
+        page = page[:self.limit]
+
+        if reverse:
+            page.reverse()
+
+        # Moving forward, more rows mean a next page and a cursor means a previous one. Backwards it's the opposite
+        has_next, has_previous = (values is not None, has_more) if reverse else (has_more, values is not None)
+
+        self.next = self.encode_cursor(page[-1], reverse=False) if page and has_next else None
+        self.previous = self.encode_cursor(page[0], reverse=True) if page and has_previous else None
+
+        return page
+
+    def get_next_link(self):
+        return self.next
+
+    def get_previous_link(self):
+        return self.previous
+
+    def get_paginated_response(self, data):
+        return Response(OrderedDict([
+            ('limit', self.limit),
+            ('next', self.get_next_link()),
+            ('previous', self.get_previous_link()),
+            ('results', data)
+        ]))
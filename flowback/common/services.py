@@ -1,6 +1,8 @@
 from typing import List, Dict, Any, Tuple
 
 from rest_framework.exceptions import ValidationError
+from django.db.models import F, Q, QuerySet, Expression, Subquery, Count
+from django.db.models.functions import Coalesce
 from django.http import Http404
 from django.shortcuts import get_object_or_404
 from flowback.common.types import DjangoModelType
@@ -52,3 +54,21 @@ def get_object(model_or_queryset,
         if reverse:
             return True
         raise ValidationError(error_message or f'{model_or_queryset._meta.model_name} does not exist')
+
+
+# Correlated COUNT(*) over a queryset filtered by an OuterRef, grouped by the given field
+def count_subquery(queryset: QuerySet, field: str) -> Subquery:
+    return Subquery(queryset.values(field).annotate(total=Count('*')).values('total')[:1])
+
+
+# Resets denormalized counter columns that drifted away from their source, returns the number of corrected rows
+def counter_reconcile(*, queryset: QuerySet, counters: Dict[str, Expression]) -> int:
+    counters = {field: Coalesce(expression, 0) for field, expression in counters.items()}
+
+    drifted = Q()
+    for field in counters:
+        drifted |= ~Q(**{field: F(f'actual_{field}')})
+
+    return (queryset.alias(**{f'actual_{field}': expression for field, expression in counters.items()})
+            .filter(drifted)
+            .update(**counters))
@@ -0,0 +1,124 @@
+import datetime
+from urllib.parse import parse_qs, urlparse
+
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework import serializers
+from rest_framework.test import APITestCase
+from rest_framework.views import APIView
+
+from flowback.common.pagination import CursorPagination, LimitOffsetPagination, get_paginated_response
+from flowback.common.tests import generate_request, fake
+from flowback.group.models import Group
+from flowback.group.tests.factories import GroupFactory, GroupUserFactory
+from flowback.poll.tests.factories import PollFactory
+from flowback.user.models import User
+from flowback.user.tests.factories import UserFactory
+from flowback.user.views.home import UserHomeFeedAPI
+
+
+class UserCursorListAPI(APIView):
+    class Pagination(CursorPagination):
+        default_limit = 3
+
+    class OutputSerializer(serializers.Serializer):
+        id = serializers.IntegerField()
+
+    def get(self, request):
+        users = User.objects.filter(username__startswith='pagination').order_by('-dark_theme', 'email_notifications')
+        return get_paginated_response(pagination_class=self.Pagination,
+                                      serializer_class=self.OutputSerializer,
+                                      queryset=users,
+                                      request=request,
+                                      view=self)
+
+
+class GroupCursorListAPI(UserCursorListAPI):
+    def get(self, request):
+        return get_paginated_response(pagination_class=self.Pagination,
+                                      serializer_class=self.OutputSerializer,
+                                      queryset=Group.objects.all(),
+                                      request=request,
+                                      view=self)
+
+
+class GroupEstimateListAPI(GroupCursorListAPI):
+    class Pagination(LimitOffsetPagination):
+        count_mode = 'estimate'
+
+
+class PaginationTest(APITestCase):
+    def setUp(self):
+        fake.unique.clear()
+        self.users = [UserFactory(username=f'pagination_{i}', dark_theme=i % 3 == 0) for i in range(8)]
+
+    @staticmethod
+    def cursor(url: str) -> str | None:
+        return url and parse_qs(urlparse(url).query)['cursor'][0]
+
+    def pages(self, api, direction='next', cursor=None):
+        pages = []
+        while True:
+            response = generate_request(api=api, user=self.users[0], data=dict(cursor=cursor) if cursor else None)
+            self.assertEqual(response.status_code, 200, response.data)
+            self.assertNotIn('count', response.data)
+
+            pages.append([x['id'] for x in response.data['results']])
+            if not response.data[direction]:
+                return pages, response
+
+            cursor = self.cursor(response.data[direction])
+
+    def test_cursor_pagination(self):
+        pages, response = self.pages(UserCursorListAPI)
+
+        # Ties on the ordering are broken by id, every row shows up exactly once
+        expected = [u.id for u in sorted(self.users, key=lambda u: (not u.dark_theme, u.id))]
+        self.assertEqual([x for page in pages for x in page], expected)
+        self.assertEqual([len(page) for page in pages], [3, 3, 2])
+
+        # Walking back from the last page returns the same pages
+        previous, _ = self.pages(UserCursorListAPI, direction='previous',
+                                 cursor=self.cursor(response.data['previous']))
+        self.assertEqual(previous, pages[-2::-1])
+
+    def test_cursor_pagination_datetime(self):
+        groups = GroupFactory.create_batch(size=4)
+
+        # Cursors keep the microseconds, rows within the same millisecond are neither skipped nor repeated
+        created_at = timezone.now()
+        for i, group in enumerate(groups):
+            Group.objects.filter(id=group.id).update(created_at=created_at + datetime.timedelta(microseconds=i))
+
+        pages, _ = self.pages(GroupCursorListAPI)
+        self.assertEqual([x for page in pages for x in page], [g.id for g in reversed(groups)])
+
+    def test_cursor_pagination_invalid_cursor(self):
+        response = generate_request(api=UserCursorListAPI, user=self.users[0], data=dict(cursor='invalid'))
+        self.assertEqual(response.status_code, 400)
+
+    def test_limit_offset_pagination_count(self):
+        group_user = GroupUserFactory()
+        PollFactory.create_batch(size=4, created_by=group_user)
+
+        with CaptureQueriesContext(connection) as queries:
+            response = generate_request(api=UserHomeFeedAPI, user=group_user.user, data=dict(limit=3, count='false'))
+
+        self.assertFalse(any('COUNT(*)' in query['sql'] for query in queries))
+        self.assertIsNone(response.data['count'])
+        self.assertEqual(len(response.data['results']), 3)
+        self.assertIn('offset=3', response.data['next'])
+
+        response = generate_request(api=UserHomeFeedAPI, user=group_user.user,
+                                    data=dict(limit=3, offset=3, count='false'))
+        self.assertEqual(len(response.data['results']), 1)
+        self.assertIsNone(response.data['next'])
+
+        response = generate_request(api=UserHomeFeedAPI, user=group_user.user, data=dict(limit=3))
+        self.assertEqual(response.data['count'], 4)
+
+        GroupFactory.create_batch(size=2)
+        response = generate_request(api=GroupEstimateListAPI, user=group_user.user)
+        self.assertIsInstance(response.data['count'], int)
+        self.assertEqual(len(response.data['results']), 3)
@@ -0,0 +1,19 @@
+from django.core.management.base import BaseCommand
+
+from flowback.files.tasks import image_derivatives_backfill
+
+
+class Command(BaseCommand):
+    help = 'Generates the missing image derivatives of every user and group image'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=100, help='Objects loaded at a time')
+        parser.add_argument('--enqueue', action='store_true', help='Generate in a Celery worker instead of in-process')
+
+    def handle(self, *args, batch_size, enqueue, **options):
+        if enqueue:
+            image_derivatives_backfill.delay(batch_size=batch_size)
+            self.stdout.write('Image derivatives backfill enqueued')
+            return
+
+        self.stdout.write(image_derivatives_backfill(batch_size=batch_size))
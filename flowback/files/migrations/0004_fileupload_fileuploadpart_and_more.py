@@ -0,0 +1,50 @@
+# Generated by Django 4.2.17 on 2026-10-19 09:35
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+import django.utils.timezone
+import flowback.common.validators
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('files', '0003_alter_filesegment_file_name'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='FileUpload',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('created_at', models.DateTimeField(db_index=True, default=django.utils.timezone.now)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('file_name', models.CharField(max_length=255, validators=[flowback.common.validators.FieldNotBlankValidator])),
+                ('size', models.PositiveBigIntegerField()),
+                ('part_size', models.PositiveBigIntegerField()),
+                ('collection', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, to='files.filecollection')),
+                ('created_by', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL)),
+                ('segment', models.OneToOneField(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, to='files.filesegment')),
+            ],
+            options={
+                'abstract': False,
+            },
+        ),
+        migrations.CreateModel(
+            name='FileUploadPart',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('created_at', models.DateTimeField(db_index=True, default=django.utils.timezone.now)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('number', models.PositiveIntegerField()),
+                ('size', models.PositiveBigIntegerField()),
+                ('upload', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='files.fileupload')),
+            ],
+        ),
+        migrations.AddConstraint(
+            model_name='fileuploadpart',
+            constraint=models.UniqueConstraint(fields=('upload', 'number'), name='unique_file_upload_part'),
+        ),
+    ]
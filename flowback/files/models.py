@@ -1,10 +1,19 @@
-import os.path
+import io
+import logging
+import math
 
-from django.db import models
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.db import models, transaction
+from django.db.models.fields.files import FieldFile
 from django.utils import timezone
+from PIL import Image, ImageOps
 
-from flowback.common.models import BaseModel
+from flowback.common.models import BaseModel, SaveExcludedModel
 from flowback.common.validators import FieldNotBlankValidator
+from flowback.files.tasks import image_derivatives_generate_schedule
+
+logger = logging.getLogger(__name__)
 
 
 # Collection of files
@@ -17,3 +26,151 @@ class FileSegment(BaseModel):
     collection = models.ForeignKey(FileCollection, on_delete=models.CASCADE)
     file = models.FileField()
     file_name = models.CharField(max_length=255, validators=[FieldNotBlankValidator])
+
+
+class FileUpload(BaseModel):
+    """
+    A resumable upload of a single file, sent in parts of part_size bytes (the last part may be smaller).
+    Parts are kept as temporary blobs in default_storage until the upload is completed, the assembled file
+    is then added to the collection (a new one unless given) as the segment.
+    """
+    created_by = models.ForeignKey('user.User', on_delete=models.CASCADE)
+    file_name = models.CharField(max_length=255, validators=[FieldNotBlankValidator])
+    size = models.PositiveBigIntegerField()
+    part_size = models.PositiveBigIntegerField()
+    collection = models.ForeignKey(FileCollection, null=True, blank=True, on_delete=models.CASCADE)
+    segment = models.OneToOneField(FileSegment, null=True, blank=True, on_delete=models.SET_NULL)
+
+    @property
+    def part_count(self) -> int:
+        return max(1, math.ceil(self.size / self.part_size))
+
+    def part_name(self, number: int) -> str:
+        return f"upload/parts/{self.id}/{number}"
+
+    def expected_part_size(self, number: int) -> int:
+        return self.part_size if number < self.part_count else self.size - self.part_size * (self.part_count - 1)
+
+
+class FileUploadPart(BaseModel):
+    upload = models.ForeignKey(FileUpload, on_delete=models.CASCADE)
+    number = models.PositiveIntegerField()
+    size = models.PositiveBigIntegerField()
+
+    class Meta:
+        constraints = [models.UniqueConstraint(fields=['upload', 'number'], name='unique_file_upload_part')]
+
+
+class ImageDerivativeModel(SaveExcludedModel):
+    """
+    A plugin for models with images, generating resized WebP derivatives of the IMAGE_DERIVATIVE_FIELDS in Celery
+    whenever an image changes. image_derivatives keeps track of the image name and sizes the derivatives of each field
+    were generated for, derivatives of a replaced image are never served. Only the task writes image_derivatives.
+    """
+    IMAGE_DERIVATIVE_FIELDS: tuple[str, ...] = ()
+
+    image_derivatives = models.JSONField(default=dict, blank=True)
+
+    class Meta:
+        abstract = True
+
+    @classmethod
+    def save_excluded_fields(cls) -> tuple[str, ...]:
+        return super().save_excluded_fields() + ('image_derivatives',)
+
+    @staticmethod
+    def image_derivative_name(name: str, size: int) -> str:
+        # The full image name is kept, images differing only by extension would otherwise share derivatives
+        return f"derivatives/{size}/{name}.webp"
+
+    @classmethod
+    def image_derivative_url(cls, image: FieldFile, size: int) -> str | None:
+        """
+        URL of the smallest derivative of an image at least size pixels wide and high,
+        the original image if there is none (yet).
+        """
+        if not image:
+            return None
+
+        generated = (getattr(image.instance, 'image_derivatives', None) or {}).get(image.field.name)
+        if generated and generated['name'] == image.name:
+            if sizes := [derivative_size for derivative_size in generated['sizes'] if derivative_size >= size]:
+                return image.storage.url(cls.image_derivative_name(image.name, min(sizes)))
+
+        return image.url
+
+    @property
+    def image_derivatives_pending(self) -> list[str]:
+        """Image fields lacking derivatives of their current image at the FLOWBACK_IMAGE_DERIVATIVE_SIZES"""
+        sizes = sorted(settings.FLOWBACK_IMAGE_DERIVATIVE_SIZES)
+        return [field for field in self.IMAGE_DERIVATIVE_FIELDS
+                if getattr(self, field) and self.image_derivatives.get(field) != dict(name=getattr(self, field).name,
+                                                                                      sizes=sizes)]
+
+    def generate_image_derivatives(self, fields: list[str] = None) -> list[str]:
+        """
+        Generates the derivatives of the given (by default the pending) image fields and records them in
+        image_derivatives, unless the image has been replaced in the meantime. Returns the fields recorded.
+        Images that can't be decoded are logged and left without derivatives, the original is served instead.
+        """
+        sizes = sorted(settings.FLOWBACK_IMAGE_DERIVATIVE_SIZES)
+        generated = {}
+
+        for field in self.image_derivatives_pending if fields is None else fields:
+            image = getattr(self, field)
+            if not image:
+                continue
+
+            try:
+                with image.open('rb'), Image.open(image) as source:
+                    # JPEGs are decoded at a reduced scale when the largest derivative allows it
+                    source.draft('RGB', (sizes[-1], sizes[-1]))
+                    source = ImageOps.exif_transpose(source)
+                    if source.mode not in ('RGB', 'RGBA'):
+                        source = source.convert('RGBA' if source.has_transparency_data else 'RGB')
+
+                    for size in sizes:
+                        derivative = source.copy()
+                        derivative.thumbnail((size, size), Image.Resampling.LANCZOS)
+                        buffer = io.BytesIO()
+                        derivative.save(buffer, 'WEBP', quality=settings.FLOWBACK_IMAGE_DERIVATIVE_QUALITY)
+
+                        # Derivative names are deterministic, storages would otherwise save under another name
+                        name = self.image_derivative_name(image.name, size)
+                        image.storage.delete(name)
+                        image.storage.save(name, ContentFile(buffer.getvalue()))
+
+            except (OSError, ValueError, Image.DecompressionBombError):
+                logger.warning("Unable to generate derivatives of %s", image.name, exc_info=True)
+                continue
+
+            generated[field] = dict(name=image.name, sizes=sizes)
+
+        if not generated:
+            return []
+
+        with transaction.atomic():
+            current = type(self).objects.select_for_update().filter(pk=self.pk).values('image_derivatives',
+                                                                                      *generated).first()
+            if current is None:
+                return []
+
+            recorded = [field for field, derivative in generated.items() if current[field] == derivative['name']]
+            self.image_derivatives = current['image_derivatives'] | {field: generated[field] for field in recorded}
+            type(self).objects.filter(pk=self.pk).update(image_derivatives=self.image_derivatives)
+
+        return recorded
+
+    @classmethod
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+        models.signals.post_save.connect(generate_image_derivatives, sender=cls)
+
+
+def generate_image_derivatives(sender, instance: ImageDerivativeModel, **kwargs):
+    pending = {field: getattr(instance, field).name for field in instance.image_derivatives_pending}
+
+    # Instances saved again (e.g. by their own post_save) don't enqueue the same images twice
+    if pending and pending != getattr(instance, '_image_derivatives_scheduled', None):
+        instance._image_derivatives_scheduled = pending
+        image_derivatives_generate_schedule(model=instance._meta.label, object_id=instance.pk, fields=list(pending))
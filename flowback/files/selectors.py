@@ -0,0 +1,6 @@
+from flowback.common.services import get_object
+from flowback.files.models import FileUpload
+
+
+def file_upload_get(*, user_id: int, upload_id: int) -> FileUpload:
+    return get_object(FileUpload, 'Upload does not exist', id=upload_id, created_by_id=user_id)
@@ -1,5 +1,9 @@
+from django.conf import settings
+from django.db.models.fields.files import FieldFile
 from rest_framework import serializers
 
+from flowback.files.models import FileUpload, ImageDerivativeModel
+
 
 class FileSerializer(serializers.Serializer):
     id = serializers.IntegerField()
@@ -7,6 +11,38 @@ class FileSerializer(serializers.Serializer):
     file_name = serializers.CharField()
 
 
+class FileUploadSerializer(serializers.Serializer):
+    id = serializers.IntegerField()
+    file_name = serializers.CharField()
+    size = serializers.IntegerField()
+    part_size = serializers.IntegerField()
+    part_count = serializers.IntegerField()
+    parts = serializers.SerializerMethodField(help_text='Numbers of the parts received so far')
+    collection_id = serializers.IntegerField(allow_null=True)
+    segment = FileSerializer(allow_null=True, help_text='The file, once the upload has been completed')
+
+    def get_parts(self, obj: FileUpload) -> list[int]:
+        return sorted(obj.fileuploadpart_set.values_list('number', flat=True))
+
+
+class ImageDerivativeField(serializers.ImageField):
+    """
+    Serializes an image as the URL of its smallest derivative fitting size pixels, see ImageDerivativeModel.
+    """
+    def __init__(self, size: int, **kwargs):
+        self.size = size
+        kwargs.setdefault('read_only', True)
+        super().__init__(**kwargs)
+
+    def to_representation(self, value):
+        if not isinstance(value, FieldFile) or not value:
+            return super().to_representation(value)
+
+        url = ImageDerivativeModel.image_derivative_url(value, self.size)
+        request = self.context.get('request', None)
+        return request.build_absolute_uri(url) if request is not None else url
+
+
 class FileCollectionListSerializerMixin:
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
@@ -18,7 +54,8 @@ class FileCollectionCreateSerializerMixin:
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
         if not hasattr(self, 'attachments'):
-            self.fields['attachments'] = serializers.ListField(child=serializers.FileField(), required=False, max_length=10)
+            self.fields['attachments'] = serializers.ListField(child=serializers.FileField(), required=False,
+                                                               max_length=settings.FLOWBACK_FILE_COLLECTION_LIMIT)
 
 
 class FileCollectionUpdateSerializerMixin:
@@ -26,6 +63,6 @@ class FileCollectionUpdateSerializerMixin:
         super().__init__(*args, **kwargs)
         if not hasattr(self, 'attachments_add'):
             self.fields['attachments_add'] = serializers.ListField(child=serializers.FileField(), required=False,
-                                                                   max_length=10)
+                                                                   max_length=settings.FLOWBACK_FILE_COLLECTION_LIMIT)
         if not hasattr(self, 'attachments_remove'):
             self.fields['attachments_remove'] = serializers.ListField(child=serializers.IntegerField(), required=False)
\ No newline at end of file
@@ -1,47 +1,93 @@
+import hashlib
+import io
+import mimetypes
 import ntpath
 import uuid
+from concurrent.futures import ThreadPoolExecutor
 from typing import Union
 
-from django.core.exceptions import ValidationError
-from django.core.files.base import ContentFile
-from django.core.files.uploadedfile import InMemoryUploadedFile
+from django.conf import settings
+from django.core.exceptions import SuspiciousFileOperation, ValidationError
+from django.core.files import File
+from django.core.files.uploadedfile import InMemoryUploadedFile, UploadedFile
 from django.core.files.storage import default_storage
+from django.db import transaction
 from django.utils import timezone
 
-from .models import FileCollection, FileSegment
+from .models import FileCollection, FileSegment, FileUpload, FileUploadPart
 from ..user.models import User
 
+# S3 storage is optional, see the AWS settings
+try:
+    from storages.backends.s3 import S3Storage
+    from storages.utils import clean_name, safe_join
+
+except ImportError:
+    S3Storage = None
+
+S3_MAX_PARTS = 10000
+
+
+def _file_sha256(file: File) -> str:
+    digest = hashlib.sha256()
+    for chunk in file.chunks():
+        digest.update(chunk)
+
+    return digest.hexdigest()
+
+
+def _store_file(name: str, file: File, content_addressed: bool) -> str:
+    """
+    Streams a file to default_storage chunk by chunk, returns the name it was stored under.
+    Content-addressed files that are already stored are not uploaded again.
+    """
+    if content_addressed and default_storage.exists(name):
+        return name
+
+    return default_storage.save(name, file)
+
 
 def upload_file_manager(*, upload_to: str,
-                        files: list[InMemoryUploadedFile],
+                        files: list[UploadedFile],
                         collection: FileCollection,
                         upload_to_uuid=True,
                         upload_to_include_timestamp=True):
-    data = []
+    """
+    Uploads files to default_storage, FLOWBACK_FILE_UPLOAD_WORKERS at a time, and adds them to a collection.
+
+    With upload_to_uuid the files are named after the SHA-256 of their content (keeping the extension),
+    identical files share one stored copy. Content-addressed names leave out the timestamp,
+    it would only deduplicate files uploaded on the same day.
+    """
     if upload_to != "" and not upload_to.endswith("/"):
         upload_to += "/"
 
-    if upload_to_include_timestamp:
+    if upload_to_include_timestamp and not upload_to_uuid:
         upload_to += timezone.now().strftime("%Y/%m/%d/")
 
-    for file in files:
-        file_name = file.name
+    segments, uploads = [], {}
+    for i, file in enumerate(files):
+        # Files keeping their own name are stored one by one, storage picks a free name for duplicates
+        key, name = i, upload_to + file.name
 
-        # Generates an uuid instead of a user-defined file name
+        # Generates a content-addressed name instead of a user-defined file name
         if upload_to_uuid:
-            extension = ntpath.splitext(file_name)
+            extension = ntpath.splitext(file.name)
             extension = extension[1 if len(extension) > 1 else 0]
-            file.name = uuid.uuid4().hex + extension
+            key = name = upload_to + _file_sha256(file) + extension
 
-        default_storage.save(upload_to + file.name, ContentFile(file.read()))
-        data.append(dict(file_name=file_name,
-                         file=upload_to + file.name))
+        segments.append((key, FileSegment(collection=collection, file_name=file.name)))
+        uploads.setdefault(key, (name, file))
 
-    for file in [FileSegment(collection=collection,
-                             file=file['file'],
-                             file_name=file['file_name']) for file in data]:
-        file.full_clean()
-        file.save()
+    with ThreadPoolExecutor(max_workers=max(1, min(settings.FLOWBACK_FILE_UPLOAD_WORKERS, len(uploads)))) as executor:
+        stored = dict(zip(uploads, executor.map(lambda upload: _store_file(*upload, upload_to_uuid),
+                                                uploads.values())))
+
+    for key, segment in segments:
+        segment.file = stored[key]
+        segment.full_clean(exclude=['collection'])
+
+    FileSegment.objects.bulk_create([segment for _, segment in segments])
 
 
 # A function to allow uploading a collection of files to a specified directory
@@ -83,8 +129,9 @@ def update_collection(*, user_id: int = None,
         elif not user.is_staff and file_collection.created_by_id != user_id:
             raise ValidationError("Only the author of the attachment can update it.")
 
-    if (file_collection.filesegment_set.count() + (len(attachments_add or [])) - (len(attachments_remove or []))) > 10:
-        raise ValidationError("Cannot add more than 10 attachments.")
+    if ((file_collection.filesegment_set.count() + (len(attachments_add or [])) - (len(attachments_remove or [])))
+            > settings.FLOWBACK_FILE_COLLECTION_LIMIT):
+        raise ValidationError(f"Cannot add more than {settings.FLOWBACK_FILE_COLLECTION_LIMIT} attachments.")
 
     if attachments_remove:
         file_collection.filesegment_set.filter(id__in=attachments_remove).delete()
@@ -95,3 +142,237 @@ def update_collection(*, user_id: int = None,
                             collection=file_collection,
                             upload_to_uuid=upload_to_uuid,
                             upload_to_include_timestamp=upload_to_include_timestamp)
+
+
+def file_upload_create(*, user_id: int,
+                       file_name: str,
+                       size: int,
+                       part_size: int = None,
+                       collection_id: int = None) -> FileUpload:
+    """
+    Starts a resumable upload of a file of size bytes, added to the collection (a new one unless given) once completed.
+    """
+    part_size = part_size or settings.FLOWBACK_FILE_UPLOAD_PART_SIZE
+
+    if size > settings.FLOWBACK_FILE_UPLOAD_MAX_SIZE:
+        raise ValidationError(f"Files cannot be larger than {settings.FLOWBACK_FILE_UPLOAD_MAX_SIZE} bytes.")
+
+    if part_size < min(size, settings.FLOWBACK_FILE_UPLOAD_MIN_PART_SIZE):
+        raise ValidationError(f"Parts must be at least {settings.FLOWBACK_FILE_UPLOAD_MIN_PART_SIZE} bytes.")
+
+    if collection_id is not None:
+        collection = FileCollection.objects.filter(id=collection_id, created_by_id=user_id).first()
+        if collection is None:
+            raise ValidationError("Only the author of the collection can upload files to it.")
+
+        if collection.filesegment_set.count() >= settings.FLOWBACK_FILE_COLLECTION_LIMIT:
+            raise ValidationError(f"Cannot add more than {settings.FLOWBACK_FILE_COLLECTION_LIMIT} attachments.")
+
+    upload = FileUpload(created_by_id=user_id,
+                        file_name=file_name,
+                        size=size,
+                        part_size=part_size,
+                        collection_id=collection_id)
+
+    if upload.part_count > S3_MAX_PARTS:
+        raise ValidationError(f"Files cannot be uploaded in more than {S3_MAX_PARTS} parts.")
+
+    upload.full_clean()
+    upload.save()
+
+    return upload
+
+
+def _file_upload_get(*, user_id: int, upload_id: int, lock: bool = False) -> FileUpload:
+    uploads = FileUpload.objects.select_for_update() if lock else FileUpload.objects
+    upload = uploads.filter(id=upload_id, created_by_id=user_id).first()
+
+    if upload is None:
+        raise ValidationError("Upload does not exist.")
+
+    if upload.segment_id:
+        raise ValidationError("Upload has already been completed.")
+
+    return upload
+
+
+def file_upload_part(*, user_id: int, upload_id: int, number: int, part: File) -> FileUploadPart:
+    """
+    Stores a part of an upload as a temporary blob, parts sent again replace the earlier one.
+    """
+    upload = _file_upload_get(user_id=user_id, upload_id=upload_id)
+
+    if not 1 <= number <= upload.part_count:
+        raise ValidationError(f"Part number must be between 1 and {upload.part_count}.")
+
+    if part.size != upload.expected_part_size(number):
+        raise ValidationError(f"Part {number} must be {upload.expected_part_size(number)} bytes.")
+
+    # Part names are deterministic, storages would otherwise save under another name
+    name = upload.part_name(number)
+    default_storage.delete(name)
+    default_storage.save(name, part)
+
+    upload_part, _ = FileUploadPart.objects.update_or_create(upload=upload, number=number,
+                                                             defaults=dict(size=part.size))
+    return upload_part
+
+
+class FileUploadReader(io.RawIOBase):
+    """
+    Reads the parts of an upload from default_storage one after another, never holding more than a read at a time.
+    """
+    def __init__(self, names: list[str]):
+        self.names = iter(names)
+        self.part = None
+
+    def readable(self):
+        return True
+
+    def readinto(self, buffer) -> int:
+        while True:
+            if self.part is None:
+                name = next(self.names, None)
+                if name is None:
+                    return 0
+
+                self.part = default_storage.open(name, 'rb')
+
+            data = self.part.read(len(buffer))
+            if data:
+                buffer[:len(data)] = data
+                return len(data)
+
+            self.part.close()
+            self.part = None
+
+    def close(self):
+        if self.part is not None:
+            self.part.close()
+
+        super().close()
+
+
+def _s3_key(storage: 'S3Storage', name: str) -> str:
+    """
+    Key of a stored file in the bucket of an S3Storage, the name within the storage location.
+    """
+    try:
+        return safe_join(storage.location, clean_name(name))
+
+    except ValueError:
+        raise SuspiciousFileOperation(f"Attempted access to '{name}' denied.")
+
+
+def _file_upload_assemble_s3(storage: 'S3Storage', name: str, part_names: list[str]) -> str:
+    """
+    Assembles the parts with an S3 multipart upload copying them within the bucket, the data never leaves S3.
+    """
+    name = clean_name(storage.get_available_name(name))
+    parameters = storage.get_object_parameters(name)
+    parameters.setdefault('ContentType', mimetypes.guess_type(name)[0] or storage.default_content_type)
+    if storage.default_acl:
+        parameters.setdefault('ACL', storage.default_acl)
+
+    multipart_upload = storage.bucket.Object(_s3_key(storage, name)).initiate_multipart_upload(**parameters)
+    try:
+        parts = []
+        for number, part_name in enumerate(part_names, start=1):
+            source = dict(Bucket=storage.bucket_name, Key=_s3_key(storage, part_name))
+            result = multipart_upload.Part(number).copy_from(CopySource=source)
+            parts.append(dict(ETag=result['CopyPartResult']['ETag'], PartNumber=number))
+
+        multipart_upload.complete(MultipartUpload=dict(Parts=parts))
+
+    except Exception:
+        multipart_upload.abort()
+        raise
+
+    return name
+
+
+def _file_upload_parts_delete(part_names: list[str]):
+    for name in part_names:
+        default_storage.delete(name)
+
+
+def file_upload_complete(*, user_id: int, upload_id: int, upload_to: str = "upload") -> FileUpload:
+    """
+    Assembles the parts of an upload into a file in default_storage by streaming them one after another,
+    then adds it to the collection of the upload. The temporary part blobs are removed afterwards.
+
+    Assembling a large file takes minutes, it runs outside of any transaction. The upload is only locked to check
+    the parts beforehand and to record the file afterwards.
+    """
+    with transaction.atomic():
+        upload = _file_upload_get(user_id=user_id, upload_id=upload_id, lock=True)
+
+        numbers = set(upload.fileuploadpart_set.values_list('number', flat=True))
+        if missing := [number for number in range(1, upload.part_count + 1) if number not in numbers]:
+            raise ValidationError(f"Missing parts: {', '.join(map(str, missing))}")
+
+        if upload.collection and upload.collection.filesegment_set.count() >= settings.FLOWBACK_FILE_COLLECTION_LIMIT:
+            raise ValidationError(f"Cannot add more than {settings.FLOWBACK_FILE_COLLECTION_LIMIT} attachments.")
+
+    extension = ntpath.splitext(upload.file_name)[1]
+    name = f"{upload_to.rstrip('/')}/{timezone.now().strftime('%Y/%m/%d')}/{uuid.uuid4().hex}{extension}"
+    part_names = [upload.part_name(number) for number in range(1, upload.part_count + 1)]
+
+    if S3Storage is not None and isinstance(default_storage, S3Storage):
+        name = _file_upload_assemble_s3(default_storage, name, part_names)
+
+    else:
+        with FileUploadReader(part_names) as reader:
+            name = default_storage.save(name, File(io.BufferedReader(reader)))
+
+    try:
+        with transaction.atomic():
+            # Completed by a concurrent request in the meantime, the file assembled here is discarded
+            upload = _file_upload_get(user_id=user_id, upload_id=upload_id, lock=True)
+
+            collection = upload.collection or FileCollection.objects.create(created_by_id=user_id)
+            if collection.filesegment_set.count() >= settings.FLOWBACK_FILE_COLLECTION_LIMIT:
+                raise ValidationError(f"Cannot add more than {settings.FLOWBACK_FILE_COLLECTION_LIMIT} attachments.")
+
+            upload.segment = FileSegment(collection=collection, file=name, file_name=upload.file_name)
+            upload.segment.full_clean(exclude=['collection'])
+            upload.segment.save()
+
+            upload.collection = collection
+            upload.save(update_fields=['collection', 'segment', 'updated_at'])
+            upload.fileuploadpart_set.all().delete()
+
+            transaction.on_commit(lambda: _file_upload_parts_delete(part_names))
+
+    except Exception:
+        default_storage.delete(name)
+        raise
+
+    return upload
+
+
+def file_upload_attach(*, user_id: int, upload_ids: list[int], collection: FileCollection = None) -> FileCollection:
+    """
+    Adds the files of completed uploads to a collection (a new one unless given), for attaching them to threads, polls,
+    messages etc. The files are shared with the collections of the uploads, not copied in storage.
+    """
+    uploads = list(FileUpload.objects.filter(id__in=upload_ids, created_by_id=user_id, segment__isnull=False)
+                   .select_related('segment'))
+
+    if missing := sorted(set(upload_ids) - {upload.id for upload in uploads}):
+        raise ValidationError(f"Uploads do not exist or have not been completed: {', '.join(map(str, missing))}")
+
+    if collection is None:
+        collection = FileCollection.objects.create(created_by_id=user_id)
+
+    elif collection.created_by_id != user_id:
+        raise ValidationError("Only the author of the attachment can update it.")
+
+    if collection.filesegment_set.count() + len(uploads) > settings.FLOWBACK_FILE_COLLECTION_LIMIT:
+        raise ValidationError(f"Cannot add more than {settings.FLOWBACK_FILE_COLLECTION_LIMIT} attachments.")
+
+    FileSegment.objects.bulk_create([FileSegment(collection=collection,
+                                                 file=upload.segment.file.name,
+                                                 file_name=upload.segment.file_name) for upload in uploads])
+
+    return collection
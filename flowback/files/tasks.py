@@ -0,0 +1,100 @@
+import datetime
+
+from celery import shared_task
+from django.apps import apps
+from django.conf import settings
+from django.core.files.storage import default_storage
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from flowback.common.instrumentation import instrumented_task, task_rows
+
+# Models are resolved lazily, flowback.files.models imports this module to hook up its signals
+
+
+def image_derivatives_generate_schedule(*, model: str, object_id: int, fields: list[str]):
+    """
+    Enqueues the derivative generation of changed images once the surrounding transaction has been committed.
+    """
+    transaction.on_commit(lambda: image_derivatives_generate.delay(model=model, object_id=object_id, fields=fields))
+
+
+@shared_task
+@instrumented_task
+def image_derivatives_generate(model: str, object_id: int, fields: list[str] = None):
+    """
+    Generates the pending image derivatives of an object, see ImageDerivativeModel.generate_image_derivatives.
+    """
+    instance = apps.get_model(model).objects.filter(pk=object_id).first()
+    if instance is None:
+        return "Object no longer exists."
+
+    # Fields handled by an earlier task are skipped
+    pending = instance.image_derivatives_pending
+    generated = instance.generate_image_derivatives([field for field in fields or pending if field in pending])
+    task_rows(len(generated))
+
+    return f"{len(generated)} image derivatives generated."
+
+
+def image_derivative_models() -> list:
+    from flowback.files.models import ImageDerivativeModel
+    return [model for model in apps.get_models() if issubclass(model, ImageDerivativeModel)]
+
+
+@shared_task
+@instrumented_task
+def image_derivatives_backfill(batch_size: int = 100):
+    """
+    Generates the pending image derivatives of every object with images, batch_size objects at a time.
+    """
+    generated = 0
+
+    for model in image_derivative_models():
+        images = Q()
+        for field in model.IMAGE_DERIVATIVE_FIELDS:
+            images |= Q(**{f'{field}__isnull': False}) & ~Q(**{field: ''})
+
+        last_pk = None
+        while True:
+            batch = model.objects.filter(images).order_by('pk')
+            if last_pk is not None:
+                batch = batch.filter(pk__gt=last_pk)
+
+            batch = list(batch[:batch_size])
+            for instance in batch:
+                generated += len(instance.generate_image_derivatives())
+
+            task_rows(len(batch))
+            if len(batch) < batch_size:
+                break
+
+            last_pk = batch[-1].pk
+
+    return f"{generated} image derivatives generated."
+
+
+@shared_task
+@instrumented_task
+def file_upload_sweep(batch_size: int = 100):
+    """
+    Removes uploads started more than FLOWBACK_FILE_UPLOAD_EXPIRY hours ago, along with the part blobs of the ones
+    never completed. Completed files stay in their collection.
+    """
+    file_upload = apps.get_model('files', 'FileUpload')
+    expired = file_upload.objects.filter(
+        created_at__lt=timezone.now() - datetime.timedelta(hours=settings.FLOWBACK_FILE_UPLOAD_EXPIRY)
+    ).prefetch_related('fileuploadpart_set').order_by('id')
+    removed = 0
+
+    while uploads := list(expired[:batch_size]):
+        for upload in uploads:
+            for part in upload.fileuploadpart_set.all():
+                default_storage.delete(upload.part_name(part.number))
+
+        file_upload.objects.filter(id__in=[upload.id for upload in uploads]).delete()
+        removed += len(uploads)
+        task_rows(len(uploads))
+
+    return f"{removed} expired uploads removed."
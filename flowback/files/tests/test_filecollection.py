@@ -1,10 +1,39 @@
+import hashlib
+import tempfile
+import threading
+import time
+
+from django.core.files.storage import FileSystemStorage
 from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import override_settings
 from rest_framework.test import APITestCase
 
 from flowback.files.services import upload_collection, update_collection
 from flowback.user.tests.factories import UserFactory
 
 
+class SlowStorage(FileSystemStorage):
+    """
+    A local storage taking a while for every save, like a remote storage would. Keeps track of the saves in flight.
+    """
+    lock = threading.Lock()
+    active = peak = saves = 0
+
+    def _save(self, name, content):
+        with self.lock:
+            SlowStorage.active += 1
+            SlowStorage.saves += 1
+            SlowStorage.peak = max(SlowStorage.peak, SlowStorage.active)
+
+        time.sleep(0.2)
+        try:
+            return super()._save(name, content)
+
+        finally:
+            with self.lock:
+                SlowStorage.active -= 1
+
+
 class TestFileCollection(APITestCase):
     def setUp(self):
         self.user_one = UserFactory()
@@ -37,3 +66,52 @@ class TestFileCollection(APITestCase):
 
         self.assertEqual(collection.filesegment_set.count(), 7)
         self.assertEqual(collection.filesegment_set.filter(id__in=attachments_remove).count(), 0)
+
+    def test_filecollection_content_addressed(self):
+        with tempfile.TemporaryDirectory() as location, override_settings(MEDIA_ROOT=location):
+            files = [SimpleUploadedFile(name=f'test{i}.txt', content=b'hi', content_type='text/plain')
+                     for i in range(3)]
+            files.append(SimpleUploadedFile(name='other.md', content=b'hello', content_type='text/plain'))
+
+            collection = upload_collection(user_id=self.user_one.id, file=files, upload_to='test')
+            upload_collection(user_id=self.user_two.id,
+                              file=SimpleUploadedFile(name='again.txt', content=b'hi', content_type='text/plain'),
+                              upload_to='test')
+
+            segments = collection.filesegment_set.order_by('id')
+            self.assertEqual([segment.file_name for segment in segments], ['test0.txt', 'test1.txt', 'test2.txt',
+                                                                           'other.md'])
+            self.assertEqual({segment.file.name for segment in segments},
+                             {f"test/{hashlib.sha256(b'hi').hexdigest()}.txt",
+                              f"test/{hashlib.sha256(b'hello').hexdigest()}.md"})
+            self.assertEqual(len(FileSystemStorage().listdir('test')[1]), 2)
+            self.assertEqual(segments[0].file.read(), b'hi')
+
+            # Files keeping their own name are never merged
+            collection = upload_collection(user_id=self.user_one.id,
+                                           file=[SimpleUploadedFile(name='same.txt', content=f'{i}'.encode())
+                                                 for i in range(2)],
+                                           upload_to='named',
+                                           upload_to_uuid=False,
+                                           upload_to_include_timestamp=False)
+
+            self.assertEqual(sorted(segment.file.read() for segment in collection.filesegment_set.all()),
+                             [b'0', b'1'])
+
+    def test_filecollection_concurrent_upload(self):
+        SlowStorage.active = SlowStorage.peak = SlowStorage.saves = 0
+
+        with tempfile.TemporaryDirectory() as location, override_settings(
+                MEDIA_ROOT=location,
+                FLOWBACK_FILE_UPLOAD_WORKERS=3,
+                STORAGES={'default': {'BACKEND': 'flowback.files.tests.test_filecollection.SlowStorage'}}):
+            files = [SimpleUploadedFile(name='test.txt', content=f'{i}'.encode()) for i in range(6)]
+
+            started = time.monotonic()
+            with self.assertNumQueries(3):
+                collection = upload_collection(user_id=self.user_one.id, file=files)
+
+            self.assertLess(time.monotonic() - started, 6 * 0.2)
+            self.assertEqual(SlowStorage.saves, 6)
+            self.assertEqual(SlowStorage.peak, 3)
+            self.assertEqual(collection.filesegment_set.count(), 6)
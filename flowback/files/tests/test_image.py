@@ -0,0 +1,107 @@
+import io
+import os.path
+import tempfile
+from unittest import mock
+
+from django.core.files.storage import default_storage
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import override_settings
+from PIL import Image
+from rest_framework.test import APITestCase
+
+from flowback.common.tests import fake
+from flowback.files.models import ImageDerivativeModel
+from flowback.files.tasks import image_derivatives_backfill, image_derivatives_generate
+from flowback.group.tests.factories import GroupFactory
+from flowback.user.models import User
+from flowback.user.serializers import BasicUserSerializer
+from flowback.user.tests.factories import UserFactory
+
+
+def image_file(name: str, size: tuple[int, int], mode: str = 'RGB') -> SimpleUploadedFile:
+    buffer = io.BytesIO()
+    Image.new(mode, size).save(buffer, 'PNG')
+    return SimpleUploadedFile(name=name, content=buffer.getvalue(), content_type='image/png')
+
+
+class TestImageDerivatives(APITestCase):
+    def setUp(self):
+        fake.unique.clear()  # Keeps the unique name pool from running dry in full test runs
+        self.enterContext(override_settings(MEDIA_ROOT=self.enterContext(tempfile.TemporaryDirectory())))
+
+    def assertDerivatives(self, image, size: tuple[int, int]):
+        for derivative_size in (64, 256, 1024):
+            with default_storage.open(ImageDerivativeModel.image_derivative_name(image.name, derivative_size)) as file,\
+                    Image.open(file) as derivative:
+                scale = min(1, derivative_size / max(size))
+                self.assertEqual(derivative.format, 'WEBP')
+                self.assertEqual(derivative.size, (round(size[0] * scale), round(size[1] * scale)))
+
+    def test_image_derivatives_generate(self):
+        with mock.patch('flowback.files.models.image_derivatives_generate_schedule') as schedule:
+            user = UserFactory(profile_image=image_file('avatar.png', (2000, 1000)))
+
+        schedule.assert_called_once_with(model='user.User', object_id=user.id, fields=['profile_image'])
+        self.assertEqual(user.image_derivatives_pending, ['profile_image'])
+        self.assertEqual(BasicUserSerializer(user).data['profile_image'], user.profile_image.url)
+        stale = User.objects.get(id=user.id)
+
+        self.assertEqual(image_derivatives_generate(model='user.User', object_id=user.id, fields=['profile_image']),
+                         "1 image derivatives generated.")
+        self.assertEqual(image_derivatives_generate(model='user.User', object_id=user.id, fields=['profile_image']),
+                         "0 image derivatives generated.")
+
+        # Saving a stale instance leaves the derivatives alone
+        stale.bio = 'derivative test'
+        stale.save()
+
+        user.refresh_from_db()
+        self.assertEqual(user.image_derivatives,
+                         dict(profile_image=dict(name=user.profile_image.name, sizes=[64, 256, 1024])))
+        self.assertDerivatives(user.profile_image, (2000, 1000))
+        self.assertEqual(BasicUserSerializer(user).data['profile_image'],
+                         default_storage.url(ImageDerivativeModel.image_derivative_name(user.profile_image.name, 64)))
+        self.assertEqual(ImageDerivativeModel.image_derivative_url(user.profile_image, 2048), user.profile_image.url)
+
+        with mock.patch('flowback.files.models.image_derivatives_generate_schedule') as schedule:
+            user.save()
+            schedule.assert_not_called()
+
+            # Derivatives of a replaced image are never served
+            user.profile_image = image_file('avatar.png', (100, 300))
+            user.save()
+            schedule.assert_called_once_with(model='user.User', object_id=user.id, fields=['profile_image'])
+
+        self.assertEqual(BasicUserSerializer(user).data['profile_image'], user.profile_image.url)
+
+    def test_image_derivatives_name(self):
+        png = UserFactory(profile_image=image_file('avatar.png', (300, 100)))
+        jpg = UserFactory(profile_image=image_file('avatar.jpg', (100, 300)))
+        self.assertEqual(os.path.splitext(png.profile_image.name)[0], os.path.splitext(jpg.profile_image.name)[0])
+
+        self.assertEqual(image_derivatives_backfill(), "2 image derivatives generated.")
+
+        self.assertNotEqual(ImageDerivativeModel.image_derivative_name(png.profile_image.name, 64),
+                            ImageDerivativeModel.image_derivative_name(jpg.profile_image.name, 64))
+        self.assertDerivatives(png.profile_image, (300, 100))
+        self.assertDerivatives(jpg.profile_image, (100, 300))
+
+    def test_image_derivatives_backfill(self):
+        group = GroupFactory(image=image_file('icon.png', (300, 300), mode='P'),
+                             cover_image=image_file('cover.png', (3000, 600), mode='LA'))
+        broken = UserFactory(profile_image=SimpleUploadedFile(name='broken.png', content=b'Silver?'))
+        GroupFactory()
+
+        with self.assertLogs('flowback.files.models', 'WARNING'):
+            self.assertEqual(image_derivatives_backfill(batch_size=1), "2 image derivatives generated.")
+
+        group.refresh_from_db()
+        self.assertEqual(set(group.image_derivatives), {'image', 'cover_image'})
+        self.assertDerivatives(group.image, (300, 300))
+        self.assertDerivatives(group.cover_image, (3000, 600))
+        self.assertEqual(group.notification_channel.data['group_image'],
+                         default_storage.url(ImageDerivativeModel.image_derivative_name(group.image.name, 64)))
+
+        broken.refresh_from_db()
+        self.assertEqual(broken.image_derivatives, {})
+        self.assertEqual(BasicUserSerializer(broken).data['profile_image'], broken.profile_image.url)
@@ -0,0 +1,255 @@
+import datetime
+import io
+import tempfile
+import tracemalloc
+from unittest import mock
+
+from django.core.files import File
+from django.core.files.storage import default_storage
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import override_settings
+from django.utils import timezone
+from rest_framework.test import APITestCase, APIRequestFactory, force_authenticate
+from storages.backends.s3 import S3Storage
+
+from flowback.common.tests import generate_request
+from flowback.files.models import FileUpload, FileUploadPart
+from flowback.files.services import file_upload_create, file_upload_part, file_upload_complete
+from flowback.files.tasks import file_upload_sweep
+from flowback.files.tests.factories import FileSegmentFactory
+from flowback.files.views import FileUploadCreateAPI, FileUploadDetailAPI, FileUploadPartAPI, FileUploadCompleteAPI
+from flowback.group.models import GroupThread
+from flowback.group.tests.factories import GroupUserFactory
+from flowback.group.views.thread import GroupThreadCreateAPI, GroupThreadUpdateAPI
+from flowback.poll.tests.factories import PollFactory
+from flowback.poll.views.poll import PollUpdateAPI
+from flowback.user.tests.factories import UserFactory
+
+
+class SyntheticPart(io.RawIOBase):
+    """
+    A part of size bytes of a single fill byte, generated while it's being read.
+    """
+    def __init__(self, size: int, fill: int):
+        self.size = size
+        self.fill = fill
+        self.position = 0
+
+    def readable(self):
+        return True
+
+    def readinto(self, buffer) -> int:
+        length = min(len(buffer), self.size - self.position)
+        buffer[:length] = bytes([self.fill]) * length
+        self.position += length
+        return length
+
+
+@override_settings(FLOWBACK_FILE_UPLOAD_MIN_PART_SIZE=4)
+class TestFileUpload(APITestCase):
+    def setUp(self):
+        self.enterContext(override_settings(MEDIA_ROOT=self.enterContext(tempfile.TemporaryDirectory())))
+        self.user = UserFactory()
+
+    def upload_part(self, upload_id: int, number: int, content: bytes, user=None):
+        request = APIRequestFactory().post('', data=dict(part=SimpleUploadedFile('blob', content)), format='multipart')
+        force_authenticate(request, user=user or self.user)
+        return FileUploadPartAPI.as_view()(request, upload_id=upload_id, number=number)
+
+    def test_file_upload(self):
+        response = generate_request(api=FileUploadCreateAPI,
+                                    data=dict(file_name='report.pdf', size=10, part_size=4),
+                                    user=self.user)
+        self.assertEqual(response.status_code, 201, response.data)
+        self.assertEqual(response.data['part_count'], 3)
+        upload_id = response.data['id']
+
+        self.assertEqual(self.upload_part(upload_id, 3, b'ij').status_code, 200)
+        self.assertEqual(self.upload_part(upload_id, 1, b'xxxx').status_code, 200)
+        self.assertEqual(self.upload_part(upload_id, 1, b'abcd').status_code, 200)
+        self.assertEqual(self.upload_part(upload_id, 2, b'efg').status_code, 400)
+        self.assertEqual(self.upload_part(upload_id, 4, b'ij').status_code, 400)
+        self.assertEqual(self.upload_part(upload_id, 2, b'efgh', user=UserFactory()).status_code, 400)
+
+        response = generate_request(api=FileUploadDetailAPI, url_params=dict(upload_id=upload_id), user=self.user)
+        self.assertEqual(response.data['parts'], [1, 3])
+        self.assertIsNone(response.data['segment'])
+
+        # Uploads resume from the missing parts
+        response = generate_request(api=FileUploadCompleteAPI, url_params=dict(upload_id=upload_id), user=self.user)
+        self.assertEqual(response.status_code, 400)
+
+        self.assertEqual(self.upload_part(upload_id, 2, b'efgh').status_code, 200)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            response = generate_request(api=FileUploadCompleteAPI, url_params=dict(upload_id=upload_id),
+                                        user=self.user)
+
+        self.assertEqual(response.status_code, 200, response.data)
+        self.assertEqual(response.data['segment']['file_name'], 'report.pdf')
+        self.assertTrue(response.data['segment']['file'].endswith('.pdf'))
+
+        upload = FileUpload.objects.get(id=upload_id)
+        self.assertEqual(upload.collection.created_by, self.user)
+        self.assertEqual(list(upload.collection.filesegment_set.all()), [upload.segment])
+        self.assertEqual(upload.segment.file.read(), b'abcdefghij')
+        self.assertFalse(FileUploadPart.objects.filter(upload=upload).exists())
+        self.assertFalse(any(default_storage.exists(upload.part_name(number)) for number in range(1, 4)))
+
+        response = generate_request(api=FileUploadCompleteAPI, url_params=dict(upload_id=upload_id), user=self.user)
+        self.assertEqual(response.status_code, 400)
+
+    def test_file_upload_collection(self):
+        segment = FileSegmentFactory(collection__created_by=self.user)
+
+        upload = file_upload_create(user_id=self.user.id, file_name='notes.txt', size=2,
+                                    collection_id=segment.collection_id)
+        file_upload_part(user_id=self.user.id, upload_id=upload.id, number=1,
+                         part=SimpleUploadedFile('blob', b'hi'))
+        upload = file_upload_complete(user_id=self.user.id, upload_id=upload.id)
+        self.assertEqual(upload.collection_id, segment.collection_id)
+        self.assertEqual(segment.collection.filesegment_set.count(), 2)
+
+        with override_settings(FLOWBACK_FILE_COLLECTION_LIMIT=2):
+            response = generate_request(api=FileUploadCreateAPI,
+                                        data=dict(file_name='notes.txt', size=2, collection_id=segment.collection_id),
+                                        user=self.user)
+            self.assertEqual(response.status_code, 400)
+
+        response = generate_request(api=FileUploadCreateAPI,
+                                    data=dict(file_name='notes.txt', size=2, collection_id=segment.collection_id),
+                                    user=UserFactory())
+        self.assertEqual(response.status_code, 400)
+
+        response = generate_request(api=FileUploadCreateAPI,
+                                    data=dict(file_name='notes.txt', size=10, part_size=2),
+                                    user=self.user)
+        self.assertEqual(response.status_code, 400)
+
+    @mock.patch.object(S3Storage, 'bucket', new_callable=mock.PropertyMock)
+    def test_file_upload_s3(self, bucket):
+        upload = file_upload_create(user_id=self.user.id, file_name='report.pdf', size=6, part_size=4)
+        file_upload_part(user_id=self.user.id, upload_id=upload.id, number=1, part=SimpleUploadedFile('blob', b'abcd'))
+        file_upload_part(user_id=self.user.id, upload_id=upload.id, number=2, part=SimpleUploadedFile('blob', b'ef'))
+
+        storage = S3Storage(bucket_name='flowback', location='media')
+        multipart_upload = bucket.return_value.Object.return_value.initiate_multipart_upload.return_value
+        copy_from = multipart_upload.Part.return_value.copy_from
+
+        # Parts are copied within the bucket, a failed copy aborts the multipart upload
+        copy_from.side_effect = Exception('Copy failed')
+        with mock.patch('flowback.files.services.default_storage', storage), self.assertRaises(Exception):
+            file_upload_complete(user_id=self.user.id, upload_id=upload.id)
+
+        multipart_upload.abort.assert_called_once()
+        self.assertIsNone(FileUpload.objects.get(id=upload.id).segment_id)
+
+        copy_from.side_effect = [dict(CopyPartResult=dict(ETag='"1"')), dict(CopyPartResult=dict(ETag='"2"'))]
+        with (mock.patch('flowback.files.services.default_storage', storage),
+              self.captureOnCommitCallbacks(execute=True)):
+            upload = file_upload_complete(user_id=self.user.id, upload_id=upload.id)
+
+        name = upload.segment.file.name
+        self.assertTrue(name.startswith('upload/') and name.endswith('.pdf'))
+        bucket.return_value.Object.assert_any_call(f'media/{name}')
+        bucket.return_value.Object.return_value.initiate_multipart_upload.assert_called_with(
+            ContentType='application/pdf')
+        self.assertEqual([call.kwargs['CopySource'] for call in copy_from.call_args_list[-2:]],
+                         [dict(Bucket='flowback', Key=f'media/upload/parts/{upload.id}/{number}') for number in (1, 2)])
+        multipart_upload.complete.assert_called_once_with(
+            MultipartUpload=dict(Parts=[dict(ETag='"1"', PartNumber=1), dict(ETag='"2"', PartNumber=2)]))
+
+        # The part blobs are removed from the bucket
+        bucket.return_value.Object.assert_any_call(f'media/upload/parts/{upload.id}/2')
+
+    def test_file_upload_attach(self):
+        def upload(file_name: str, content: bytes, user=self.user) -> FileUpload:
+            started = file_upload_create(user_id=user.id, file_name=file_name, size=len(content))
+            file_upload_part(user_id=user.id, upload_id=started.id, number=1, part=SimpleUploadedFile('blob', content))
+            with self.captureOnCommitCallbacks(execute=True):
+                return file_upload_complete(user_id=user.id, upload_id=started.id)
+
+        group_user = GroupUserFactory(user=self.user)
+        report, notes = upload('report.pdf', b'report'), upload('notes.txt', b'notes')
+
+        response = generate_request(api=GroupThreadCreateAPI,
+                                    data=dict(title='Minutes', attachments_upload_ids=[report.id]),
+                                    url_params=dict(group_id=group_user.group_id),
+                                    user=self.user)
+        self.assertEqual(response.status_code, 201, response.data)
+
+        thread = GroupThread.objects.get(id=response.data)
+        self.assertEqual(thread.attachments.created_by, self.user)
+        self.assertEqual(list(thread.attachments.filesegment_set.values_list('file', 'file_name')),
+                         [(report.segment.file.name, 'report.pdf')])
+
+        response = generate_request(api=GroupThreadUpdateAPI,
+                                    data=dict(attachments_upload_ids=[notes.id]),
+                                    url_params=dict(thread_id=thread.id),
+                                    user=self.user)
+        self.assertEqual(response.status_code, 200, response.data)
+        self.assertEqual(sorted(thread.attachments.filesegment_set.values_list('file_name', flat=True)),
+                         ['notes.txt', 'report.pdf'])
+
+        poll = PollFactory(created_by=group_user)
+        response = generate_request(api=PollUpdateAPI,
+                                    data=dict(attachments_upload_ids=[report.id, notes.id]),
+                                    url_params=dict(poll=poll.id),
+                                    user=self.user)
+        self.assertEqual(response.status_code, 200, response.data)
+
+        poll.refresh_from_db()
+        self.assertNotEqual(poll.attachments_id, thread.attachments_id)
+        self.assertEqual(poll.attachments.filesegment_set.count(), 2)
+
+        # Incomplete uploads and uploads of other users can't be attached
+        incomplete = file_upload_create(user_id=self.user.id, file_name='draft.txt', size=2)
+        other = upload('other.txt', b'other', user=GroupUserFactory(group=group_user.group).user)
+        for upload_id in (incomplete.id, other.id):
+            response = generate_request(api=PollUpdateAPI,
+                                        data=dict(attachments_upload_ids=[upload_id]),
+                                        url_params=dict(poll=poll.id),
+                                        user=self.user)
+            self.assertEqual(response.status_code, 400)
+
+        self.assertEqual(poll.attachments.filesegment_set.count(), 2)
+
+    def test_file_upload_sweep(self):
+        upload = file_upload_create(user_id=self.user.id, file_name='notes.txt', size=8, part_size=4)
+        file_upload_part(user_id=self.user.id, upload_id=upload.id, number=1, part=SimpleUploadedFile('blob', b'4' * 4))
+        recent = file_upload_create(user_id=self.user.id, file_name='notes.txt', size=8)
+        FileUpload.objects.filter(id=upload.id).update(created_at=timezone.now() - datetime.timedelta(hours=25))
+
+        self.assertEqual(file_upload_sweep(), "1 expired uploads removed.")
+        self.assertFalse(default_storage.exists(upload.part_name(1)))
+        self.assertEqual(list(FileUpload.objects.all()), [recent])
+
+    @override_settings(FLOWBACK_FILE_UPLOAD_MIN_PART_SIZE=5 * 1024 ** 2)
+    def test_file_upload_memory(self):
+        size, part_size = 1024 ** 3, 64 * 1024 ** 2
+        upload = file_upload_create(user_id=self.user.id, file_name='backup.bin', size=size, part_size=part_size)
+
+        tracemalloc.start()
+        try:
+            for number in range(1, upload.part_count + 1):
+                file_upload_part(user_id=self.user.id, upload_id=upload.id, number=number,
+                                 part=File(SyntheticPart(upload.expected_part_size(number), fill=number)))
+
+            with self.captureOnCommitCallbacks(execute=True):
+                upload = file_upload_complete(user_id=self.user.id, upload_id=upload.id)
+
+            peak = tracemalloc.get_traced_memory()[1]
+
+        finally:
+            tracemalloc.stop()
+
+        self.assertLess(peak, 16 * 1024 ** 2)
+        self.assertEqual(upload.segment.file.size, size)
+
+        # Parts are assembled in order
+        with upload.segment.file.open('rb') as file:
+            for number in range(1, upload.part_count + 1):
+                file.seek(part_size * number - 1)
+                self.assertEqual(file.read(2), bytes([number, number + 1])[:1 + (number < upload.part_count)])
+
+        self.assertFalse(default_storage.exists(upload.part_name(1)))
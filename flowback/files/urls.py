@@ -0,0 +1,11 @@
+from django.urls import path
+
+from flowback.files.views import FileUploadCreateAPI, FileUploadDetailAPI, FileUploadPartAPI, FileUploadCompleteAPI
+
+
+files_patterns = [
+    path('upload/create', FileUploadCreateAPI.as_view(), name='file_upload_create'),
+    path('upload/<int:upload_id>', FileUploadDetailAPI.as_view(), name='file_upload_detail'),
+    path('upload/<int:upload_id>/part/<int:number>', FileUploadPartAPI.as_view(), name='file_upload_part'),
+    path('upload/<int:upload_id>/complete', FileUploadCompleteAPI.as_view(), name='file_upload_complete'),
+]
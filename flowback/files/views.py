@@ -0,0 +1,56 @@
+from drf_spectacular.utils import extend_schema
+from rest_framework import serializers, status
+from rest_framework.parsers import MultiPartParser
+from rest_framework.response import Response
+from rest_framework.views import APIView
+
+from flowback.files.selectors import file_upload_get
+from flowback.files.serializers import FileUploadSerializer
+from flowback.files.services import file_upload_create, file_upload_part, file_upload_complete
+
+
+@extend_schema(tags=['files'])
+class FileUploadCreateAPI(APIView):
+    class InputSerializer(serializers.Serializer):
+        file_name = serializers.CharField(max_length=255)
+        size = serializers.IntegerField(min_value=1, help_text='Size of the file in bytes')
+        part_size = serializers.IntegerField(required=False, min_value=1,
+                                             help_text='Size of every part but the last one, in bytes')
+        collection_id = serializers.IntegerField(required=False,
+                                                 help_text='Collection to add the file to, a new one by default')
+
+    def post(self, request):
+        serializer = self.InputSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+
+        upload = file_upload_create(user_id=request.user.id, **serializer.validated_data)
+        return Response(status=status.HTTP_201_CREATED, data=FileUploadSerializer(upload).data)
+
+
+@extend_schema(tags=['files'])
+class FileUploadDetailAPI(APIView):
+    def get(self, request, upload_id: int):
+        upload = file_upload_get(user_id=request.user.id, upload_id=upload_id)
+        return Response(FileUploadSerializer(upload).data)
+
+
+@extend_schema(tags=['files'])
+class FileUploadPartAPI(APIView):
+    parser_classes = [MultiPartParser]
+
+    class InputSerializer(serializers.Serializer):
+        part = serializers.FileField()
+
+    def post(self, request, upload_id: int, number: int):
+        serializer = self.InputSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+
+        file_upload_part(user_id=request.user.id, upload_id=upload_id, number=number, **serializer.validated_data)
+        return Response(status=status.HTTP_200_OK)
+
+
+@extend_schema(tags=['files'])
+class FileUploadCompleteAPI(APIView):
+    def post(self, request, upload_id: int):
+        upload = file_upload_complete(user_id=request.user.id, upload_id=upload_id)
+        return Response(FileUploadSerializer(upload).data)
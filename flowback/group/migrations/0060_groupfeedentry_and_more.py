@@ -0,0 +1,52 @@
+# Generated by Django 4.2.17 on 2026-10-19 06:43
+
+from django.db import migrations, models
+import django.db.models.deletion
+import django.utils.timezone
+
+
+def populate_group_feed(apps, schema_editor):
+    GroupFeedEntry = apps.get_model('group', 'GroupFeedEntry')
+
+    for related_model, model in (('poll', apps.get_model('poll', 'Poll')),
+                                 ('thread', apps.get_model('group', 'GroupThread'))):
+        GroupFeedEntry.objects.bulk_create([GroupFeedEntry(related_model=related_model,
+                                                           object_id=obj.id,
+                                                           group_id=obj.created_by.group_id,
+                                                           work_group_id=obj.work_group_id,
+                                                           public=obj.public,
+                                                           created_at=obj.created_at)
+                                            for obj in model.objects.filter(active=True).select_related('created_by')],
+                                           batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('group', '0059_alter_group_description_alter_group_name_and_more'),
+        ('poll', '0052_pollproposaltypeschedule_preliminary_score'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='GroupFeedEntry',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('created_at', models.DateTimeField(db_index=True, default=django.utils.timezone.now)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('related_model', models.CharField(choices=[('poll', 'Poll'), ('thread', 'Thread')], max_length=16)),
+                ('object_id', models.IntegerField()),
+                ('public', models.BooleanField(default=False)),
+                ('group', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='group.group')),
+                ('work_group', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, to='group.workgroup')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['group', 'work_group', '-created_at', '-id'], name='groupfeedentry_timeline_idx'), models.Index(condition=models.Q(('public', True), ('work_group__isnull', True)), fields=['-created_at', '-id'], name='groupfeedentry_public_idx')],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='groupfeedentry',
+            constraint=models.UniqueConstraint(fields=('related_model', 'object_id'), name='groupfeedentry_related_model_and_object_id_is_unique'),
+        ),
+        migrations.RunPython(populate_group_feed, migrations.RunPython.noop),
+    ]
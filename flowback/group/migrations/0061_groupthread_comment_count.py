@@ -0,0 +1,30 @@
+# Generated by Django 4.2.17 on 2026-10-19 06:53
+
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def populate_thread_counters(apps, schema_editor):
+    GroupThread = apps.get_model('group', 'GroupThread')
+    Comment = apps.get_model('comment', 'Comment')
+
+    GroupThread.objects.update(comment_count=Coalesce(Subquery(
+        Comment.objects.filter(comment_section_id=OuterRef('comment_section_id'), active=True)
+        .values('comment_section_id').annotate(total=Count('*')).values('total')[:1]), 0))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('group', '0060_groupfeedentry_and_more'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='groupthread',
+            name='comment_count',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.RunPython(populate_thread_counters, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,41 @@
+# Generated by Django 4.2.17 on 2026-10-19 08:08
+
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Q, Subquery
+from django.db.models.functions import Coalesce
+
+
+def populate_group_member_counters(apps, schema_editor):
+    Group = apps.get_model('group', 'Group')
+    GroupUser = apps.get_model('group', 'GroupUser')
+
+    def total(queryset):
+        return Coalesce(Subquery(queryset.values('group_id').annotate(total=Count('*')).values('total')[:1]), 0)
+
+    members = GroupUser.objects.filter(group_id=OuterRef('id'), active=True)
+    Group.objects.update(member_count=total(members),
+                         voter_count=total(members.filter(Q(is_admin=True)
+                                                          | Q(permission__allow_vote=True)
+                                                          | Q(permission__isnull=True,
+                                                              group__default_permission__allow_vote=True))))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('group', '0061_groupthread_comment_count'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='group',
+            name='member_count',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='group',
+            name='voter_count',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.RunPython(populate_group_member_counters, migrations.RunPython.noop),
+    ]
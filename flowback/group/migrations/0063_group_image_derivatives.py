@@ -0,0 +1,18 @@
+# Generated by Django 4.2.17 on 2026-10-19 09:28
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('group', '0062_group_member_count_group_voter_count'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='group',
+            name='image_derivatives',
+            field=models.JSONField(blank=True, default=dict),
+        ),
+    ]
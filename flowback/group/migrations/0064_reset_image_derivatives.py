@@ -0,0 +1,21 @@
+from django.db import migrations
+
+
+def reset_image_derivatives(apps, schema_editor):
+    """
+    Derivatives were named after the image name without its extension, forget them so that
+    the image_derivatives_backfill command regenerates them under their current names
+    """
+    Group = apps.get_model('group', 'group')
+    Group.objects.exclude(image_derivatives={}).update(image_derivatives={})
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('group', '0063_group_image_derivatives'),
+    ]
+
+    operations = [
+        migrations.RunPython(reset_image_derivatives, migrations.RunPython.noop)
+    ]
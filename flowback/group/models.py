@@ -2,7 +2,8 @@ import logging
 import uuid
 
 from django.core.validators import MinValueValidator, MaxValueValidator
-from django.db.models import Q
+from django.db.models import Q, F, OuterRef
+from django.db.models.functions import Coalesce
 from django.db.models.signals import post_save, post_delete, pre_save
 from django.forms import model_to_dict
 from rest_framework.exceptions import ValidationError
@@ -10,9 +11,11 @@ from rest_framework.exceptions import ValidationError
 from backend.settings import FLOWBACK_DEFAULT_GROUP_JOIN
 from flowback.chat.models import MessageChannel, MessageChannelParticipant
 from flowback.comment.models import CommentSection, comment_section_create, comment_section_create_model_default
-from flowback.common.models import BaseModel
+from flowback.common.models import BaseModel, CounterModel
+from flowback.common.services import count_subquery
 from flowback.common.validators import FieldNotBlankValidator
-from flowback.files.models import FileCollection
+from flowback.files.models import FileCollection, ImageDerivativeModel
+from flowback.group.tasks import group_feed_entry_schedule
 from flowback.kanban.models import Kanban, KanbanSubscription
 from flowback.notification.models import NotifiableModel, NotificationChannel
 from flowback.schedule.models import ScheduleModel
@@ -69,12 +72,38 @@ class GroupPermissions(BaseModel):
     def negate_field_perms() -> list[str]:
         return ['id', 'created_at', 'updated_at', 'role_name', 'author']
 
+    # Keeps track of the stored vote permission, used for keeping group voter counters in sync
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance._loaded_allow_vote = instance.__dict__.get('allow_vote')
+        return instance
+
+    @classmethod
+    def post_save(cls, instance, created, *args, **kwargs):
+        if not created and instance.allow_vote != getattr(instance, '_loaded_allow_vote', instance.allow_vote):
+            Group.member_recount(Group.objects.filter(id=instance.author_id))
+
+        instance._loaded_allow_vote = instance.allow_vote
+
+    # Group users holding the permission have fallen back to the default permission by now
+    @classmethod
+    def post_delete(cls, instance, *args, **kwargs):
+        Group.member_recount(Group.objects.filter(id=instance.author_id))
+
     class Meta:
         verbose_name_plural = 'Group permissions'
         verbose_name = 'Group permission'
 
 
-class Group(BaseModel, NotifiableModel, ScheduleModel):
+post_save.connect(GroupPermissions.post_save, sender=GroupPermissions)
+post_delete.connect(GroupPermissions.post_delete, sender=GroupPermissions)
+
+
+class Group(BaseModel, CounterModel, NotifiableModel, ScheduleModel, ImageDerivativeModel):
+    COUNTER_FIELDS = ('member_count', 'voter_count')
+    IMAGE_DERIVATIVE_FIELDS = ('image', 'cover_image')
+
     created_by = models.ForeignKey(User, on_delete=models.CASCADE)
     active = models.BooleanField(default=True)
 
@@ -105,10 +134,42 @@ class Group(BaseModel, NotifiableModel, ScheduleModel):
 
     jitsi_room = models.UUIDField(unique=True, default=uuid.uuid4)
 
+    # Active group users and the ones among them allowed to vote, kept in sync by group user and permission
+    # signals and reconciled by group_member_counter_reconcile
+    member_count = models.IntegerField(default=0)
+    voter_count = models.IntegerField(default=0)
+
     class Meta:
         constraints = [models.CheckConstraint(check=~Q(Q(public=False) & Q(direct_join=True)),
                                               name='group_not_public_and_direct_join_check')]
 
+    # Keeps track of the stored default permission, used for keeping group voter counters in sync
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance._loaded_default_permission_id = instance.__dict__.get('default_permission_id')
+        return instance
+
+    # Correlated member and voter counts of the outer group
+    @staticmethod
+    def member_counters() -> dict:
+        members = GroupUser.objects.filter(group_id=OuterRef('id'), active=True)
+        return dict(member_count=count_subquery(members, 'group_id'),
+                    voter_count=count_subquery(members.filter(GroupUser.voter_q()), 'group_id'))
+
+    @classmethod
+    def member_count_update(cls, group_id: int, members: int, voters: int):
+        if members or voters:
+            cls.objects.filter(id=group_id).update(member_count=F('member_count') + members,
+                                                   voter_count=F('voter_count') + voters)
+
+    # Recounts members and voters in a single UPDATE, used when a permission change affects many group users
+    @classmethod
+    def member_recount(cls, queryset: models.QuerySet = None) -> int:
+        queryset = cls.objects.all() if queryset is None else queryset
+        return queryset.update(**{field: Coalesce(expression, 0)
+                                  for field, expression in cls.member_counters().items()})
+
     @property
     def group_user_creator(self):
         try:
@@ -117,6 +178,10 @@ class Group(BaseModel, NotifiableModel, ScheduleModel):
         except GroupUser.DoesNotExist:
             raise ValidationError("Group creator has left the group..?")
 
+    @property
+    def schedule_user_ids(self):
+        return GroupUser.objects.filter(group=self, active=True).values_list('user_id', flat=True)
+
     # Notifications
     NOTIFICATION_DATA_FIELDS = (('group_id', int, 'Group ID'),
                                 ('group_name', str, 'Name of the group'),
@@ -203,7 +268,7 @@ class Group(BaseModel, NotifiableModel, ScheduleModel):
             instance.default_permission = default_permission
 
             instance.kanban = kanban
-            instance.save()
+            instance.save(update_fields=['default_permission', 'kanban'])
 
             group_user = GroupUser(user=instance.created_by,
                                    group=instance,
@@ -211,8 +276,11 @@ class Group(BaseModel, NotifiableModel, ScheduleModel):
                                    is_admin=True)
             group_user.save()
 
-            instance.kanban = kanban
-            instance.save()
+        elif instance.default_permission_id != getattr(instance, '_loaded_default_permission_id',
+                                                       instance.default_permission_id):
+            cls.member_recount(cls.objects.filter(id=instance.id))
+
+        instance._loaded_default_permission_id = instance.default_permission_id
 
         if update_fields:
             if not all(isinstance(field, str) for field in update_fields):
@@ -297,6 +365,33 @@ class GroupUser(BaseModel):
 
         return True
 
+    # Group users allowed to vote, the same rule as permission_q('...', 'allow_vote') rooted at the group user
+    @staticmethod
+    def voter_q() -> Q:
+        return (Q(is_admin=True)
+                | Q(permission__allow_vote=True)
+                | Q(permission__isnull=True, group__default_permission__allow_vote=True))
+
+    # Keeps track of the stored membership state, used for keeping group member counters in sync
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance._loaded_member_state = tuple(instance.__dict__.get(field)
+                                              for field in ('active', 'is_admin', 'permission_id'))
+        return instance
+
+    # Whether a membership state counts as a member and as a voter of the group, as (member, voter)
+    def member_counter_state(self, active: bool, is_admin: bool, permission_id: int | None) -> tuple[int, int]:
+        if not active:
+            return 0, 0
+
+        if is_admin:
+            return 1, 1
+
+        permissions = (GroupPermissions.objects.filter(id=permission_id) if permission_id
+                       else GroupPermissions.objects.filter(group__id=self.group_id))
+        return 1, int(permissions.filter(allow_vote=True).exists())
+
     @classmethod
     def pre_save(cls, instance, raw, using, update_fields, *args, **kwargs):
         if instance.pk is None:
@@ -313,6 +408,15 @@ class GroupUser(BaseModel):
 
     @classmethod
     def post_save(cls, instance, created, update_fields, *args, **kwargs):
+        member_state = (instance.active, instance.is_admin, instance.permission_id)
+        loaded_member_state = None if created else getattr(instance, '_loaded_member_state', member_state)
+        if member_state != loaded_member_state:
+            old = (0, 0) if loaded_member_state is None else instance.member_counter_state(*loaded_member_state)
+            new = instance.member_counter_state(*member_state)
+            Group.member_count_update(instance.group_id, new[0] - old[0], new[1] - old[1])
+
+        instance._loaded_member_state = member_state
+
         if created:
             instance.group.schedule.add_user(user=instance.user)
             subscription = KanbanSubscription(kanban_id=instance.user.kanban_id, target_id=instance.group.kanban_id)
@@ -321,6 +425,8 @@ class GroupUser(BaseModel):
         elif update_fields and 'active' in update_fields:
             if instance.active:
                 instance.group.schedule.add_user(user=instance.user)
+                KanbanSubscription.objects.get_or_create(kanban_id=instance.user.kanban_id,
+                                                         target_id=instance.group.kanban_id)
 
                 instance.chat_participant.active = True
                 instance.chat_participant.save()
@@ -339,6 +445,12 @@ class GroupUser(BaseModel):
 
     @classmethod
     def post_delete(cls, instance, *args, **kwargs):
+        members, voters = instance.member_counter_state(*getattr(instance, '_loaded_member_state',
+                                                                 (instance.active,
+                                                                  instance.is_admin,
+                                                                  instance.permission_id)))
+        Group.member_count_update(instance.group_id, -members, -voters)
+
         KanbanSubscription.objects.filter(kanban_id=instance.user.kanban_id,
                                           target_id=instance.group.kanban_id).delete()
 
@@ -369,6 +481,10 @@ class WorkGroup(BaseModel, ScheduleModel):
     def group_users(self):
         return GroupUser.objects.filter(group=self.group, workgroupuser__work_group=self, active=True)
 
+    @property
+    def schedule_user_ids(self):
+        return WorkGroupUser.objects.filter(work_group=self, active=True).values_list('group_user__user_id', flat=True)
+
     @classmethod
     def pre_save(cls, instance, raw, using, update_fields, *args, **kwargs):
         if instance.pk is None:
@@ -443,7 +559,9 @@ class WorkGroupUserJoinRequest(BaseModel):
 
 
 # GroupThreads are mainly used for creating comment sections for various topics
-class GroupThread(BaseModel, NotifiableModel):
+class GroupThread(BaseModel, CounterModel, NotifiableModel):
+    COUNTER_FIELDS = ('comment_count',)
+
     created_by = models.ForeignKey(GroupUser, on_delete=models.CASCADE)
     title = models.CharField(max_length=200, validators=[FieldNotBlankValidator])
     description = models.TextField(null=True, blank=True, validators=[FieldNotBlankValidator])
@@ -454,6 +572,9 @@ class GroupThread(BaseModel, NotifiableModel):
     work_group = models.ForeignKey(WorkGroup, on_delete=models.SET_NULL, null=True, blank=True)
     public = models.BooleanField(default=False)
 
+    # Kept in sync by comment signals and reconciled by group_thread_counter_reconcile
+    comment_count = models.IntegerField(default=0)
+
     @property
     def notification_data(self) -> dict | None:
         return dict(thread_id=self.id,
@@ -478,6 +599,41 @@ class GroupThread(BaseModel, NotifiableModel):
 
         return self.notification_channel.notify(**params)
 
+    @classmethod
+    def post_save(cls, instance, *args, **kwargs):
+        group_feed_entry_schedule(related_model='thread', object_id=instance.id)
+
+    @classmethod
+    def post_delete(cls, instance, *args, **kwargs):
+        group_feed_entry_schedule(related_model='thread', object_id=instance.id)
+
+
+post_save.connect(GroupThread.post_save, sender=GroupThread)
+post_delete.connect(GroupThread.post_delete, sender=GroupThread)
+
+
+# Fan-out timeline of polls and threads per group/work group, used by the home feed.
+# Entries are maintained by the group_feed_entry_update task whenever a poll or thread is written.
+class GroupFeedEntry(BaseModel):
+    class RelatedModel(models.TextChoices):
+        POLL = 'poll', 'Poll'
+        THREAD = 'thread', 'Thread'
+
+    group = models.ForeignKey(Group, on_delete=models.CASCADE)
+    work_group = models.ForeignKey(WorkGroup, on_delete=models.CASCADE, null=True, blank=True)
+    related_model = models.CharField(max_length=16, choices=RelatedModel.choices)
+    object_id = models.IntegerField()
+    public = models.BooleanField(default=False)
+
+    class Meta:
+        constraints = [models.UniqueConstraint(name='groupfeedentry_related_model_and_object_id_is_unique',
+                                               fields=['related_model', 'object_id'])]
+        indexes = [models.Index(name='groupfeedentry_timeline_idx',
+                                fields=['group', 'work_group', '-created_at', '-id']),
+                   models.Index(name='groupfeedentry_public_idx',
+                                fields=['-created_at', '-id'],
+                                condition=Q(public=True, work_group__isnull=True))]
+
 
 # Likes and Dislikes for Group Thread
 class GroupThreadVote(BaseModel):
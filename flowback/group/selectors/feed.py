@@ -0,0 +1,65 @@
+import heapq
+
+from django.db import models
+from django.db.models import F, Q
+
+from flowback.group.models import GroupFeedEntry, GroupUser, WorkGroupUser
+from flowback.user.models import User
+
+
+def group_feed_streams(*, fetched_by: User) -> list[models.QuerySet]:
+    """
+    Returns every feed the user reads from, each one is an index ordered slice of GroupFeedEntry:
+    one per active group membership, one per work group membership and one for public groups the user isn't part of.
+    """
+    group_ids = list(GroupUser.objects.filter(user=fetched_by, active=True)
+                     .values_list('group_id', flat=True).distinct())
+    work_groups = (WorkGroupUser.objects.filter(group_user__user=fetched_by, group_user__active=True)
+                   .values_list('work_group__group_id', 'work_group_id').distinct())
+
+    streams = [GroupFeedEntry.objects.filter(group_id=group_id, work_group__isnull=True) for group_id in group_ids]
+    streams += [GroupFeedEntry.objects.filter(group_id=group_id, work_group_id=work_group_id)
+                for group_id, work_group_id in work_groups]
+    streams.append(GroupFeedEntry.objects.filter(public=True, work_group__isnull=True, group__public=True)
+                   .exclude(group_id__in=group_ids))
+
+    return streams
+
+
+def group_feed_timeline(*,
+                        fetched_by: User,
+                        limit: int,
+                        ordering: list[str] = ('-feed_created_at', '-feed_entry_id'),
+                        keyset: Q = None,
+                        filters: Q = None) -> list[dict]:
+    """
+    K-way merges the users group feeds, optionally narrowed down by filters on GroupFeedEntry. Entries are ordered by
+    feed_created_at and feed_entry_id (both descending, or both ascending), past the keyset filter if given.
+    Each feed contributes at most limit entries, all fetched in a single UNION ALL query.
+
+    :return: Up to limit GroupFeedEntry values
+    """
+    fields = [field.lstrip('-') for field in ordering]
+    descending = ordering[0].startswith('-')
+
+    streams = [stream.annotate(feed_created_at=F('created_at'),
+                               feed_entry_id=F('id'),
+                               stream=models.Value(i, models.IntegerField()))
+               .filter(keyset or Q(), filters or Q())
+               .order_by(*ordering)
+               .values('id', 'created_at', 'related_model', 'object_id', 'feed_created_at', 'feed_entry_id',
+                       'stream')[:limit]
+               for i, stream in enumerate(group_feed_streams(fetched_by=fetched_by))]
+
+    buckets = [[] for _ in streams]
+    for row in streams[0].union(*streams[1:], all=True):
+        buckets[row['stream']].append(row)
+
+    # Postgres does not guarantee the order of a UNION ALL, every bucket is ordered again before merging
+    def key(row):
+        return tuple(row[field] for field in fields)
+
+    for bucket in buckets:
+        bucket.sort(key=key, reverse=descending)
+
+    return list(heapq.merge(*buckets, key=key, reverse=descending))[:limit]
@@ -1,7 +1,7 @@
 import django_filters
-from django.db.models import OuterRef, Exists, Count, Q
+from django.db.models import OuterRef, Exists, Q
 
-from flowback.group.models import Group, GroupFolder
+from flowback.group.models import Group, GroupFolder, GroupUser
 from flowback.group.selectors.permission import group_user_permissions
 from flowback.user.models import User
 
@@ -19,15 +19,14 @@ def group_list(*, fetched_by: User, filters=None):
     qs = _group_get_visible_for(user=fetched_by
                                 ).annotate(joined=Exists(joined_groups),
                                            pending_invite=Exists(pending_invite),
-                                           pending_join=Exists(pending_join),
-                                           member_count=Count('groupuser')
+                                           pending_join=Exists(pending_join)
                                            ).order_by('created_at').all()
     qs = BaseGroupFilter(filters, qs).qs
     return qs
 
 
 def _group_get_visible_for(user: User):
-    query = Q(public=True) | Q(Q(public=False) & Q(groupuser__user__in=[user]))
+    query = Q(public=True) | Exists(GroupUser.objects.filter(group=OuterRef('pk'), user=user))
     return Group.objects.filter(query)
 
 
@@ -50,4 +49,4 @@ def group_folder_list():
 
 def group_detail(*, fetched_by: User, group_id: int):
     group_user = group_user_permissions(user=fetched_by, group=group_id)
-    return Group.objects.annotate(member_count=Count('groupuser')).get(id=group_user.group.id)
+    return Group.objects.get(id=group_user.group.id)
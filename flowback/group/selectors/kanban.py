@@ -0,0 +1,9 @@
+from flowback.group.selectors.permission import group_user_permissions
+from flowback.kanban.selectors import KanbanBoard, kanban_board
+from flowback.user.models import User
+
+
+def group_kanban_board(*, fetched_by: User, group_id: int, since_version: int = None) -> KanbanBoard:
+    group_user = group_user_permissions(user=fetched_by, group=group_id)
+
+    return kanban_board(kanban_id=group_user.group.kanban_id, user=fetched_by, since_version=since_version)
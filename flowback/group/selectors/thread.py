@@ -1,9 +1,8 @@
 import django_filters
 from django.db import models
-from django.db.models import Q, Exists, Subquery, OuterRef, Count
+from django.db.models import Q, Exists, Subquery, OuterRef, Count, F
 from django.db.models.functions import Coalesce
-from flowback.comment.models import Comment
-from flowback.comment.selectors import comment_list, comment_ancestor_list
+from flowback.comment.selectors import comment_list, comment_ancestor_list, comment_tree_list
 from flowback.common.filters import NumberInFilter
 from flowback.common.services import get_object
 from flowback.group.models import GroupThread, GroupThreadVote, Group
@@ -41,10 +40,6 @@ def group_thread_list(*, fetched_by: User, filters=None):
 
     threads = GroupThread.objects.filter(id__in=[t['id'] for t in threads])  # TODO make this one query
 
-    comment_qs = Coalesce(Subquery(
-        Comment.objects.filter(comment_section_id=OuterRef('comment_section_id'), active=True).values(
-            'comment_section_id').annotate(total=Count('*')).values('total')[:1]), 0)
-
     user_vote_qs = GroupThreadVote.objects.filter(thread_id=OuterRef('id'), created_by__user=fetched_by).values('vote')
 
     positive_votes_qs = (
@@ -69,13 +64,13 @@ def group_thread_list(*, fetched_by: User, filters=None):
 
     joined_groups_qs = Group.objects.filter(groupuser__active=True, id=OuterRef('created_by__group_id'), groupuser__user__in=[fetched_by])
 
-    qs = threads.annotate(total_comments=comment_qs,
+    qs = threads.annotate(total_comments=F('comment_count'),
                           group_joined=Exists(joined_groups_qs),
                           user_vote=Subquery(user_vote_qs),
                           score=Coalesce(Subquery(positive_votes_qs,
                                                   output_field=models.IntegerField()), 0) -
                                 Coalesce(Subquery(negative_votes_qs,
-                                                  output_field=models.IntegerField()), 0)).all()
+                                                  output_field=models.IntegerField()), 0)).order_by('id')
 
     return BaseGroupThreadFilter(filters, qs).qs
 
@@ -87,6 +82,23 @@ def group_thread_comment_list(*, fetched_by: User, thread_id: int, filters=None)
     return comment_list(fetched_by=fetched_by, comment_section_id=thread.comment_section_id, filters=filters)
 
 
+def group_thread_comment_tree_list(*, fetched_by: User, thread_id: int, filters=None):
+    thread = get_object(GroupThread, id=thread_id)
+    group_user_permissions(user=fetched_by, group=thread.created_by.group)
+
+    return comment_tree_list(fetched_by=fetched_by, comment_section_id=thread.comment_section_id, filters=filters)
+
+
+def group_thread_comment_reply_list(*, fetched_by: User, thread_id: int, comment_id: int, filters=None):
+    thread = get_object(GroupThread, id=thread_id)
+    group_user_permissions(user=fetched_by, group=thread.created_by.group)
+
+    return comment_tree_list(fetched_by=fetched_by,
+                             comment_section_id=thread.comment_section_id,
+                             parent_id=comment_id,
+                             filters=filters)
+
+
 def group_thread_comment_ancestor_list(*, fetched_by: User, thread_id: int, comment_id: int):
     thread = get_object(GroupThread, id=thread_id)
     group_user_permissions(user=fetched_by, group=thread.created_by.group)
@@ -1,11 +1,15 @@
 from rest_framework import serializers
 from rest_framework.fields import SerializerMethodField
 
+from flowback.files.serializers import ImageDerivativeField
 from flowback.group.models import Group, GroupUser
 from flowback.user.serializers import BasicUserSerializer
 
 
 class BasicGroupSerializer(serializers.ModelSerializer):
+    image = ImageDerivativeField(size=64)
+    cover_image = ImageDerivativeField(size=1024)
+
     class Meta:
         model = Group
         fields = ('id', 'name', 'image', 'cover_image', 'hide_poll_users')
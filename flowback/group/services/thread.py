@@ -2,7 +2,7 @@ from rest_framework.exceptions import ValidationError
 
 from flowback.comment.services import comment_create, comment_update, comment_delete, comment_vote
 from flowback.common.services import get_object, model_update
-from flowback.files.services import upload_collection, update_collection
+from flowback.files.services import upload_collection, update_collection, file_upload_attach
 from flowback.group.models import GroupThread, GroupThreadVote
 from flowback.group.notify import notify_group_thread
 from flowback.group.selectors.permission import group_user_permissions
@@ -15,6 +15,7 @@ def group_thread_create(user_id: int,
                         title: str,
                         description: str = None,
                         attachments: list = None,
+                        attachments_upload_ids: list[int] = None,
                         work_group_id: int = None,
                         public: bool = True):
     group_user = group_user_permissions(user=user_id, group=group_id, work_group=work_group_id)
@@ -27,6 +28,12 @@ def group_thread_create(user_id: int,
                                         file=attachments,
                                         upload_to='group/thread')
 
+    # Files of completed resumable uploads, see file_upload_complete
+    if attachments_upload_ids:
+        attachments = file_upload_attach(user_id=user_id,
+                                         upload_ids=attachments_upload_ids,
+                                         collection=attachments or None)
+
     thread = GroupThread(created_by=group_user,
                          title=title,
                          description=description,
@@ -53,6 +60,9 @@ def group_thread_update(user_id: int, thread_id: int, data: dict):
     thread = get_object(GroupThread, id=thread_id, active=True)
     non_side_effect_fields = ['title', 'description', 'attachments', 'pinned']
 
+    if data.get('pinned') is None:
+        data.pop('pinned', None)
+
     if 'pinned' in data.keys():
         group_user_permissions(user=user_id, group=thread.created_by.group, permissions=['admin'])
 
@@ -65,6 +75,11 @@ def group_thread_update(user_id: int, thread_id: int, data: dict):
                       attachments_add=data.get('attachments_add'),
                       upload_to='group/thread')
 
+    if data.get('attachments_upload_ids'):
+        data['attachments'] = file_upload_attach(user_id=user_id,
+                                                 upload_ids=data['attachments_upload_ids'],
+                                                 collection=thread.attachments)
+
     thread, has_updated = model_update(instance=thread,
                                        fields=non_side_effect_fields,
                                        data=data)
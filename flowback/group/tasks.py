@@ -0,0 +1,104 @@
+from itertools import batched
+
+from celery import shared_task
+from django.apps import apps
+from django.db import transaction
+from django.db.models import OuterRef
+
+from flowback.common.instrumentation import instrumented_task, task_rows
+from flowback.common.services import counter_reconcile, count_subquery
+
+# Models are resolved lazily, flowback.group.models imports this module to hook up its signals
+FEED_RELATED_MODELS = dict(poll='poll.Poll', thread='group.GroupThread')
+
+
+def group_feed_entry_schedule(*, related_model: str, object_id: int):
+    """
+    Enqueues a feed entry update once the surrounding transaction has been committed,
+    making sure the worker sees the same state as the request that wrote it.
+    """
+    transaction.on_commit(lambda: group_feed_entry_update.delay(related_model=related_model, object_id=object_id))
+
+
+@shared_task
+@instrumented_task
+def group_feed_entry_update(related_model: str, object_id: int):
+    """
+    Pushes (or removes) a poll or thread into its group feed. Idempotent, the entry mirrors the current row state.
+    """
+    group_feed_entry = apps.get_model('group', 'GroupFeedEntry')
+    model = apps.get_model(FEED_RELATED_MODELS[related_model])
+
+    obj = model.objects.filter(id=object_id).select_related('created_by').first()
+
+    if obj is None or not obj.active:
+        group_feed_entry.objects.filter(related_model=related_model, object_id=object_id).delete()
+        task_rows(1)
+        return
+
+    group_feed_entry.objects.update_or_create(related_model=related_model,
+                                              object_id=object_id,
+                                              defaults=dict(group_id=obj.created_by.group_id,
+                                                            work_group_id=obj.work_group_id,
+                                                            public=obj.public,
+                                                            created_at=obj.created_at))
+    task_rows(1)
+
+
+@shared_task
+@instrumented_task
+def group_feed_rebuild(batch_size: int = 1000):
+    """
+    Rebuilds every group feed from scratch, used for backfilling and recovering from lost updates.
+    """
+    group_feed_entry = apps.get_model('group', 'GroupFeedEntry')
+
+    with transaction.atomic():
+        group_feed_entry.objects.all().delete()
+
+        for related_model, model_name in FEED_RELATED_MODELS.items():
+            qs = apps.get_model(model_name).objects.filter(active=True).values_list('id',
+                                                                                   'created_by__group_id',
+                                                                                   'work_group_id',
+                                                                                   'public',
+                                                                                   'created_at')
+
+            # Inserted chunk by chunk, the rows are never all held in memory at once
+            for chunk in batched(qs.iterator(chunk_size=batch_size), batch_size):
+                group_feed_entry.objects.bulk_create([group_feed_entry(related_model=related_model,
+                                                                       object_id=object_id,
+                                                                       group_id=group_id,
+                                                                       work_group_id=work_group_id,
+                                                                       public=public,
+                                                                       created_at=created_at)
+                                                      for object_id, group_id, work_group_id, public, created_at
+                                                      in chunk])
+                task_rows(len(chunk))
+
+
+@shared_task
+@instrumented_task
+def group_thread_counter_reconcile():
+    """
+    Corrects drifted thread comment counters, e.g. after writes that bypassed signals.
+    """
+    reconciled = counter_reconcile(
+        queryset=apps.get_model('group', 'GroupThread').objects.all(),
+        counters=dict(comment_count=count_subquery(apps.get_model('comment', 'Comment').objects.filter(
+            comment_section_id=OuterRef('comment_section_id'), active=True), 'comment_section_id')))
+    task_rows(reconciled)
+
+    return reconciled
+
+
+@shared_task
+@instrumented_task
+def group_member_counter_reconcile():
+    """
+    Corrects drifted group member and voter counters, e.g. after group user writes that bypassed signals.
+    """
+    Group = apps.get_model('group', 'Group')
+    reconciled = counter_reconcile(queryset=Group.objects.all(), counters=Group.member_counters())
+    task_rows(reconciled)
+
+    return reconciled
@@ -6,7 +6,8 @@ from rest_framework.test import APIRequestFactory, force_authenticate, APITestCa
 
 from flowback.common.tests import generate_request
 from flowback.group.models import GroupUser, Group, GroupUserInvite
-from flowback.group.tests.factories import GroupFactory, GroupUserFactory, WorkGroupUserFactory
+from flowback.group.tasks import group_member_counter_reconcile
+from flowback.group.tests.factories import GroupFactory, GroupUserFactory, WorkGroupUserFactory, GroupPermissionsFactory
 from flowback.group.views.group import GroupListApi, GroupCreateApi, GroupUpdateApi
 from flowback.group.views.user import GroupInviteApi, GroupJoinApi, GroupInviteAcceptApi, GroupInviteListApi, \
     GroupUserListApi
@@ -183,3 +184,43 @@ class GroupTest(APITestCase):
             response = view(request, group=group_user.group)
 
             self.assertTrue(bool(response.data.get('results')) == allowed)
+
+    def test_group_member_counters(self):
+        group = self.group_one
+
+        def counters():
+            group.refresh_from_db()
+            return group.member_count, group.voter_count
+
+        group_users = GroupUserFactory.create_batch(3, group=group)
+        self.assertEqual(counters(), (4, 4))
+
+        restricted = GroupPermissionsFactory(author=group, allow_vote=False)
+        group_users[0].permission = restricted
+        group_users[0].save()
+        self.assertEqual(counters(), (4, 3))
+
+        group_users[1].active = False
+        group_users[1].save(update_fields=['active'])
+        self.assertEqual(counters(), (3, 2))
+
+        # Permission changes recount the group, the admin creator votes regardless
+        restricted.allow_vote = True
+        restricted.save()
+        self.assertEqual(counters(), (3, 3))
+
+        group.default_permission.allow_vote = False
+        group.default_permission.save()
+        self.assertEqual(counters(), (3, 2))
+
+        group_users[0].delete()
+        self.assertEqual(counters(), (2, 1))
+
+        # Saving a stale instance leaves the counters alone
+        stale = Group.objects.get(id=group.id)
+        Group.objects.filter(id=group.id).update(member_count=0)
+        self.assertEqual(group_member_counter_reconcile(), 1)
+
+        stale.description = 'counter test'
+        stale.save()
+        self.assertEqual(counters(), (2, 1))
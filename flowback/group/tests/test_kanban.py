@@ -1,8 +1,13 @@
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
 from rest_framework.test import APITestCase
 
 from flowback.common.tests import generate_request
-from flowback.group.tests.factories import GroupFactory, WorkGroupFactory, WorkGroupUserFactory
-from flowback.kanban.tests.factories import KanbanEntryFactory
+from flowback.group.models import GroupUser
+from flowback.group.tests.factories import GroupFactory, GroupUserFactory, WorkGroupFactory, WorkGroupUserFactory
+from flowback.kanban.models import Kanban, KanbanEntry, KanbanSubscription
+from flowback.kanban.selectors import kanban_entry_list
+from flowback.kanban.tests.factories import KanbanEntryFactory, KanbanFactory
 from flowback.user.views.kanban import UserKanbanEntryListAPI
 
 
@@ -54,3 +59,52 @@ class TestKanban(APITestCase):
                                     data={'title__icontains': kanbanentriesg_two[0].title})
 
         self.assertEqual(response.data['count'], 1)
+
+    def effective_kanban_ids(self, user) -> list[int]:
+        return Kanban.objects.get(id=user.kanban_id).effective_kanban_ids
+
+    def test_kanban_effective_kanbans(self):
+        user = self.group_user_one.user
+        self.assertEqual(self.effective_kanban_ids(user), [self.group_one.kanban_id])
+
+        group_user = GroupUserFactory(user=user, group=self.group_two)
+        self.assertEqual(self.effective_kanban_ids(user), sorted([self.group_one.kanban_id, self.group_two.kanban_id]))
+
+        group_user.active = False
+        group_user.save(update_fields=['active'])
+        self.assertEqual(self.effective_kanban_ids(user), [self.group_one.kanban_id])
+
+        group_user.active = True
+        group_user.save(update_fields=['active'])
+        self.assertIn(self.group_two.kanban_id, self.effective_kanban_ids(user))
+
+        # Kanbans mirrored by a mirrored kanban are part of the set as well
+        mirrored = KanbanFactory()
+        KanbanSubscription.objects.create(kanban_id=self.group_two.kanban_id, target=mirrored)
+        self.assertEqual(self.effective_kanban_ids(user),
+                         sorted([self.group_one.kanban_id, self.group_two.kanban_id, mirrored.id]))
+
+        GroupUser.objects.get(id=group_user.id).delete()
+        self.assertEqual(self.effective_kanban_ids(user), [self.group_one.kanban_id])
+
+    def test_kanban_list_queries(self):
+        user = self.group_user_one.user
+
+        def queries() -> int:
+            with CaptureQueriesContext(connection) as context:
+                entries = list(kanban_entry_list(user=user))
+
+            self.assertEqual(len(entries), KanbanEntry.objects.filter(kanban_id__in=self.effective_kanban_ids(user),
+                                                                      work_group__isnull=True).count())
+            return len(context.captured_queries)
+
+        KanbanEntryFactory.create_batch(2, kanban=self.group_one.kanban)
+        few = queries()
+
+        for group in GroupFactory.create_batch(30):
+            GroupUserFactory(user=user, group=group)
+            KanbanEntryFactory(kanban=group.kanban)
+
+        # Aggregated across dozens of groups by one kanban_id IN (...) query, after reading the effective kanban set
+        self.assertEqual(queries(), few)
+        self.assertEqual(few, 2)
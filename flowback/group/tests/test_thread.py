@@ -5,6 +5,7 @@ from rest_framework.test import APITestCase
 from flowback.comment.tests.factories import CommentFactory
 from flowback.common.tests import generate_request
 from flowback.group.models import GroupThreadVote, GroupThread
+from flowback.group.selectors.thread import group_thread_list
 from flowback.group.services.thread import group_thread_comment_create, group_thread_comment_delete
 from flowback.group.tests.factories import GroupThreadFactory, GroupUserFactory, GroupThreadVoteFactory, \
     WorkGroupFactory, WorkGroupUserFactory
@@ -57,6 +58,14 @@ class TestGroupThread(APITestCase):
             self.assertIsNone(response.data['results'][n]['user_vote'])
             self.assertEqual(response.data['results'][n]['score'], 0)
 
+    def test_list_query_plan(self):
+        CommentFactory.create_batch(3, comment_section=self.threads[0].comment_section)
+        self.threads[0].refresh_from_db()
+        self.assertEqual(self.threads[0].comment_count, 3)
+
+        qs = group_thread_list(fetched_by=self.group_user.user, filters=dict(group_ids=str(self.group_user.group.id)))
+        self.assertNotIn('comment_comment', qs.explain())
+
     def test_create(self):
         work_group_user = WorkGroupUserFactory(group_user=self.group_user, work_group__group=self.group_user.group)
         response = generate_request(api=GroupThreadCreateAPI,
@@ -29,7 +29,8 @@ from .views.delegate import (GroupUserDelegateListApi,
                              GroupUserDelegatePoolListApi,
                              GroupUserDelegatePoolCreateApi,
                              GroupUserDelegatePoolDeleteApi, GroupUserDelegatePoolNotificationSubscribeAPI)
-from .views.kanban import (GroupKanbanEntryCreateAPI,
+from .views.kanban import (GroupKanbanBoardAPI,
+                           GroupKanbanEntryCreateAPI,
                            GroupKanbanEntryUpdateAPI,
                            GroupKanbanEntryDeleteAPI)
 from .views.schedule import (GroupScheduleEventCreateAPI,
@@ -48,6 +49,8 @@ from .views.thread import (GroupThreadListAPI,
                            GroupThreadCommentDeleteAPI,
                            GroupThreadCommentVoteAPI,
                            GroupThreadCommentAncestorListAPI,
+                           GroupThreadCommentTreeListAPI,
+                           GroupThreadCommentReplyListAPI,
                            GroupThreadVoteUpdateAPI,
                            GroupThreadNotificationSubscribeAPI)
 from .views.comment import (GroupDelegatePoolCommentListAPI,
@@ -136,6 +139,7 @@ group_patterns = [
          GroupDelegatePoolCommentVoteAPI.as_view(),
          name='group_user_delegate_pool_vote'),
 
+    path('<int:group_id>/kanban/board', GroupKanbanBoardAPI.as_view(), name='group_kanban_board'),
     path('<int:group_id>/kanban/entry/create', GroupKanbanEntryCreateAPI.as_view(), name='group_kanban_entry_create'),
     path('<int:group_id>/kanban/entry/update', GroupKanbanEntryUpdateAPI.as_view(), name='group_kanban_entry_update'),
     path('<int:group_id>/kanban/entry/delete', GroupKanbanEntryDeleteAPI.as_view(), name='group_kanban_entry_delete'),
@@ -156,6 +160,12 @@ group_patterns = [
     path('thread/<int:thread_id>/comment/<int:comment_id>/ancestor',
          GroupThreadCommentAncestorListAPI.as_view(),
          name='group_thread_comment_ancestor_list'),
+    path('thread/<int:thread_id>/comment/tree',
+         GroupThreadCommentTreeListAPI.as_view(),
+         name='group_thread_comment_tree_list'),
+    path('thread/<int:thread_id>/comment/<int:comment_id>/replies',
+         GroupThreadCommentReplyListAPI.as_view(),
+         name='group_thread_comment_reply_list'),
     path('thread/<int:thread_id>/comment/create',
          GroupThreadCommentCreateAPI.as_view(),
          name='group_thread_comment_create'),
@@ -1,6 +1,7 @@
 from drf_spectacular.utils import extend_schema
 from rest_framework import serializers, status
 from flowback.common.pagination import LimitOffsetPagination, get_paginated_response
+from flowback.files.serializers import ImageDerivativeField
 from rest_framework.response import Response
 from rest_framework.views import APIView
 
@@ -29,6 +30,8 @@ class GroupListApi(APIView):
         joined = serializers.BooleanField(required=False, default=None, allow_null=True)
 
     class OutputSerializer(serializers.ModelSerializer):
+        image = ImageDerivativeField(size=256)
+        cover_image = ImageDerivativeField(size=1024)
         joined = serializers.BooleanField()
         member_count = serializers.IntegerField()
         pending_invite = serializers.BooleanField(help_text="Group sent invite to current user")
@@ -92,6 +95,8 @@ class GroupFolderListApi(APIView):  #use serializers.Serializers
 @extend_schema(tags=['group'])
 class GroupDetailApi(APIView):
     class OutputSerializer(serializers.ModelSerializer):
+        image = ImageDerivativeField(size=256)
+        cover_image = ImageDerivativeField(size=1024)
         member_count = serializers.IntegerField()
 
         class Meta:
@@ -107,6 +112,7 @@ class GroupDetailApi(APIView):
                       'image',
                       'cover_image',
                       'member_count',
+                      'voter_count',
                       'chat_id',
                       'blockchain_id',
                       'jitsi_room')
@@ -1,9 +1,20 @@
 from drf_spectacular.utils import extend_schema
 from rest_framework.response import Response
 from rest_framework import status
+from flowback.group.selectors.kanban import group_kanban_board
 from flowback.group.services.kanban import group_kanban_entry_create, group_kanban_entry_update, group_kanban_entry_delete
 
-from flowback.kanban.views import KanbanEntryCreateAPI, KanbanEntryUpdateAPI, KanbanEntryDeleteAPI
+from flowback.kanban.views import KanbanBoardApi, KanbanEntryCreateAPI, KanbanEntryUpdateAPI, KanbanEntryDeleteAPI
+
+
+@extend_schema(tags=['group/kanban'])
+class GroupKanbanBoardAPI(KanbanBoardApi):
+    def get(self, request, group_id: int):
+        serializer = self.FilterSerializer(data=request.query_params)
+        serializer.is_valid(raise_exception=True)
+
+        board = group_kanban_board(fetched_by=request.user, group_id=group_id, **serializer.validated_data)
+        return self.board_response(request, board)
 
 
 @extend_schema(tags=['group/kanban'])
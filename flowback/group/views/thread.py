@@ -5,10 +5,10 @@ from rest_framework.response import Response
 
 from flowback.common.pagination import LimitOffsetPagination, get_paginated_response
 from flowback.comment.views import CommentListAPI, CommentCreateAPI, CommentUpdateAPI, CommentDeleteAPI, CommentVoteAPI, \
-    CommentAncestorListAPI
-from flowback.files.serializers import FileSerializer
+    CommentAncestorListAPI, CommentTreeListAPI, CommentReplyListAPI
+from flowback.files.serializers import ImageDerivativeField, FileSerializer
 from flowback.group.selectors.thread import group_thread_list, group_thread_comment_list, \
-    group_thread_comment_ancestor_list
+    group_thread_comment_ancestor_list, group_thread_comment_tree_list, group_thread_comment_reply_list
 from flowback.group.serializers import WorkGroupSerializer, GroupUserSerializer
 from flowback.notification.views import NotificationSubscribeTemplateAPI
 from flowback.group.services.thread import (group_thread_create,
@@ -55,7 +55,7 @@ class GroupThreadListAPI(APIView):
         group_joined = serializers.BooleanField()
         group_id = serializers.IntegerField(source='created_by.group_id')
         group_name = serializers.CharField(source='created_by.group.name')
-        group_image = serializers.ImageField(source='created_by.group.image')
+        group_image = ImageDerivativeField(size=64, source='created_by.group.image')
 
     def get(self, request):
         serializer = self.FilterSerializer(data=request.query_params)
@@ -76,6 +76,8 @@ class GroupThreadCreateAPI(APIView):
         description = serializers.CharField(required=False)
         pinned = serializers.BooleanField(default=False)
         attachments = serializers.ListField(child=serializers.FileField(), required=False, max_length=10)
+        attachments_upload_ids = serializers.ListField(child=serializers.IntegerField(), required=False, max_length=10,
+                                                       help_text='Ids of completed file uploads to attach')
         work_group_id = serializers.IntegerField(required=False)
         public = serializers.BooleanField(default=False)
 
@@ -93,6 +95,8 @@ class GroupThreadUpdateAPI(APIView):
         title = serializers.CharField(required=False)
         pinned = serializers.BooleanField(allow_null=True, default=None)
         attachments = serializers.ListField(child=serializers.FileField(), required=False, max_length=10)
+        attachments_upload_ids = serializers.ListField(child=serializers.IntegerField(), required=False, max_length=10,
+                                                       help_text='Ids of completed file uploads to attach')
 
     def post(self, request, thread_id: int):
         serializer = self.InputSerializer(data=request.data)
@@ -137,6 +141,16 @@ class GroupThreadCommentAncestorListAPI(CommentAncestorListAPI):
     lazy_action = group_thread_comment_ancestor_list
 
 
+@extend_schema(tags=['group/thread'])
+class GroupThreadCommentTreeListAPI(CommentTreeListAPI):
+    lazy_action = group_thread_comment_tree_list
+
+
+@extend_schema(tags=['group/thread'])
+class GroupThreadCommentReplyListAPI(CommentReplyListAPI):
+    lazy_action = group_thread_comment_reply_list
+
+
 @extend_schema(tags=['group/thread'])
 class GroupThreadCommentCreateAPI(CommentCreateAPI):
     lazy_action = group_thread_comment_create
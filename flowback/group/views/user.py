@@ -3,6 +3,7 @@ from rest_framework import serializers, status
 from rest_framework.response import Response
 from rest_framework.views import APIView
 from flowback.common.pagination import LimitOffsetPagination, get_paginated_response
+from flowback.files.serializers import ImageDerivativeField
 
 from flowback.group.models import GroupUser
 from flowback.group.selectors.user import group_user_list, group_user_invite_list
@@ -60,10 +61,10 @@ class GroupInviteListApi(APIView):
     class OutputSerializer(serializers.Serializer):
         user = serializers.IntegerField(source='user_id')
         username = serializers.CharField(source='user.username')
-        profile_image = serializers.ImageField(source='user.profile_image')
+        profile_image = ImageDerivativeField(size=64, source='user.profile_image')
         group = serializers.IntegerField(source='group_id')
         group_name = serializers.CharField(source='group.name')
-        group_image = serializers.ImageField(source='group.image')
+        group_image = ImageDerivativeField(size=64, source='group.image')
         external = serializers.BooleanField()
 
     def get(self, request, group: int = None):
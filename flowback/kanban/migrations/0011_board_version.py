@@ -0,0 +1,31 @@
+# Generated by Django 4.2.17 on 2026-10-19 09:08
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('kanban', '0010_kanbanentry_active_alter_kanban_name_and_more'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='kanban',
+            name='version',
+            field=models.BigIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='kanbanentry',
+            name='version',
+            field=models.BigIntegerField(default=0),
+        ),
+        migrations.AddIndex(
+            model_name='kanbanentry',
+            index=models.Index(fields=['kanban', 'active', 'lane', '-priority'], name='kanban_entry_board_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='kanbanentry',
+            index=models.Index(fields=['kanban', 'version'], name='kanban_entry_version_idx'),
+        ),
+    ]
@@ -0,0 +1,61 @@
+# Generated by Django 4.2.17 on 2026-10-19 09:13
+
+from collections import defaultdict
+
+import django.contrib.postgres.fields
+import django.contrib.postgres.indexes
+from django.db import migrations, models
+
+
+def populate_effective_kanban_ids(apps, schema_editor):
+    GroupUser = apps.get_model('group', 'GroupUser')
+    Kanban = apps.get_model('kanban', 'Kanban')
+    KanbanSubscription = apps.get_model('kanban', 'KanbanSubscription')
+
+    # Reactivated members never got their subscription back
+    KanbanSubscription.objects.bulk_create(
+        [KanbanSubscription(kanban_id=kanban_id, target_id=target_id)
+         for kanban_id, target_id in GroupUser.objects.filter(active=True,
+                                                              user__kanban__isnull=False,
+                                                              group__kanban__isnull=False)
+         .values_list('user__kanban_id', 'group__kanban_id')],
+        ignore_conflicts=True)
+
+    targets = defaultdict(set)
+    for kanban_id, target_id in KanbanSubscription.objects.values_list('kanban_id', 'target_id'):
+        targets[kanban_id].add(target_id)
+
+    def effective(origin_id):
+        reached, stack = set(), [origin_id]
+        while stack:
+            for target_id in targets[stack.pop()] - reached:
+                reached.add(target_id)
+                stack.append(target_id)
+
+        return sorted(reached - {origin_id})
+
+    Kanban.objects.bulk_update([Kanban(id=kanban_id, effective_kanban_ids=effective(kanban_id))
+                                for kanban_id in list(targets)],
+                               fields=['effective_kanban_ids'],
+                               batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('kanban', '0011_board_version'),
+        ('group', '0062_group_member_count_group_voter_count'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='kanban',
+            name='effective_kanban_ids',
+            field=django.contrib.postgres.fields.ArrayField(base_field=models.BigIntegerField(), blank=True, default=list, size=None),
+        ),
+        migrations.AddIndex(
+            model_name='kanban',
+            index=django.contrib.postgres.indexes.GinIndex(fields=['effective_kanban_ids'], name='kanban_effective_ids_gin'),
+        ),
+        migrations.RunPython(populate_effective_kanban_ids, migrations.RunPython.noop),
+    ]
@@ -1,23 +1,69 @@
 import math
+from collections import defaultdict
 
+from django.contrib.postgres.fields import ArrayField
+from django.contrib.postgres.indexes import GinIndex
 from django.core.validators import MinValueValidator
 from django.utils.translation import gettext_lazy as _
 
-from django.db import models
+from django.db import models, transaction
+from django.db.models import F
+from django.db.models.signals import post_save, post_delete
 from rest_framework.exceptions import ValidationError
 
 from backend.settings import FLOWBACK_KANBAN_PRIORITY_LIMIT, FLOWBACK_KANBAN_LANES
-from flowback.common.models import BaseModel
+from flowback.common.models import BaseModel, CounterModel
 from flowback.common.validators import FieldNotBlankValidator
 
 
-class Kanban(BaseModel):
+class Kanban(BaseModel, CounterModel):
+    COUNTER_FIELDS = ('version',)
+    SAVE_EXCLUDED_FIELDS = ('effective_kanban_ids',)
+
     name = models.CharField(max_length=255, validators=[FieldNotBlankValidator])
     origin_type = models.CharField(max_length=255, validators=[FieldNotBlankValidator])
     origin_id = models.IntegerField()
 
+    # Incremented by every change to an entry, see KanbanEntry.save
+    version = models.BigIntegerField(default=0)
+
+    # Kanbans mirrored through subscriptions (directly or through other kanbans), see refresh_effective_kanbans
+    effective_kanban_ids = ArrayField(models.BigIntegerField(), default=list, blank=True)
+
     class Meta:
         unique_together = ('origin_type', 'origin_id')
+        indexes = [GinIndex(fields=['effective_kanban_ids'], name='kanban_effective_ids_gin')]
+
+    @classmethod
+    def refresh_effective_kanbans(cls, kanban_id: int) -> None:
+        """
+        Recomputes the effective kanban set of a kanban and of every kanban mirroring it, after its subscriptions
+        changed. Subscriptions are read one level at a time.
+        """
+        kanban_ids = {kanban_id, *cls.objects.filter(effective_kanban_ids__contains=[kanban_id])
+                      .values_list('id', flat=True)}
+
+        targets, frontier, seen = defaultdict(set), set(kanban_ids), set()
+        while frontier:
+            seen |= frontier
+            subscriptions = list(KanbanSubscription.objects.filter(kanban_id__in=frontier)
+                                 .values_list('kanban_id', 'target_id'))
+            for subscriber_id, target_id in subscriptions:
+                targets[subscriber_id].add(target_id)
+
+            frontier = {target_id for _subscriber_id, target_id in subscriptions} - seen
+
+        def effective(origin_id: int) -> list[int]:
+            reached, stack = set(), [origin_id]
+            while stack:
+                for target_id in targets[stack.pop()] - reached:
+                    reached.add(target_id)
+                    stack.append(target_id)
+
+            return sorted(reached - {origin_id})
+
+        cls.objects.bulk_update([cls(id=i, effective_kanban_ids=effective(i)) for i in kanban_ids],
+                                fields=['effective_kanban_ids'])
 
 
 class KanbanEntry(BaseModel):
@@ -33,6 +79,24 @@ class KanbanEntry(BaseModel):
     lane = models.IntegerField(validators=[MinValueValidator(1)])
     active = models.BooleanField(default=True)
 
+    # Board version of the latest change to the entry, read by delta syncs
+    version = models.BigIntegerField(default=0)
+
+    class Meta:
+        indexes = [models.Index(fields=['kanban', 'active', 'lane', '-priority'], name='kanban_entry_board_idx'),
+                   models.Index(fields=['kanban', 'version'], name='kanban_entry_version_idx')]
+
+    def save(self, *args, **kwargs):
+        # The board stays locked until the change is committed, versions are handed out in commit order
+        with transaction.atomic():
+            Kanban.objects.filter(id=self.kanban_id).update(version=F('version') + 1)
+            self.version = Kanban.objects.values_list('version', flat=True).get(id=self.kanban_id)
+
+            if kwargs.get('update_fields') is not None:
+                kwargs['update_fields'] = {*kwargs['update_fields'], 'version'}
+
+            super().save(*args, **kwargs)
+
     def clean(self):
         if self.priority > FLOWBACK_KANBAN_PRIORITY_LIMIT:
             raise ValidationError(f"Kanban priority can't be greater than {FLOWBACK_KANBAN_PRIORITY_LIMIT}")
@@ -56,3 +120,16 @@ class KanbanSubscription(BaseModel):
 
     class Meta:
         unique_together = ('kanban', 'target')
+
+    @classmethod
+    def post_save(cls, instance, created, *args, **kwargs):
+        if created:
+            Kanban.refresh_effective_kanbans(instance.kanban_id)
+
+    @classmethod
+    def post_delete(cls, instance, *args, **kwargs):
+        Kanban.refresh_effective_kanbans(instance.kanban_id)
+
+
+post_save.connect(KanbanSubscription.post_save, KanbanSubscription)
+post_delete.connect(KanbanSubscription.post_delete, KanbanSubscription)
@@ -1,9 +1,15 @@
+import hashlib
+from functools import cached_property
+
 import django_filters
 from django.db.models import Q
+from django.utils.http import quote_etag
+from rest_framework.exceptions import ValidationError
 
+from backend.settings import FLOWBACK_KANBAN_LANES
 from flowback.common.filters import NumberInFilter
 from flowback.group.models import WorkGroupUser, Group
-from flowback.kanban.models import KanbanEntry
+from flowback.kanban.models import KanbanEntry, Kanban
 from flowback.user.models import User
 
 
@@ -24,16 +30,76 @@ class BaseKanbanEntryFilter(django_filters.FilterSet):
                       lane=['exact', 'icontains'])
 
 
-# TODO due for rework
 def kanban_entry_list(*, user: User, filters=None):
     filters = filters or {}
-    qs = KanbanEntry.objects.filter(Q(Q(kanban__origin_type="user") & Q(kanban__origin_id=user.id)) |
-                                    Q(Q(kanban__group__active=True)
-                                      & Q(kanban__group__groupuser__user=user)
-                                      & Q(kanban__group__groupuser__active=True)),
-                                    active=True
-                                    ).exclude(Q(work_group__isnull=False)
-                                              & ~Q(work_group__workgroupuser__group_user__user=user)
-                                              & Q(work_group__workgroupuser__active=True))
+
+    # The user's kanban and every kanban it mirrors (the groups the user is in), see Kanban.effective_kanban_ids
+    effective_kanban_ids = Kanban.objects.values_list('effective_kanban_ids', flat=True).get(id=user.kanban_id)
+    work_group_ids = WorkGroupUser.objects.filter(group_user__user=user, group_user__active=True,
+                                                  active=True).values('work_group_id')
+
+    qs = KanbanEntry.objects.filter(Q(work_group__isnull=True) | Q(work_group__in=work_group_ids),
+                                    kanban_id__in=[user.kanban_id, *effective_kanban_ids],
+                                    active=True)
 
     return BaseKanbanEntryFilter(filters, qs).qs
+
+
+class KanbanBoard:
+    """
+    Snapshot of a kanban board from kanban_board. Only the board version is read up front, the entries are read once
+    the lanes are, so unchanged boards are answered from the ETag alone.
+    """
+    def __init__(self, *, kanban_id: int, version: int, since_version: int | None, entries, entry_ids, etag_key: str):
+        self.kanban_id = kanban_id
+        self.version = version
+        self.since_version = since_version
+        self.entries = entries
+        self._entry_ids = entry_ids
+        self.etag = quote_etag(hashlib.md5(f'{kanban_id}:{version}:{etag_key}'.encode()).hexdigest())
+
+    @cached_property
+    def lanes(self) -> list[dict]:
+        lanes = [dict(lane=i + 1, name=name, entries=[]) for i, name in enumerate(FLOWBACK_KANBAN_LANES)]
+        for entry in self.entries:
+            lanes[min(entry.lane, len(lanes)) - 1]['entries'].append(entry)
+
+        return lanes
+
+    @cached_property
+    def entry_ids(self) -> list[int] | None:
+        return None if self.since_version is None else list(self._entry_ids)
+
+
+def kanban_board(*, kanban_id: int, user: User, since_version: int = None) -> KanbanBoard:
+    """
+    Active entries of a kanban grouped by lane (FLOWBACK_KANBAN_LANES), highest priority first. Entries of work groups
+    the user isn't in are left out.
+
+    With since_version only the entries changed after that board version are included, deactivated ones too. The ids
+    of every active entry are included as well, clients drop the entries that are missing from them.
+    """
+    # Read before the entries, changes committed in between are sent again on the next sync rather than lost
+    version = Kanban.objects.values_list('version', flat=True).get(id=kanban_id)
+    if since_version is not None and since_version > version:
+        raise ValidationError('since_version is ahead of the board version')
+
+    work_group_ids = sorted(WorkGroupUser.objects.filter(group_user__user=user, group_user__active=True, active=True)
+                            .values_list('work_group_id', flat=True))
+
+    qs = KanbanEntry.objects.filter(Q(work_group__isnull=True) | Q(work_group__in=work_group_ids), kanban_id=kanban_id)
+    if since_version is None:
+        entries = qs.filter(active=True)
+    else:
+        entries = qs.filter(version__gt=since_version)
+
+    entries = (entries.select_related('kanban', 'created_by', 'assignee', 'work_group')
+               .prefetch_related('attachments__filesegment_set')
+               .order_by('lane', '-priority', 'id'))
+
+    return KanbanBoard(kanban_id=kanban_id,
+                       version=version,
+                       since_version=since_version,
+                       entries=entries,
+                       entry_ids=qs.filter(active=True).order_by('id').values_list('id', flat=True),
+                       etag_key=','.join(map(str, work_group_ids)))
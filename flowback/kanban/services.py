@@ -1,3 +1,6 @@
+from functools import lru_cache
+
+from django.db.models.signals import post_delete
 from django.shortcuts import get_object_or_404
 from django.utils import timezone
 
@@ -95,12 +98,24 @@ def kanban_entry_delete(*, kanban_entry_id: int) -> None:
     entry.save()
 
 
+@lru_cache(maxsize=4096)
+def _get_kanban(origin_type: str, origin_id: int) -> Kanban:
+    return get_object(Kanban, origin_type=origin_type, origin_id=origin_id)
+
+
+# Kanbans are only looked up by their origin, which never changes. Deleted kanbans leave the cache right away
+post_delete.connect(lambda *args, **kwargs: _get_kanban.cache_clear(), Kanban, weak=False)
+
+
 class KanbanManager:
     def __init__(self, origin_type: str):
         self.origin_type = origin_type
 
-    def get_kanban(self, origin_id: int, origin_type: str = None):
-        return get_object(Kanban, origin_type=origin_type or self.origin_type, origin_id=origin_id)
+    def get_kanban(self, origin_id: int, origin_type: str = None) -> Kanban:
+        """
+        Kanban of an origin, cached in-process. Only the id and origin of the cached kanban are to be relied on
+        """
+        return _get_kanban(origin_type or self.origin_type, origin_id)
 
     def kanban_create(self, *, name: str, origin_id: int):
         get_object(Kanban, reverse=True, origin_name=self.origin_type, origin_id=origin_id)
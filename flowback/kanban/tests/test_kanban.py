@@ -1,13 +1,19 @@
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
 from django.utils import timezone
-from rest_framework.test import APITestCase
+from rest_framework.exceptions import ValidationError
+from rest_framework.test import APITestCase, APIRequestFactory, force_authenticate
 from django.core.files.uploadedfile import SimpleUploadedFile
 
+from backend.settings import FLOWBACK_KANBAN_LANES
 from flowback.common.tests import generate_request
+from flowback.group.tests.factories import GroupFactory, GroupUserFactory, WorkGroupFactory, WorkGroupUserFactory
+from flowback.group.views.kanban import GroupKanbanBoardAPI
 from flowback.kanban.models import KanbanEntry
-from flowback.kanban.services import kanban_entry_create
+from flowback.kanban.services import kanban_entry_create, kanban_entry_update, kanban_entry_delete, KanbanManager
 from flowback.kanban.tests.factories import KanbanFactory, KanbanEntryFactory
 from flowback.user.tests.factories import UserFactory
-from flowback.user.views.kanban import UserKanbanEntryUpdateAPI
+from flowback.user.views.kanban import UserKanbanEntryUpdateAPI, UserKanbanBoardAPI
 
 
 class TestKanban(APITestCase):
@@ -28,6 +34,19 @@ class TestKanban(APITestCase):
 
         self.assertTrue(KanbanEntry.objects.filter(id=entry.id).exists())
 
+    def test_kanban_manager_get_kanban(self):
+        manager = KanbanManager(origin_type=self.kanban.origin_type)
+        self.assertEqual(manager.get_kanban(origin_id=self.kanban.origin_id).id, self.kanban.id)
+
+        with CaptureQueriesContext(connection) as context:
+            self.assertEqual(manager.get_kanban(origin_id=self.kanban.origin_id).id, self.kanban.id)
+
+        self.assertEqual(len(context.captured_queries), 0)
+
+        # Deleted kanbans leave the cache
+        self.kanban.delete()
+        self.assertRaises(ValidationError, manager.get_kanban, origin_id=self.kanban.origin_id)
+
     def test_kanban_entry_update_with_attachments(self):
         # Create a user-owned kanban entry
         entry = KanbanEntryFactory(kanban=self.user.kanban,
@@ -54,3 +73,83 @@ class TestKanban(APITestCase):
         entry.refresh_from_db()
         self.assertIsNotNone(entry.attachments)
         self.assertEqual(entry.attachments.filesegment_set.count(), 2)
+
+
+class TestKanbanBoard(APITestCase):
+    def setUp(self):
+        self.group = GroupFactory()
+        self.group_user = GroupUserFactory(group=self.group)
+        self.user = self.group_user.user
+
+        self.work_group = WorkGroupFactory(group=self.group)
+        WorkGroupUserFactory(group_user=self.group_user, work_group=self.work_group)
+        self.other_work_group = WorkGroupFactory(group=self.group)
+
+    def entries(self, size: int, **kwargs) -> list[KanbanEntry]:
+        return [KanbanEntryFactory(kanban=self.group.kanban, created_by=self.user, assignee=self.user, **kwargs)
+                for _ in range(size)]
+
+    def board(self, etag: str = None, **params):
+        request = APIRequestFactory().get('', data=params, **(dict(HTTP_IF_NONE_MATCH=etag) if etag else {}))
+        force_authenticate(request, user=self.user)
+
+        return GroupKanbanBoardAPI.as_view()(request, group_id=self.group.id)
+
+    def test_kanban_board(self):
+        entries = self.entries(10) + self.entries(2, work_group=self.work_group)
+        hidden = self.entries(1, work_group=self.other_work_group) + self.entries(1, active=False)
+
+        response = self.board()
+        self.assertEqual(response.status_code, 200, response.data)
+        self.assertEqual([(lane['lane'], lane['name']) for lane in response.data['lanes']],
+                         list(enumerate(FLOWBACK_KANBAN_LANES, start=1)))
+        self.assertIsNone(response.data['entry_ids'])
+
+        for lane in response.data['lanes']:
+            self.assertTrue(all(entry['lane'] == lane['lane'] for entry in lane['entries']))
+            self.assertEqual([entry['priority'] for entry in lane['entries']],
+                             sorted((entry['priority'] for entry in lane['entries']), reverse=True))
+
+        ids = {entry['id'] for lane in response.data['lanes'] for entry in lane['entries']}
+        self.assertEqual(ids, {entry.id for entry in entries})
+        self.assertFalse(ids & {entry.id for entry in hidden})
+
+        # The whole board is read at once, regardless of its size
+        with CaptureQueriesContext(connection) as context:
+            self.board()
+
+        self.entries(20)
+        with CaptureQueriesContext(connection) as larger_context:
+            self.board()
+
+        self.assertEqual(len(context.captured_queries), len(larger_context.captured_queries))
+
+        response = generate_request(api=UserKanbanBoardAPI, user=self.user)
+        self.assertEqual(response.status_code, 200, response.data)
+        self.assertFalse(any(lane['entries'] for lane in response.data['lanes']))
+
+    def test_kanban_board_delta_sync(self):
+        updated, deleted, unchanged = self.entries(3)
+
+        response = self.board()
+        version, etag = response.data['version'], response['ETag']
+        self.assertEqual(self.board(etag=etag).status_code, 304)
+
+        kanban_entry_update(kanban_entry_id=updated.id, data=dict(title='Updated'))
+        kanban_entry_delete(kanban_entry_id=deleted.id)
+        created = self.entries(1)[0]
+
+        response = self.board(etag=etag, since_version=version)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+        self.assertEqual(response.data['version'], version + 3)
+
+        changed = {entry['id']: entry for lane in response.data['lanes'] for entry in lane['entries']}
+        self.assertEqual(set(changed), {updated.id, deleted.id, created.id})
+        self.assertEqual(changed[updated.id]['title'], 'Updated')
+        self.assertFalse(changed[deleted.id]['active'])
+        self.assertEqual(response.data['entry_ids'], sorted([updated.id, unchanged.id, created.id]))
+
+        response = self.board(since_version=response.data['version'])
+        self.assertFalse(any(lane['entries'] for lane in response.data['lanes']))
+        self.assertEqual(self.board(since_version=version + 4).status_code, 400)
@@ -3,15 +3,18 @@ import math
 from django.shortcuts import render
 
 # Create your views here.
+from django.utils.cache import get_conditional_response
+from rest_framework.response import Response
 from rest_framework.views import APIView
 from rest_framework import serializers
 
 from backend.settings import FLOWBACK_KANBAN_LANES, FLOWBACK_KANBAN_PRIORITY_LIMIT
 from flowback.common.pagination import LimitOffsetPagination
-from flowback.files.serializers import FileSerializer, FileCollectionCreateSerializerMixin, \
+from flowback.files.serializers import ImageDerivativeField, FileSerializer, FileCollectionCreateSerializerMixin, \
     FileCollectionUpdateSerializerMixin, FileCollectionListSerializerMixin
 from flowback.group.serializers import WorkGroupSerializer
 from flowback.kanban.models import KanbanEntry
+from flowback.kanban.selectors import KanbanBoard
 
 
 class KanbanEntryListApi(APIView):
@@ -34,7 +37,7 @@ class KanbanEntryListApi(APIView):
     class OutputSerializer(FileCollectionListSerializerMixin, serializers.Serializer):
         class UserSerializer(serializers.Serializer):
             id = serializers.IntegerField()
-            profile_image = serializers.ImageField()
+            profile_image = ImageDerivativeField(size=64)
             username = serializers.CharField()
 
         id = serializers.IntegerField()
@@ -51,6 +54,54 @@ class KanbanEntryListApi(APIView):
         category = serializers.CharField(allow_null=True)
 
 
+class KanbanBoardApi(APIView):
+    class FilterSerializer(serializers.Serializer):
+        since_version = serializers.IntegerField(required=False, min_value=0,
+                                                 help_text='Board version of the last sync, only entries changed '
+                                                           'after it are included')
+
+    class OutputSerializer(serializers.Serializer):
+        class LaneSerializer(serializers.Serializer):
+            class EntrySerializer(FileCollectionListSerializerMixin, serializers.Serializer):
+                class UserSerializer(serializers.Serializer):
+                    id = serializers.IntegerField()
+                    profile_image = ImageDerivativeField(size=64)
+                    username = serializers.CharField()
+
+                id = serializers.IntegerField()
+                assignee = UserSerializer(read_only=True, required=False)
+                created_by = UserSerializer(read_only=True)
+                origin_type = serializers.CharField(source='kanban.origin_type')
+                origin_id = serializers.IntegerField(source='kanban.origin_id')
+                priority = serializers.IntegerField()
+                end_date = serializers.DateTimeField(required=False)
+                title = serializers.CharField()
+                description = serializers.CharField(allow_null=True, allow_blank=True)
+                work_group = WorkGroupSerializer()
+                lane = serializers.IntegerField()
+                active = serializers.BooleanField(help_text='False for entries deleted since the last sync')
+                version = serializers.IntegerField()
+
+            lane = serializers.IntegerField()
+            name = serializers.CharField()
+            entries = EntrySerializer(many=True)
+
+        version = serializers.IntegerField()
+        lanes = LaneSerializer(many=True)
+        entry_ids = serializers.ListField(child=serializers.IntegerField(), allow_null=True,
+                                          help_text='Every active entry, only included with since_version')
+
+    def board_response(self, request, board: KanbanBoard):
+        # Unchanged boards are answered from the board version, without reading the entries
+        if response := get_conditional_response(request, etag=board.etag):
+            return response
+
+        response = Response(self.OutputSerializer(board).data)
+        response['ETag'] = board.etag
+        response['Cache-Control'] = 'private, no-cache'
+        return response
+
+
 class KanbanEntryCreateAPI(APIView):
     class InputSerializer(FileCollectionCreateSerializerMixin, serializers.Serializer):
         assignee_id = serializers.IntegerField(required=False, allow_null=True)
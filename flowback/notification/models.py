@@ -1,5 +1,6 @@
 import inspect
 import re
+from collections import defaultdict
 from datetime import timedelta, datetime
 from inspect import getfullargspec, isclass
 
@@ -17,6 +18,15 @@ from tree_queries.models import TreeNode
 
 from flowback.common.models import BaseModel
 from flowback.common.validators import FieldNotBlankValidator
+from flowback.files.models import ImageDerivativeModel
+
+NOTIFICATION_IMAGE_SIZE = 64
+
+
+def notification_data_images(data: dict) -> dict:
+    """Replaces the ImageFieldFiles in notification data, which JSONField can't serialize, with icon sized URLs"""
+    return {k: ImageDerivativeModel.image_derivative_url(v, NOTIFICATION_IMAGE_SIZE) if isinstance(v, ImageFieldFile)
+            else v for k, v in data.items()}
 
 
 # NotificationObject is created containing data for each occurrence
@@ -78,17 +88,54 @@ class NotificationObject(BaseModel):
                 **exclude_subscription_filters
             ).annotate(reminders=F('notificationsubscriptiontag__reminders'))
 
-            notifications = []
-            for subscriber in subscribers:
-                if subscriber.reminders:
-                    for i in subscriber.reminders:
-                        notifications.append(Notification(user=subscriber.user,
-                                                          notification_object=instance,
-                                                          reminder=i))
+            Notification.objects.bulk_create(cls.subscriber_notifications(
+                instance, subscribers.values('user_id', 'reminders')))
+
+    @staticmethod
+    def subscriber_notifications(instance, subscribers) -> list['Notification']:
+        notifications = []
+        for subscriber in subscribers:
+            if subscriber['reminders']:
+                for i in subscriber['reminders']:
+                    notifications.append(Notification(user_id=subscriber['user_id'],
+                                                      notification_object=instance,
+                                                      reminder=i))
 
-                notifications.append(Notification(user=subscriber.user, notification_object=instance))
+            notifications.append(Notification(user_id=subscriber['user_id'], notification_object=instance))
 
-            Notification.objects.bulk_create(notifications)
+        return notifications
+
+    @classmethod
+    def bulk_notify(cls, notification_objects: list['NotificationObject'],
+                    subscription_filters: dict[int, dict] = None) -> list['NotificationObject']:
+        """
+        Creates many notification objects at once and delivers them to subscribers, like post_save would.
+        Subscribers of every channel and tag are fetched in a single query.
+
+        :param notification_objects: Unsaved NotificationObjects, their data must be JSON serializable
+        :param subscription_filters: Optional user ids to deliver to, keyed by channel id
+        """
+        subscription_filters = subscription_filters or {}
+        notification_objects = cls.objects.bulk_create(notification_objects)
+
+        subscribers = defaultdict(list)
+        for subscriber in NotificationSubscription.objects.filter(
+                channel_id__in={obj.channel_id for obj in notification_objects},
+                notificationsubscriptiontag__name__in={obj.tag for obj in notification_objects}
+        ).values('user_id', 'channel_id',
+                 tag=F('notificationsubscriptiontag__name'),
+                 reminders=F('notificationsubscriptiontag__reminders')):
+            subscribers[subscriber['channel_id'], subscriber['tag']].append(subscriber)
+
+        notifications = []
+        for obj in notification_objects:
+            user_ids = subscription_filters.get(obj.channel_id)
+            notifications += cls.subscriber_notifications(
+                obj, [s for s in subscribers[obj.channel_id, obj.tag] if user_ids is None or s['user_id'] in user_ids])
+
+        Notification.objects.bulk_create(notifications)
+
+        return notification_objects
 
 
 post_save.connect(NotificationObject.post_save, NotificationObject)
@@ -215,17 +262,8 @@ class NotificationChannel(BaseModel, TreeNode):
     @property
     def data(self) -> dict | None:
         if self.content_object.notification_data is not None:
-            data = self.content_object.notification_data
-
             # Patch to fix django's immaculate ImageFieldFile serialization for JSONField
-            for k, v in data.items():
-                if isinstance(v, ImageFieldFile):
-                    if not v:
-                        data[k] = None
-                    else:
-                        data[k] = v.url
-
-            return data
+            return notification_data_images(self.content_object.notification_data)
 
         else:
             return None
@@ -280,12 +318,7 @@ class NotificationChannel(BaseModel, TreeNode):
             data = data | self.content_object.notification_data
 
         # A patchwork for django image fields due to them returning <ImageFieldFile: None> when empty
-        for k, v in data.items():
-            if isinstance(v, ImageFieldFile):
-                if not v:
-                    data[k] = None
-                else:
-                    data[k] = v.url
+        data = notification_data_images(data)
 
         extra_fields = dict(timestamp=timestamp)  # Dict of fields that has defaults in NotificationObject model
         notification_object = NotificationObject(channel=self,
@@ -389,6 +422,84 @@ class NotificationChannel(BaseModel, TreeNode):
     def unsubscribe(self, *, user):
         self.subscribe(user=user)
 
+    @classmethod
+    def bulk_subscribe(cls, *,
+                       subscriptions: dict[tuple[int, int], tuple[None | tuple[int]] | None],
+                       tags: tuple[str] | list[str],
+                       batch_size: int = 1000) -> None:
+        """
+        Subscribes many users to many channels at once, like subscribe would, in a handful of statements.
+        Subscriptions are upserted, tags they had outside the given tags are removed.
+        Unlike subscribe, the tags are not checked against the channels, callers are expected to pass valid tags.
+        :param subscriptions: Reminders of every subscription (same format as subscribe), keyed by (channel id, user id)
+        :param tags: A tuple of tags to subscribe to
+        :param batch_size: Rows inserted per statement
+        """
+        if not subscriptions:
+            return
+
+        for reminders in subscriptions.values():
+            if reminders and any(rem and any(r == 0 for r in rem) for rem in reminders):
+                raise ValidationError('Reminders cannot be set to 0')
+
+        channel_ids = {channel_id for channel_id, user_id in subscriptions}
+        user_ids = {user_id for channel_id, user_id in subscriptions}
+
+        NotificationSubscription.objects.bulk_create([NotificationSubscription(channel_id=channel_id, user_id=user_id)
+                                                      for channel_id, user_id in subscriptions],
+                                                     ignore_conflicts=True,
+                                                     batch_size=batch_size)
+
+        subscription_ids = {}
+        for subscription_id, channel_id, user_id in NotificationSubscription.objects.filter(
+                channel_id__in=channel_ids, user_id__in=user_ids).values_list('id', 'channel_id', 'user_id'):
+            if (channel_id, user_id) in subscriptions:
+                subscription_ids[channel_id, user_id] = subscription_id
+
+        subscription_tags = []
+        for key, reminders in subscriptions.items():
+            for i, tag in enumerate(tags):
+                rem = None
+                if reminders is not None and len(reminders) >= i + 1 and reminders[i] and len(reminders[i]) <= 10:
+                    rem = list(reminders[i])
+
+                subscription_tags.append(NotificationSubscriptionTag(subscription_id=subscription_ids[key],
+                                                                     name=tag,
+                                                                     reminders=rem))
+
+        NotificationSubscriptionTag.objects.filter(subscription_id__in=subscription_ids.values()
+                                                   ).exclude(name__in=tags).delete()
+        NotificationSubscriptionTag.objects.bulk_create(subscription_tags,
+                                                        update_conflicts=True,
+                                                        unique_fields=['subscription', 'name'],
+                                                        update_fields=['reminders', 'updated_at'],
+                                                        batch_size=batch_size)
+
+    @classmethod
+    def bulk_unsubscribe(cls, *, subscriptions: list[tuple[int, int]]) -> None:
+        """
+        Unsubscribes many users from many channels at once.
+        :param subscriptions: (channel id, user id) of every subscription to delete
+        """
+        if not subscriptions:
+            return
+
+        # Grouped by whichever side has the fewest distinct ids, e.g. one user leaving many channels
+        by_channel, by_user = defaultdict(set), defaultdict(set)
+        for channel_id, user_id in subscriptions:
+            by_channel[channel_id].add(user_id)
+            by_user[user_id].add(channel_id)
+
+        if len(by_channel) <= len(by_user):
+            q = Q(*[Q(channel_id=channel_id, user_id__in=user_ids) for channel_id, user_ids in by_channel.items()],
+                  _connector=Q.OR)
+
+        else:
+            q = Q(*[Q(user_id=user_id, channel_id__in=channel_ids) for user_id, channel_ids in by_user.items()],
+                  _connector=Q.OR)
+
+        NotificationSubscription.objects.filter(q).delete()
+
     def unsubscribe_all(self, *, user = None):
         """
         Deletes all subscriptions for the given user (or all if user is None), including related channels.
@@ -0,0 +1,44 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from flowback.poll.models import Poll
+from flowback.poll.selectors.export import (poll_export_ballot_matrix, poll_export_rows, POLL_EXPORT_FORMATS,
+                                            POLL_EXPORT_TABLES)
+
+
+class Command(BaseCommand):
+    help = "Exports a poll's proposals, ballots, delegate mandates and prediction bets as CSV, JSONL or a NumPy .npz"
+
+    def add_arguments(self, parser):
+        parser.add_argument('poll_id', type=int)
+        parser.add_argument('--format', choices=POLL_EXPORT_FORMATS, default='jsonl')
+        parser.add_argument('--table', choices=POLL_EXPORT_TABLES, action='append', dest='tables',
+                            help='Table to export, can be repeated (csv takes exactly one). Defaults to every table')
+        parser.add_argument('--output', help='File to write to, defaults to stdout (not available for npz)')
+        parser.add_argument('--chunk-size', type=int, default=2000)
+
+    def handle(self, *args, poll_id, format, tables, output, chunk_size, **options):
+        poll = Poll.objects.filter(id=poll_id).first()
+        if poll is None:
+            raise CommandError(f'Poll {poll_id} does not exist')
+
+        if format == 'npz':
+            if not output:
+                raise CommandError('npz exports require --output')
+
+            with open(output, 'wb') as f:
+                f.write(poll_export_ballot_matrix(poll=poll, chunk_size=chunk_size).getbuffer())
+            return
+
+        tables = tables or list(POLL_EXPORT_TABLES)
+        if format == 'csv' and len(tables) != 1:
+            raise CommandError('csv exports take exactly one --table')
+
+        rows = poll_export_rows(poll=poll, export_format=format, tables=tables, chunk_size=chunk_size)
+        if not output:
+            for chunk in rows:
+                self.stdout.write(chunk, ending='')
+            return
+
+        with open(output, 'w', newline='') as f:
+            for chunk in rows:
+                f.write(chunk)
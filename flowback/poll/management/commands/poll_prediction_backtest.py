@@ -0,0 +1,41 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from flowback.group.models import Group
+from flowback.poll.selectors.backtest import poll_prediction_backtest
+
+
+class Command(BaseCommand):
+    help = 'Replays the combined prediction bets of a group per tag without writing anything, ' \
+           'reporting IMAC, Brier score and runtime next to the stored combined bets'
+
+    def add_arguments(self, parser):
+        parser.add_argument('group_id', type=int)
+        parser.add_argument('--tag', type=int, action='append', dest='tag_ids',
+                            help='Tag to replay, can be repeated. Defaults to every tag of the group')
+        parser.add_argument('--processes', type=int, default=1, help='Replay tags in parallel worker processes')
+        parser.add_argument('--seed', type=int, default=0, help='Seed of the singular covariance nudges')
+
+    def handle(self, *args, group_id, tag_ids, processes, seed, **options):
+        if not Group.objects.filter(id=group_id).exists():
+            raise CommandError(f'Group {group_id} does not exist')
+
+        def score(value):
+            return '-' if value is None else f'{value:.4f}'
+
+        start = time.perf_counter()
+        results = poll_prediction_backtest(group_id=group_id, tag_ids=tag_ids, processes=processes, seed=seed)
+        elapsed = (time.perf_counter() - start) * 1000
+
+        self.stdout.write(f'{"Tag":>8} {"Polls":>6} {"Statements":>10} {"Predictors":>10} {"Evaluated":>9} '
+                          f'{"IMAC":>15} {"Brier":>15} {"Runtime":>10}')
+        for tag_id, result in results.items():
+            replayed, stored = result['replayed'], result['stored']
+            self.stdout.write(f'{tag_id:>8} {result["polls"]:>6} {result["statements"]:>10} '
+                              f'{result["predictors"]:>10} {replayed["evaluated"]:>9} '
+                              f'{score(replayed["imac"]) + "/" + score(stored["imac"]):>15} '
+                              f'{score(replayed["brier"]) + "/" + score(stored["brier"]):>15} '
+                              f'{result["runtime"] * 1000:>8.2f}ms')
+
+        self.stdout.write(f'Replayed {len(results)} tag(s) in {elapsed:.2f}ms (IMAC and Brier as replayed/stored)')
@@ -0,0 +1,40 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from rest_framework.exceptions import ValidationError
+
+from flowback.poll.models import PollResultSnapshot
+from flowback.poll.services.result import poll_result_snapshot_verify
+
+
+class Command(BaseCommand):
+    help = 'Recounts poll results from their snapshots and checks them against the stored results'
+
+    def add_arguments(self, parser):
+        parser.add_argument('poll_ids', type=int, nargs='*', help='Polls to verify, defaults to every poll')
+        parser.add_argument('--all', action='store_true', help='Verify every snapshot instead of the latest per poll')
+
+    def handle(self, *args, poll_ids, all, **options):
+        snapshots = PollResultSnapshot.objects.order_by('poll_id', '-created_at', '-id')
+        if poll_ids:
+            snapshots = snapshots.filter(poll_id__in=poll_ids)
+
+        if not all:
+            snapshots = snapshots.distinct('poll_id')
+
+        mismatches = 0
+        for snapshot in snapshots.iterator():
+            start = time.perf_counter()
+            try:
+                verified = poll_result_snapshot_verify(snapshot=snapshot)
+
+            except ValidationError:
+                verified = False
+
+            elapsed = (time.perf_counter() - start) * 1000
+            mismatches += not verified
+            self.stdout.write(f'Poll {snapshot.poll_id} snapshot {snapshot.id}: '
+                              f'{"OK" if verified else "MISMATCH"} ({elapsed:.2f}ms)')
+
+        if mismatches:
+            raise CommandError(f'{mismatches} snapshot(s) failed verification')
@@ -0,0 +1,47 @@
+# Generated by Django 4.2.17 on 2026-10-19 06:53
+
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def populate_poll_counters(apps, schema_editor):
+    Poll = apps.get_model('poll', 'Poll')
+    PollProposal = apps.get_model('poll', 'PollProposal')
+    PollPredictionStatement = apps.get_model('poll', 'PollPredictionStatement')
+    Comment = apps.get_model('comment', 'Comment')
+
+    def total(queryset, field):
+        return Coalesce(Subquery(queryset.values(field).annotate(total=Count('*')).values('total')[:1]), 0)
+
+    Poll.objects.update(
+        proposal_count=total(PollProposal.objects.filter(poll_id=OuterRef('id')), 'poll_id'),
+        comment_count=total(Comment.objects.filter(comment_section_id=OuterRef('comment_section_id'), active=True),
+                            'comment_section_id'),
+        prediction_count=total(PollPredictionStatement.objects.filter(poll_id=OuterRef('id')), 'poll_id'))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('poll', '0052_pollproposaltypeschedule_preliminary_score'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='poll',
+            name='comment_count',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='poll',
+            name='prediction_count',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='poll',
+            name='proposal_count',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.RunPython(populate_poll_counters, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,36 @@
+# Generated by Django 4.2.17 on 2026-10-19 07:26
+
+from django.db import migrations, models
+import django.db.models.deletion
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('poll', '0053_poll_comment_count_poll_prediction_count_and_more'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PollPhaseJob',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('created_at', models.DateTimeField(db_index=True, default=django.utils.timezone.now)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('job', models.CharField(choices=[('area_vote_count', 'area_vote_count'), ('prediction_bet_count', 'prediction_bet_count'), ('proposal_vote_count', 'proposal_vote_count')], max_length=32)),
+                ('due_at', models.DateTimeField()),
+                ('state', models.CharField(choices=[('pending', 'pending'), ('done', 'done'), ('failed', 'failed')], default='pending', max_length=16)),
+                ('version', models.PositiveIntegerField(default=0)),
+                ('attempts', models.PositiveIntegerField(default=0)),
+                ('poll', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='poll.poll')),
+            ],
+            options={
+                'indexes': [models.Index(condition=models.Q(('state', 'pending')), fields=['due_at'], name='pollphasejob_due_idx')],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='pollphasejob',
+            constraint=models.UniqueConstraint(fields=('poll', 'job'), name='pollphasejob_unique_job'),
+        ),
+    ]
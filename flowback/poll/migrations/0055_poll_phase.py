@@ -0,0 +1,67 @@
+# Generated by Django 4.2.17 on 2026-10-19 07:32
+
+from django.db import migrations, models
+from django.db.models import Case, When, Value, F, Q
+from django.utils import timezone
+
+
+def populate_poll_phase(apps, schema_editor):
+    poll = apps.get_model('poll', 'Poll')
+    now = timezone.now()
+
+    # Same rules as Poll.phase_at, evaluated in the database
+    poll.objects.update(phase=Case(
+        When(dynamic=True, end_date__lte=now, then=Value('result')),
+        When(end_date__lte=now, then=Value('prediction_vote')),
+        When(dynamic=False, vote_end_date__lte=now, then=Value('result')),
+        When(dynamic=False, delegate_vote_end_date__lte=now, then=Value('vote')),
+        When(dynamic=False, prediction_bet_end_date__lte=now, then=Value('delegate_vote')),
+        When(dynamic=False, prediction_statement_end_date__lte=now, then=Value('prediction_bet')),
+        When(dynamic=False, proposal_end_date__lte=now, then=Value('prediction_statement')),
+        When(dynamic=False, area_vote_end_date__lte=now, then=Value('proposal')),
+        When(dynamic=True, poll_type=3, start_date__lte=now, then=Value('schedule')),
+        When(dynamic=True, start_date__lte=now, then=Value('dynamic')),
+        When(start_date__lte=now, then=Value('area_vote')),
+        default=Value('waiting')))
+
+    # Same rules as Poll.next_phase_date
+    poll.objects.update(next_phase_at=Case(
+        When(phase='waiting', then=F('start_date')),
+        When(Q(phase='schedule') | Q(phase='dynamic'), then=F('end_date')),
+        When(phase='area_vote', then=F('area_vote_end_date')),
+        When(phase='proposal', then=F('proposal_end_date')),
+        When(phase='prediction_statement', then=F('prediction_statement_end_date')),
+        When(phase='prediction_bet', then=F('prediction_bet_end_date')),
+        When(phase='delegate_vote', then=F('delegate_vote_end_date')),
+        When(phase='vote', then=F('vote_end_date')),
+        When(dynamic=False, phase='result', then=F('end_date')),
+        default=None))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('poll', '0054_pollphasejob'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='poll',
+            name='next_phase_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='poll',
+            name='phase',
+            field=models.CharField(default='waiting', max_length=32),
+        ),
+        migrations.RunPython(populate_poll_phase, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='poll',
+            index=models.Index(fields=['phase'], name='poll_phase_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='poll',
+            index=models.Index(condition=models.Q(('active', True), ('next_phase_at__isnull', False)), fields=['next_phase_at'], name='poll_next_phase_at_idx'),
+        ),
+    ]
@@ -0,0 +1,36 @@
+# Generated by Django 4.2.17 on 2026-10-19 08:00
+
+from django.db import migrations, models
+import django.db.models.deletion
+import django.utils.timezone
+import pgtrigger.compiler
+import pgtrigger.migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('poll', '0055_poll_phase'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PollResultSnapshot',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('created_at', models.DateTimeField(db_index=True, default=django.utils.timezone.now)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('data', models.BinaryField()),
+                ('digest', models.CharField(max_length=64)),
+                ('scores', models.JSONField()),
+                ('result_proposal_id', models.IntegerField(blank=True, null=True)),
+                ('participants', models.IntegerField()),
+                ('status', models.IntegerField()),
+                ('poll', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='poll.poll')),
+            ],
+        ),
+        pgtrigger.migrations.AddTrigger(
+            model_name='pollresultsnapshot',
+            trigger=pgtrigger.compiler.Trigger(name='protects_poll_result_snapshot', sql=pgtrigger.compiler.UpsertTriggerSql(func="RAISE EXCEPTION 'pgtrigger: Cannot update rows from % table', TG_TABLE_NAME;", hash='87b2b061f3a50e1357a37fce92f79a3ba8315fad', operation='UPDATE', pgid='pgtrigger_protects_poll_result_snapshot_bcdf0', table='poll_pollresultsnapshot', when='BEFORE')),
+        ),
+    ]
@@ -0,0 +1,30 @@
+# Generated by Django 4.2.17 on 2026-10-19 08:08
+
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def populate_poll_participant_count(apps, schema_editor):
+    Poll = apps.get_model('poll', 'Poll')
+    PollVoting = apps.get_model('poll', 'PollVoting')
+
+    Poll.objects.update(participant_count=Coalesce(Subquery(
+        PollVoting.objects.filter(poll_id=OuterRef('id'))
+        .values('poll_id').annotate(total=Count('*')).values('total')[:1]), 0))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('poll', '0056_pollresultsnapshot'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='poll',
+            name='participant_count',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.RunPython(populate_poll_participant_count, migrations.RunPython.noop),
+    ]
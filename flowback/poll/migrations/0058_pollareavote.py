@@ -0,0 +1,86 @@
+# Generated by Django 4.2.17 on 2026-10-19 08:17
+
+from django.db import migrations, models
+import django.db.models.deletion
+import django.utils.timezone
+
+
+def populate_poll_area_votes(apps, schema_editor):
+    PollAreaVote = apps.get_model('poll', 'PollAreaVote')
+    PollAreaStatementVote = apps.get_model('poll', 'PollAreaStatementVote')
+    PollAreaStatementSegment = apps.get_model('poll', 'PollAreaStatementSegment')
+
+    # Statements hold a single tag, the latest vote of a group user wins
+    tags = dict(PollAreaStatementSegment.objects.values_list('poll_area_statement_id', 'tag_id'))
+    votes = (PollAreaStatementVote.objects.filter(vote=True)
+             .order_by('-created_at')
+             .values_list('created_by_id', 'poll_area_statement__poll_id', 'poll_area_statement_id', 'created_at'))
+
+    PollAreaVote.objects.bulk_create([PollAreaVote(created_by_id=created_by_id,
+                                                   poll_id=poll_id,
+                                                   tag_id=tags[statement_id],
+                                                   created_at=created_at)
+                                      for created_by_id, poll_id, statement_id, created_at in votes.iterator()
+                                      if statement_id in tags],
+                                     batch_size=1000,
+                                     ignore_conflicts=True)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('group', '0062_group_member_count_group_voter_count'),
+        ('poll', '0057_poll_participant_count'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PollAreaVote',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('created_at', models.DateTimeField(db_index=True, default=django.utils.timezone.now)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('created_by', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='group.groupuser')),
+                ('poll', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='poll.poll')),
+                ('tag', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='group.grouptags')),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='pollareavote',
+            index=models.Index(fields=['poll', 'tag'], name='pollareavote_tally_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='pollareavote',
+            constraint=models.UniqueConstraint(fields=('poll', 'created_by'), name='pollareavote_created_by_and_poll_is_unique'),
+        ),
+        migrations.RunPython(populate_poll_area_votes, migrations.RunPython.noop),
+        migrations.RemoveField(
+            model_name='pollareastatementsegment',
+            name='poll_area_statement',
+        ),
+        migrations.RemoveField(
+            model_name='pollareastatementsegment',
+            name='tag',
+        ),
+        migrations.AlterUniqueTogether(
+            name='pollareastatementvote',
+            unique_together=None,
+        ),
+        migrations.RemoveField(
+            model_name='pollareastatementvote',
+            name='created_by',
+        ),
+        migrations.RemoveField(
+            model_name='pollareastatementvote',
+            name='poll_area_statement',
+        ),
+        migrations.DeleteModel(
+            name='PollAreaStatement',
+        ),
+        migrations.DeleteModel(
+            name='PollAreaStatementSegment',
+        ),
+        migrations.DeleteModel(
+            name='PollAreaStatementVote',
+        ),
+    ]
@@ -0,0 +1,38 @@
+from django.db import migrations
+from django.utils import timezone
+
+
+def backfill_poll_phase_jobs(apps, schema_editor):
+    """
+    Creates the counting jobs of active, unfinished polls, same as poll_phase_jobs_backfill. Jobs already due are
+    created as done, the count tasks queued for the pending ones do nothing once the job exists.
+    """
+    Poll = apps.get_model('poll', 'Poll')
+    PollPhaseJob = apps.get_model('poll', 'PollPhaseJob')
+    due_fields = {'area_vote_count': 'area_vote_end_date',
+                  'prediction_bet_count': 'prediction_bet_end_date',
+                  'proposal_vote_count': 'end_date'}
+
+    now = timezone.now()
+    polls = Poll.objects.filter(active=True, end_date__gt=now).values('id', *due_fields.values())
+
+    jobs = []
+    for poll in polls.iterator():
+        jobs += [PollPhaseJob(poll_id=poll['id'],
+                              job=job,
+                              due_at=poll[field],
+                              state='done' if poll[field] <= now else 'pending')
+                 for job, field in due_fields.items() if poll[field] is not None]
+
+    PollPhaseJob.objects.bulk_create(jobs, batch_size=1000, ignore_conflicts=True)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('poll', '0058_pollareavote'),
+    ]
+
+    operations = [
+        migrations.RunPython(backfill_poll_phase_jobs, migrations.RunPython.noop)
+    ]
@@ -16,15 +16,21 @@ from flowback.prediction.models import (PredictionBet,
                                         PredictionStatement,
                                         PredictionStatementSegment,
                                         PredictionStatementVote)
-from flowback.common.models import BaseModel
+from flowback.common.models import BaseModel, CounterModel
 from flowback.common.validators import FieldNotBlankValidator
 from flowback.group.models import GroupUser, GroupUserDelegatePool, GroupTags, WorkGroup
+from flowback.group.tasks import group_feed_entry_schedule
 from flowback.comment.models import CommentSection, comment_section_create_model_default
 import pgtrigger
 
 
 # Create your models here.
-class Poll(BaseModel, NotifiableModel):
+class Poll(BaseModel, CounterModel, NotifiableModel):
+    COUNTER_FIELDS = ('proposal_count', 'comment_count', 'prediction_count', 'participant_count')
+
+    # The persisted phase is only written on creation, by poll_phase_sweep and by fast forwarding
+    SAVE_EXCLUDED_FIELDS = ('phase', 'next_phase_at')
+
     class PollType(models.IntegerChoices):
         # 1 and 2 are depricated
         RANKING = 1, _('ranking')
@@ -68,6 +74,10 @@ class Poll(BaseModel, NotifiableModel):
     vote_end_date = models.DateTimeField(null=True, blank=True)  # Voting Phase
     end_date = models.DateTimeField()  # Result Phase, Prediction Vote afterward indefinitely
 
+    # Persisted current_phase, advanced by poll_phase_sweep once next_phase_at has passed
+    phase = models.CharField(max_length=32, default='waiting')
+    next_phase_at = models.DateTimeField(null=True, blank=True)
+
     blockchain_id = models.PositiveIntegerField(null=True, blank=True, default=None)
     work_group = models.ForeignKey(WorkGroup, on_delete=models.CASCADE, null=True, blank=True)
     schedule_poll_meeting_link = models.URLField(null=True, blank=True)
@@ -93,6 +103,12 @@ class Poll(BaseModel, NotifiableModel):
     comment_section = models.ForeignKey(CommentSection, default=comment_section_create_model_default,
                                         on_delete=models.DO_NOTHING)
 
+    # Engagement counters, kept in sync by signals and reconciled by poll_counter_reconcile
+    proposal_count = models.IntegerField(default=0)
+    comment_count = models.IntegerField(default=0)
+    prediction_count = models.IntegerField(default=0)
+    participant_count = models.IntegerField(default=0)  # Group users with a ballot so far
+
     # Optional dynamic counting support
     participants = models.IntegerField(default=0)
     dynamic = models.BooleanField()
@@ -187,18 +203,42 @@ class Poll(BaseModel, NotifiableModel):
 
                        models.CheckConstraint(check=~Q(Q(poll_type=3) & Q(dynamic=False)),
                                               name='polltypeisscheduleanddynamic_check')]
+        indexes = [models.Index(fields=['phase'], name='poll_phase_idx'),
+                   models.Index(fields=['next_phase_at'],
+                                condition=Q(active=True, next_phase_at__isnull=False),
+                                name='poll_next_phase_at_idx')]
 
     @property
     def current_phase(self) -> str:
+        return self.phase_at(timezone.now())
+
+    def phase_at(self, at: datetime) -> str:
         labels = self.labels
-        current_time = timezone.now()
 
         for x in reversed(range(len(labels))):
-            if current_time >= labels[x][0]:
+            if at >= labels[x][0]:
                 return labels[x][2]
 
         return 'waiting'
 
+    # Start of the phase following the given phase, None for the last phase
+    def next_phase_date(self, phase: str) -> datetime | None:
+        phases = ['waiting'] + [label[2] for label in self.labels]
+        dates = [label[0] for label in self.labels]
+
+        i = phases.index(phase)
+        return dates[i] if i < len(dates) else None
+
+    def phase_refresh(self, at: datetime = None):
+        self.phase = self.phase_at(at or timezone.now())
+        self.next_phase_at = self.next_phase_date(self.phase)
+
+    def save(self, *args, **kwargs):
+        if self._state.adding:
+            self.phase_refresh()
+
+        super().save(*args, **kwargs)
+
     def get_phase(self, phase: str, field_name=False) -> datetime | str:
         time_table = self.time_table
 
@@ -298,12 +338,19 @@ class Poll(BaseModel, NotifiableModel):
 
         return self.notification_channel.notify(**params)
 
+    @classmethod
+    def post_save(cls, instance, **kwargs):
+        group_feed_entry_schedule(related_model='poll', object_id=instance.id)
+
     @classmethod
     def post_delete(cls, instance, **kwargs):
         if hasattr(instance, 'schedule'):
             instance.schedule.delete()
 
+        group_feed_entry_schedule(related_model='poll', object_id=instance.id)
 
+
+post_save.connect(Poll.post_save, sender=Poll)
 post_delete.connect(Poll.post_delete, sender=Poll)
 
 
@@ -319,6 +366,19 @@ class PollProposal(BaseModel):
 
     active = models.BooleanField(default=True)
 
+    @classmethod
+    def post_save(cls, instance, created, **kwargs):
+        if created:
+            Poll.objects.filter(id=instance.poll_id).update(proposal_count=F('proposal_count') + 1)
+
+    @classmethod
+    def post_delete(cls, instance, **kwargs):
+        Poll.objects.filter(id=instance.poll_id).update(proposal_count=F('proposal_count') - 1)
+
+
+post_save.connect(PollProposal.post_save, sender=PollProposal)
+post_delete.connect(PollProposal.post_delete, sender=PollProposal)
+
 
 class PollProposalTypeSchedule(BaseModel):
     proposal = models.OneToOneField(PollProposal, on_delete=models.CASCADE)
@@ -338,6 +398,19 @@ class PollVoting(BaseModel):
     class Meta:
         unique_together = ('created_by', 'poll')
 
+    @classmethod
+    def post_save(cls, instance, created, **kwargs):
+        if created:
+            Poll.objects.filter(id=instance.poll_id).update(participant_count=F('participant_count') + 1)
+
+    @classmethod
+    def post_delete(cls, instance, **kwargs):
+        Poll.objects.filter(id=instance.poll_id).update(participant_count=F('participant_count') - 1)
+
+
+post_save.connect(PollVoting.post_save, sender=PollVoting)
+post_delete.connect(PollVoting.post_delete, sender=PollVoting)
+
 
 class PollDelegateVoting(BaseModel):
     created_by = models.ForeignKey(GroupUserDelegatePool, on_delete=models.CASCADE)
@@ -426,28 +499,24 @@ class PollVotingTypeForAgainst(BaseModel):
         ]
 
 
+# Ballot row model and the field holding the raw vote, per poll type
+POLL_BALLOT_MODELS = {Poll.PollType.RANKING: (PollVotingTypeRanking, 'priority'),
+                      Poll.PollType.CARDINAL: (PollVotingTypeCardinal, 'raw_score'),
+                      Poll.PollType.SCHEDULE: (PollVotingTypeForAgainst, 'vote')}
+
+
 # TODO Area requires refactor
-class PollAreaStatement(BaseModel):
+# A group user's vote on the tag (area) of a poll, one per group user and poll. Votes are tallied per tag with
+# a single GROUP BY over pollareavote_tally_idx, both live and by poll_area_vote_count
+class PollAreaVote(BaseModel):
     created_by = models.ForeignKey(GroupUser, on_delete=models.CASCADE)
     poll = models.ForeignKey(Poll, on_delete=models.CASCADE)
-
-
-class PollAreaStatementSegment(BaseModel):
-    poll_area_statement = models.ForeignKey(PollAreaStatement, on_delete=models.CASCADE)
     tag = models.ForeignKey(GroupTags, on_delete=models.CASCADE)
 
-    def clean(self):
-        if self.tag.active is False:
-            raise ValidationError("Tag must be active")
-
-
-class PollAreaStatementVote(BaseModel):
-    created_by = models.ForeignKey(GroupUser, on_delete=models.CASCADE)
-    poll_area_statement = models.ForeignKey(PollAreaStatement, on_delete=models.CASCADE)
-    vote = models.BooleanField()
-
     class Meta:
-        unique_together = ('created_by', 'poll_area_statement')
+        constraints = [models.UniqueConstraint(name='pollareavote_created_by_and_poll_is_unique',
+                                               fields=['poll', 'created_by'])]
+        indexes = [models.Index(name='pollareavote_tally_idx', fields=['poll', 'tag'])]
 
 
 class PollPredictionStatement(PredictionStatement):
@@ -465,6 +534,19 @@ class PollPredictionStatement(PredictionStatement):
             .filter(segment_count__lt=1) \
             .delete()
 
+    @classmethod
+    def post_save(cls, instance, created, **kwargs):
+        if created:
+            Poll.objects.filter(id=instance.poll_id).update(prediction_count=F('prediction_count') + 1)
+
+    @classmethod
+    def post_delete(cls, instance, **kwargs):
+        Poll.objects.filter(id=instance.poll_id).update(prediction_count=F('prediction_count') - 1)
+
+
+post_save.connect(PollPredictionStatement.post_save, sender=PollPredictionStatement)
+post_delete.connect(PollPredictionStatement.post_delete, sender=PollPredictionStatement)
+
 
 class PollPredictionStatementSegment(PredictionStatementSegment):
     prediction_statement = models.ForeignKey(PollPredictionStatement, on_delete=models.CASCADE)
@@ -536,3 +618,49 @@ class PollPhaseTemplate(BaseModel):
                                                 | Q(end_time_delta__isnull=False))),
                                    name='pollphasetemplatescheduleordynamicisvalid_check')
         ]
+
+
+# Counting jobs run at poll phase boundaries, claimed by the poll_phase_job_sweep beat task
+class PollPhaseJob(BaseModel):
+    class Job(models.TextChoices):
+        AREA_VOTE_COUNT = 'area_vote_count', _('area_vote_count')
+        PREDICTION_BET_COUNT = 'prediction_bet_count', _('prediction_bet_count')
+        PROPOSAL_VOTE_COUNT = 'proposal_vote_count', _('proposal_vote_count')
+
+    class State(models.TextChoices):
+        PENDING = 'pending', _('pending')
+        DONE = 'done', _('done')
+        FAILED = 'failed', _('failed')
+
+    # Poll field holding the due time of each job
+    due_fields = {Job.AREA_VOTE_COUNT: 'area_vote_end_date',
+                  Job.PREDICTION_BET_COUNT: 'prediction_bet_end_date',
+                  Job.PROPOSAL_VOTE_COUNT: 'end_date'}
+
+    poll = models.ForeignKey(Poll, on_delete=models.CASCADE)
+    job = models.CharField(max_length=32, choices=Job.choices)
+    due_at = models.DateTimeField()
+    state = models.CharField(max_length=16, choices=State.choices, default=State.PENDING)
+
+    # Incremented whenever the job is rescheduled
+    version = models.PositiveIntegerField(default=0)
+    attempts = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        constraints = [models.UniqueConstraint(fields=['poll', 'job'], name='pollphasejob_unique_job')]
+        indexes = [models.Index(fields=['due_at'], condition=Q(state='pending'), name='pollphasejob_due_idx')]
+
+
+# Immutable record of a proposal vote count: its inputs as a compressed .npz blob and the result counted from them
+class PollResultSnapshot(BaseModel):
+    poll = models.ForeignKey(Poll, on_delete=models.CASCADE)
+    data = models.BinaryField()  # Ballot matrices, mandate vector, permission mask and quorum inputs
+    digest = models.CharField(max_length=64)  # SHA-256 of data
+
+    scores = models.JSONField()  # Proposal id to score, null where nothing was counted
+    result_proposal_id = models.IntegerField(null=True, blank=True)
+    participants = models.IntegerField()
+    status = models.IntegerField()
+
+    class Meta:
+        triggers = [pgtrigger.Protect(name='protects_poll_result_snapshot', operation=pgtrigger.Update)]
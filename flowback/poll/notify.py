@@ -1,5 +1,10 @@
+from collections import defaultdict
+
+from django.contrib.contenttypes.models import ContentType
+
 from flowback.comment.models import Comment
-from flowback.notification.models import NotificationChannel, NotificationObject
+from flowback.group.models import GroupUser
+from flowback.notification.models import NotificationChannel, NotificationObject, notification_data_images
 from flowback.poll.models import Poll
 
 
@@ -19,7 +24,6 @@ def notify_poll(message: str,
                             subscription_filters=dict(user_id__in=users) if users else None)
 
 
-# TODO add notifications to every phase change
 def notify_poll_phase(message: str,
                       action: NotificationChannel.Action,
                       poll: Poll) -> NotificationObject:
@@ -37,6 +41,44 @@ def notify_poll_phase(message: str,
                                   subscription_filters=dict(user_id__in=users) if users else None)
 
 
+def notify_poll_phase_bulk(*, polls: list[Poll], action: NotificationChannel.Action) -> list[NotificationObject]:
+    """
+    Notifies about the persisted phase of many polls at once, used by poll_phase_sweep.
+    The polls are expected to have created_by__group and work_group selected.
+    """
+    channels = dict(NotificationChannel.objects.filter(content_type=ContentType.objects.get_for_model(Poll),
+                                                       object_id__in=[poll.id for poll in polls])
+                    .values_list('object_id', 'id'))
+
+    work_group_users = defaultdict(set)
+    for work_group_id, user_id in GroupUser.objects.filter(
+            workgroupuser__work_group_id__in={poll.work_group_id for poll in polls if poll.work_group_id},
+            active=True).values_list('workgroupuser__work_group_id', 'user_id'):
+        work_group_users[work_group_id].add(user_id)
+
+    notification_objects, subscription_filters = [], {}
+    for poll in polls:
+        if poll.id not in channels:
+            continue
+
+        current_phase = poll.phase.replace('_', ' ').capitalize()
+        data = poll.notification_data | dict(work_group_id=poll.work_group_id,
+                                             work_group_name=poll.work_group.name if poll.work_group else None,
+                                             current_phase=current_phase)
+        data = notification_data_images(data)
+
+        notification_objects.append(NotificationObject(channel_id=channels[poll.id],
+                                                       action=action,
+                                                       message=f"Poll has moved to {current_phase}",
+                                                       tag='poll_phase',
+                                                       data=data))
+
+        if work_group_users.get(poll.work_group_id):
+            subscription_filters[channels[poll.id]] = work_group_users[poll.work_group_id]
+
+    return NotificationObject.bulk_notify(notification_objects, subscription_filters=subscription_filters)
+
+
 def notify_poll_comment(message: str,
                         action: NotificationChannel.Action,
                         poll: Poll,
@@ -1,32 +1,45 @@
 import django_filters
-from django.db import models
-from django.db.models import OuterRef, Subquery
+from django.db.models import OuterRef, Exists, Count, QuerySet
 
 from flowback.common.services import get_object
+from flowback.group.models import GroupTags
 from flowback.group.selectors.permission import group_user_permissions
-from flowback.poll.models import PollAreaStatement, PollAreaStatementVote, Poll
+from flowback.poll.models import PollAreaVote, Poll
 from flowback.user.models import User
 
 
-class BasePollAreaStatementFilter(django_filters.FilterSet):
+class BasePollAreaVoteFilter(django_filters.FilterSet):
     order_by = django_filters.OrderingFilter(fields=(('created_at', 'created_at_asc'),
                                                      ('-created_at', 'created_at_desc'),
                                                      ('score', 'score_asc'),
                                                      ('-score', 'score_desc')))
 
     user_vote = django_filters.BooleanFilter()
-    tag = django_filters.CharFilter(field_name='pollareastatementsegment__tag__name',
-                                    lookup_expr='iexact')
+    tag = django_filters.CharFilter(field_name='name', lookup_expr='iexact')
 
 
-def poll_area_statement_list(*, user: User, poll_id: int, filters=None):
+def poll_area_vote_tally(*, poll: Poll) -> QuerySet:
+    """
+    Votes per tag, highest first, counted with a single GROUP BY over pollareavote_tally_idx.
+    Ties go to the tag created first.
+    """
+    return (PollAreaVote.objects.filter(poll=poll)
+            .values('tag_id')
+            .annotate(score=Count('*'))
+            .order_by('-score', 'tag_id'))
+
+
+def poll_area_vote_list(*, user: User, poll_id: int, filters=None):
+    """
+    Live tally of the tags voted for in a poll, along with whether the user voted for each tag.
+    """
     filters = filters or {}
     poll = get_object(Poll, id=poll_id)
     group_user = group_user_permissions(user=user, group=poll.created_by.group)
 
-    user_vote = PollAreaStatementVote.objects.filter(created_by=group_user,
-                                                     poll_area_statement=OuterRef('pk')).values('vote')
-    qs = PollAreaStatement.objects.filter(poll=poll).annotate(user_vote=Subquery(user_vote,
-                                                                                 output_field=models.BooleanField()))
+    user_vote = PollAreaVote.objects.filter(poll=poll, created_by=group_user, tag=OuterRef('pk'))
+    qs = GroupTags.objects.filter(pollareavote__poll=poll).annotate(score=Count('pollareavote'),
+                                                                    user_vote=Exists(user_vote)
+                                                                    ).order_by('-score', 'id')
 
-    return BasePollAreaStatementFilter(filters, qs).qs
+    return BasePollAreaVoteFilter(filters, qs).qs
@@ -0,0 +1,226 @@
+import multiprocessing
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+from django.db.models.functions import Coalesce
+
+from flowback.poll.models import Poll, PollPredictionBet, PollPredictionStatement, PollPredictionStatementVote
+
+# Same nudge as poll_prediction_bet_count uses to make a singular covariance matrix invertible
+SMALL_DECIMAL = 10 ** -7
+
+
+def _epoch(value) -> float:
+    return np.nan if value is None else value.timestamp()
+
+
+def poll_prediction_backtest_arrays(*, group_id: int, tag_ids: list[int] = None) -> dict[int, dict[str, np.ndarray]]:
+    """
+    Reads every active prediction statement, statement vote and bet of a group's tagged polls in four queries,
+    returning dense arrays per tag.
+
+    Polls are ordered by the time their combined bets are counted (prediction_bet_end_date, or end_date for dynamic
+    polls). bets is a (predictors, statements) matrix of scores divided by 5, NaN where no bet was placed.
+    outcomes hold 1, 0 or NaN (no majority) per statement, following update_poll_prediction_statement_outcomes.
+    """
+    polls = Poll.objects.filter(created_by__group_id=group_id, tag__isnull=False)
+    if tag_ids:
+        polls = polls.filter(tag_id__in=tag_ids)
+
+    polls = np.fromiter(((poll_id, tag_id, _epoch(end_date), _epoch(counted_at))
+                         for poll_id, tag_id, end_date, counted_at
+                         in polls.values_list('id', 'tag_id', 'end_date',
+                                              Coalesce('prediction_bet_end_date', 'end_date')).iterator()),
+                        dtype=[('id', np.int64), ('tag', np.int64), ('end', np.float64), ('at', np.float64)])
+    polls = np.sort(polls, order=['id'])
+
+    statements = PollPredictionStatement.objects.filter(poll_id__in=polls['id'].tolist(), active=True)
+    statements = np.sort(np.fromiter(((statement_id, poll_id, _epoch(created_at),
+                                       np.nan if combined_bet is None else float(combined_bet))
+                                      for statement_id, poll_id, created_at, combined_bet
+                                      in statements.values_list('id', 'poll_id', 'created_at',
+                                                                'combined_bet').iterator()),
+                                     dtype=[('id', np.int64), ('poll', np.int64),
+                                            ('created', np.float64), ('stored', np.float64)]), order=['id'])
+
+    votes = np.fromiter(PollPredictionStatementVote.objects.filter(
+        prediction_statement_id__in=statements['id'].tolist()).values_list('prediction_statement_id',
+                                                                           'vote').iterator(),
+                        dtype=[('statement', np.int64), ('vote', np.bool_)])
+    bets = np.fromiter(PollPredictionBet.objects.filter(
+        prediction_statement_id__in=statements['id'].tolist()).values_list('prediction_statement_id',
+                                                                           'created_by_id',
+                                                                           'score').iterator(),
+                       dtype=[('statement', np.int64), ('predictor', np.int64), ('score', np.float64)])
+
+    # Majority of the statement votes, ties and statements without votes have no outcome
+    vote_sums = np.zeros(len(statements), dtype=np.int64)
+    np.add.at(vote_sums, np.searchsorted(statements['id'], votes['statement']), np.where(votes['vote'], 1, -1))
+    outcomes = np.select([vote_sums > 0, vote_sums < 0], [1.0, 0.0], np.nan)
+
+    statement_polls = polls[np.searchsorted(polls['id'], statements['poll'])]
+    bet_tags = statement_polls['tag'][np.searchsorted(statements['id'], bets['statement'])]
+
+    arrays = {}
+    for tag_id in np.unique(polls['tag']).tolist():
+        tag_polls = np.sort(polls[polls['tag'] == tag_id], order=['at', 'id'])
+        in_tag = statement_polls['tag'] == tag_id
+        tag_statements = statements[in_tag]
+        tag_bets = bets[bet_tags == tag_id]
+
+        predictor_ids = np.unique(tag_bets['predictor'])
+        matrix = np.full((len(predictor_ids), len(tag_statements)), np.nan)
+        matrix[np.searchsorted(predictor_ids, tag_bets['predictor']),
+               np.searchsorted(tag_statements['id'], tag_bets['statement'])] = tag_bets['score'] / 5
+
+        arrays[tag_id] = dict(poll_ids=tag_polls['id'],
+                              poll_times=tag_polls['at'],
+                              statement_ids=tag_statements['id'],
+                              statement_polls=tag_statements['poll'],
+                              statement_created=tag_statements['created'],
+                              statement_poll_ends=statement_polls['end'][in_tag],
+                              stored_bets=tag_statements['stored'],
+                              outcomes=outcomes[in_tag],
+                              predictor_ids=predictor_ids,
+                              bets=matrix)
+
+    return arrays
+
+
+def poll_prediction_combined_bets(*,
+                                  current_bets: np.ndarray,
+                                  previous_bets: np.ndarray,
+                                  previous_outcomes: np.ndarray,
+                                  rng: np.random.Generator) -> np.ndarray:
+    """
+    Dense array port of the combined bet in poll_prediction_bet_count, NaN standing in for missing bets.
+    Predictors without a shared history are treated as uncorrelated, where the task itself fails on a zero division.
+
+    :param current_bets: (predictors, statements) bets on the statements to combine, between 0 and 1
+    :param previous_bets: (predictors, previous statements) bets of the same predictors on statements with an outcome
+    :param previous_outcomes: Outcome (0 or 1) of every previous statement
+    :return: Combined bet per statement, NaN where nobody bet
+    """
+    previous_outcome_avg = previous_outcomes.mean() if len(previous_outcomes) else 0
+
+    # Predictors without history are dropped if anyone has one, then outcomes nobody left has bet on
+    has_history = ~np.isnan(previous_bets).all(axis=1)
+    if has_history.any():
+        current_bets, previous_bets = current_bets[has_history], previous_bets[has_history]
+
+    compared = ~np.isnan(previous_bets).all(axis=0)
+    previous_bets, previous_outcomes = previous_bets[:, compared], previous_outcomes[compared]
+
+    combined = np.full(current_bets.shape[1], np.nan)
+    for i in range(current_bets.shape[1]):
+        betting = ~np.isnan(current_bets[:, i])
+        if not betting.any():
+            continue
+
+        main_bets = current_bets[betting, i]
+        if previous_bets.shape[1] == 0:
+            combined[i] = main_bets.mean()
+            continue
+
+        bets = previous_bets[betting]
+        bias_adjustments = previous_outcome_avg - np.nanmean(bets, axis=1)
+
+        # Population covariance of every pair of predictor errors, over the statements both of them bet on
+        errors = previous_outcomes - bets
+        compared = (~np.isnan(errors)).astype(np.float64)
+        errors = np.nan_to_num(errors)
+        counts = compared @ compared.T
+        sums = errors @ compared.T
+        with np.errstate(divide='ignore', invalid='ignore'):
+            covariance = np.where(counts > 0, (errors @ errors.T - sums * sums.T / counts) / counts, 0)
+
+        while np.linalg.det(covariance) == 0:
+            covariance = covariance + SMALL_DECIMAL * rng.choice([-1, 1], size=covariance.shape)
+
+        inverse = np.linalg.inv(covariance)
+        ones = np.ones(len(inverse))
+        denominator = ones @ inverse @ ones
+        weights = (inverse @ ones) / (denominator if denominator != 0 else SMALL_DECIMAL)
+
+        combined[i] = np.clip(weights @ np.clip(main_bets + bias_adjustments, 0, 1), 0, 1)
+
+    return combined
+
+
+def poll_prediction_backtest_metrics(*, combined_bets: np.ndarray, outcomes: np.ndarray) -> dict:
+    """
+    IMAC as in group_tags_list (1 - |sum(combined bets) - sum(outcomes)| / N over statements with an outcome)
+    and the Brier score (mean squared error over statements with both an outcome and a combined bet).
+    """
+    evaluated = ~np.isnan(outcomes)
+    scored = evaluated & ~np.isnan(combined_bets)
+
+    imac = (1 - abs(np.nansum(combined_bets[evaluated]) - outcomes[evaluated].sum()) / evaluated.sum()
+            if evaluated.any() else None)
+    brier = np.mean((combined_bets[scored] - outcomes[scored]) ** 2) if scored.any() else None
+
+    return dict(evaluated=int(evaluated.sum()),
+                scored=int(scored.sum()),
+                imac=None if imac is None else float(imac),
+                brier=None if brier is None else float(brier))
+
+
+def poll_prediction_backtest_replay(arrays: dict[str, np.ndarray], seed: int = 0) -> dict:
+    """
+    Replays the combined bets of a tag poll by poll in the order they were counted. Every poll only sees statements
+    of earlier ended polls that were created by then, with the outcomes as they are today.
+    """
+    start = time.perf_counter()
+    rng = np.random.default_rng(seed)
+    outcomes, bets = arrays['outcomes'], arrays['bets']
+    combined = np.full(len(arrays['statement_ids']), np.nan)
+
+    for poll_id, counted_at in zip(arrays['poll_ids'].tolist(), arrays['poll_times'].tolist()):
+        current = arrays['statement_polls'] == poll_id
+        if not current.any():
+            continue
+
+        previous = (~current
+                    & ~np.isnan(outcomes)
+                    & (arrays['statement_poll_ends'] <= counted_at)
+                    & (arrays['statement_created'] <= counted_at))
+        predictors = ~np.isnan(bets[:, current]).all(axis=1)
+
+        combined[current] = poll_prediction_combined_bets(current_bets=bets[predictors][:, current],
+                                                          previous_bets=bets[predictors][:, previous],
+                                                          previous_outcomes=outcomes[previous],
+                                                          rng=rng)
+
+    return dict(polls=len(arrays['poll_ids']),
+                statements=len(arrays['statement_ids']),
+                predictors=len(arrays['predictor_ids']),
+                statement_ids=arrays['statement_ids'],
+                combined_bets=combined,
+                replayed=poll_prediction_backtest_metrics(combined_bets=combined, outcomes=outcomes),
+                stored=poll_prediction_backtest_metrics(combined_bets=arrays['stored_bets'], outcomes=outcomes),
+                runtime=time.perf_counter() - start)
+
+
+def poll_prediction_backtest(*,
+                             group_id: int,
+                             tag_ids: list[int] = None,
+                             processes: int = 1,
+                             seed: int = 0) -> dict[int, dict]:
+    """
+    Read-only backtest of the combined bets of a group, see poll_prediction_backtest_replay.
+    Tags are independent of each other and are replayed in parallel when processes > 1.
+    """
+    arrays = poll_prediction_backtest_arrays(group_id=group_id, tag_ids=tag_ids)
+    tags = list(arrays)
+    seeds = [seed + tag_id for tag_id in tags]
+
+    if processes > 1 and len(tags) > 1:
+        # Forked workers only crunch arrays, they never touch the database connection
+        with ProcessPoolExecutor(max_workers=processes, mp_context=multiprocessing.get_context('fork')) as executor:
+            results = list(executor.map(poll_prediction_backtest_replay, [arrays[tag] for tag in tags], seeds))
+
+    else:
+        results = [poll_prediction_backtest_replay(arrays[tag], tag_seed) for tag, tag_seed in zip(tags, seeds)]
+
+    return dict(zip(tags, results))
@@ -0,0 +1,154 @@
+import csv
+import io
+import json
+from typing import Iterator
+
+import numpy as np
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db.models import QuerySet
+from rest_framework.exceptions import ValidationError
+
+from flowback.common.services import get_object
+from flowback.group.selectors.permission import group_user_permissions
+from flowback.poll.models import Poll, PollDelegateVoting, PollPredictionBet, PollVoting, POLL_BALLOT_MODELS
+from flowback.user.models import User
+
+POLL_EXPORT_FORMATS = ('csv', 'jsonl', 'npz')
+POLL_EXPORT_TABLES = ('proposals', 'ballots', 'delegate_mandates', 'prediction_bets')
+
+
+class _Echo:
+    # csv.writer target that hands every written line straight back
+    def write(self, value):
+        return value
+
+
+def poll_export_tables(*, poll: Poll) -> dict[str, QuerySet]:
+    """
+    Returns a values_list queryset per exported table, ordered by primary key.
+    Ballots are pseudonymous, they refer to the PollVoting (or PollDelegateVoting) instead of the user.
+    """
+    if poll.poll_type not in POLL_BALLOT_MODELS:
+        raise ValidationError('Unknown poll type')
+
+    model, value_field = POLL_BALLOT_MODELS[poll.poll_type]
+    proposal_fields = ['id', 'title', 'created_by_id', 'score', 'created_at']
+    if poll.poll_type == Poll.PollType.SCHEDULE:
+        proposal_fields += ['pollproposaltypeschedule__event_start_date',
+                            'pollproposaltypeschedule__event_end_date',
+                            'pollproposaltypeschedule__preliminary_score']
+
+    return dict(proposals=poll.pollproposal_set.order_by('id').values_list(*proposal_fields),
+                ballots=model.objects.filter(proposal__poll=poll).order_by('id').values_list(
+                    'author_id', 'author_delegate_id', 'proposal_id', value_field, 'score'),
+                delegate_mandates=PollDelegateVoting.objects.filter(poll=poll).order_by('id').values_list(
+                    'id', 'created_by_id', 'mandate'),
+                prediction_bets=PollPredictionBet.objects.filter(prediction_statement__poll=poll).order_by(
+                    'id').values_list('id', 'prediction_statement_id', 'created_by_id', 'score', 'created_at'))
+
+
+def poll_export_rows(*, poll: Poll, export_format: str, tables: list[str], chunk_size: int = 2000) -> Iterator[str]:
+    """
+    Streams the given tables as CSV (a single table, with a header) or JSONL (one object per row, tagged with its
+    table).
+    Rows are read through server side cursors and yielded chunk_size rows at a time, keeping memory flat.
+    """
+    querysets = poll_export_tables(poll=poll)
+    writer = csv.writer(_Echo())
+
+    for table in tables:
+        queryset = querysets[table]
+        columns = [field.split('__')[-1] for field in queryset.query.values_select]
+
+        if export_format == 'csv':
+            yield writer.writerow(columns)
+
+        chunk = []
+        for row in queryset.iterator(chunk_size=chunk_size):
+            if export_format == 'csv':
+                chunk.append(writer.writerow(row))
+            else:
+                chunk.append(json.dumps(dict(table=table, **dict(zip(columns, row))), cls=DjangoJSONEncoder) + '\n')
+
+            if len(chunk) >= chunk_size:
+                yield ''.join(chunk)
+                chunk = []
+
+        if chunk:
+            yield ''.join(chunk)
+
+
+def poll_ballot_arrays(*, poll: Poll, active_only: bool = False, chunk_size: int = 2000) -> dict[str, np.ndarray]:
+    """
+    Reads the ballots of a poll into NumPy arrays, each ballot row being read straight into a structured array.
+
+    proposal_ids holds the matrix columns, voter_ids and delegate_ids (PollVoting and PollDelegateVoting ids) the rows
+    of ballots and delegate_ballots respectively. Cells hold the raw vote (priority, raw score or 1/0 for schedule
+    votes), NaN where nothing was voted. delegate_mandates holds the mandate of every delegate ballot row.
+    """
+    if poll.poll_type not in POLL_BALLOT_MODELS:
+        raise ValidationError('Unknown poll type')
+
+    model, value_field = POLL_BALLOT_MODELS[poll.poll_type]
+    proposals = poll.pollproposal_set.filter(active=True) if active_only else poll.pollproposal_set.all()
+    proposal_ids = np.fromiter(proposals.order_by('id').values_list('id', flat=True), dtype=np.int64)
+    voter_ids = np.fromiter(PollVoting.objects.filter(poll=poll).order_by('id').values_list('id', flat=True),
+                            dtype=np.int64)
+    delegates = np.fromiter(PollDelegateVoting.objects.filter(poll=poll).order_by('id').values_list('id', 'mandate'),
+                            dtype=[('id', np.int64), ('mandate', np.int64)])
+
+    def matrix(author_field: str, row_ids: np.ndarray) -> np.ndarray:
+        rows = np.fromiter(model.objects.filter(**{f'{author_field}__poll': poll})
+                           .values_list(f'{author_field}_id', 'proposal_id', value_field)
+                           .iterator(chunk_size=chunk_size),
+                           dtype=[('voter', np.int64), ('proposal', np.int64), ('value', np.float64)])
+        rows = rows[np.isin(rows['voter'], row_ids) & np.isin(rows['proposal'], proposal_ids)]
+
+        ballots = np.full((len(row_ids), len(proposal_ids)), np.nan)
+        cells = np.searchsorted(row_ids, rows['voter']), np.searchsorted(proposal_ids, rows['proposal'])
+        ballots[cells] = rows['value']
+
+        return ballots
+
+    return dict(poll_type=np.int64(poll.poll_type),
+                proposal_ids=proposal_ids,
+                voter_ids=voter_ids,
+                ballots=matrix('author', voter_ids),
+                delegate_ids=delegates['id'],
+                delegate_ballots=matrix('author_delegate', delegates['id']),
+                delegate_mandates=delegates['mandate'])
+
+
+def poll_export_ballot_matrix(*, poll: Poll, chunk_size: int = 2000) -> io.BytesIO:
+    """
+    Writes the ballots (see poll_ballot_arrays) as a compressed NumPy .npz, ready to be fed into the tally engines
+    offline.
+    """
+    buffer = io.BytesIO()
+    np.savez_compressed(buffer, **poll_ballot_arrays(poll=poll, chunk_size=chunk_size))
+    buffer.seek(0)
+
+    return buffer
+
+
+def poll_export(*,
+                fetched_by: User,
+                poll_id: int,
+                export_format: str,
+                tables: list[str] = None,
+                chunk_size: int = 2000) -> Iterator[str | bytes]:
+    poll = get_object(Poll, id=poll_id)
+    group_user_permissions(user=fetched_by, group=poll.created_by.group.id, permissions=['admin'])
+
+    if poll.poll_type not in POLL_BALLOT_MODELS:
+        raise ValidationError('Unknown poll type')
+
+    if export_format == 'npz':
+        return iter([poll_export_ballot_matrix(poll=poll, chunk_size=chunk_size).getvalue()])
+
+    # Validated up front, the rows are only read once the response is streaming
+    tables = tables or list(POLL_EXPORT_TABLES)
+    if export_format == 'csv' and len(tables) != 1:
+        raise ValidationError('CSV exports contain exactly one table')
+
+    return poll_export_rows(poll=poll, export_format=export_format, tables=tables, chunk_size=chunk_size)
@@ -1,14 +1,11 @@
 from typing import Union
 
 import django_filters
-from django.db.models import Q, Exists, OuterRef, Count, Subquery, Case, When, Value, CharField, F
-from django.db.models.functions import Coalesce
-from django.utils import timezone
+from django.db.models import Q, Exists, OuterRef, F
 
-from flowback.comment.models import Comment
 from flowback.common.filters import ExistsFilter, NumberInFilter
 from flowback.group.models import Group
-from flowback.poll.models import Poll, PollPhaseTemplate, PollPredictionStatement
+from flowback.poll.models import Poll, PollPhaseTemplate
 from flowback.user.models import User, UserBookmark
 from flowback.group.selectors.permission import group_user_permissions
 
@@ -27,9 +24,13 @@ class BasePollFilter(django_filters.FilterSet):
     has_attachments = ExistsFilter(field_name='attachments')
     tag_name = django_filters.CharFilter(lookup_expr=['exact', 'icontains'], field_name='tag__name')
     tag_id = django_filters.NumberFilter(lookup_expr='exact', field_name='tag__id')
-    phase = django_filters.CharFilter(lookup_expr='iexact')
+    phase = django_filters.CharFilter(method='phase_filter')
     work_group_ids = NumberInFilter(field_name="work_group_id")
 
+    # Phases are stored lowercase, keeping the lookup on the phase index
+    def phase_filter(self, queryset, name, value):
+        return queryset.filter(phase=value.lower())
+
     class Meta:
         model = Poll
         fields = dict(id=['exact'],
@@ -54,31 +55,6 @@ class BasePollFilter(django_filters.FilterSet):
 def poll_list(*, fetched_by: User, group_id: Union[int, None], filters=None):
     filters = filters or {}
 
-    # Determine phase by case qs
-    poll_phase = Case(
-        When(dynamic=True, end_date__lt=timezone.now(), then=Value('result')),
-        When(end_date__lt=timezone.now(), then=Value('prediction_vote')),
-
-        When(dynamic=True, vote_end_date__lte=timezone.now(), then=Value('result_default')),
-        When(vote_end_date__lte=timezone.now(), then=Value('result')),
-
-        When(delegate_vote_end_date__lte=timezone.now(), then=Value('vote')),
-        When(prediction_bet_end_date__lte=timezone.now(), then=Value('delegate_vote')),
-        When(prediction_statement_end_date__lte=timezone.now(), then=Value('prediction_bet')),
-        When(proposal_end_date__lte=timezone.now(), then=Value('prediction_statement')),
-        When(area_vote_end_date__lte=timezone.now(), then=Value('proposal')),
-
-        When(dynamic=True,
-             poll_type=Poll.PollType.SCHEDULE,
-             start_date__lte=timezone.now(),
-             then=Value('schedule')),
-        When(dynamic=True, start_date__lte=timezone.now(), then=Value('dynamic')),
-        When(start_date__lte=timezone.now(), then=Value('area_vote')),
-
-        default=Value('waiting'),
-        output_field=CharField()
-    )
-
     polls = Poll.objects.filter(
 
         ).values('id')
@@ -110,17 +86,12 @@ def poll_list(*, fetched_by: User, group_id: Union[int, None], filters=None):
     joined_groups = Group.objects.filter(active=True, id=OuterRef('created_by__group_id'), groupuser__user__in=[fetched_by], groupuser__active=True)
 
     bookmarked = UserBookmark.objects.filter(user=fetched_by, content_type__model='poll', object_id=OuterRef('id'))
-    qs = Poll.objects.filter(base_qs, active=True).annotate(phase=poll_phase,
-                group_joined=Exists(joined_groups),
-                total_proposals=Count('pollproposal', distinct=True),
-                bookmarked=Exists(bookmarked),
-                total_comments=Coalesce(Subquery(
-                    Comment.objects.filter(comment_section_id=OuterRef('comment_section_id'), active=True).values(
-                        'comment_section_id').annotate(total=Count('*')).values('total')[:1]), 0),
-
-                total_predictions=Coalesce(Subquery(
-                    PollPredictionStatement.objects.filter(poll_id=OuterRef('id')).values('poll_id')
-                    .annotate(total=Count('*')).values('total')[:1]), 0)).all()
+    qs = Poll.objects.filter(base_qs, active=True).annotate(group_joined=Exists(joined_groups),
+                                                            total_proposals=F('proposal_count'),
+                                                            bookmarked=Exists(bookmarked),
+                                                            total_comments=F('comment_count'),
+                                                            total_predictions=F('prediction_count'),
+                                                            total_participants=F('participant_count')).all()
 
     return BasePollFilter(filters, qs).qs
 
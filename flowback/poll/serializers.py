@@ -1,6 +1,6 @@
 from rest_framework import serializers
 
-from flowback.files.serializers import FileSerializer, FileCollectionListSerializerMixin
+from flowback.files.serializers import ImageDerivativeField, FileSerializer, FileCollectionListSerializerMixin
 from flowback.group.serializers import GroupUserSerializer
 from flowback.poll.models import PollProposal, Poll
 
@@ -14,7 +14,7 @@ class PollSerializer(FileCollectionListSerializerMixin, serializers.Serializer):
     created_by = GroupUserSerializer()
     group_id = serializers.IntegerField(source='created_by.group_id')
     group_name = serializers.CharField(source='created_by.group.name')
-    group_image = serializers.ImageField(source='created_by.group.image')
+    group_image = ImageDerivativeField(size=64, source='created_by.group.image')
     tag_id = serializers.IntegerField(allow_null=True)
     tag_name = serializers.CharField(source='tag.name', allow_null=True)
     hide_poll_users = serializers.BooleanField(source='created_by.group.hide_poll_users')
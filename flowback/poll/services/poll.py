@@ -1,17 +1,19 @@
+from django.db import transaction
+from django.db.models import F, Q
 from rest_framework.exceptions import ValidationError
 
 from backend.settings import DEBUG
 from flowback.common.services import get_object, model_update
-from flowback.files.services import upload_collection
+from flowback.files.services import upload_collection, file_upload_attach
 from flowback.group.notify import notify_group_poll
 from flowback.notification.models import NotificationChannel
-from flowback.poll.models import Poll, PollPhaseTemplate
+from flowback.poll.models import Poll, PollPhaseTemplate, PollPhaseJob
 from flowback.group.selectors.permission import group_user_permissions
 from django.utils import timezone
 from datetime import datetime
 
 from flowback.poll.notify import notify_poll, notify_poll_phase
-from flowback.poll.tasks import poll_area_vote_count, poll_prediction_bet_count, poll_proposal_vote_count
+from flowback.poll.tasks import poll_phase_job_sweep
 from flowback.user.models import User
 
 
@@ -36,6 +38,7 @@ def poll_create(*, user_id: int,
                 pinned: bool = None,
                 dynamic: bool,
                 attachments: list = None,
+                attachments_upload_ids: list[int] = None,
                 quorum: int = None,
                 work_group_id: int = None
                 ) -> Poll:
@@ -78,6 +81,10 @@ def poll_create(*, user_id: int,
                                        file=attachments,
                                        upload_to="group/poll/attachments")
 
+    # Files of completed resumable uploads, see file_upload_complete
+    if attachments_upload_ids:
+        collection = file_upload_attach(user_id=user_id, upload_ids=attachments_upload_ids, collection=collection)
+
     poll = Poll(created_by=group_user,
                 title=title,
                 description=description,
@@ -105,11 +112,7 @@ def poll_create(*, user_id: int,
     poll.full_clean()
     poll.save()
 
-    poll_area_vote_count.apply_async(kwargs=dict(poll_id=poll.id), eta=poll.area_vote_end_date)
-    poll_prediction_bet_count.apply_async(kwargs=dict(poll_id=poll.id),
-                                          eta=poll.prediction_bet_end_date)
-    poll_proposal_vote_count.apply_async(kwargs=dict(poll_id=poll.id),
-                                         eta=poll.end_date)
+    poll_phase_jobs_schedule(poll=poll)
 
     notify_group_poll(message="A new poll has been posted",
                       action=NotificationChannel.Action.CREATED,
@@ -118,11 +121,51 @@ def poll_create(*, user_id: int,
     return poll
 
 
+def poll_phase_jobs_schedule(*, poll: Poll) -> None:
+    """
+    Creates the counting jobs of a poll, or moves them to the current phase dates.
+    Jobs that already ran are left untouched, making it impossible to count a phase twice.
+    """
+    jobs = {job: getattr(poll, field) for job, field in PollPhaseJob.due_fields.items()
+            if getattr(poll, field) is not None}
+
+    PollPhaseJob.objects.bulk_create([PollPhaseJob(poll=poll, job=job, due_at=due_at) for job, due_at in jobs.items()],
+                                     ignore_conflicts=True)
+
+    for job, due_at in jobs.items():
+        (PollPhaseJob.objects.filter(poll=poll, job=job)
+         .exclude(Q(state=PollPhaseJob.State.DONE) | Q(due_at=due_at))
+         .update(due_at=due_at,
+                 state=PollPhaseJob.State.PENDING,
+                 attempts=0,
+                 version=F('version') + 1,
+                 updated_at=timezone.now()))
+
+    if any(due_at <= timezone.now() for due_at in jobs.values()):
+        transaction.on_commit(lambda: poll_phase_job_sweep.delay())
+
+
+def poll_phase_jobs_backfill(*, poll: Poll) -> None:
+    """
+    Creates the missing counting jobs of a poll from before the PollPhaseJob table. Jobs that are already due
+    are created as done, their queued count task has run. The ones still queued do nothing once the job exists.
+    """
+    now = timezone.now()
+    PollPhaseJob.objects.bulk_create([PollPhaseJob(poll=poll,
+                                                   job=job,
+                                                   due_at=getattr(poll, field),
+                                                   state=(PollPhaseJob.State.DONE if getattr(poll, field) <= now
+                                                          else PollPhaseJob.State.PENDING))
+                                      for job, field in PollPhaseJob.due_fields.items()
+                                      if getattr(poll, field) is not None],
+                                     ignore_conflicts=True)
+
+
 def poll_update(*, user_id: int, poll_id: int, data) -> Poll:
     poll = get_object(Poll, id=poll_id, active=True)
     group_user = group_user_permissions(user=user_id, group=poll.created_by.group.id)
 
-    non_side_effect_fields = ['title', 'description', 'pinned', 'schedule_poll_meeting_link']
+    non_side_effect_fields = ['title', 'description', 'pinned', 'schedule_poll_meeting_link', 'attachments']
 
     if data.get('pinned') is None:
         data.pop('pinned')
@@ -130,6 +173,11 @@ def poll_update(*, user_id: int, poll_id: int, data) -> Poll:
     elif data.get('pinned') is not None and not group_user.is_admin:
         raise ValidationError('Permission denied')
 
+    if attachments_upload_ids := data.pop('attachments_upload_ids', None):
+        data['attachments'] = file_upload_attach(user_id=user_id,
+                                                 upload_ids=attachments_upload_ids,
+                                                 collection=poll.attachments)
+
     poll, has_updated = model_update(instance=poll,
                                      fields=non_side_effect_fields,
                                      data=data)
@@ -184,6 +232,9 @@ def poll_fast_forward(*, user_id: int, poll_id: int, phase: str):
     if not poll.current_phase == 'waiting' and phases.index(phase) <= phases.index(poll.current_phase):
         raise ValidationError('Unable to fast forward poll to the same/previous phase')
 
+    # Counts that already ran must not run again once the phase dates move
+    poll_phase_jobs_backfill(poll=poll)
+
     time_difference = poll.get_phase(phase) - timezone.now()
 
     # Save new times to dict
@@ -197,26 +248,12 @@ def poll_fast_forward(*, user_id: int, poll_id: int, phase: str):
     poll.full_clean()
     poll.save()
 
-    # If not date poll, do these things depending on which phase one is going into
-    if (poll.poll_type == 4):
-        # TODO update/remove previous celery tasks
-        if poll.area_vote_end_date > timezone.now():
-            poll_area_vote_count.apply_async(kwargs=dict(poll_id=poll.id), eta=poll.area_vote_end_date)
-
-        else:
-            poll_area_vote_count(poll_id=poll.id)
-
-        if poll.prediction_bet_end_date > timezone.now():
-            poll_prediction_bet_count.apply_async(kwargs=dict(poll_id=poll.id), eta=poll.prediction_bet_end_date)
-
-        else:
-            poll_prediction_bet_count(poll_id=poll.id)
-
-        if poll.end_date > timezone.now():
-            poll_proposal_vote_count.apply_async(kwargs=dict(poll_id=poll.id), eta=poll.end_date)
+    # The persisted phase jumps along, the fast forward notification below covers the transition
+    poll.phase_refresh()
+    Poll.objects.filter(id=poll.id).update(phase=poll.phase, next_phase_at=poll.next_phase_at)
 
-        else:
-            poll_proposal_vote_count(poll_id=poll.id)
+    # Moves the pending counting jobs, the ones that became due are picked up right after commit
+    poll_phase_jobs_schedule(poll=poll)
 
     notify_poll_phase(message=f"Poll has been fast forwarded "
                               f"to {poll.current_phase.replace('_', ' ').capitalize()}",
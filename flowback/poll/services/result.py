@@ -0,0 +1,106 @@
+import hashlib
+import io
+
+import numpy as np
+from rest_framework.exceptions import ValidationError
+
+from flowback.group.selectors.permission import permission_q
+from flowback.poll.models import Poll, PollResultSnapshot, PollVoting
+from flowback.poll.selectors.export import poll_ballot_arrays
+
+# Arrays stored in a snapshot, in the order they're hashed into the tie-break seed
+POLL_RESULT_SNAPSHOT_ARRAYS = ('poll_type', 'proposal_ids', 'voter_ids', 'voter_mask', 'ballots', 'delegate_ids',
+                               'delegate_ballots', 'delegate_mandates', 'group_users', 'quorum')
+
+
+def poll_result_seed(*, arrays: dict[str, np.ndarray]) -> int:
+    """
+    Tie-break seed derived from the counted inputs, so the same snapshot always breaks a tie the same way
+    while nobody can tell the outcome of a tie before the ballots are final.
+    """
+    digest = hashlib.sha256()
+    for key in POLL_RESULT_SNAPSHOT_ARRAYS:
+        digest.update(np.ascontiguousarray(arrays[key]).tobytes())
+
+    return int.from_bytes(digest.digest()[:8], 'big')
+
+
+def poll_result_tally(*, arrays: dict[str, np.ndarray]) -> dict:
+    """
+    Counts a cardinal or schedule poll from its snapshot arrays, without touching any table.
+    Votes of users lacking the vote permission are masked out, delegate votes are weighted by their mandate.
+    Proposals without any counted vote get no score, ties for the highest score are broken by a seeded draw.
+
+    :return: PollResultSnapshot fields: scores, result_proposal_id, participants and status
+    """
+    ballots, delegate_ballots = arrays['ballots'], arrays['delegate_ballots']
+
+    # Schedule votes are for (1) or against (0), counted as +1 and -1
+    if int(arrays['poll_type']) == Poll.PollType.SCHEDULE:
+        ballots, delegate_ballots = ballots * 2 - 1, delegate_ballots * 2 - 1
+
+    ballots = np.where(arrays['voter_mask'][:, None], ballots, np.nan)
+    delegate_ballots = delegate_ballots * arrays['delegate_mandates'][:, None]
+
+    counted = ~np.isnan(ballots).all(axis=0) | ~np.isnan(delegate_ballots).all(axis=0)
+    totals = np.nansum(ballots, axis=0) + np.nansum(delegate_ballots, axis=0)
+
+    result_proposal_id = None
+    if counted.any():
+        tied = np.sort(arrays['proposal_ids'][counted & (totals == totals[counted].max())])
+        result_proposal_id = int(np.random.default_rng(poll_result_seed(arrays=arrays)).choice(tied))
+
+    participants = int(arrays['voter_mask'].sum() + arrays['delegate_mandates'].sum())
+
+    return dict(scores={str(proposal_id): int(total) if is_counted else None
+                        for proposal_id, total, is_counted in zip(arrays['proposal_ids'].tolist(),
+                                                                  totals.tolist(),
+                                                                  counted.tolist())},
+                result_proposal_id=result_proposal_id,
+                participants=participants,
+                status=1 if participants >= int(arrays['group_users']) * float(arrays['quorum']) else -1)
+
+
+def poll_result_snapshot_create(*, poll: Poll, group_users: int, quorum: float) -> PollResultSnapshot:
+    """
+    Snapshots the inputs of a proposal vote count (active proposals only) and counts the result from the snapshot.
+
+    :param group_users: Amount of group users the quorum is relative to
+    :param quorum: Share of group users that has to participate, between 0 and 1
+    """
+    arrays = poll_ballot_arrays(poll=poll, active_only=True)
+    allowed = PollVoting.objects.filter(permission_q('created_by', 'allow_vote'),
+                                        poll=poll).values_list('id', flat=True)
+    arrays.update(voter_mask=np.isin(arrays['voter_ids'], np.fromiter(allowed, dtype=np.int64)),
+                  group_users=np.int64(group_users),
+                  quorum=np.float64(quorum))
+
+    buffer = io.BytesIO()
+    np.savez_compressed(buffer, **arrays)
+    data = buffer.getvalue()
+
+    return PollResultSnapshot.objects.create(poll=poll,
+                                             data=data,
+                                             digest=hashlib.sha256(data).hexdigest(),
+                                             **poll_result_tally(arrays=arrays))
+
+
+def poll_result_snapshot_load(*, snapshot: PollResultSnapshot) -> dict[str, np.ndarray]:
+    data = bytes(snapshot.data)
+    if hashlib.sha256(data).hexdigest() != snapshot.digest:
+        raise ValidationError('Poll result snapshot does not match its digest')
+
+    with np.load(io.BytesIO(data)) as arrays:
+        return {key: arrays[key] for key in arrays.files}
+
+
+def poll_result_snapshot_verify(*, snapshot: PollResultSnapshot) -> bool:
+    """
+    Recounts a snapshot and checks it against the result that was stored with it.
+    """
+    result = poll_result_tally(arrays=poll_result_snapshot_load(snapshot=snapshot))
+
+    return result == dict(scores=snapshot.scores,
+                          result_proposal_id=snapshot.result_proposal_id,
+                          participants=snapshot.participants,
+                          status=snapshot.status)
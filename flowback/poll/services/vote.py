@@ -1,44 +1,33 @@
+from collections import Counter, defaultdict
+
 from rest_framework.exceptions import ValidationError
 
-from django.db.models import F
+from django.db import transaction
+from django.db.models import Case, F, IntegerField, Q, When
 from backend.settings import FLOWBACK_SCORE_VOTE_CEILING, FLOWBACK_SCORE_VOTE_FLOOR
 from flowback.common.services import get_object
-from flowback.group.models import GroupUserDelegatePool
+from flowback.group.models import GroupUser, GroupUserDelegatePool
 from flowback.group.notify import notify_group_user_delegate_pool_poll_vote_update
 from flowback.notification.models import NotificationChannel
 from flowback.poll.models import Poll, PollVoting, PollVotingTypeRanking, PollDelegateVoting, \
-    PollVotingTypeForAgainst, PollVotingTypeCardinal, PollProposalTypeSchedule
+    PollProposalTypeSchedule, POLL_BALLOT_MODELS
 from flowback.group.selectors.permission import group_user_permissions
 
 
-def poll_proposal_vote_update(*, user_id: int, poll_id: int, data: dict) -> None:
-    poll = get_object(Poll, id=poll_id)
-    group_user = group_user_permissions(user=user_id,
-                                        group=poll.created_by.group.id,
-                                        permissions=['allow_vote', 'admin'])
-
-    poll.check_phase('vote', 'dynamic', 'schedule')
-
-    if poll.poll_type == Poll.PollType.RANKING:
-        if not data['proposals']:
-            PollVoting.objects.filter(created_by=group_user, poll=poll).delete()
-            return
-
-        proposals = poll.pollproposal_set.filter(id__in=[x for x in data['proposals']]).all()
-
-        if len(proposals) != len(data['proposals']):
-            raise ValidationError('Not all proposals are available to vote for')
+def poll_ballots_validate(*, poll: Poll, ballots: list[dict]) -> list[dict[int, int | bool]]:
+    """
+    Validates ballots (proposals, with scores for cardinal polls) against the poll, in a single query.
 
-        poll_vote, created = PollVoting.objects.get_or_create(created_by=group_user, poll=poll)
-        poll_vote_ranking = [PollVotingTypeRanking(author=poll_vote,
-                                                   proposal_id=proposal,
-                                                   priority=len(data['proposals']) - priority)
-                             for priority, proposal in enumerate(data['proposals'])]
-        PollVotingTypeRanking.objects.filter(author=poll_vote).delete()
-        PollVotingTypeRanking.objects.bulk_create(poll_vote_ranking)
+    :return: The raw vote per proposal id of every ballot, empty if the ballot removes the vote
+    """
+    if poll.poll_type not in POLL_BALLOT_MODELS:
+        raise ValidationError('Unknown poll type')
 
-    elif poll.poll_type == Poll.PollType.CARDINAL:
+    for data in ballots:
+        if poll.poll_type != Poll.PollType.CARDINAL:
+            continue
 
+        data.setdefault('scores', [])
         if FLOWBACK_SCORE_VOTE_CEILING is not None and any(
                 [score > FLOWBACK_SCORE_VOTE_CEILING for score in data['scores']]):
             raise ValidationError(
@@ -48,151 +37,190 @@ def poll_proposal_vote_update(*, user_id: int, poll_id: int, data: dict) -> None
                 [score < FLOWBACK_SCORE_VOTE_FLOOR for score in data['scores']]):
             raise ValidationError(f'Voting scores exceeds floor bounds (currently set at {FLOWBACK_SCORE_VOTE_FLOOR})')
 
-        # Delete votes if no polls are registered
-        if not data['proposals']:
-            PollVoting.objects.filter(created_by=group_user, poll=poll).delete()
-            return
-
-        if len(data['scores']) != len(data['proposals']):
+        if data['proposals'] and len(data['scores']) != len(data['proposals']):
             raise ValidationError("The amount of votes don't match the amount of polls")
 
-        proposals = poll.pollproposal_set.filter(id__in=data['proposals']).all()
-        if len(proposals) != len(data['proposals']):
+    proposal_ids = {proposal for data in ballots for proposal in data['proposals']}
+    available = set(poll.pollproposal_set.filter(id__in=proposal_ids).values_list('id', flat=True))
+
+    for data in ballots:
+        if len(set(data['proposals'])) != len(data['proposals']) or not available.issuperset(data['proposals']):
             raise ValidationError('Not all proposals are available to vote for')
 
-        user_vote, created = PollVoting.objects.get_or_create(created_by=group_user, poll=poll)
-        poll_vote_cardinal = [PollVotingTypeCardinal(author=user_vote,
-                                                     proposal_id=data['proposals'][i],
-                                                     raw_score=data['scores'][i])
-                              for i in range(len(data['proposals']))]
+    if poll.poll_type == Poll.PollType.RANKING:
+        return [{proposal: len(data['proposals']) - priority for priority, proposal in enumerate(data['proposals'])}
+                for data in ballots]
 
-        PollVotingTypeCardinal.objects.filter(author=user_vote).delete()
-        PollVotingTypeCardinal.objects.bulk_create(poll_vote_cardinal)
+    if poll.poll_type == Poll.PollType.CARDINAL:
+        return [dict(zip(data['proposals'], data['scores'])) for data in ballots]
 
-    elif poll.poll_type == Poll.PollType.SCHEDULE:
+    return [{proposal: True for proposal in data['proposals']} for data in ballots]
 
-        # Delete all votes whenever null is passed in.
-        if not data['proposals']:
-            PollVoting.objects.filter(created_by=group_user, poll=poll).delete()
-            return
 
-        proposals = poll.pollproposal_set.filter(id__in=data['proposals']).all()
+def poll_ballots_apply(*,
+                       poll: Poll,
+                       ballots: dict[PollVoting | PollDelegateVoting, dict[int, int | bool]]) -> dict[int, int]:
+    """
+    Brings the stored ballot rows in line with the given ballots by diffing them against the current rows.
+    Unchanged rows are left alone, new and changed rows are upserted and removed rows are deleted,
+    which keeps autosaving clients from rewriting (and bloating) the whole ballot on every change.
 
-        if len(proposals) != len(data['proposals']):
-            raise ValidationError('Not all proposals are available to vote for')
+    :return: Net change in the amount of ballots containing each proposal, unchanged proposals are left out
+    """
+    if not ballots:
+        return {}
 
-        poll_vote, created = PollVoting.objects.get_or_create(created_by=group_user, poll=poll)
-        poll_vote_schedule = [PollVotingTypeForAgainst(author=poll_vote,
-                                                       proposal_id=proposal,
-                                                       vote=True)
-                              for proposal in data['proposals']]
-
-        # Preliminary score is used to present data on how many users have voted on said date in datepoll
-        old_proposal_ids = list(
-            PollVotingTypeForAgainst.objects.filter(author=poll_vote).values_list('proposal_id', flat=True)
-        )
-
-        # Scuffed solution that removes and re-ads all votes
-        PollVotingTypeForAgainst.objects.filter(author=poll_vote).delete()
-        PollVotingTypeForAgainst.objects.bulk_create(poll_vote_schedule)
-
-        PollProposalTypeSchedule.objects.filter(proposal_id__in=old_proposal_ids).update(
-            preliminary_score=F('preliminary_score') - 1
-        )
-        PollProposalTypeSchedule.objects.filter(proposal_id__in=data['proposals']).update(
-            preliminary_score=F('preliminary_score') + 1
-        )
-
-    else:
-        raise ValidationError('Unknown poll type')
+    model, value_field = POLL_BALLOT_MODELS[poll.poll_type]
+    author_field = 'author_delegate' if isinstance(next(iter(ballots)), PollDelegateVoting) else 'author'
+    ballots = {voting.id: ballot for voting, ballot in ballots.items()}
 
+    current = defaultdict(dict)
+    for row_id, voting_id, proposal_id, value in model.objects.filter(
+            **{f'{author_field}_id__in': ballots}).values_list('id', f'{author_field}_id', 'proposal_id', value_field):
+        current[voting_id][proposal_id] = (row_id, value)
 
-# TODO update in future for delegate pool
-def poll_proposal_delegate_vote_update(*, user_id: int, poll_id: int, data) -> None:
-    poll = Poll.objects.get(id=poll_id)
-    group_user = group_user_permissions(user=user_id, group=poll.created_by.group.id)
+    stale, changed, delta = [], [], Counter()
+    for voting_id, ballot in ballots.items():
+        for proposal_id, (row_id, value) in current[voting_id].items():
+            if proposal_id not in ballot:
+                stale.append(row_id)
+                delta[proposal_id] -= 1
 
-    try:
-        delegate_pool = GroupUserDelegatePool.objects.get(groupuserdelegate__group_user=group_user)
+            # Priorities are unique per author, so reordered ranking rows can't be swapped in place
+            elif ballot[proposal_id] != value and model is PollVotingTypeRanking:
+                stale.append(row_id)
 
-    except GroupUserDelegatePool.DoesNotExist:
-        raise ValidationError("User is not a delegate")
+        for proposal_id, value in ballot.items():
+            if proposal_id not in current[voting_id]:
+                delta[proposal_id] += 1
 
-    if group_user.group.id != poll.created_by.group.id:
-        raise ValidationError('Permission denied')
+            elif current[voting_id][proposal_id][1] == value:
+                continue
 
-    poll.check_phase('delegate_vote', 'dynamic', 'schedule')
+            changed.append(model(**{f'{author_field}_id': voting_id, 'proposal_id': proposal_id, value_field: value}))
 
-    if poll.poll_type == Poll.PollType.RANKING:
-        if not data['proposals']:
-            PollDelegateVoting.objects.filter(created_by=delegate_pool, poll=poll).delete()
-            return
+    if stale:
+        model.objects.filter(id__in=stale).delete()
 
-        proposals = poll.pollproposal_set.filter(id__in=data['proposals']).all()
+    if changed:
+        model.objects.bulk_create(changed,
+                                  update_conflicts=True,
+                                  unique_fields=[author_field, 'proposal'],
+                                  update_fields=[value_field, 'updated_at'])
 
-        if len(proposals) != len(data['proposals']):
-            raise ValidationError('Not all proposals are available to vote for')
+    return {proposal_id: change for proposal_id, change in delta.items() if change}
 
-        poll_vote, created = PollDelegateVoting.objects.get_or_create(created_by=delegate_pool, poll=poll)
-        poll_vote_ranking = [PollVotingTypeRanking(author_delegate=poll_vote,
-                                                   proposal_id=proposal,
-                                                   priority=len(data['proposals']) - priority)
-                             for priority, proposal in enumerate(data['proposals'])]
-        PollVotingTypeRanking.objects.filter(author_delegate=poll_vote).delete()
-        PollVotingTypeRanking.objects.bulk_create(poll_vote_ranking)
 
-    elif poll.poll_type == Poll.PollType.CARDINAL:
+def poll_schedule_preliminary_score_apply(*, delta: dict[int, int]) -> None:
+    """
+    Applies net changes to the preliminary scores of schedule proposals, which present how many users have voted on
+    each date. Runs within the transaction that changed the votes, the rows are locked in proposal order beforehand
+    so concurrent voters on overlapping dates wait on each other instead of deadlocking.
+    """
+    if not delta:
+        return
 
-        # Delete votes if no polls are registered
-        if not data['proposals']:
-            PollDelegateVoting.objects.filter(created_by=delegate_pool, poll=poll).delete()
-            return
+    schedules = PollProposalTypeSchedule.objects.filter(proposal_id__in=delta)
+    list(schedules.select_for_update().order_by('proposal_id').values_list('id', flat=True))
 
-        if len(data['scores']) != len(data['proposals']):
-            raise ValidationError("The amount of votes don't match the amount of polls")
+    schedules.update(preliminary_score=F('preliminary_score') + Case(*[When(proposal_id=proposal_id, then=change)
+                                                                      for proposal_id, change in delta.items()],
+                                                                    output_field=IntegerField()))
 
-        proposals = poll.pollproposal_set.filter(id__in=data['proposals']).all()
-        if len(proposals) != len(data['proposals']):
-            raise ValidationError('Not all proposals are available to vote for')
 
-        if FLOWBACK_SCORE_VOTE_CEILING is not None and any(
-                [score > FLOWBACK_SCORE_VOTE_CEILING for score in data['scores']]):
-            raise ValidationError(
-                f'Voting scores exceeds ceiling bounds (currently set at {FLOWBACK_SCORE_VOTE_CEILING})')
+def poll_user_ballots_update(*, poll: Poll, ballots: dict[int, dict[int, int | bool]]) -> None:
+    """
+    Applies validated ballots by group user id in one transaction, empty ballots remove the users vote.
+    """
+    with transaction.atomic():
+        # Locking the voting rows serializes concurrent saves of the same ballot, their diffs would overlap otherwise
+        locked = PollVoting.objects.select_for_update().filter(poll=poll).order_by('id')
+        votings = {voting.created_by_id: voting for voting in locked.filter(created_by_id__in=ballots)}
+        missing = [group_user_id for group_user_id, ballot in ballots.items() if ballot and group_user_id not in votings]
 
-        if FLOWBACK_SCORE_VOTE_FLOOR is not None and any(
-                [score < FLOWBACK_SCORE_VOTE_FLOOR for score in data['scores']]):
-            raise ValidationError(f'Voting scores exceeds floor bounds (currently set at {FLOWBACK_SCORE_VOTE_FLOOR})')
+        if missing:
+            # One by one, only the votings that were actually created count towards Poll.participant_count
+            for group_user_id in missing:
+                PollVoting.objects.get_or_create(created_by_id=group_user_id, poll=poll)
 
-        pool_vote, created = PollDelegateVoting.objects.get_or_create(created_by=delegate_pool, poll=poll)
-        poll_vote_cardinal = [PollVotingTypeCardinal(author_delegate=pool_vote,
-                                                     proposal_id=data['proposals'][i],
-                                                     raw_score=data['scores'][i])
-                              for i in range(len(data['proposals']))]
+            votings.update({voting.created_by_id: voting for voting in locked.filter(created_by_id__in=missing)})
 
-        PollVotingTypeCardinal.objects.filter(author_delegate=pool_vote).delete()
-        PollVotingTypeCardinal.objects.bulk_create(poll_vote_cardinal)
+        delta = poll_ballots_apply(poll=poll, ballots={votings[group_user_id]: ballot
+                                                       for group_user_id, ballot in ballots.items()
+                                                       if group_user_id in votings})
 
-    elif poll.poll_type == Poll.PollType.SCHEDULE:
-        if not data['proposals']:
-            PollDelegateVoting.objects.filter(created_by=delegate_pool, poll=poll).delete()
-            return
+        # Only the locked votings, one committed by a concurrent save in the meantime keeps its ballot
+        PollVoting.objects.filter(id__in=[votings[group_user_id].id for group_user_id, ballot in ballots.items()
+                                          if not ballot and group_user_id in votings]).delete()
 
-        proposals = poll.pollproposal_set.filter(id__in=data['proposals']).all()
+        if poll.poll_type == Poll.PollType.SCHEDULE:
+            poll_schedule_preliminary_score_apply(delta=delta)
 
-        if len(proposals) != len(data['proposals']):
-            raise ValidationError('Not all proposals are available to vote for')
 
+def poll_proposal_vote_update(*, user_id: int, poll_id: int, data: dict) -> None:
+    poll = get_object(Poll, id=poll_id)
+    group_user = group_user_permissions(user=user_id,
+                                        group=poll.created_by.group.id,
+                                        permissions=['allow_vote', 'admin'])
+
+    poll.check_phase('vote', 'dynamic', 'schedule')
+
+    ballot, = poll_ballots_validate(poll=poll, ballots=[data])
+    poll_user_ballots_update(poll=poll, ballots={group_user.id: ballot})
+
+
+def poll_proposal_vote_batch_update(*, user_id: int, poll_id: int, ballots: list[dict]) -> None:
+    """
+    Applies many ballots at once on behalf of group users (e.g. imported ballots), all or none of them are stored.
+    Each ballot has a group_user_id next to the data used by poll_proposal_vote_update.
+    """
+    poll = get_object(Poll, id=poll_id)
+    group_user_permissions(user=user_id, group=poll.created_by.group.id, permissions=['admin'])
+
+    poll.check_phase('vote', 'dynamic', 'schedule')
+
+    group_user_ids = [data['group_user_id'] for data in ballots]
+    if len(set(group_user_ids)) != len(group_user_ids):
+        raise ValidationError('Group users can only have one ballot each')
+
+    voters = GroupUser.objects.filter(Q(is_admin=True)
+                                      | Q(permission__isnull=False, permission__allow_vote=True)
+                                      | Q(permission__isnull=True, group__default_permission__allow_vote=True),
+                                      id__in=group_user_ids,
+                                      group_id=poll.created_by.group_id,
+                                      active=True)
+    if voters.count() != len(group_user_ids):
+        raise ValidationError('Not all group users are allowed to vote in this poll')
+
+    validated = poll_ballots_validate(poll=poll, ballots=ballots)
+    poll_user_ballots_update(poll=poll, ballots=dict(zip(group_user_ids, validated)))
+
+
+# TODO update in future for delegate pool
+def poll_proposal_delegate_vote_update(*, user_id: int, poll_id: int, data) -> None:
+    poll = Poll.objects.get(id=poll_id)
+    group_user = group_user_permissions(user=user_id, group=poll.created_by.group.id)
+
+    try:
+        delegate_pool = GroupUserDelegatePool.objects.get(groupuserdelegate__group_user=group_user)
+
+    except GroupUserDelegatePool.DoesNotExist:
+        raise ValidationError("User is not a delegate")
+
+    if group_user.group.id != poll.created_by.group.id:
+        raise ValidationError('Permission denied')
+
+    poll.check_phase('delegate_vote', 'dynamic', 'schedule')
+
+    ballot, = poll_ballots_validate(poll=poll, ballots=[data])
+
+    if not ballot:
+        PollDelegateVoting.objects.filter(created_by=delegate_pool, poll=poll).delete()
+        return
+
+    with transaction.atomic():
         poll_vote, created = PollDelegateVoting.objects.get_or_create(created_by=delegate_pool, poll=poll)
-        poll_vote_schedule = [PollVotingTypeForAgainst(author_delegate=poll_vote,
-                                                       proposal_id=proposal,
-                                                       vote=True)
-                              for proposal in enumerate(data['proposals'])]
-        PollVotingTypeForAgainst.objects.filter(author_delegate=poll_vote).delete()
-        PollVotingTypeForAgainst.objects.bulk_create(poll_vote_schedule)
-
-    else:
-        raise ValidationError('Unknown poll type')
+        poll_ballots_apply(poll=poll, ballots={poll_vote: ballot})
 
     notify_group_user_delegate_pool_poll_vote_update(action=NotificationChannel.Action.UPDATED,
                                                      message="A Delegate you subscribed to has "
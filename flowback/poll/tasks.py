@@ -1,58 +1,69 @@
+import logging
 import random
 from celery import shared_task
-from django.db import models
-from django.db.models import Count, Q, Sum, OuterRef, Case, When, F, Subquery, Max
+from django.db import models, transaction
+from django.db.models import Count, Q, Sum, OuterRef, Case, When, F, Subquery
 from django.db.models.functions import Cast
 from django.utils import timezone
 
-from backend.settings import DEBUG
-from flowback.common.services import get_object
-from flowback.group.models import GroupTags, GroupUser, GroupUserDelegatePool
+from flowback.comment.models import Comment
+from flowback.common.instrumentation import instrumented_task, task_rows
+from flowback.common.services import get_object, counter_reconcile, count_subquery
+from flowback.group.models import Group, GroupUser, GroupUserDelegatePool
 from flowback.group.selectors.permission import permission_q
 from flowback.group.selectors.tags import group_tags_list
 from flowback.notification.models import NotificationChannel
-from flowback.poll.models import Poll, PollAreaStatement, PollPredictionBet, PollPredictionStatement, \
+from flowback.poll.models import Poll, PollPredictionBet, PollPredictionStatement, \
     PollDelegateVoting, PollVotingTypeRanking, PollProposal, PollVoting, \
-    PollVotingTypeCardinal, PollVotingTypeForAgainst
+    PollVotingTypeCardinal, PollVotingTypeForAgainst, PollPhaseJob, PollProposalTypeSchedule
 
 import numpy as np
 
-from flowback.poll.notify import notify_poll
+from flowback.poll.notify import notify_poll, notify_poll_phase_bulk
+from flowback.poll.selectors.area import poll_area_vote_tally
+from flowback.poll.services.result import poll_result_snapshot_create
+
+logger = logging.getLogger(__name__)
+
+
+def poll_phase_job_exists(*, poll_id: int, job: str) -> bool:
+    """
+    Polls created before the PollPhaseJob table still have count tasks queued with an ETA. Once a poll has a job
+    (backfilled or created by fast forwarding), only poll_phase_job_sweep counts it and those tasks do nothing.
+    """
+    return PollPhaseJob.objects.filter(poll_id=poll_id, job=job).exists()
 
 
 @shared_task
-def poll_area_vote_count(poll_id: int):
-    tag = None
+@instrumented_task
+def poll_area_vote_count(poll_id: int, phase_job: bool = False):
+    if not phase_job and poll_phase_job_exists(poll_id=poll_id, job=PollPhaseJob.Job.AREA_VOTE_COUNT):
+        return f"Poll {poll_id} area is counted by its phase job."
+
     poll = get_object(Poll, id=poll_id)
-    statement = PollAreaStatement.objects.filter(poll=poll).annotate(
-        result=Count('pollareastatementvote', filter=Q(pollareastatementvote__vote=True)) -
-               Count('pollareastatementvote', filter=Q(pollareastatementvote__vote=False))
-    ).order_by('-result').first()
-
-    if statement:
-        tag = GroupTags.objects.filter(pollareastatementsegment__poll_area_statement=statement).first()
-        poll.tag = tag
-        poll.save()
+    result = poll_area_vote_tally(poll=poll).values('tag_id', 'tag__name', 'score').first()
 
-        # Clean all area tag votes, we won't need it anymore
-        PollAreaStatement.objects.filter(poll=poll).delete()
+    if result:
+        poll.tag_id = result['tag_id']
+        poll.save()
+        task_rows(result['score'])
 
     notify_poll(message="Poll area phase has ended and results have been counted",
                 action=NotificationChannel.Action.UPDATED,
                 poll=poll)
 
     return (f"Poll {poll_id} area task completed. "
-            f"{'No tags have won.' if not tag else
-            f'Tag: {tag.name} has won with {statement.pollareastatementvote_set.all().count()} points.'}")
+            f"{'No tags have won.' if not result else
+            f'Tag: {result['tag__name']} has won with {result['score']} points.'}")
 
 
 @shared_task
-def poll_prediction_bet_count(poll_id: int):
-    # For one prediction, assuming no bias and stationary predictors
+@instrumented_task
+def poll_prediction_bet_count(poll_id: int, phase_job: bool = False):
+    if not phase_job and poll_phase_job_exists(poll_id=poll_id, job=PollPhaseJob.Job.PREDICTION_BET_COUNT):
+        return f"Poll {poll_id} prediction bets are counted by their phase job."
 
-    def dprint(*args, **kwargs):
-        if DEBUG:
-            print(*args, **kwargs)
+    # For one prediction, assuming no bias and stationary predictors
 
     # Get every predictor participating in poll
     timestamp = timezone.now()  # Avoid new bets causing list to be offset
@@ -194,17 +205,18 @@ def poll_prediction_bet_count(poll_id: int):
     for i in range(len(previous_bets)):
         previous_bets[i] = [j for n, j in enumerate(previous_bets[i]) if n not in to_delete]
 
-    dprint("\n\n" + "#" * 50)
-
     # Assume previous_bets matches order of current_bets
-    dprint("Previous Statements count: ", statements.filter(~Q(poll=poll)).count())
-    dprint("Current statements count: ", statements.filter(poll=poll).count())
-    dprint("Total predictor count: ", predictors.count())
-    dprint("Current Bets:", current_bets)
-    dprint("Previous Outcomes:", previous_outcomes)
-    dprint("Previous Bets:", previous_bets)
-
-    dprint("Total Statement:", len(poll_statements))
+    # The counts cost queries of their own, only run them when debugging
+    if logger.isEnabledFor(logging.DEBUG):
+        logger.debug("Previous Statements count: %s", statements.filter(~Q(poll=poll)).count())
+        logger.debug("Current statements count: %s", statements.filter(poll=poll).count())
+        logger.debug("Total predictor count: %s", predictors.count())
+
+    logger.debug("Current Bets: %s", current_bets)
+    logger.debug("Previous Outcomes: %s", previous_outcomes)
+    logger.debug("Previous Bets: %s", previous_bets)
+    logger.debug("Total Statement: %s", len(poll_statements))
+    task_rows(len(poll_statements))
 
     # Calculation below
     # for i, statement in enumerate(poll_statements):
@@ -216,7 +228,7 @@ def poll_prediction_bet_count(poll_id: int):
         # If there's no previous bets then do nothing
         if len(previous_bets) == 0 or len(previous_bets[0]) == 0:
             combined_bet = None if all(bets[i] is None for bets in current_bets) else (sum(main_bets)) / len(main_bets)
-            dprint(f"No previous bets found, returning {combined_bet}")
+            logger.debug("No previous bets found, returning %s", combined_bet)
             PollPredictionStatement.objects.filter(id=statement).update(combined_bet=combined_bet)
 
             continue
@@ -226,7 +238,7 @@ def poll_prediction_bet_count(poll_id: int):
             continue
 
         previous_bets_trimmed = [previous_bets[j] for j in range(len(previous_bets)) if current_bets[j][i] is not None]
-        dprint("Previous Bets Trimmed:", previous_bets_trimmed)
+        logger.debug("Previous Bets Trimmed: %s", previous_bets_trimmed)
         for bets in previous_bets_trimmed:
             bets_trimmed = [i for i in bets if i is not None]
             bias_adjustments.append(0 if len(bets) == 0 else previous_outcome_avg - (sum(bets_trimmed) /
@@ -272,7 +284,7 @@ def poll_prediction_bet_count(poll_id: int):
         # The inverse only exists when the determinant is non-zero, this can be made sure of by changing small decimals
         if np.linalg.det(np_covariance_matrix) == 0:
             determinant_is_zero = True
-            dprint("Zero determinant")
+            logger.debug("Zero determinant")
 
             while determinant_is_zero:
                 for m in range(np_covariance_matrix.shape[0]):
@@ -299,9 +311,9 @@ def poll_prediction_bet_count(poll_id: int):
         bet_weights = nominator * (1 / denominator)
         transposed_bet_weights = np.transpose(bet_weights)
 
-        dprint("Transposed_bet_weights:", transposed_bet_weights)
-        dprint("Main bets:", main_bets)
-        dprint("Bias_adjustments:", bias_adjustments)
+        logger.debug("Transposed_bet_weights: %s", transposed_bet_weights)
+        logger.debug("Main bets: %s", main_bets)
+        logger.debug("Bias_adjustments: %s", bias_adjustments)
 
         # I am unsure if I should limit the bias adjusted bets or only limit the combined bet in the end,
         # I think this might make more sense but I have to think about this more
@@ -317,7 +329,6 @@ def poll_prediction_bet_count(poll_id: int):
             elif bias_adjusted_bet[j] > 1:
                 bias_adjusted_bet[j] = 1.0
 
-        dprint(f"Results: {np.matmul(transposed_bet_weights, bias_adjusted_bet)}")
         combined_bet = float(np.matmul(transposed_bet_weights, bias_adjusted_bet)[0])
 
         if combined_bet < 0:
@@ -328,9 +339,9 @@ def poll_prediction_bet_count(poll_id: int):
         # Sanity check
         check = np.matmul(transposed_bet_weights, row_one_vector)
         if (check[0] > 1 + small_decimal) or (0.99 + small_decimal > check[0]):
-            dprint(f"Error with weights: {check[0]:.4f}")
+            logger.debug("Error with weights: %.4f", check[0])
 
-        dprint(combined_bet)
+        logger.debug("Combined bet: %s", combined_bet)
 
         PollPredictionStatement.objects.filter(id=statement).update(combined_bet=combined_bet)
 
@@ -343,7 +354,11 @@ def poll_prediction_bet_count(poll_id: int):
 
 
 @shared_task
-def poll_proposal_vote_count(poll_id: int) -> None:
+@instrumented_task
+def poll_proposal_vote_count(poll_id: int, phase_job: bool = False) -> None:
+    if not phase_job and poll_phase_job_exists(poll_id=poll_id, job=PollPhaseJob.Job.PROPOSAL_VOTE_COUNT):
+        return
+
     poll = Poll.objects.get(id=poll_id)
     group = poll.created_by.group
 
@@ -384,15 +399,6 @@ def poll_proposal_vote_count(poll_id: int) -> None:
                                               proposal__active=True,
                                               ).update(score=F('raw_score') * Subquery(delegate_mandate))
 
-        # Update proposal scores
-        proposal_scores = PollVotingTypeCardinal.objects.filter(
-            proposal=OuterRef('id'),
-        ).values('proposal').annotate(
-            total_score=Sum('score')
-        ).values('total_score')
-
-        PollProposal.objects.filter(poll=poll, active=True).update(score=Subquery(proposal_scores))
-
     if poll.poll_type == Poll.PollType.SCHEDULE:
         # Update user vote scores
         PollVotingTypeForAgainst.objects.filter(
@@ -406,40 +412,28 @@ def poll_proposal_vote_count(poll_id: int) -> None:
                                                 ).update(score=Case(When(vote=True, then=1), default=-1)
                                                                * Subquery(delegate_mandate))
 
-        # Update proposal scores
-        proposal_scores = PollVotingTypeForAgainst.objects.filter(
-            proposal=OuterRef('id')
-        ).values('proposal').annotate(
-            total_score=Sum('score')
-        ).values('total_score')
-
-        PollProposal.objects.filter(poll=poll, active=True).update(score=Subquery(proposal_scores))
-
-    # Check if quorum is fulfilled
-    total_group_users = GroupUser.objects.filter(group=group).count()
+    # Check if quorum is fulfilled, relative to the maintained count of active group users allowed to vote
+    total_group_users = Group.objects.values_list('voter_count', flat=True).get(id=group.id)
     quorum = (poll.quorum if poll.quorum is not None else group.default_quorum) / 100
 
+    # The result is counted from an immutable snapshot of its inputs, see poll_result_snapshot_verify
+    snapshot = poll_result_snapshot_create(poll=poll, group_users=total_group_users, quorum=quorum)
+    PollProposal.objects.bulk_update([PollProposal(id=int(proposal_id), score=score)
+                                      for proposal_id, score in snapshot.scores.items()], ['score'])
+    task_rows(len(snapshot.scores))
+
     # TODO participants will include dangling participants
     #  (participants with only proposal votes that are active=False and removed votes)
-    user_participants = PollVoting.objects.filter(permission_q('created_by', 'allow_vote'),
-                                                  poll=poll).count()
-    delegate_participants = PollDelegateVoting.objects.filter(poll=poll).aggregate(mandate=Sum('mandate'))['mandate']
-    participants = ((user_participants if user_participants is not None else 0)
-                    + (delegate_participants if delegate_participants is not None else 0))
+    participants = snapshot.participants
     poll.participants = participants
     poll.save()
 
-    winning_proposal_score = PollProposal.objects.filter(poll_id=poll_id,
-                                                         active=True).aggregate(score=Max('score'))['score']
-    winning_proposal = PollProposal.objects.filter(poll_id=poll_id,
-                                                   active=True,
-                                                   score=winning_proposal_score).order_by('?').first()
+    winning_proposal = PollProposal.objects.filter(id=snapshot.result_proposal_id).first()
 
     if poll.finished and not poll.result:
-        print(f"Total Participants: {participants}")
-        print(f"Total Group Users: {total_group_users}")
-        print(f"Quorum: {quorum}")
-        poll.status = 1 if poll.participants >= total_group_users * quorum else -1
+        logger.info("Poll %s counted: %s participants, %s group users, quorum %s",
+                    poll_id, participants, total_group_users, quorum)
+        poll.status = snapshot.status
         poll.interval_mean_absolute_correctness = group_tags_list(group_id=poll.created_by.group_id,
                                                                   filters=dict(id=poll.tag_id)).first().imac
         poll.result = winning_proposal
@@ -457,3 +451,121 @@ def poll_proposal_vote_count(poll_id: int) -> None:
                                   start_date=winning_proposal.pollproposaltypeschedule.event_start_date,
                                   end_date=winning_proposal.pollproposaltypeschedule.event_end_date,
                                   created_by=poll)
+
+
+@shared_task
+@instrumented_task
+def poll_counter_reconcile():
+    """
+    Corrects drifted proposal/comment/prediction/participant counters, e.g. after writes that bypassed signals.
+    """
+    reconciled = counter_reconcile(
+        queryset=Poll.objects.all(),
+        counters=dict(proposal_count=count_subquery(PollProposal.objects.filter(poll_id=OuterRef('id')), 'poll_id'),
+                      comment_count=count_subquery(Comment.objects.filter(
+                          comment_section_id=OuterRef('comment_section_id'), active=True), 'comment_section_id'),
+                      prediction_count=count_subquery(PollPredictionStatement.objects.filter(
+                          poll_id=OuterRef('id')), 'poll_id'),
+                      participant_count=count_subquery(PollVoting.objects.filter(poll_id=OuterRef('id')), 'poll_id')))
+    task_rows(reconciled)
+
+    return reconciled
+
+
+@shared_task
+@instrumented_task
+def poll_schedule_preliminary_score_reconcile():
+    """
+    Corrects drifted schedule proposal preliminary scores, e.g. after votes were removed through cascading deletes.
+    """
+    reconciled = counter_reconcile(
+        queryset=PollProposalTypeSchedule.objects.all(),
+        counters=dict(preliminary_score=count_subquery(PollVotingTypeForAgainst.objects.filter(
+            proposal_id=OuterRef('proposal_id'), author__isnull=False, vote=True), 'proposal_id')))
+    task_rows(reconciled)
+
+    return reconciled
+
+
+@shared_task
+@instrumented_task
+def poll_phase_job_sweep(batch_size: int = 100, max_attempts: int = 3, retry_delay: int = 60):
+    """
+    Runs every due PollPhaseJob. Each job is claimed with SELECT ... FOR UPDATE SKIP LOCKED and marked done in the
+    same transaction as its count, so concurrent sweeps on other workers pick different jobs and none runs twice.
+    Failing jobs are retried after attempts * retry_delay seconds, up to max_attempts.
+    """
+    counts = {PollPhaseJob.Job.AREA_VOTE_COUNT: poll_area_vote_count,
+              PollPhaseJob.Job.PREDICTION_BET_COUNT: poll_prediction_bet_count,
+              PollPhaseJob.Job.PROPOSAL_VOTE_COUNT: poll_proposal_vote_count}
+    done, failed = 0, 0
+
+    for _ in range(batch_size):
+        with transaction.atomic():
+            job = (PollPhaseJob.objects.select_for_update(skip_locked=True, of=('self',))
+                   .filter(state=PollPhaseJob.State.PENDING, due_at__lte=timezone.now(), poll__active=True)
+                   .order_by('due_at')
+                   .first())
+
+            if job is None:
+                break
+
+            try:
+                with transaction.atomic():
+                    counts[job.job](poll_id=job.poll_id, phase_job=True)
+
+                job.state = PollPhaseJob.State.DONE
+                done += 1
+
+            except Exception:
+                logger.exception("Poll %s %s failed", job.poll_id, job.job)
+                job.attempts += 1
+                job.due_at = timezone.now() + timezone.timedelta(seconds=job.attempts * retry_delay)
+                failed += 1
+
+                if job.attempts >= max_attempts:
+                    job.state = PollPhaseJob.State.FAILED
+
+            job.save(update_fields=['state', 'attempts', 'due_at', 'updated_at'])
+
+    else:
+        # Jobs may be left after a full batch, continue on whichever worker is free
+        poll_phase_job_sweep.delay(batch_size=batch_size, max_attempts=max_attempts, retry_delay=retry_delay)
+
+    task_rows(done + failed)
+
+    return f"Poll phase jobs: {done} done, {failed} failed."
+
+
+@shared_task
+@instrumented_task
+def poll_phase_sweep(batch_size: int = 500):
+    """
+    Advances the persisted phase of every poll whose next phase boundary has passed, notifying subscribers in bulk.
+    Polls are claimed with SELECT ... FOR UPDATE SKIP LOCKED, concurrent sweeps never notify the same transition.
+    """
+    advanced = 0
+
+    while True:
+        with transaction.atomic():
+            now = timezone.now()
+            polls = list(Poll.objects.select_for_update(skip_locked=True, of=('self',))
+                         .filter(active=True, next_phase_at__lte=now)
+                         .select_related('created_by__group', 'work_group')
+                         .order_by('next_phase_at')[:batch_size])
+
+            changed = []
+            for poll in polls:
+                phase = poll.phase
+                poll.phase_refresh(now)
+
+                if poll.phase != phase:
+                    changed.append(poll)
+
+            Poll.objects.bulk_update(polls, fields=['phase', 'next_phase_at'])
+            task_rows(len(polls))
+            notify_poll_phase_bulk(polls=changed, action=NotificationChannel.Action.UPDATED)
+            advanced += len(changed)
+
+        if len(polls) < batch_size:
+            return f"{advanced} polls changed phase."
@@ -17,9 +17,7 @@ from flowback.poll.models import (Poll,
                                   PollPredictionStatement,
                                   PollPredictionStatementSegment,
                                   PollPredictionStatementVote,
-                                  PollAreaStatement,
-                                  PollAreaStatementSegment,
-                                  PollAreaStatementVote)
+                                  PollAreaVote)
 from flowback.poll.tests.utils import generate_poll_phase_kwargs
 
 
@@ -146,26 +144,10 @@ class PollPredictionStatementVoteFactory(factory.django.DjangoModelFactory):
     vote = factory.LazyAttribute(lambda _: fake.pybool())
 
 
-class PollAreaStatementFactory(factory.django.DjangoModelFactory):
+class PollAreaVoteFactory(factory.django.DjangoModelFactory):
     class Meta:
-        model = PollAreaStatement
+        model = PollAreaVote
 
     created_by = factory.SubFactory(GroupUserFactory)
-    poll = factory.SubFactory(PollFactory, **generate_poll_phase_kwargs('area'))
-
-
-class PollAreaStatementSegmentFactory(factory.django.DjangoModelFactory):
-    class Meta:
-        model = PollAreaStatementSegment
-
-    poll_area_statement = factory.SubFactory(PollAreaStatementFactory)
-    tag = factory.SubFactory(GroupTagsFactory)
-
-
-class PollAreaStatementVoteFactory(factory.django.DjangoModelFactory):
-    class Meta:
-        model = PollAreaStatementVote
-
-    created_by = factory.SubFactory(GroupUserFactory)
-    poll_area_statement = factory.SubFactory(PollAreaStatementFactory)
-    vote = factory.LazyAttribute(lambda _: fake.pybool())
+    poll = factory.SubFactory(PollFactory, **generate_poll_phase_kwargs('area_vote'))
+    tag = factory.SubFactory(GroupTagsFactory, group=factory.SelfAttribute('..created_by.group'))
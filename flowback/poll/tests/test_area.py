@@ -1,19 +1,18 @@
-import json
-
-from django.db.models import Sum, Case, When
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from rest_framework.exceptions import ValidationError
 from rest_framework.test import APITestCase
 
 from flowback.common.tests import generate_request
 from flowback.group.models import GroupUser, GroupTags
 from flowback.group.tests.factories import GroupFactory, GroupUserFactory, GroupTagsFactory
-from flowback.poll.models import Poll, PollAreaStatementSegment, PollAreaStatementVote
-from flowback.poll.selectors.area import poll_area_statement_list
+from flowback.poll.models import Poll, PollAreaVote
 from flowback.poll.services.poll import poll_fast_forward
-from flowback.poll.tasks import poll_area_vote_count
+from flowback.poll.tasks import poll_area_vote_count, poll_phase_job_sweep
 from flowback.poll.tests.factories import PollFactory
 from flowback.poll.tests.utils import generate_poll_phase_kwargs
 
-from flowback.poll.services.area import poll_area_statement_vote_update
+from flowback.poll.services.area import poll_area_vote_update
 from flowback.poll.views.area import PollAreaStatementListAPI
 
 
@@ -35,75 +34,44 @@ class PollAreaTest(APITestCase):
                                 **generate_poll_phase_kwargs('area_vote'))
 
     def test_update_area_vote(self):
-        def cast_vote(group_user: GroupUser, poll: Poll, tag_id: int, vote: bool):
-            return poll_area_statement_vote_update(user_id=group_user.user.id,
-                                                   poll_id=poll.id,
-                                                   tag=tag_id,
-                                                   vote=vote)
-
-        # Test creating area statements
-        area_vote_one = cast_vote(group_user=self.group_user_one,
-                                  poll=self.poll,
-                                  tag_id=self.group_tag_two.id,
-                                  vote=True)
-
-        area_vote_two = cast_vote(group_user=self.group_user_two,
-                                  poll=self.poll,
-                                  tag_id=self.group_tag_two.id,
-                                  vote=True)
-
-        area_vote_three = cast_vote(group_user=self.group_user_three,
-                                    poll=self.poll,
-                                    tag_id=self.group_tag_one.id,
-                                    vote=False)
-
-        self.assertEqual(area_vote_one, area_vote_two)
-        self.assertNotEqual(area_vote_one, area_vote_three)
-
-        # Check if segments match properly
-        total_area_segments_one = PollAreaStatementSegment.objects.filter(poll_area_statement=area_vote_one,
-                                                                          tag_id__in=[self.group_tag_two.id,
-                                                                                      self.group_tag_three.id]
-                                                                          ).count()
-        total_area_segments_two = PollAreaStatementSegment.objects.filter(poll_area_statement=area_vote_one,
-                                                                          tag_id__in=[self.group_tag_one.id,
-                                                                                      self.group_tag_two.id]
-                                                                          ).count()
-
-        self.assertEqual(total_area_segments_one, 1)
-        self.assertEqual(total_area_segments_two, 1)
-
-        sum_agg = Sum(Case(When(vote=True, then=1), default=-1))
-
-        def statement_qs(area_statement):
-            return PollAreaStatementVote.objects.filter(poll_area_statement=area_statement)
-
-        # Check if votes counted properly
-        area_statement_one_votes = statement_qs(area_vote_one).aggregate(result=sum_agg).get('result')
-        area_statement_two_votes = statement_qs(area_vote_two).aggregate(result=sum_agg).get('result')
-        area_statement_three_votes = statement_qs(area_vote_three).aggregate(result=sum_agg).get('result')
-
-        for qs in [statement_qs(i) for i in [area_vote_one, area_vote_two, area_vote_three]]:
-            print([i.vote for i in qs])
-
-        self.assertEqual(area_statement_one_votes, 2)
-        self.assertEqual(area_statement_two_votes, 2)
-        self.assertEqual(area_statement_three_votes, -1)
-
-        # Check if List API reads properly
+        def cast_vote(group_user: GroupUser, tag: GroupTags, poll: Poll = None):
+            return poll_area_vote_update(user_id=group_user.user.id,
+                                         poll_id=(poll or self.poll).id,
+                                         tag=tag.id,
+                                         vote=True)
+
+        cast_vote(self.group_user_one, self.group_tag_two)
+        cast_vote(self.group_user_two, self.group_tag_two)
+        cast_vote(self.group_user_three, self.group_tag_one)
+
+        # Changing a vote updates the existing row in a single statement
+        vote_id = PollAreaVote.objects.get(poll=self.poll, created_by=self.group_user_three).id
+        with CaptureQueriesContext(connection) as queries:
+            cast_vote(self.group_user_three, self.group_tag_three)
+
+        self.assertEqual(len([x for x in queries if x['sql'].startswith(('INSERT', 'UPDATE', 'DELETE'))]), 1)
+        self.assertEqual(PollAreaVote.objects.get(poll=self.poll, created_by=self.group_user_three).id, vote_id)
+
+        with self.assertRaises(ValidationError):
+            poll_area_vote_update(user_id=self.group_user_one.user.id, poll_id=self.poll.id,
+                                  tag=GroupTagsFactory().id, vote=True)
+
+        # Live tally through the list API
         response = generate_request(api=PollAreaStatementListAPI,
                                     user=self.group_user_one.user,
                                     url_params={'poll_id': self.poll.id})
 
-        data = json.loads(response.rendered_content)['results']
+        self.assertEqual(response.status_code, 200, response.data)
+        self.assertEqual([(x['tag_id'], x['score'], x['user_vote']) for x in response.data['results']],
+                         [(self.group_tag_two.id, 2, True), (self.group_tag_three.id, 1, False)])
 
-        self.assertEqual(len(data), 2)
+        # Counting is a single GROUP BY
+        with CaptureQueriesContext(connection) as queries:
+            message = poll_area_vote_count(poll_id=self.poll.id)
 
-        # Check if Counting votes work
-        winning_tag = GroupTags.objects.filter(pollareastatementsegment__poll_area_statement=area_vote_one).first()
-        tag = poll_area_vote_count.apply(kwargs=dict(poll_id=self.poll.id)).get().tag
-
-        self.assertEqual(winning_tag.id, tag.id)
+        self.assertEqual(len([x for x in queries if 'GROUP BY' in x['sql']]), 1)
+        self.assertIn(f'{self.group_tag_two.name} has won with 2 points', message)
+        self.assertEqual(Poll.objects.get(id=self.poll.id).tag_id, self.group_tag_two.id)
 
     def test_area_vote_change_then_fast_forward(self):
         """
@@ -145,7 +113,10 @@ class PollAreaTest(APITestCase):
 
         # Fast forward the poll to complete it
         poll_fast_forward(user_id=user.id, poll_id=poll.id, phase='proposal')
-        poll_area_vote_count.apply(kwargs=dict(poll_id=poll.id))
+
+        # The area vote end queued for the poll does nothing, its phase job counts it
+        self.assertEqual(poll_area_vote_count(poll_id=poll.id), f"Poll {poll.id} area is counted by its phase job.")
+        self.assertEqual(poll_phase_job_sweep(), "Poll phase jobs: 1 done, 0 failed.")
 
         # Check the poll results via PollListApi
         response3 = generate_request(api=PollListApi,
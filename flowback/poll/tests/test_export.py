@@ -0,0 +1,129 @@
+import csv
+import io
+import json
+import os
+import tempfile
+import tracemalloc
+
+import numpy as np
+from django.core.management import call_command
+from rest_framework.test import APITestCase
+
+from .factories import (PollFactory, PollProposalFactory, PollVotingFactory, PollDelegateVotingFactory,
+                        PollVotingTypeCardinalFactory, PollPredictionStatementFactory, PollPredictionBetFactory)
+from .utils import generate_poll_phase_kwargs
+from ..models import Poll, PollVoting, PollVotingTypeCardinal
+from ..selectors.export import poll_export_rows
+from ..views.poll import PollExportAPI
+from ...common.tests import generate_request, fake
+from ...group.tests.factories import GroupFactory, GroupUserFactory, GroupUserDelegatePoolFactory
+
+
+class PollExportTest(APITestCase):
+    def setUp(self):
+        fake.unique.clear()
+        self.group = GroupFactory()
+        self.group_user_creator = self.group.group_user_creator
+        self.group_user_one, self.group_user_two = GroupUserFactory.create_batch(2, group=self.group)
+        self.poll = PollFactory(created_by=self.group_user_creator, poll_type=Poll.PollType.CARDINAL,
+                                **generate_poll_phase_kwargs('vote'))
+        self.proposals = [PollProposalFactory(created_by=self.group_user_creator, poll=self.poll) for _ in range(3)]
+
+        self.votings = [PollVotingFactory(created_by=x, poll=self.poll)
+                        for x in (self.group_user_one, self.group_user_two)]
+        for voting, scores in zip(self.votings, ([10, 20, 30], [40, None, 60])):
+            for proposal, score in zip(self.proposals, scores):
+                if score is not None:
+                    PollVotingTypeCardinalFactory(author=voting, proposal=proposal, raw_score=score)
+
+        self.delegate_voting = PollDelegateVotingFactory(created_by=GroupUserDelegatePoolFactory(group=self.group),
+                                                         poll=self.poll,
+                                                         mandate=4)
+        PollVotingTypeCardinalFactory(author_delegate=self.delegate_voting, proposal=self.proposals[1], raw_score=70)
+
+        statement = PollPredictionStatementFactory(created_by=self.group_user_one, poll=self.poll)
+        PollPredictionBetFactory(prediction_statement=statement, created_by=self.group_user_two)
+
+    def export(self, user=None, **data):
+        response = generate_request(api=PollExportAPI,
+                                    data=data,
+                                    url_params=dict(poll=self.poll.id),
+                                    user=user or self.group_user_creator.user)
+        if response.status_code == 200:
+            self.assertTrue(response.streaming)
+
+        return response
+
+    def test_poll_export_csv(self):
+        response = self.export(export_format='csv', table='ballots')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Type'], 'text/csv')
+
+        rows = list(csv.DictReader(io.StringIO(response.getvalue().decode())))
+        self.assertEqual(list(rows[0]), ['author_id', 'author_delegate_id', 'proposal_id', 'raw_score', 'score'])
+        self.assertEqual(len(rows), 6)
+        self.assertEqual({int(x['author_delegate_id']) for x in rows if x['author_delegate_id']},
+                         {self.delegate_voting.id})
+
+        response = self.export(export_format='csv')
+        self.assertEqual(response.status_code, 400)
+
+        response = self.export(user=self.group_user_one.user, export_format='csv', table='ballots')
+        self.assertEqual(response.status_code, 403)
+
+    def test_poll_export_jsonl(self):
+        response = self.export(export_format='jsonl')
+        self.assertEqual(response.status_code, 200)
+
+        rows = [json.loads(line) for line in response.getvalue().decode().splitlines()]
+        self.assertEqual([x['table'] for x in rows],
+                         ['proposals'] * 3 + ['ballots'] * 6 + ['delegate_mandates', 'prediction_bets'])
+        self.assertEqual(rows[9], dict(table='delegate_mandates', id=self.delegate_voting.id,
+                                       created_by_id=self.delegate_voting.created_by_id, mandate=4))
+
+    def test_poll_export_npz(self):
+        response = self.export(export_format='npz')
+        self.assertEqual(response.status_code, 200)
+
+        data = np.load(io.BytesIO(response.getvalue()))
+        self.assertEqual(data['proposal_ids'].tolist(), [x.id for x in self.proposals])
+        self.assertEqual(data['voter_ids'].tolist(), [x.id for x in self.votings])
+        np.testing.assert_array_equal(data['ballots'], [[10, 20, 30], [40, np.nan, 60]])
+        np.testing.assert_array_equal(data['delegate_ballots'], [[np.nan, 70, np.nan]])
+        self.assertEqual(data['delegate_mandates'].tolist(), [4])
+
+        # A cardinal tally straight from the matrix
+        totals = np.nansum(data['ballots'], axis=0) + np.nansum(data['delegate_ballots']
+                                                                * data['delegate_mandates'][:, None], axis=0)
+        self.assertEqual(totals.tolist(), [50, 300, 90])
+
+    def test_poll_export_command(self):
+        stdout = io.StringIO()
+        call_command('poll_export', self.poll.id, '--format', 'csv', '--table', 'proposals', stdout=stdout)
+        self.assertEqual(len(stdout.getvalue().splitlines()), 4)
+
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'ballots.npz')
+            call_command('poll_export', self.poll.id, '--format', 'npz', '--output', path)
+            self.assertEqual(np.load(path)['ballots'].shape, (2, 3))
+
+    def test_poll_export_memory(self):
+        voters = GroupUserFactory.create_batch(50, group=self.group)
+        votings = PollVoting.objects.bulk_create([PollVoting(created_by=x, poll=self.poll) for x in voters])
+        proposals = [PollProposalFactory(created_by=self.group_user_creator, poll=self.poll) for _ in range(40)]
+        PollVotingTypeCardinal.objects.bulk_create([PollVotingTypeCardinal(author=voting, proposal=proposal,
+                                                                           raw_score=i % 100)
+                                                    for i, (voting, proposal)
+                                                    in enumerate((v, p) for v in votings for p in proposals)])
+
+        # Only a chunk is held at a time, the export as a whole never is
+        tracemalloc.start()
+        size = sum(len(chunk) for chunk in poll_export_rows(poll=self.poll,
+                                                            export_format='jsonl',
+                                                            tables=['ballots'],
+                                                            chunk_size=100))
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+
+        self.assertGreater(size, 100000)
+        self.assertLess(peak, size / 2)
@@ -1,6 +1,9 @@
 import json
+from unittest import mock
 
 from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
 from django.utils import timezone
 from rest_framework import status
 from rest_framework.exceptions import ValidationError
@@ -8,11 +11,14 @@ from rest_framework.test import APIRequestFactory, force_authenticate, APITestCa
 from .factories import PollFactory, PollProposalFactory, PollPredictionStatementFactory
 
 from .utils import generate_poll_phase_kwargs
-from ..models import Poll
-from ..services.poll import poll_fast_forward, poll_create
+from ..models import Poll, PollPhaseJob
+from ..selectors.poll import poll_list
+from ..tasks import poll_counter_reconcile, poll_phase_job_sweep, poll_phase_sweep, poll_prediction_bet_count
+from ..services.poll import poll_fast_forward, poll_create, poll_phase_jobs_schedule
 from ..views.poll import PollListApi, PollCreateAPI, PollUpdateAPI, PollDeleteAPI
+from ...comment.services import comment_delete
 from ...comment.tests.factories import CommentFactory
-from ...common.tests import generate_request
+from ...common.tests import generate_request, fake
 from ...files.tests.factories import FileSegmentFactory
 from ...group.models import GroupUser
 from ...group.tests.factories import GroupFactory, GroupUserFactory, GroupTagsFactory
@@ -24,6 +30,7 @@ from ...user.models import User
 
 class PollTest(APITestCase):
     def setUp(self):
+        fake.unique.clear()  # Keeps the unique name pool from running dry in full test runs
         self.group = GroupFactory()
         self.group_tag = GroupTagsFactory(group=self.group)
         self.group_user_creator = GroupUser.objects.get(user=self.group.created_by, group=self.group)
@@ -62,6 +69,36 @@ class PollTest(APITestCase):
         self.assertEqual(response.data['results'][1]['total_proposals'], 12)
         self.assertEqual(response.data['results'][1]['total_predictions'], 15)
 
+    def test_poll_counters(self):
+        proposals = PollProposalFactory.create_batch(3, poll=self.poll_one)
+        proposals[0].delete()
+
+        PollPredictionStatementFactory.create_batch(2, poll=self.poll_one)
+        comments = CommentFactory.create_batch(4, comment_section=self.poll_one.comment_section)
+        comment_delete(fetched_by=comments[0].author_id,
+                       comment_section_id=self.poll_one.comment_section_id,
+                       comment_id=comments[0].id)
+
+        # Saving a stale instance should not overwrite the counters
+        self.poll_one.title = 'counter test'
+        self.poll_one.save()
+
+        self.poll_one.refresh_from_db()
+        self.assertEqual((self.poll_one.proposal_count,
+                          self.poll_one.prediction_count,
+                          self.poll_one.comment_count), (2, 2, 3))
+
+        Poll.objects.filter(id=self.poll_one.id).update(proposal_count=0, comment_count=0)
+        self.assertEqual(poll_counter_reconcile(), 1)
+
+        self.poll_one.refresh_from_db()
+        self.assertEqual((self.poll_one.proposal_count, self.poll_one.comment_count), (2, 3))
+
+    def test_list_polls_query_plan(self):
+        qs = poll_list(fetched_by=self.group_user_creator.user, group_id=self.group.id)
+
+        self.assertNotIn('Aggregate', qs.explain())
+
     def test_list_polls_hide_users(self):
         self.group.hide_poll_users = True
         self.group.save()
@@ -239,6 +276,129 @@ class PollTest(APITestCase):
         poll.refresh_from_db()
         self.assertEqual('vote', poll.current_phase)
 
+    def test_poll_phase_jobs(self):
+        response = generate_request(api=PollCreateAPI,
+                                    user=self.group_user_creator.user,
+                                    url_params=dict(group_id=self.group.id),
+                                    data=dict(title='test title', poll_type=4, public=True, tag=self.group_tag.id,
+                                              pinned=False, dynamic=False, allow_fast_forward=True,
+                                              **generate_poll_phase_kwargs('area_vote')))
+        self.assertEqual(response.status_code, status.HTTP_200_OK, response.data)
+
+        poll = Poll.objects.get(id=response.data)
+        jobs = {job.job: job for job in PollPhaseJob.objects.filter(poll=poll)}
+        self.assertEqual(len(jobs), 3)
+        self.assertEqual(jobs['proposal_vote_count'].due_at, poll.end_date)
+
+        # Nothing is due yet
+        self.assertEqual(poll_phase_job_sweep(), "Poll phase jobs: 0 done, 0 failed.")
+
+        # Fast forwarding moves the jobs, the area vote count becomes due
+        with self.captureOnCommitCallbacks() as callbacks:
+            poll_fast_forward(user_id=self.group_user_creator.user.id, poll_id=poll.id, phase='proposal')
+        self.assertEqual(len(callbacks), 2)  # Group feed entry update and the sweep
+
+        poll.refresh_from_db()
+        job = PollPhaseJob.objects.get(poll=poll, job='area_vote_count')
+        self.assertEqual((job.due_at, job.version), (poll.area_vote_end_date, 1))
+
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(poll_phase_job_sweep(), "Poll phase jobs: 1 done, 0 failed.")
+        self.assertTrue(any('SKIP LOCKED' in query['sql'] for query in queries))
+
+        # Done jobs are never rescheduled nor counted again
+        poll_fast_forward(user_id=self.group_user_creator.user.id, poll_id=poll.id, phase='vote')
+        job.refresh_from_db()
+        self.assertEqual((job.state, job.version), (PollPhaseJob.State.DONE, 1))
+
+        self.assertEqual(poll_phase_job_sweep(), "Poll phase jobs: 1 done, 0 failed.")  # Prediction bet count
+        self.assertEqual(poll_phase_job_sweep(), "Poll phase jobs: 0 done, 0 failed.")
+        self.assertEqual(PollPhaseJob.objects.filter(poll=poll, state=PollPhaseJob.State.PENDING).count(), 1)
+
+    def test_poll_phase_jobs_backfill(self):
+        # Polls from before the job table have no jobs, their area vote was counted by the task queued for it
+        poll = PollFactory(created_by=self.group_user_creator, allow_fast_forward=True,
+                           **generate_poll_phase_kwargs('proposal'))
+        self.assertFalse(PollPhaseJob.objects.filter(poll=poll).exists())
+
+        with mock.patch('flowback.poll.tasks.poll_area_vote_count') as area_vote_count:
+            poll_fast_forward(user_id=self.group_user_creator.user.id, poll_id=poll.id, phase='delegate_vote')
+            self.assertEqual(poll_phase_job_sweep(), "Poll phase jobs: 1 done, 0 failed.")  # Prediction bet count
+            area_vote_count.assert_not_called()
+
+        jobs = dict(PollPhaseJob.objects.filter(poll=poll).values_list('job', 'state'))
+        self.assertEqual(jobs, dict(area_vote_count=PollPhaseJob.State.DONE,
+                                    prediction_bet_count=PollPhaseJob.State.DONE,
+                                    proposal_vote_count=PollPhaseJob.State.PENDING))
+
+        # The count tasks still queued for the poll do nothing
+        self.assertEqual(poll_prediction_bet_count(poll_id=poll.id),
+                         f"Poll {poll.id} prediction bets are counted by their phase job.")
+        self.assertEqual(poll_phase_job_sweep(), "Poll phase jobs: 0 done, 0 failed.")
+
+    def test_poll_phase_job_retry(self):
+        poll = PollFactory(created_by=self.group_user_one, **generate_poll_phase_kwargs('prediction_vote'))
+        poll_phase_jobs_schedule(poll=poll)
+
+        with mock.patch('flowback.poll.tasks.poll_area_vote_count', side_effect=Exception('Count failed')):
+            self.assertEqual(poll_phase_job_sweep(max_attempts=2), "Poll phase jobs: 2 done, 1 failed.")
+
+            job = PollPhaseJob.objects.get(poll=poll, job='area_vote_count')
+            self.assertEqual((job.state, job.attempts), (PollPhaseJob.State.PENDING, 1))
+            self.assertGreater(job.due_at, timezone.now())
+
+            PollPhaseJob.objects.filter(id=job.id).update(due_at=timezone.now())
+            poll_phase_job_sweep(max_attempts=2)
+            job.refresh_from_db()
+            self.assertEqual((job.state, job.attempts), (PollPhaseJob.State.FAILED, 2))
+
+    def test_poll_phase_sweep(self):
+        polls = [PollFactory(created_by=self.group_user_one, **generate_poll_phase_kwargs('proposal'))
+                 for _ in range(3)]
+        self.assertEqual((polls[0].phase, polls[0].next_phase_at), ('proposal', polls[0].proposal_end_date))
+
+        for poll in polls:
+            poll.notification_channel.subscribe(user=self.group_user_two.user, tags=['poll_phase'])
+
+        # Simulates the area vote boundary passing since the phase was stored
+        Poll.objects.filter(id__in=[poll.id for poll in polls]).update(phase='area_vote',
+                                                                       next_phase_at=polls[0].area_vote_end_date)
+
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(poll_phase_sweep(), "3 polls changed phase.")
+        query_count = len(queries)
+
+        poll = Poll.objects.get(id=polls[0].id)
+        self.assertEqual((poll.phase, poll.next_phase_at), ('proposal', poll.proposal_end_date))
+
+        notifications = Notification.objects.filter(user=self.group_user_two.user,
+                                                    notification_object__tag='poll_phase')
+        self.assertEqual(notifications.count(), 3)
+        self.assertEqual(notifications.first().notification_object.data['current_phase'], 'Proposal')
+
+        self.assertEqual(poll_phase_sweep(), "0 polls changed phase.")
+
+        # The sweep costs the same amount of queries regardless of the amount of polls
+        Poll.objects.filter(id__in=[poll.id for poll in polls]).update(phase='area_vote',
+                                                                       next_phase_at=polls[0].area_vote_end_date)
+        for _ in range(3):
+            PollFactory(created_by=self.group_user_one, **generate_poll_phase_kwargs('proposal'))
+        Poll.objects.filter(phase='proposal').update(phase='area_vote', next_phase_at=polls[0].area_vote_end_date)
+
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(poll_phase_sweep(), "6 polls changed phase.")
+        self.assertEqual(len(queries), query_count)
+
+    def test_list_polls_phase(self):
+        PollFactory(created_by=self.group_user_one, **generate_poll_phase_kwargs('vote'))
+
+        response = generate_request(api=PollListApi, data=dict(phase='Vote'), user=self.group_user_creator.user)
+        self.assertEqual(response.data['count'], 1)
+        self.assertEqual(response.data['results'][0]['phase'], 'vote')
+
+        qs = poll_list(fetched_by=self.group_user_creator.user, group_id=None, filters=dict(phase='vote'))
+        self.assertNotIn('CASE', str(qs.query))
+
     @staticmethod
     def delete_poll(poll: Poll, user: User):
         factory = APIRequestFactory()
@@ -1,6 +1,9 @@
+import io
 import json
 import random
 
+import numpy as np
+from django.core.management import call_command
 from django.utils import timezone
 from rest_framework import status
 from rest_framework.test import APIRequestFactory, force_authenticate, APITestCase
@@ -11,6 +14,7 @@ from flowback.group.tests.factories import GroupFactory, GroupUserFactory, Group
 from flowback.group.views.tag import GroupTagsListApi
 from flowback.poll.models import Poll, PollPredictionStatement, PollPredictionStatementSegment, PollPredictionBet, \
     PollPredictionStatementVote
+from flowback.poll.selectors.backtest import poll_prediction_backtest
 from flowback.poll.services.prediction import update_poll_prediction_statement_outcomes
 from flowback.poll.tasks import poll_prediction_bet_count
 from flowback.poll.tests.factories import PollFactory, PollPredictionBetFactory, PollProposalFactory, \
@@ -423,31 +427,23 @@ class PollPredictionStatementTest(APITestCase):
     def test_poll_area_vote_count(self):
         """Test poll_area_vote_count task coverage."""
         from flowback.poll.tasks import poll_area_vote_count
-        from flowback.poll.models import PollAreaStatement, PollAreaStatementSegment, PollAreaStatementVote
+        from flowback.poll.models import PollAreaVote
 
         # Create a poll in area phase
         area_poll = PollFactory(created_by=self.user_group_creator, tag=self.poll.tag,
                                 **generate_poll_phase_kwargs('area'))
 
-        # Create area statements with different tags
+        # Add votes for two tags (more votes for tag1)
         tag1 = GroupTagsFactory()
         tag2 = GroupTagsFactory()
 
-        area_statement1 = PollAreaStatement.objects.create(poll=area_poll, created_by=self.user_group_creator)
-        area_statement2 = PollAreaStatement.objects.create(poll=area_poll, created_by=self.user_group_creator)
-
-        # Create segments linking statements to tags
-        PollAreaStatementSegment.objects.create(poll_area_statement=area_statement1, tag=tag1)
-        PollAreaStatementSegment.objects.create(poll_area_statement=area_statement2, tag=tag2)
-
-        # Add votes (more positive votes for statement1)
         for i in range(3):
             user = GroupUserFactory(group=self.group)
-            PollAreaStatementVote.objects.create(poll_area_statement=area_statement1, created_by=user, vote=True)
+            PollAreaVote.objects.create(poll=area_poll, created_by=user, tag=tag1)
 
         for i in range(1):
             user = GroupUserFactory(group=self.group)
-            PollAreaStatementVote.objects.create(poll_area_statement=area_statement2, created_by=user, vote=True)
+            PollAreaVote.objects.create(poll=area_poll, created_by=user, tag=tag2)
 
         # Test the task
         poll_area_vote_count(poll_id=area_poll.id)
@@ -456,7 +452,7 @@ class PollPredictionStatementTest(APITestCase):
         area_poll.refresh_from_db()
         self.assertEqual(area_poll.tag, tag1)
 
-        # Test case where no statements exist
+        # Test case where no votes exist
         empty_poll = PollFactory(created_by=self.user_group_creator, tag=self.poll.tag,
                                  **generate_poll_phase_kwargs('area'))
 
@@ -613,3 +609,81 @@ class PollPredictionStatementTest(APITestCase):
         # Calculate expected combined bet (average of fresh user scores converted to 0-1 scale)
         expected_combined_bet = sum([2/5, 5/5, 0/5]) / 3  # scores divided by 5, then averaged
         self.assertAlmostEqual(float(new_statement.combined_bet), expected_combined_bet, places=2)
+
+
+class PollPredictionBacktestTest(APITestCase):
+    def setUp(self):
+        self.group = GroupFactory.create()
+        self.group_user_creator = self.group.group_user_creator
+        self.tag = GroupTagsFactory(group=self.group)
+        self.predictors = GroupUserFactory.create_batch(3, group=self.group)
+
+        # Four earlier polls with a statement each, ended a day apart
+        scores = [[5, 1, 4, 0], [3, 3, 2, 4], [1, 5, None, 2]]
+        self.previous_statements = []
+        for i, vote in enumerate([True, False, True, False]):
+            poll = PollFactory(created_by=self.group_user_creator, tag=self.tag,
+                               **generate_poll_phase_kwargs('prediction_vote'))
+            offset = timezone.timedelta(days=10 - i)
+            Poll.objects.filter(id=poll.id).update(**{field: getattr(poll, field) - offset
+                                                      for field in generate_poll_phase_kwargs()})
+
+            statement = PollPredictionStatementFactory(created_by=self.group_user_creator, poll=poll)
+            PollPredictionStatement.objects.filter(id=statement.id).update(created_at=poll.start_date - offset)
+            PollPredictionStatementVoteFactory(prediction_statement=statement, created_by=self.group_user_creator,
+                                               vote=vote)
+            for predictor, predictor_scores in zip(self.predictors, scores):
+                if predictor_scores[i] is not None:
+                    PollPredictionBetFactory(prediction_statement=statement, created_by=predictor,
+                                             score=predictor_scores[i])
+
+            self.previous_statements.append(statement)
+
+        self.poll = PollFactory(created_by=self.group_user_creator, tag=self.tag,
+                                **generate_poll_phase_kwargs('prediction_vote'))
+        self.statements = PollPredictionStatementFactory.create_batch(2, created_by=self.group_user_creator,
+                                                                      poll=self.poll)
+        for statement, statement_scores in zip(self.statements, [[4, 2, 5], [1, None, 3]]):
+            for predictor, score in zip(self.predictors, statement_scores):
+                if score is not None:
+                    PollPredictionBetFactory(prediction_statement=statement, created_by=predictor, score=score)
+
+    def test_poll_prediction_backtest(self):
+        poll_prediction_bet_count(poll_id=self.poll.id)
+        stored = dict(PollPredictionStatement.objects.filter(poll=self.poll).values_list('id', 'combined_bet'))
+
+        with self.assertNumQueries(4):
+            results = poll_prediction_backtest(group_id=self.group.id)
+
+        result = results[self.tag.id]
+        replayed = dict(zip(result['statement_ids'].tolist(), result['combined_bets'].tolist()))
+        for statement_id, combined_bet in stored.items():
+            self.assertAlmostEqual(replayed[statement_id], float(combined_bet), places=6)
+
+        # The first poll had no history, its combined bet is the plain average
+        self.assertAlmostEqual(replayed[self.previous_statements[0].id], (1 + 0.6 + 0.2) / 3)
+
+        outcomes = [1, 0, 1, 0]
+        combined_bets = [replayed[x.id] for x in self.previous_statements]
+        self.assertEqual(result['replayed']['evaluated'], 4)
+        self.assertAlmostEqual(result['replayed']['imac'], 1 - abs(sum(combined_bets) - sum(outcomes)) / 4)
+        self.assertAlmostEqual(result['replayed']['brier'],
+                               sum((x - y) ** 2 for x, y in zip(combined_bets, outcomes)) / 4)
+        self.assertEqual(result['stored']['scored'], 0)
+
+        # Tags are independent, running them in worker processes gives the same results
+        other_tag = GroupTagsFactory(group=self.group)
+        Poll.objects.filter(id__in=[x.poll_id for x in self.previous_statements[2:]]).update(tag=other_tag)
+        single = poll_prediction_backtest(group_id=self.group.id)
+        parallel = poll_prediction_backtest(group_id=self.group.id, processes=2)
+        for tag_id in (self.tag.id, other_tag.id):
+            np.testing.assert_array_equal(single[tag_id]['combined_bets'], parallel[tag_id]['combined_bets'])
+
+    def test_poll_prediction_backtest_command(self):
+        stdout = io.StringIO()
+        call_command('poll_prediction_backtest', self.group.id, '--tag', self.tag.id, stdout=stdout)
+
+        lines = stdout.getvalue().splitlines()
+        self.assertEqual(len(lines), 3)
+        self.assertTrue(lines[1].split()[0] == str(self.tag.id))
+        self.assertEqual(PollPredictionStatement.objects.filter(combined_bet__isnull=False).count(), 0)
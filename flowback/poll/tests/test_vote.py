@@ -1,20 +1,31 @@
+import io
+import random
+import time
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
 from unittest import skip
 
 from django.contrib.contenttypes.models import ContentType
-from rest_framework.test import APITestCase
+from django.core.management import call_command, CommandError
+from django.db import connection, transaction, ProgrammingError
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APITestCase, APITransactionTestCase
 from rest_framework.exceptions import ValidationError
 from .factories import (PollFactory, PollProposalFactory, PollVotingFactory, PollDelegateVotingFactory,
                         PollVotingTypeCardinalFactory, PollVotingTypeForAgainstFactory)
 from .utils import generate_poll_phase_kwargs
 from ..models import PollDelegateVoting, PollVotingTypeCardinal, Poll, PollProposal, PollVoting, \
-    PollVotingTypeForAgainst
-from ..tasks import poll_proposal_vote_count
+    PollVotingTypeForAgainst, PollVotingTypeRanking, PollProposalTypeSchedule, PollResultSnapshot
+from ..services.result import poll_result_snapshot_create, poll_result_snapshot_load, poll_result_snapshot_verify
+from ..services.vote import poll_proposal_vote_update
+from ..tasks import poll_proposal_vote_count, poll_schedule_preliminary_score_reconcile, poll_counter_reconcile
 from ..views.vote import (PollProposalDelegateVoteUpdateAPI,
                           PollProposalVoteUpdateAPI,
+                          PollProposalVoteBatchUpdateAPI,
                           PollProposalVoteListAPI)
 from ...common.tests import generate_request
 from ...files.tests.factories import FileSegmentFactory
+from ...group.models import GroupUser
 from ...group.tests.factories import GroupFactory, GroupUserFactory, GroupUserDelegateFactory, GroupTagsFactory, \
     GroupUserDelegatePoolFactory, GroupUserDelegatorFactory, GroupPermissionsFactory
 from ...user.models import User
@@ -148,6 +159,91 @@ class PollVoteTest(APITestCase):
             user=user
         )
 
+    def test_vote_count_snapshot(self):
+        proposals = [self.poll_cardinal_proposal_one,
+                     self.poll_cardinal_proposal_two,
+                     self.poll_cardinal_proposal_three]
+        self.cardinal_vote_update(self.group_user_one.user, self.poll_cardinal, proposals[:2], [40, 60])
+        self.cardinal_vote_update(self.group_user_two.user, self.poll_cardinal, proposals[:2], [60, 40])
+
+        # Delegate votes are weighted by their mandate of two delegators
+        delegate = GroupUserDelegateFactory(group=self.group, group_user=self.group_user_three)
+        for delegator in GroupUserDelegatorFactory.create_batch(2, group=self.group, delegate_pool=delegate.pool):
+            delegator.tags.add(self.poll_cardinal.tag)
+
+        Poll.objects.filter(id=self.poll_cardinal.id).update(**generate_poll_phase_kwargs('delegate_vote'))
+        self.cardinal_vote_update(self.group_user_three.user, self.poll_cardinal, proposals[2:], [50], delegate=True)
+
+        Poll.objects.filter(id=self.poll_cardinal.id).update(**generate_poll_phase_kwargs('result'))
+        poll_proposal_vote_count(poll_id=self.poll_cardinal.id)
+
+        first = PollResultSnapshot.objects.get(poll=self.poll_cardinal)
+        self.assertEqual(first.scores, {str(proposals[0].id): 100, str(proposals[1].id): 100,
+                                        str(proposals[2].id): 100})
+        self.assertEqual(first.participants, 4)
+        self.assertTrue(poll_result_snapshot_verify(snapshot=first))
+
+        # Three way tie, broken the same way by every count of the same inputs
+        arrays = poll_result_snapshot_load(snapshot=first)
+        second = poll_result_snapshot_create(poll=self.poll_cardinal,
+                                             group_users=int(arrays['group_users']),
+                                             quorum=float(arrays['quorum']))
+        self.assertEqual(first.digest, second.digest)
+        self.assertEqual(first.result_proposal_id, second.result_proposal_id)
+        self.assertEqual(Poll.objects.get(id=self.poll_cardinal.id).result_id, first.result_proposal_id)
+        self.assertEqual({x.id: x.score for x in PollProposal.objects.filter(poll=self.poll_cardinal)},
+                         {int(k): v for k, v in first.scores.items()})
+
+        # Snapshots are immutable, and tampering with one shows up in verification
+        with self.assertRaises(ProgrammingError), transaction.atomic():
+            PollResultSnapshot.objects.filter(id=first.id).update(status=-first.status)
+
+        first.participants += 1
+        self.assertFalse(poll_result_snapshot_verify(snapshot=first))
+
+        stdout = io.StringIO()
+        call_command('poll_result_verify', self.poll_cardinal.id, '--all', stdout=stdout)
+        self.assertEqual(stdout.getvalue().count('OK'), 2)
+
+        PollResultSnapshot.objects.create(poll=self.poll_cardinal, data=second.data, digest=second.digest,
+                                          scores=second.scores, result_proposal_id=proposals[0].id
+                                          if second.result_proposal_id != proposals[0].id else proposals[1].id,
+                                          participants=second.participants, status=second.status)
+        with self.assertRaises(CommandError):
+            call_command('poll_result_verify', self.poll_cardinal.id, stdout=io.StringIO())
+
+    def test_vote_participant_count(self):
+        proposals = [self.poll_cardinal_proposal_one, self.poll_cardinal_proposal_two]
+        for group_user in self.group_users:
+            self.cardinal_vote_update(group_user.user, self.poll_cardinal, proposals, [10, 20])
+
+        # Saving a ballot again doesn't add a participant, clearing it removes one
+        self.cardinal_vote_update(self.group_user_one.user, self.poll_cardinal, proposals, [30, 20])
+        response = self.cardinal_vote_update(self.group_user_two.user, self.poll_cardinal, [], [])
+        self.assertEqual(response.status_code, 200, response.data)
+
+        self.poll_cardinal.refresh_from_db()
+        self.assertEqual(self.poll_cardinal.participant_count, 2)
+
+        Poll.objects.filter(id=self.poll_cardinal.id).update(participant_count=0)
+        self.assertEqual(poll_counter_reconcile(), 1)
+        self.assertEqual(Poll.objects.get(id=self.poll_cardinal.id).participant_count, 2)
+
+        # The quorum is relative to the active group users allowed to vote, read without counting them
+        GroupUserFactory(group=self.group, active=False)
+        GroupUserFactory(group=self.group, permission=GroupPermissionsFactory(author=self.group, allow_vote=False))
+
+        Poll.objects.filter(id=self.poll_cardinal.id).update(quorum=50, **generate_poll_phase_kwargs('result'))
+        with CaptureQueriesContext(connection) as queries:
+            poll_proposal_vote_count(poll_id=self.poll_cardinal.id)
+
+        self.assertFalse(any('COUNT(' in query['sql'] and 'FROM "group_groupuser"' in query['sql']
+                             for query in queries))
+
+        snapshot = PollResultSnapshot.objects.get(poll=self.poll_cardinal)
+        self.assertEqual(int(poll_result_snapshot_load(snapshot=snapshot)['group_users']), 4)
+        self.assertEqual(Poll.objects.get(id=self.poll_cardinal.id).status, 1)
+
     def test_vote_update_schedule(self):
         user = self.group_user_one.user
         proposals = [self.poll_schedule_proposal_three, self.poll_schedule_proposal_one]
@@ -259,6 +355,126 @@ class PollVoteTest(APITestCase):
         for vote in response.data['results']:
             self.assertEqual(vote['proposal'], self.poll_schedule_proposal_three.id)
 
+    def test_vote_update_cardinal_diff(self):
+        user = self.group_user_one.user
+        proposals = [self.poll_cardinal_proposal_one,
+                     self.poll_cardinal_proposal_two,
+                     self.poll_cardinal_proposal_three]
+        response = self.cardinal_vote_update(user, self.poll_cardinal, proposals, [10, 20, 30])
+        self.assertEqual(response.status_code, 200, response.data)
+
+        voting_account = PollVoting.objects.get(created_by=self.group_user_one)
+        row_ids = dict(PollVotingTypeCardinal.objects.filter(author=voting_account).values_list('proposal_id', 'id'))
+
+        # Moving a single slider writes a single row, nothing gets deleted
+        with CaptureQueriesContext(connection) as queries:
+            response = self.cardinal_vote_update(user, self.poll_cardinal, proposals, [10, 25, 30])
+            self.assertEqual(response.status_code, 200, response.data)
+
+        self.assertFalse(any(query['sql'].startswith('DELETE') for query in queries))
+        self.assertEqual(len([query for query in queries if query['sql'].startswith('INSERT')]), 1)
+
+        response = self.cardinal_vote_update(user, self.poll_cardinal, proposals[:2], [10, 40])
+        self.assertEqual(response.status_code, 200, response.data)
+
+        votes = PollVotingTypeCardinal.objects.filter(author=voting_account)
+        self.assertEqual({x.proposal_id: x.raw_score for x in votes},
+                         {proposals[0].id: 10, proposals[1].id: 40})
+        self.assertEqual({x.proposal_id: x.id for x in votes},
+                         {x.id: row_ids[x.id] for x in proposals[:2]})
+
+    def test_vote_update_ranking_diff(self):
+        poll = PollFactory(created_by=self.group_user_one, poll_type=Poll.PollType.RANKING,
+                           tag=GroupTagsFactory(group=self.group), **generate_poll_phase_kwargs('vote'))
+        proposals = [PollProposalFactory(created_by=x, poll=poll) for x in self.group_users]
+
+        def vote(order: list[PollProposal]):
+            response = generate_request(api=PollProposalVoteUpdateAPI,
+                                        data=dict(proposals=[x.id for x in order]),
+                                        url_params=dict(poll=poll.id),
+                                        user=self.group_user_one.user)
+            self.assertEqual(response.status_code, 200, response.data)
+
+            return {x.proposal_id: (x.priority, x.id) for x in PollVotingTypeRanking.objects.filter(
+                author__created_by=self.group_user_one, author__poll=poll)}
+
+        before = vote(proposals)
+        after = vote(proposals[::-1])
+
+        self.assertEqual({proposal_id: priority for proposal_id, (priority, _) in after.items()},
+                         {proposals[0].id: 1, proposals[1].id: 2, proposals[2].id: 3})
+
+        # The middle proposal kept its priority and therefore its row
+        self.assertEqual(after[proposals[1].id], before[proposals[1].id])
+
+    def test_vote_update_schedule_preliminary_score(self):
+        proposals = [self.poll_schedule_proposal_one,
+                     self.poll_schedule_proposal_two,
+                     self.poll_schedule_proposal_three]
+
+        def preliminary_scores():
+            return [PollProposalTypeSchedule.objects.get(proposal=x).preliminary_score for x in proposals]
+
+        self.schedule_vote_update(self.group_user_one.user, self.poll_schedule, proposals[:2])
+        self.schedule_vote_update(self.group_user_two.user, self.poll_schedule, proposals[1:2])
+        self.assertEqual(preliminary_scores(), [1, 2, 0])
+
+        self.schedule_vote_update(self.group_user_one.user, self.poll_schedule, proposals[1:])
+        self.assertEqual(preliminary_scores(), [0, 2, 1])
+
+        # Removing the vote altogether releases its proposals as well
+        self.schedule_vote_update(self.group_user_one.user, self.poll_schedule, [])
+        self.assertEqual(preliminary_scores(), [0, 1, 0])
+        self.assertFalse(PollVoting.objects.filter(created_by=self.group_user_one, poll=self.poll_schedule).exists())
+
+    def test_vote_schedule_preliminary_score_reconcile(self):
+        proposals = [self.poll_schedule_proposal_one, self.poll_schedule_proposal_two]
+        self.schedule_vote_update(self.group_user_one.user, self.poll_schedule, proposals)
+        self.schedule_vote_update(self.group_user_two.user, self.poll_schedule, proposals[1:])
+
+        # Cascading deletes bypass the counters
+        PollVoting.objects.filter(created_by=self.group_user_two).delete()
+        PollProposalTypeSchedule.objects.filter(proposal=self.poll_schedule_proposal_three).update(preliminary_score=5)
+
+        self.assertEqual(poll_schedule_preliminary_score_reconcile(), 2)
+        self.assertEqual(poll_schedule_preliminary_score_reconcile(), 0)
+        self.assertEqual([PollProposalTypeSchedule.objects.get(proposal=x).preliminary_score
+                          for x in self.poll_schedule.pollproposal_set.order_by('id')], [1, 1, 0])
+
+    def test_vote_batch_update(self):
+        def batch_update(user: User, ballots: list[dict]):
+            return generate_request(api=PollProposalVoteBatchUpdateAPI,
+                                    data=dict(ballots=ballots),
+                                    url_params=dict(poll=self.poll_schedule.id),
+                                    user=user)
+
+        ballots = [dict(group_user_id=self.group_user_two.id,
+                        proposals=[self.poll_schedule_proposal_one.id, self.poll_schedule_proposal_two.id]),
+                   dict(group_user_id=self.group_user_three.id,
+                        proposals=[self.poll_schedule_proposal_two.id])]
+
+        response = batch_update(self.group_user_one.user, ballots)
+        self.assertEqual(response.status_code, 403, response.data)
+
+        response = batch_update(self.group_user_creator.user, ballots)
+        self.assertEqual(response.status_code, 200, response.data)
+
+        self.assertEqual(set(PollVotingTypeForAgainst.objects.filter(author__created_by=self.group_user_two)
+                             .values_list('proposal_id', flat=True)),
+                         {self.poll_schedule_proposal_one.id, self.poll_schedule_proposal_two.id})
+        self.assertEqual(PollProposalTypeSchedule.objects.get(proposal=self.poll_schedule_proposal_two
+                                                              ).preliminary_score, 2)
+
+        # A single invalid ballot rejects the whole batch
+        outsider = GroupUserFactory()
+        for invalid in (dict(group_user_id=self.group_user_three.id, proposals=[self.poll_cardinal_proposal_one.id]),
+                        dict(group_user_id=outsider.id, proposals=[self.poll_schedule_proposal_one.id])):
+            response = batch_update(self.group_user_creator.user,
+                                    [dict(group_user_id=self.group_user_two.id, proposals=[]), invalid])
+            self.assertEqual(response.status_code, 400, response.data)
+
+        self.assertEqual(PollVoting.objects.filter(poll=self.poll_schedule).count(), 2)
+
     @skip("Only test separately, it takes a lot of time.")
     def test_hundreds_of_polls_vote_count(self):
         """Test poll_proposal_vote_count with hundreds of Schedule and Cardinal polls with proposals, votes and delegate votes"""
@@ -693,3 +909,94 @@ class PollDelegateVoteTest(APITestCase):
         proposal_scores = {vote.proposal_id: vote.raw_score for vote in delegate_vote_cardinal}
         self.assertEqual(proposal_scores[proposal_one.id], 80)
         self.assertEqual(proposal_scores[proposal_two.id], 40)
+
+
+class PollVoteChurnBenchmarkTest(APITransactionTestCase):
+    voters = 8
+    saves = 25
+    proposals = 10
+
+    def test_vote_churn_benchmark(self):
+        """Voters autosaving a cardinal ballot concurrently, every save moves a single slider"""
+        group = GroupFactory()
+        group_users = GroupUserFactory.create_batch(self.voters, group=group)
+        poll = PollFactory(created_by=group_users[0], poll_type=Poll.PollType.CARDINAL,
+                           tag=GroupTagsFactory(group=group), **generate_poll_phase_kwargs('vote'))
+        proposals = [PollProposalFactory(created_by=group_users[0], poll=poll).id for _ in range(self.proposals)]
+
+        def autosave(group_user: GroupUser) -> list[int]:
+            rng = random.Random(group_user.id)
+            scores = [rng.randint(0, 100) for _ in proposals]
+
+            try:
+                for _ in range(self.saves):
+                    scores[rng.randrange(len(scores))] = rng.randint(0, 100)
+                    poll_proposal_vote_update(user_id=group_user.user_id,
+                                              poll_id=poll.id,
+                                              data=dict(proposals=proposals, scores=list(scores)))
+                return scores
+
+            finally:
+                connection.close()
+
+        def sequence_value() -> int:
+            with connection.cursor() as cursor:
+                cursor.execute("SELECT nextval(pg_get_serial_sequence(%s, 'id'))",
+                               [PollVotingTypeCardinal._meta.db_table])
+                return cursor.fetchone()[0]
+
+        start_id = sequence_value()
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=self.voters) as executor:
+            ballots = dict(zip(group_users, executor.map(autosave, group_users)))
+
+        elapsed = time.perf_counter() - start
+        rows_written = sequence_value() - start_id - 1
+        rows_rewritten = self.voters * self.saves * self.proposals  # Deleting and recreating the ballot every save
+
+        print(f'{self.voters} voters, {self.voters * self.saves} saves: {elapsed * 1000:.2f}ms, '
+              f'{rows_written} rows written ({rows_rewritten} rows when rewriting whole ballots)')
+
+        for group_user, scores in ballots.items():
+            self.assertEqual(list(PollVotingTypeCardinal.objects.filter(author__created_by=group_user)
+                                  .order_by('proposal_id').values_list('raw_score', flat=True)),
+                             [score for _, score in sorted(zip(proposals, scores))])
+
+        self.assertLessEqual(rows_written, self.voters * (self.proposals + self.saves))
+
+
+class PollSchedulePreliminaryScoreStressTest(APITransactionTestCase):
+    voters = 8
+    saves = 15
+    proposals = 6
+
+    def test_preliminary_score_concurrent_votes(self):
+        """Voters concurrently toggle overlapping dates, two sessions per voter, the counters have to add up"""
+        group = GroupFactory()
+        group_users = GroupUserFactory.create_batch(self.voters, group=group)
+        poll = PollFactory(created_by=group_users[0], poll_type=Poll.PollType.SCHEDULE, dynamic=True,
+                           tag=GroupTagsFactory(group=group), **generate_poll_phase_kwargs('vote'))
+        proposals = [PollProposalFactory(created_by=group_users[0], poll=poll).id for _ in range(self.proposals)]
+
+        def session(args: tuple[GroupUser, int]):
+            group_user, seed = args
+            rng = random.Random(seed)
+
+            try:
+                for _ in range(self.saves):
+                    poll_proposal_vote_update(user_id=group_user.user_id,
+                                              poll_id=poll.id,
+                                              data=dict(proposals=rng.sample(proposals, rng.randint(0, 4))))
+
+            finally:
+                connection.close()
+
+        with ThreadPoolExecutor(max_workers=self.voters * 2) as executor:
+            list(executor.map(session, [(group_user, seed) for seed, group_user in enumerate(group_users * 2)]))
+
+        for proposal_id in proposals:
+            self.assertEqual(PollProposalTypeSchedule.objects.get(proposal_id=proposal_id).preliminary_score,
+                             PollVotingTypeForAgainst.objects.filter(proposal_id=proposal_id,
+                                                                     author__isnull=False).count())
+
+        self.assertEqual(poll_schedule_preliminary_score_reconcile(), 0)
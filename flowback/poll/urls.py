@@ -6,14 +6,16 @@ from .views.poll import (PollListApi,
                          PollUpdateAPI,
                          PollDeleteAPI,
                          PollDelegatesListAPI, PollPhaseTemplateListAPI, PollPhaseTemplateCreateAPI,
-                         PollPhaseTemplateUpdateAPI, PollPhaseTemplateDeleteAPI, PollNotificationSubscribeAPI)
+                         PollPhaseTemplateUpdateAPI, PollPhaseTemplateDeleteAPI, PollNotificationSubscribeAPI,
+                         PollExportAPI)
 from .views.proposal import PollProposalListAPI, PollProposalDeleteAPI, PollProposalCreateAPI
 from .views.vote import (PollProposalVoteListAPI,
                          PollProposalVoteUpdateAPI,
+                         PollProposalVoteBatchUpdateAPI,
                          PollProposalDelegateVoteUpdateAPI,
                          DelegatePollVoteListAPI)
 from .views.comment import PollCommentListAPI, PollCommentCreateAPI, PollCommentUpdateAPI, PollCommentDeleteAPI, \
-    PollCommentVoteAPI, PollCommentAncestorListAPI
+    PollCommentVoteAPI, PollCommentAncestorListAPI, PollCommentTreeListAPI, PollCommentReplyListAPI
 from .views.prediction import (PollPredictionStatementListAPI,
                                PollPredictionBetListAPI,
                                PollPredictionStatementCreateAPI,
@@ -39,6 +41,7 @@ poll_patterns = [
     path('<int:poll_id>/fast_forward', PollFastForwardAPI.as_view(), name='poll_fast_forward'),
     path('<int:poll>/delete', PollDeleteAPI.as_view(), name='poll_delete'),
     path('<int:poll_id>/subscribe', PollNotificationSubscribeAPI.as_view(), name='poll_subscribe'),
+    path('<int:poll>/export', PollExportAPI.as_view(), name='poll_export'),
 
     path('<int:poll>/proposals', PollProposalListAPI.as_view(), name='poll_proposals'),
     path('<int:poll>/proposal/create', PollProposalCreateAPI.as_view(), name='poll_proposal_create'),
@@ -46,6 +49,8 @@ poll_patterns = [
 
     path('<int:poll>/proposal/votes', PollProposalVoteListAPI.as_view(), name='poll_proposal_votes'),
     path('<int:poll>/proposal/vote/update', PollProposalVoteUpdateAPI.as_view(), name='poll_proposal_vote_update'),
+    path('<int:poll>/proposal/vote/batch/update', PollProposalVoteBatchUpdateAPI.as_view(),
+         name='poll_proposal_vote_batch_update'),
     path('<int:poll>/proposal/vote/delegate/update', PollProposalDelegateVoteUpdateAPI.as_view(),
          name='poll_proposal_delegate_vote_update'),
     path('<int:poll>/delegates', PollDelegatesListAPI.as_view(), name='poll_delegates'),
@@ -54,6 +59,10 @@ poll_patterns = [
     path('<int:poll_id>/comment/<int:comment_id>/ancestor',
          PollCommentAncestorListAPI.as_view(),
          name='poll_comment_ancestor_list'),
+    path('<int:poll_id>/comment/tree', PollCommentTreeListAPI.as_view(), name='poll_comment_tree_list'),
+    path('<int:poll_id>/comment/<int:comment_id>/replies',
+         PollCommentReplyListAPI.as_view(),
+         name='poll_comment_reply_list'),
     path('<int:poll_id>/comment/create', PollCommentCreateAPI.as_view(), name='poll_comment_create'),
     path('<int:poll_id>/comment/<int:comment_id>/update', PollCommentUpdateAPI.as_view(), name='poll_comment_update'),
     path('<int:poll_id>/comment/<int:comment_id>/delete', PollCommentDeleteAPI.as_view(), name='poll_comment_delete'),
@@ -5,8 +5,8 @@ from rest_framework.views import APIView
 
 from flowback.common.pagination import LimitOffsetPagination, get_paginated_response
 from flowback.group.serializers import GroupUserSerializer
-from flowback.poll.selectors.area import poll_area_statement_list
-from flowback.poll.services.area import poll_area_statement_create, poll_area_statement_vote_update
+from flowback.poll.selectors.area import poll_area_vote_list
+from flowback.poll.services.area import poll_area_vote_update
 
 
 @extend_schema(tags=['poll/area'])
@@ -16,29 +16,28 @@ class PollAreaStatementListAPI(APIView):
         max_limit = 50
 
     class FilterSerializer(serializers.Serializer):
-        order_by = serializers.ChoiceField(choices=['created_at', '-created_at', 'score', '-score'],
+        order_by = serializers.ChoiceField(choices=['created_at_asc', 'created_at_desc', 'score_asc', 'score_desc'],
                                            required=False)
         user_vote = serializers.BooleanField(required=False, allow_null=True, default=None)
         tag = serializers.CharField(required=False)
 
     class OutputSerializer(serializers.Serializer):
-        class SegmentSerializer(serializers.Serializer):
-            tag_name = serializers.CharField(source='tag.name')
-
-        user_vote = serializers.BooleanField(allow_null=True)
-        tags = SegmentSerializer(many=True, source='pollareastatementsegment_set')
+        tag_id = serializers.IntegerField(source='id')
+        tag_name = serializers.CharField(source='name')
+        score = serializers.IntegerField(help_text='Votes for the tag so far')
+        user_vote = serializers.BooleanField()
 
     def get(self, request, poll_id: int):
         serializer = self.FilterSerializer(data=request.query_params)
         serializer.is_valid(raise_exception=True)
 
-        area_statements = poll_area_statement_list(user=request.user,
-                                                   poll_id=poll_id,
-                                                   filters=serializer.validated_data)
+        area_votes = poll_area_vote_list(user=request.user,
+                                         poll_id=poll_id,
+                                         filters=serializer.validated_data)
 
         return get_paginated_response(pagination_class=self.Pagination,
                                       serializer_class=self.OutputSerializer,
-                                      queryset=area_statements,
+                                      queryset=area_votes,
                                       request=request,
                                       view=self)
 
@@ -53,11 +52,12 @@ class PollAreaVoteAPI(APIView):
         serializer = self.InputSerializer(data=request.data)
         serializer.is_valid(raise_exception=True)
 
-        poll_area_statement = poll_area_statement_vote_update(user_id=request.user.id,
-                                                              poll_id=poll_id,
-                                                              **serializer.validated_data)
+        poll_area_vote = poll_area_vote_update(user_id=request.user.id,
+                                               poll_id=poll_id,
+                                               **serializer.validated_data)
 
-        return Response(status=status.HTTP_201_CREATED, data=poll_area_statement.id)
+        # Responds with the voted tag id, area statements (and their ids) no longer exist
+        return Response(status=status.HTTP_201_CREATED, data=poll_area_vote.tag_id)
 
 # @extend_schema(tags=['poll'])
 # class PollAreaStatementDeleteAPI(APIView):
@@ -1,6 +1,9 @@
 from drf_spectacular.utils import extend_schema
 
-from ..selectors.comment import poll_comment_list, poll_comment_ancestor_list
+from ..selectors.comment import (poll_comment_list,
+                                 poll_comment_ancestor_list,
+                                 poll_comment_tree_list,
+                                 poll_comment_reply_list)
 
 from ..services.comment import (poll_comment_create,
                                 poll_comment_update,
@@ -12,7 +15,9 @@ from flowback.comment.views import (CommentListAPI,
                                     CommentUpdateAPI,
                                     CommentDeleteAPI,
                                     CommentVoteAPI,
-                                    CommentAncestorListAPI)
+                                    CommentAncestorListAPI,
+                                    CommentTreeListAPI,
+                                    CommentReplyListAPI)
 
 
 @extend_schema(tags=['poll/comment'])
@@ -25,6 +30,16 @@ class PollCommentAncestorListAPI(CommentAncestorListAPI):
     lazy_action = poll_comment_ancestor_list
 
 
+@extend_schema(tags=['poll/comment'])
+class PollCommentTreeListAPI(CommentTreeListAPI):
+    lazy_action = poll_comment_tree_list
+
+
+@extend_schema(tags=['poll/comment'])
+class PollCommentReplyListAPI(CommentReplyListAPI):
+    lazy_action = poll_comment_reply_list
+
+
 @extend_schema(tags=['poll/comment'])
 class PollCommentCreateAPI(CommentCreateAPI):
     lazy_action = poll_comment_create
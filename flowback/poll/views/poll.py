@@ -1,15 +1,18 @@
 from drf_spectacular.utils import extend_schema
 
 # Create your views here.
+from django.conf import settings
+from django.http import StreamingHttpResponse
 from rest_framework import serializers, status
 from rest_framework.views import APIView, Response
 
 from flowback.common.pagination import LimitOffsetPagination, get_paginated_response
-from flowback.files.serializers import FileCollectionCreateSerializerMixin, FileCollectionListSerializerMixin
+from flowback.files.serializers import ImageDerivativeField, FileCollectionCreateSerializerMixin, FileCollectionListSerializerMixin
 
 from flowback.group.serializers import GroupUserSerializer
 from flowback.notification.views import NotificationSubscribeTemplateAPI
 from flowback.poll.models import Poll, PollProposal
+from flowback.poll.selectors.export import poll_export, POLL_EXPORT_FORMATS, POLL_EXPORT_TABLES
 from flowback.poll.selectors.poll import poll_list, poll_phase_template_list
 from flowback.poll.selectors.proposal import poll_user_schedule_list
 from flowback.poll.selectors.vote import poll_delegates_list
@@ -72,7 +75,7 @@ class PollListApi(APIView):
         group_joined = serializers.BooleanField(required=False)
         group_id = serializers.IntegerField(source='created_by.group_id')
         group_name = serializers.CharField(source='created_by.group.name')
-        group_image = serializers.ImageField(source='created_by.group.image')
+        group_image = ImageDerivativeField(size=64, source='created_by.group.image')
         tag_id = serializers.IntegerField(allow_null=True)
         tag_name = serializers.CharField(source='tag.name', allow_null=True)
         hide_poll_users = serializers.BooleanField(source='created_by.group.hide_poll_users')
@@ -80,6 +83,9 @@ class PollListApi(APIView):
         total_comments = serializers.IntegerField()
         total_proposals = serializers.IntegerField()
         total_predictions = serializers.IntegerField()
+        total_participants = serializers.IntegerField(help_text='Group users who have voted so far')
+        group_voters = serializers.IntegerField(source='created_by.group.voter_count',
+                                                help_text='Group users allowed to vote, the base of the quorum')
         work_group_id = serializers.IntegerField(allow_null=True)
         work_group_name = serializers.CharField(source='work_group.name', allow_null=True)
 
@@ -125,6 +131,8 @@ class PollListApi(APIView):
                       'total_comments',
                       'total_proposals',
                       'total_predictions',
+                      'total_participants',
+                      'group_voters',
                       'quorum',
                       'status',
                       'status_prediction',
@@ -163,6 +171,9 @@ class PollCreateAPI(APIView):
         vote_end_date = serializers.DateTimeField(required=False)
         end_date = serializers.DateTimeField(required=False)
         work_group_id = serializers.IntegerField(required=False)
+        attachments_upload_ids = serializers.ListField(child=serializers.IntegerField(), required=False,
+                                                       max_length=settings.FLOWBACK_FILE_COLLECTION_LIMIT,
+                                                       help_text='Ids of completed file uploads to attach')
 
         class Meta:
             model = Poll
@@ -185,7 +196,8 @@ class PollCreateAPI(APIView):
                       'pinned',
                       'dynamic',
                       'quorum',
-                      'work_group_id')
+                      'work_group_id',
+                      'attachments_upload_ids')
 
     def post(self, request, group_id: int):
         serializer = self.InputSerializer(data=request.data)
@@ -201,6 +213,9 @@ class PollUpdateAPI(APIView):
         pinned = serializers.BooleanField(required=False, allow_null=True, default=None)
         schedule_poll_meeting_link = serializers.CharField(required=False, allow_null=True)
         description = serializers.CharField(required=False)
+        attachments_upload_ids = serializers.ListField(child=serializers.IntegerField(), required=False,
+                                                       max_length=settings.FLOWBACK_FILE_COLLECTION_LIMIT,
+                                                       help_text='Ids of completed file uploads to attach')
 
     def post(self, request, poll: int):
         serializer = self.InputSerializer(data=request.data)
@@ -392,3 +407,30 @@ class PollPhaseTemplateDeleteAPI(APIView):
 @extend_schema(tags=['poll'], description=Poll.notification_docs())
 class PollNotificationSubscribeAPI(NotificationSubscribeTemplateAPI):
     lazy_action = poll_notification_subscribe
+
+
+@extend_schema(tags=['poll'])
+class PollExportAPI(APIView):
+    content_types = dict(csv='text/csv', jsonl='application/x-ndjson', npz='application/octet-stream')
+
+    class FilterSerializer(serializers.Serializer):
+        # Not "format", DRF reserves it for picking a renderer
+        export_format = serializers.ChoiceField(POLL_EXPORT_FORMATS, default='csv')
+        table = serializers.ChoiceField(POLL_EXPORT_TABLES, required=False,
+                                        help_text='Required for csv, jsonl exports every table when left out')
+
+    def get(self, request, poll: int):
+        serializer = self.FilterSerializer(data=request.query_params)
+        serializer.is_valid(raise_exception=True)
+        export_format, table = serializer.validated_data['export_format'], serializer.validated_data.get('table')
+
+        content = poll_export(fetched_by=request.user,
+                              poll_id=poll,
+                              export_format=export_format,
+                              tables=[table] if table else None)
+
+        response = StreamingHttpResponse(content, content_type=self.content_types[export_format])
+        response['Content-Disposition'] = (f'attachment; filename="poll_{poll}'
+                                           f'{f"_{table}" if table and export_format != "npz" else ""}'
+                                           f'.{export_format}"')
+        return response
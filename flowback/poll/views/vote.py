@@ -11,7 +11,8 @@ from flowback.poll.models import Poll, PollVotingTypeRanking, PollVotingTypeForA
 
 from ..selectors.vote import poll_vote_list, delegate_poll_vote_list
 from ..serializers import PollSerializer
-from ..services.vote import poll_proposal_vote_update, poll_proposal_delegate_vote_update
+from ..services.vote import poll_proposal_vote_update, poll_proposal_delegate_vote_update, \
+    poll_proposal_vote_batch_update
 from ...group.serializers import GroupUserSerializer
 
 
@@ -208,6 +209,24 @@ class PollProposalVoteUpdateAPI(APIView):
         return Response(status=status.HTTP_200_OK)
 
 
+@extend_schema(tags=['poll/vote'])
+class PollProposalVoteBatchUpdateAPI(APIView):
+    class InputSerializer(serializers.Serializer):
+        class BallotSerializer(serializers.Serializer):
+            group_user_id = serializers.IntegerField()
+            proposals = serializers.ListField(child=serializers.IntegerField())
+            scores = serializers.ListField(child=serializers.IntegerField(), required=False,
+                                           help_text='Cardinal polls only')
+
+        ballots = BallotSerializer(many=True, allow_empty=False)
+
+    def post(self, request, poll: int):
+        serializer = self.InputSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        poll_proposal_vote_batch_update(user_id=request.user.id, poll_id=poll, **serializer.validated_data)
+        return Response(status=status.HTTP_200_OK)
+
+
 # TODO change serializer based upon poll type
 @extend_schema(tags=['poll/vote'])
 class PollProposalDelegateVoteUpdateAPI(APIView):
@@ -0,0 +1,21 @@
+from rest_framework.authentication import BaseAuthentication
+from rest_framework.exceptions import AuthenticationFailed
+
+from flowback.schedule.models import ScheduleCalendarToken
+
+
+class ScheduleCalendarTokenAuthentication(BaseAuthentication):
+    """
+    Authenticates by the calendar feed token in the URL (the token URL kwarg), for calendar clients that can't send
+    the Authorization header.
+    """
+    def authenticate(self, request):
+        key = request.parser_context['kwargs'].get('token')
+        if key is None:
+            return None
+
+        token = ScheduleCalendarToken.objects.select_related('user').filter(key=key).first()
+        if token is None or not token.user.is_active:
+            raise AuthenticationFailed('Invalid calendar token')
+
+        return token.user, token
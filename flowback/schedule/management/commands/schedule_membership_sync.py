@@ -0,0 +1,30 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from flowback.schedule.models import Schedule
+from flowback.schedule.tasks import schedule_membership_sync
+
+
+class Command(BaseCommand):
+    help = 'Syncs the users of schedules with the members of the group or work group they belong to'
+
+    def add_arguments(self, parser):
+        parser.add_argument('schedule_ids', type=int, nargs='*', help='Schedules to sync, defaults to every schedule')
+        parser.add_argument('--batch-size', type=int, default=1000, help='Users added or removed at a time')
+        parser.add_argument('--enqueue', action='store_true', help='Sync in Celery workers instead of in-process')
+
+    def handle(self, *args, schedule_ids, batch_size, enqueue, **options):
+        schedules = Schedule.objects.order_by('id')
+        if schedule_ids:
+            schedules = schedules.filter(id__in=schedule_ids)
+
+            if missing := set(schedule_ids) - set(schedules.values_list('id', flat=True)):
+                raise CommandError(f'Schedule(s) {", ".join(map(str, sorted(missing)))} do not exist')
+
+        for schedule_id in schedules.values_list('id', flat=True).iterator():
+            if enqueue:
+                schedule_membership_sync.delay(schedule_id=schedule_id, batch_size=batch_size)
+                self.stdout.write(f'Schedule {schedule_id}: enqueued')
+                continue
+
+            self.stdout.write(f'Schedule {schedule_id}: '
+                              f'{schedule_membership_sync(schedule_id=schedule_id, batch_size=batch_size)}')
@@ -0,0 +1,33 @@
+# Generated by Django 4.2.17 on 2026-10-19 08:36
+
+from django.db import migrations, models
+
+
+def schedule_recurring_events(apps, schema_editor):
+    ScheduleEvent = apps.get_model('schedule', 'ScheduleEvent')
+    PeriodicTask = apps.get_model('django_celery_beat', 'PeriodicTask')
+
+    # schedule_event_sweep skips occurrences that already ended, starting from the first one is enough
+    ScheduleEvent.objects.filter(repeat_frequency__isnull=False).update(next_occurrence_at=models.F('start_date'))
+    PeriodicTask.objects.filter(name__startswith='schedule_event_', task='schedule.tasks.event_notify').delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('schedule', '0021_alter_scheduleevent_description_and_more'),
+        ('django_celery_beat', '0018_improve_crontab_helptext'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='scheduleevent',
+            name='next_occurrence_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddIndex(
+            model_name='scheduleevent',
+            index=models.Index(condition=models.Q(('active', True), ('next_occurrence_at__isnull', False)), fields=['next_occurrence_at'], name='schedule_event_next_occur_idx'),
+        ),
+        migrations.RunPython(schedule_recurring_events, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,27 @@
+# Generated by Django 4.2.17 on 2026-10-19 08:43
+
+from django.db import migrations, models
+
+
+def delete_duplicate_event_subscriptions(apps, schema_editor):
+    ScheduleEventSubscription = apps.get_model('schedule', 'ScheduleEventSubscription')
+
+    # Keeps the latest subscription of every user to an event
+    latest = (ScheduleEventSubscription.objects.values('event_id', 'schedule_user_id')
+              .annotate(latest_id=models.Max('id')).values_list('latest_id', flat=True))
+    ScheduleEventSubscription.objects.exclude(id__in=latest).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('schedule', '0022_scheduleevent_next_occurrence_at'),
+    ]
+
+    operations = [
+        migrations.RunPython(delete_duplicate_event_subscriptions, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='scheduleeventsubscription',
+            constraint=models.UniqueConstraint(fields=('event', 'schedule_user'), name='unique_schedule_event_subscription'),
+        ),
+    ]
@@ -0,0 +1,58 @@
+# Generated by Django 4.2.17 on 2026-10-19 09:01
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+import django.utils.timezone
+from itertools import batched
+
+
+def populate_calendar_entries(apps, schema_editor):
+    ScheduleEvent = apps.get_model('schedule', 'ScheduleEvent')
+    ScheduleCalendarEntry = apps.get_model('schedule', 'ScheduleCalendarEntry')
+    now = django.utils.timezone.now()
+
+    rows = (ScheduleEvent.objects.filter(schedule__scheduleuser__isnull=False)
+            .values_list('schedule__scheduleuser__user_id', 'schedule__scheduleuser__id',
+                         'id', 'start_date', 'end_date', 'repeat_frequency'))
+
+    for chunk in batched(rows.iterator(chunk_size=2000), 2000):
+        ScheduleCalendarEntry.objects.bulk_create([
+            ScheduleCalendarEntry(user_id=user_id,
+                                  schedule_user_id=schedule_user_id,
+                                  event_id=event_id,
+                                  start_date=start_date,
+                                  until=None if repeat_frequency else end_date or start_date,
+                                  updated_at=now)
+            for user_id, schedule_user_id, event_id, start_date, end_date, repeat_frequency in chunk])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('schedule', '0023_scheduleeventsubscription_unique'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ScheduleCalendarEntry',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('start_date', models.DateTimeField()),
+                ('until', models.DateTimeField(blank=True, null=True)),
+                ('updated_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('event', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='schedule.scheduleevent')),
+                ('schedule_user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='schedule.scheduleuser')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['user', 'until', 'start_date'], name='schedule_calendar_window_idx')],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='schedulecalendarentry',
+            constraint=models.UniqueConstraint(fields=('schedule_user', 'event'), name='unique_schedule_calendar_entry'),
+        ),
+        migrations.RunPython(populate_calendar_entries, migrations.RunPython.noop),
+    ]
@@ -1,8 +1,10 @@
+import calendar
 import datetime
-import json
+import secrets
+from contextvars import ContextVar
+from itertools import batched
 
 import pgtrigger
-from celery.schedules import crontab
 from django.contrib.contenttypes.fields import GenericForeignKey, GenericRelation
 from django.contrib.contenttypes.models import ContentType
 from django.contrib.postgres.fields import ArrayField
@@ -10,14 +12,16 @@ from django.db import models, transaction
 from django.db.models import Q
 from django.db.models.signals import post_save, pre_delete
 from django.utils import timezone
-from django_celery_beat.models import PeriodicTask, CrontabSchedule
 from rest_framework.exceptions import ValidationError
 
 from flowback.common.models import BaseModel
 from flowback.common.validators import FieldNotBlankValidator
 from django.utils.translation import gettext_lazy as _
 
-from flowback.notification.models import NotifiableModel, NotificationObject
+from flowback.notification.models import NotifiableModel, NotificationObject, NotificationChannel
+
+# Set while event subscriptions are deleted in bulk, their notification subscriptions are already gone by then
+_bulk_unsubscribing = ContextVar('schedule_event_bulk_unsubscribing', default=False)
 
 
 class Schedule(BaseModel):
@@ -86,6 +90,31 @@ class Schedule(BaseModel):
 
         return None
 
+    def add_users(self, user_ids: list[int], batch_size: int = 1000) -> int:
+        """
+        Add many users to schedule at once, users that are already added are skipped
+        :param user_ids: Users to be added
+        :param batch_size: Users inserted per statement
+        :return: Amount of users added
+        """
+        added = 0
+        for chunk in batched(dict.fromkeys(user_ids), batch_size):
+            existing = set(ScheduleUser.objects.filter(schedule=self, user_id__in=chunk)
+                           .values_list('user_id', flat=True))
+            schedule_users = [ScheduleUser(schedule=self, user_id=user_id)
+                              for user_id in chunk if user_id not in existing]
+
+            ScheduleUser.objects.bulk_create(schedule_users, ignore_conflicts=True)
+            if schedule_users:
+                ScheduleCalendarEntry.populate(
+                    schedule_user_ids=ScheduleUser.objects.filter(schedule=self,
+                                                                  user_id__in=[s.user_id for s in schedule_users])
+                    .values('id'))
+
+            added += len(schedule_users)
+
+        return added
+
     def remove_user(self, user, raise_exception: bool = False) -> None:
         """
         Remove user from schedule
@@ -102,6 +131,30 @@ class Schedule(BaseModel):
 
             return None
 
+    def remove_users(self, user_ids: list[int], batch_size: int = 1000) -> int:
+        """
+        Remove many users from schedule at once, along with their tag and event subscriptions
+        :param user_ids: Users to be removed
+        :param batch_size: Users removed per transaction
+        :return: Amount of users removed
+        """
+        removed = 0
+        for chunk in batched(user_ids, batch_size):
+            schedule_users = ScheduleUser.objects.filter(schedule=self, user_id__in=chunk)
+
+            with transaction.atomic():
+                ScheduleEventSubscription.bulk_unsubscribe(
+                    ScheduleEventSubscription.objects.filter(schedule_user__in=schedule_users))
+
+                token = _bulk_unsubscribing.set(True)
+                try:
+                    removed += schedule_users.delete()[1].get(ScheduleUser._meta.label, 0)
+
+                finally:
+                    _bulk_unsubscribing.reset(token)
+
+        return removed
+
     def subscribe_new_tags(self, user, reminders: list[int] = None):
         """
         Subscribes to new tags
@@ -179,11 +232,17 @@ class Schedule(BaseModel):
         with transaction.atomic():
             events = ScheduleEvent.objects.filter(id__in=event_ids, schedule=self)
 
-            if len(event_ids) > events.count():
+            if len(event_ids) > len(events):
                 raise ValidationError("One or more events does not exist.")
 
-            for event in events:
-                event.event_subscribe(user, user_tags, locked, reminders)
+            if not all(event.active and event.is_live for event in events):
+                raise ValidationError("Event is not active or has already ended.")
+
+            schedule_user = ScheduleUser.objects.get(schedule=self, user=user)
+            ScheduleEventSubscription.bulk_subscribe(event_ids=[event.id for event in events],
+                                                     schedule_users={schedule_user.id: reminders},
+                                                     locked=locked,
+                                                     tags=user_tags)
 
     def unsubscribe_events(self, user, event_ids: list[int]) -> None:
         """
@@ -194,9 +253,10 @@ class Schedule(BaseModel):
         :return: None
         """
         with transaction.atomic():
-            events = ScheduleEvent.objects.filter(id__in=event_ids, schedule=self)
-            for event in events:
-                event.event_unsubscribe(user)
+            ScheduleEventSubscription.bulk_unsubscribe(
+                ScheduleEventSubscription.objects.filter(event__schedule=self,
+                                                         event_id__in=event_ids,
+                                                         schedule_user__user=user))
 
     @classmethod
     def post_save(cls, instance, created, *args, **kwargs):
@@ -215,17 +275,54 @@ class ScheduleTag(BaseModel, NotifiableModel):
     schedule = models.ForeignKey(Schedule, on_delete=models.CASCADE)
     name = models.CharField(max_length=100, validators=[FieldNotBlankValidator])
 
+    @property
+    def upcoming_events(self):
+        """Active events of the tag that have yet to end"""
+        return self.scheduleevent_set.filter(Q(start_date__gte=timezone.now())
+                                             | Q(end_date__isnull=True)
+                                             | Q(end_date__gt=timezone.now()), active=True)
+
+    def fan_out(self, batch_size: int = 1000) -> int:
+        """
+        Subscribes every schedule user following new tags to the tag (and its upcoming events) with their reminders,
+        batch_size users at a time.
+        :return: Amount of users subscribed
+        """
+        schedule_users = ScheduleUser.objects.filter(schedule_id=self.schedule_id,
+                                                     subscribe_to_new_notification_tags=True).order_by('id')
+        event_ids = list(self.upcoming_events.values_list('id', flat=True))
+        subscribed = 0
+
+        for chunk in batched(schedule_users.values_list('id', 'reminders').iterator(chunk_size=batch_size),
+                             batch_size):
+            reminders = dict(chunk)
+
+            with transaction.atomic():
+                ScheduleTagSubscription.objects.bulk_create([ScheduleTagSubscription(schedule_user_id=schedule_user_id,
+                                                                                     schedule_tag=self,
+                                                                                     reminders=schedule_user_reminders)
+                                                             for schedule_user_id, schedule_user_reminders
+                                                             in reminders.items()],
+                                                            ignore_conflicts=True)
+                ScheduleEventSubscription.bulk_subscribe(event_ids=event_ids,
+                                                         schedule_users=reminders,
+                                                         keep_locked=True,
+                                                         batch_size=batch_size)
+
+            subscribed += len(chunk)
+
+        return subscribed
+
     @classmethod
     def post_save(cls, instance, created, *args, **kwargs):
         if not created:
             return
 
-        subscriptions = ScheduleUser.objects.filter(schedule=instance.schedule,
-                                                    subscribe_to_new_notification_tags=True)
+        # Imported here, flowback.schedule.tasks imports the models
+        from flowback.schedule.tasks import schedule_tag_fan_out_schedule
 
-        for sub in subscriptions:
-            ScheduleTagSubscription.objects.get_or_create(schedule_subscription=sub,
-                                                          schedule_tag=instance)
+        # Schedules of big groups have thousands of users following new tags
+        schedule_tag_fan_out_schedule(tag_id=instance.id)
 
 
 post_save.connect(ScheduleTag.post_save, ScheduleTag)
@@ -256,6 +353,14 @@ class ScheduleEvent(BaseModel, NotifiableModel):
 
     repeat_frequency = models.IntegerField(null=True, blank=True, choices=Frequency.choices)
 
+    # Start of the next occurrence of a recurring event yet to be notified, advanced by schedule_event_sweep
+    next_occurrence_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [models.Index(fields=['next_occurrence_at'],
+                                condition=Q(active=True, next_occurrence_at__isnull=False),
+                                name='schedule_event_next_occur_idx')]
+
     NOTIFICATION_DATA_FIELDS = (('id', int),
                                 ('title', str),
                                 ('description', str),
@@ -294,29 +399,42 @@ class ScheduleEvent(BaseModel, NotifiableModel):
 
         return self.notification_channel.notify(**data)
 
-    def _get_cron_from_date(self, date: datetime.datetime):
-        date = date.astimezone(timezone.now().tzinfo)
+    @property
+    def duration(self) -> datetime.timedelta:
+        return self.end_date - self.start_date if self.end_date else datetime.timedelta()
+
+    def next_occurrence(self, after: datetime.datetime) -> datetime.datetime | None:
+        """
+        Start of the first occurrence at or after the given date, None if there is none.
+        Follows the same rules as schedule_event_occurrences, monthly and yearly events skip months lacking their day.
+        """
+        if after <= self.start_date:
+            return self.start_date
+
         freq = self.Frequency
+        if self.repeat_frequency in (freq.DAILY, freq.WEEKLY):
+            period = datetime.timedelta(days=1 if self.repeat_frequency == freq.DAILY else 7)
+            return self.start_date - ((self.start_date - after) // period) * period
 
-        if self.repeat_frequency == freq.DAILY:
-            schedule = crontab(minute=date.minute, hour=date.hour)
-        elif self.repeat_frequency == freq.WEEKLY:
-            schedule = crontab(minute=date.minute,
-                               hour=date.hour,
-                               day_of_week=str(date.weekday()))
-        elif self.repeat_frequency == freq.MONTHLY:
-            schedule = crontab(minute=date.minute,
-                               hour=date.hour,
-                               day_of_month=date.day)
-        elif self.repeat_frequency == freq.YEARLY:
-            schedule = crontab(minute=date.minute,
-                               hour=date.hour,
-                               day_of_month=date.day,
-                               month_of_year=date.month)
-        else:
-            schedule = None
+        elif self.repeat_frequency in (freq.MONTHLY, freq.YEARLY):
+            start_date = self.start_date.astimezone(datetime.timezone.utc)
+            after = after.astimezone(datetime.timezone.utc)
+            step = 12 if self.repeat_frequency == freq.YEARLY else 1
+            number = ((after.year - start_date.year) * 12 + after.month - start_date.month) // step
+
+            # At most eight years pass between two February 29ths
+            while True:
+                year, month = divmod(start_date.month - 1 + number * step, 12)
+                year, month = start_date.year + year, month + 1
+
+                if start_date.day <= calendar.monthrange(year, month)[1]:
+                    occurrence = start_date.replace(year=year, month=month)
+                    if occurrence >= after:
+                        return occurrence
 
-        return schedule
+                number += 1
+
+        return None
 
     @property
     def is_live(self) -> bool:
@@ -327,33 +445,36 @@ class ScheduleEvent(BaseModel, NotifiableModel):
 
     @property
     def next_start_date(self) -> datetime.datetime | None:
-        if timezone.now() < self.start_date:
-            return self.start_date
-
-        elif self.repeat_frequency:
-            return timezone.now() + self._get_cron_from_date(self.start_date).remaining_estimate(timezone.now())
-
-        return None
+        return self.next_occurrence(timezone.now())
 
     @property
     def next_end_date(self) -> datetime.datetime | None:
         if not self.end_date:
             return None
 
-        if timezone.now() < self.end_date:
-            return self.end_date
+        occurrence = self.next_occurrence(timezone.now() - self.duration)
+        return occurrence + self.duration if occurrence else None
 
-        elif self.repeat_frequency:
-            return timezone.now() + self._get_cron_from_date(self.end_date).remaining_estimate(timezone.now())
+    def regenerate_notifications(self):
+        """
+        Regenerate notifications for the event. Recurring events are rescheduled instead, schedule_event_sweep
+        notifies them ahead of every occurrence from next_occurrence_at onward (starting with the ongoing one)
+        """
+        now = timezone.now()
+        next_occurrence_at = self.next_occurrence(now - self.duration) if self.repeat_frequency else None
 
-        return None
+        # Updated directly, saving would trigger post_save again
+        if next_occurrence_at or self.next_occurrence_at:
+            self.next_occurrence_at = next_occurrence_at
+            ScheduleEvent.objects.filter(id=self.id).update(next_occurrence_at=next_occurrence_at)
 
-    def regenerate_notifications(self):
-        """Regenerate notifications for the event"""
-        if not self.repeat_frequency and self.end_date and timezone.now() > self.end_date:
+        if not self.repeat_frequency and self.end_date and now > self.end_date:
             return
 
-        self.notification_channel.notificationobject_set.filter(timestamp__gte=timezone.now()).all().delete()
+        self.notification_channel.notificationobject_set.filter(timestamp__gte=now).all().delete()
+
+        if self.repeat_frequency:
+            return
 
         if self.next_start_date:
             self.notify_start(NotificationObject.Action.CREATED,
@@ -375,9 +496,9 @@ class ScheduleEvent(BaseModel, NotifiableModel):
         user_schedule = ScheduleUser.objects.get(schedule=self.schedule, user=user)
         ScheduleEventSubscription.objects.update_or_create(event=self,
                                                            schedule_user=user_schedule,
-                                                           defaults=dict(tags=user_tags),
-                                                           reminders=reminders,
-                                                           locked=locked)
+                                                           defaults=dict(tags=user_tags,
+                                                                         reminders=reminders,
+                                                                         locked=locked))
 
     def event_unsubscribe(self, user):
         with transaction.atomic():
@@ -388,62 +509,39 @@ class ScheduleEvent(BaseModel, NotifiableModel):
     def post_save(cls, instance, created, update_fields: list[str] = None, *args, **kwargs):
         # Remove unrelated subscriptions and migrate new and existing subscribers to a new tag
         if not created and (update_fields and 'tag' in update_fields):
-            schedule_event_user_datas = ScheduleEventSubscription.objects.filter(event=instance, locked=False)
-            new_active_subscribers = ScheduleTagSubscription.objects.filter(schedule_tag=instance.tag)
-            locked_users = ScheduleEventSubscription.objects.filter(event=instance,
-                                                                    locked=True).values_list('schedule_user__user',
-                                                                                             flat=True)
+            new_active_subscribers = dict(ScheduleTagSubscription.objects.filter(schedule_tag=instance.tag)
+                                          .values_list('schedule_user_id', 'reminders'))
 
             # Delete subscriptions that are not in the new tag
-            for i in schedule_event_user_datas:
-                subscription_exists = new_active_subscribers.filter(schedule_user=i.schedule_user).exists()
-                if not subscription_exists:
-                    instance.event_unsubscribe(user=i.schedule_user.user)
+            ScheduleEventSubscription.bulk_unsubscribe(
+                ScheduleEventSubscription.objects.filter(event=instance, locked=False)
+                .exclude(schedule_user_id__in=new_active_subscribers))
 
             # Migrate subscriptions that are in the new tag (excluding users with locked event subscriptions)
-            for i in new_active_subscribers.exclude(schedule_user__user__in=locked_users):
-                instance.event_subscribe(user=i.schedule_user.user, reminders=i.reminders, locked=False)
-
-        # Repeat Frequency and notification management
-        if instance.repeat_frequency:
-            cron_data = dict()
-            if instance.repeat_frequency == instance.Frequency.WEEKLY:
-                cron_data['day_of_week'] = str(instance.end_date.weekday())
-
-            elif instance.repeat_frequency == instance.Frequency.MONTHLY:
-                cron_data['day_of_month'] = instance.end_date.day
-
-            elif instance.repeat_frequency == instance.Frequency.YEARLY:
-                cron_data['month_of_year'] = instance.end_date.month
-                cron_data['day_of_month'] = instance.end_date.day
-
-            cron_schedule = CrontabSchedule.objects.get_or_create(minute=instance.end_date.minute,
-                                                                  hour=instance.end_date.hour,
-                                                                  **cron_data)[0]
-
-            # If not created, update the instance task with a new crontab schedule
-            task = PeriodicTask.objects.filter(name=f"schedule_event_{instance.id}").first()
-            if task:
-                if task.crontab != cron_schedule:
-                    task.start_date = instance.start_date
-                    task.crontab = cron_schedule
-                    task.save()
-
-            else:
-                periodic_task = PeriodicTask.objects.create(name=f"schedule_event_{instance.id}",
-                                                            task="schedule.tasks.event_notify",
-                                                            kwargs=json.dumps(dict(event_id=instance.id)),
-                                                            crontab=cron_schedule,
-                                                            start_time=instance.start_date)
-                periodic_task.full_clean()
-                periodic_task.save()
+            ScheduleEventSubscription.bulk_subscribe(event_ids=[instance.id],
+                                                     schedule_users=new_active_subscribers,
+                                                     keep_locked=True)
 
-                instance.regenerate_notifications()
+        # Recurring events are notified ahead of every occurrence by schedule_event_sweep
+        if created and instance.repeat_frequency:
+            instance.regenerate_notifications()
 
         if not created:
             if update_fields and any([x in update_fields for x in ['end_date', 'start_date', 'repeat_frequency']]):
                 instance.regenerate_notifications()
 
+        # Every change bumps the calendar entries, their updated_at is part of the calendar feed ETag
+        if created:
+            ScheduleCalendarEntry.populate(event_ids=[instance.id])
+
+        else:
+            ScheduleCalendarEntry.objects.filter(event=instance).update(
+                start_date=instance.start_date,
+                until=ScheduleCalendarEntry.event_until(instance.start_date,
+                                                        instance.end_date,
+                                                        instance.repeat_frequency),
+                updated_at=timezone.now())
+
 
 post_save.connect(ScheduleEvent.post_save, ScheduleEvent)
 
@@ -457,6 +555,12 @@ class ScheduleEventSubscription(BaseModel):
     locked = models.BooleanField(default=True, help_text="If set to true and user unsubscribes from the tag related "
                                                          "to the event, the event will remain subscribed.")
 
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['event', 'schedule_user'],
+                                    name='unique_schedule_event_subscription')
+        ]
+
     @classmethod
     def post_save(cls, instance, *args, **kwargs):
         instance.event.notification_channel.subscribe(user=instance.schedule_user.user,
@@ -466,8 +570,93 @@ class ScheduleEventSubscription(BaseModel):
 
     @classmethod
     def pre_delete(cls, instance, *args, **kwargs):
+        if _bulk_unsubscribing.get():
+            return
+
         instance.event.notification_channel.unsubscribe(user=instance.schedule_user.user)
 
+    @staticmethod
+    def _event_channels(event_ids) -> dict[int, int]:
+        return dict(NotificationChannel.objects.filter(content_type=ContentType.objects.get_for_model(ScheduleEvent),
+                                                       object_id__in=event_ids).values_list('object_id', 'id'))
+
+    @classmethod
+    def bulk_subscribe(cls, *,
+                       event_ids: list[int],
+                       schedule_users: dict[int, list[int] | None],
+                       locked: bool = False,
+                       keep_locked: bool = False,
+                       tags: list[str] = None,
+                       batch_size: int = 1000) -> None:
+        """
+        Subscribes many schedule users to many events at once, like event_subscribe and post_save would,
+        in a handful of statements regardless of the amount of events and users.
+        :param event_ids: Events to subscribe to
+        :param schedule_users: Reminders (in seconds before the event begins) of every ScheduleUser, keyed by id
+        :param locked: Whether the subscriptions are locked
+        :param keep_locked: Leave existing locked subscriptions as is, for subscriptions made through tags.
+         Direct subscriptions by the user overwrite them
+        :param tags: A list of user-defined tags, existing tags are kept if None
+        :param batch_size: Rows inserted per statement
+        """
+        if not (event_ids and schedule_users):
+            return
+
+        skipped = set()
+        if keep_locked:
+            skipped = set(cls.objects.filter(event_id__in=event_ids,
+                                             schedule_user_id__in=schedule_users,
+                                             locked=True).values_list('event_id', 'schedule_user_id'))
+
+        pairs = [(event_id, schedule_user_id)
+                 for event_id in event_ids
+                 for schedule_user_id in schedule_users
+                 if (event_id, schedule_user_id) not in skipped]
+
+        update_fields = ['reminders', 'locked', 'updated_at'] + (['tags'] if tags is not None else [])
+        cls.objects.bulk_create([cls(event_id=event_id,
+                                     schedule_user_id=schedule_user_id,
+                                     reminders=schedule_users[schedule_user_id],
+                                     tags=tags,
+                                     locked=locked) for event_id, schedule_user_id in pairs],
+                                update_conflicts=True,
+                                unique_fields=['event', 'schedule_user'],
+                                update_fields=update_fields,
+                                batch_size=batch_size)
+
+        user_ids = dict(ScheduleUser.objects.filter(id__in=schedule_users).values_list('id', 'user_id'))
+        channels = cls._event_channels(event_ids)
+        NotificationChannel.bulk_subscribe(
+            subscriptions={(channels[event_id], user_ids[schedule_user_id]):
+                           None if not schedule_users[schedule_user_id] else [schedule_users[schedule_user_id], None]
+                           for event_id, schedule_user_id in pairs if event_id in channels},
+            tags=['start', 'end'],
+            batch_size=batch_size)
+
+    @classmethod
+    def bulk_unsubscribe(cls, subscriptions: models.QuerySet) -> int:
+        """
+        Deletes many event subscriptions at once along with their notification subscriptions, like pre_delete would.
+        :param subscriptions: ScheduleEventSubscription queryset to delete
+        :return: Amount of deleted subscriptions
+        """
+        rows = list(subscriptions.values_list('id', 'event_id', 'schedule_user__user_id'))
+        if not rows:
+            return 0
+
+        channels = cls._event_channels({event_id for _, event_id, _ in rows})
+        NotificationChannel.bulk_unsubscribe(subscriptions=[(channels[event_id], user_id)
+                                                            for _, event_id, user_id in rows if event_id in channels])
+
+        token = _bulk_unsubscribing.set(True)
+        try:
+            cls.objects.filter(id__in=[subscription_id for subscription_id, _, _ in rows]).delete()
+
+        finally:
+            _bulk_unsubscribing.reset(token)
+
+        return len(rows)
+
 
 post_save.connect(ScheduleEventSubscription.post_save, ScheduleEventSubscription)
 pre_delete.connect(ScheduleEventSubscription.pre_delete, ScheduleEventSubscription)
@@ -490,35 +679,30 @@ class ScheduleTagSubscription(BaseModel):
 
     @classmethod
     def post_save(cls, instance, created, *args, **kwargs):
-        events = instance.schedule_tag.scheduleevent_set.filter(Q(start_date__gte=timezone.now())
-                                                                | Q(end_date__isnull=True)
-                                                                | Q(end_date__gt=timezone.now()), active=True)
+        events = instance.schedule_tag.upcoming_events
 
         with transaction.atomic():
-            for event in events:
-                event.event_subscribe(user=instance.schedule_user.user, locked=False, reminders=instance.reminders)
+            ScheduleEventSubscription.bulk_subscribe(event_ids=list(events.values_list('id', flat=True)),
+                                                     schedule_users={instance.schedule_user_id: instance.reminders},
+                                                     keep_locked=True)
 
     def delete_user_events(self, include_locked: bool = False, user_tags: list[str] | None = None):
-        filters = dict()
+        subscriptions = ScheduleEventSubscription.objects.filter(schedule_user=self.schedule_user,
+                                                                 event__tag=self.schedule_tag)
         if not include_locked:
-            filters['scheduleeventsubscription__locked'] = False
+            subscriptions = subscriptions.filter(locked=False)
 
         if user_tags:
-            filters['scheduleeventsubscription__user'] = self.schedule_user.user
-            filters['scheduleeventsubscription__tag__in'] = user_tags
-
-        events = ScheduleEvent.objects.filter(
-            schedule=self.schedule_user.schedule,
-            tag=self.schedule_tag,
-            scheduleeventsubscription__schedule_user__user=self.schedule_user.user,
-            **filters)
+            subscriptions = subscriptions.filter(tags__overlap=user_tags)
 
         with transaction.atomic():
-            for event in events:
-                event.event_unsubscribe(user=self.schedule_user.user)
+            ScheduleEventSubscription.bulk_unsubscribe(subscriptions)
 
     @classmethod
     def pre_delete(cls, instance, *args, **kwargs):
+        if _bulk_unsubscribing.get():
+            return
+
         instance.delete_user_events()
 
 
@@ -564,6 +748,86 @@ class ScheduleUser(BaseModel):
         with transaction.atomic():
             tags = ScheduleEventSubscription.objects.filter(schedule_user=self)
 
+    @classmethod
+    def post_save(cls, instance, created, *args, **kwargs):
+        if created:
+            ScheduleCalendarEntry.populate(schedule_user_ids=[instance.id])
+
+
+post_save.connect(ScheduleUser.post_save, ScheduleUser)
+
+
+class ScheduleCalendarEntry(models.Model):
+    """
+    Personal calendar index, one row per event of every schedule a user is in. Kept up to date by the ScheduleUser
+    and ScheduleEvent signals (and Schedule.add_users), deleting either cascades to the entries.
+    """
+    user = models.ForeignKey('user.User', on_delete=models.CASCADE, related_name='+')
+    schedule_user = models.ForeignKey(ScheduleUser, on_delete=models.CASCADE)
+    event = models.ForeignKey(ScheduleEvent, on_delete=models.CASCADE)
+    start_date = models.DateTimeField()
+    # End of the last occurrence (or start without end date), null for recurring events
+    until = models.DateTimeField(null=True, blank=True)
+    # Bumped by every change to the event, used for the ETag of the calendar feed
+    updated_at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        constraints = [models.UniqueConstraint(fields=['schedule_user', 'event'], name='unique_schedule_calendar_entry')]
+        indexes = [models.Index(fields=['user', 'until', 'start_date'], name='schedule_calendar_window_idx')]
+
+    @staticmethod
+    def event_until(start_date: datetime.datetime,
+                    end_date: datetime.datetime | None,
+                    repeat_frequency: int | None) -> datetime.datetime | None:
+        return None if repeat_frequency else end_date or start_date
+
+    @classmethod
+    def populate(cls, *, schedule_user_ids=None, event_ids=None, batch_size: int = 1000) -> int:
+        """
+        Adds the events of the schedules to the calendars of their users, limited to the given schedule users and/or
+        events. Entries that exist already are left as is.
+        :return: Amount of (user, event) pairs inserted or skipped
+        """
+        # Filtered at once, separate filter() calls would join the schedule users once per call
+        filters = dict(schedule__scheduleuser__isnull=False)
+        if schedule_user_ids is not None:
+            filters['schedule__scheduleuser__in'] = schedule_user_ids
+        if event_ids is not None:
+            filters['id__in'] = event_ids
+
+        now = timezone.now()
+        populated = 0
+        rows = ScheduleEvent.objects.filter(**filters).values_list('schedule__scheduleuser__user_id',
+                                                                   'schedule__scheduleuser__id',
+                                                                   'id', 'start_date', 'end_date', 'repeat_frequency')
+
+        for chunk in batched(rows.iterator(chunk_size=batch_size), batch_size):
+            cls.objects.bulk_create([cls(user_id=user_id,
+                                         schedule_user_id=schedule_user_id,
+                                         event_id=event_id,
+                                         start_date=start_date,
+                                         until=cls.event_until(start_date, end_date, repeat_frequency),
+                                         updated_at=now)
+                                     for user_id, schedule_user_id, event_id, start_date, end_date, repeat_frequency
+                                     in chunk],
+                                    ignore_conflicts=True)
+            populated += len(chunk)
+
+        return populated
+
+
+class ScheduleCalendarToken(BaseModel):
+    """
+    Secret of a user's calendar feed URL, calendar clients subscribe to a URL and can't send the Authorization header.
+    Rotating the key revokes the previous URL, deleting the token revokes the feed altogether.
+    """
+    user = models.OneToOneField('user.User', on_delete=models.CASCADE)
+    key = models.CharField(max_length=64, unique=True)
+
+    @staticmethod
+    def generate_key() -> str:
+        return secrets.token_urlsafe(32)
+
 
 def generate_schedule(sender, instance, created, *args, **kwargs):
     if created and issubclass(sender, ScheduleModel):
@@ -580,6 +844,11 @@ class ScheduleModel(models.Model):
     def schedule(self):
         return self.schedule_relations.first()
 
+    @property
+    def schedule_user_ids(self) -> models.QuerySet | None:
+        """User ids that belong in the schedule, used by schedule_membership_sync. None leaves the users as is"""
+        return None
+
     @classmethod
     def __init_subclass__(cls, **kwargs):
         super().__init_subclass__(**kwargs)
@@ -0,0 +1,48 @@
+import datetime
+
+from django.contrib.contenttypes.models import ContentType
+
+from flowback.notification.models import NotificationChannel, NotificationObject
+from flowback.schedule.models import ScheduleEvent
+
+
+def notify_schedule_event_occurrences(*,
+                                      events: list[ScheduleEvent],
+                                      now: datetime.datetime) -> list[NotificationObject]:
+    """
+    Notifies about the start and end of the next_occurrence_at occurrence of many events at once, like notify_start
+    and notify_end would. Used by schedule_event_sweep, starts and ends that already passed are left out.
+    The events are expected to have content_type and schedule__content_type selected.
+    """
+    channels = dict(NotificationChannel.objects.filter(content_type=ContentType.objects.get_for_model(ScheduleEvent),
+                                                       object_id__in=[event.id for event in events])
+                    .values_list('object_id', 'id'))
+
+    notification_objects = []
+    for event in events:
+        if event.id not in channels:
+            continue
+
+        start_date = event.next_occurrence_at
+        end_date = start_date + event.duration if event.end_date else None
+        data = event.notification_data | dict(
+            start_date=start_date.strftime('%Y-%m-%d %H:%M:%S'),
+            end_date=end_date.strftime('%Y-%m-%d %H:%M:%S') if end_date else None)
+
+        if start_date >= now:
+            notification_objects.append(NotificationObject(channel_id=channels[event.id],
+                                                           action=NotificationObject.Action.CREATED,
+                                                           message=f"Event started: {event.title}",
+                                                           tag='start',
+                                                           timestamp=start_date,
+                                                           data=data))
+
+        if end_date and end_date >= now:
+            notification_objects.append(NotificationObject(channel_id=channels[event.id],
+                                                           action=NotificationObject.Action.CREATED,
+                                                           message=f"Event ended: {event.title}",
+                                                           tag='end',
+                                                           timestamp=end_date,
+                                                           data=data))
+
+    return NotificationObject.bulk_notify(notification_objects)
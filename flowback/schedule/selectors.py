@@ -1,10 +1,21 @@
 # Schedule Event List (with multiple schedule id support)
+import datetime
+import hashlib
+from typing import Iterator
+from urllib.parse import urlparse
+
 import django_filters
+import numpy as np
+from django.conf import settings
 from django.contrib.postgres.aggregates import ArrayAgg
-from django.db.models import OuterRef, Subquery, Exists
+from django.db.models import OuterRef, Subquery, Exists, Q, QuerySet, Count, Max
+from django.utils import timezone
+from django.utils.http import quote_etag
+from rest_framework.exceptions import ValidationError
 
 from flowback.common.filters import NumberInFilter
-from flowback.schedule.models import ScheduleEvent, ScheduleEventSubscription, ScheduleTagSubscription, Schedule
+from flowback.schedule.models import (ScheduleEvent, ScheduleEventSubscription, ScheduleTagSubscription, Schedule,
+                                      ScheduleCalendarEntry)
 from flowback.user.models import User
 
 
@@ -40,7 +51,26 @@ class ScheduleEventBaseFilter(django_filters.FilterSet):
                       end_date=['lt', 'gt', 'exact'])
 
 
-def schedule_event_list(*, user: User, filters=None):
+def schedule_calendar_window(*,
+                             user: User,
+                             window_start: datetime.datetime,
+                             window_end: datetime.datetime = None,
+                             prefix: str = '') -> Q:
+    """
+    Calendar entries (see ScheduleCalendarEntry) of the user's events that may have occurrences within the window,
+    a range scan over the calendar index. Prefix the lookups with the path to the entries when filtering other models.
+    """
+    window = (Q(**{f'{prefix}until__isnull': True}) | Q(**{f'{prefix}until__gte': window_start})) \
+        & Q(**{f'{prefix}user': user})
+
+    return window & Q(**{f'{prefix}start_date__lt': window_end}) if window_end else window
+
+
+def schedule_event_list(*, user: User, filters=None, window: tuple[datetime.datetime, datetime.datetime] = None):
+    """
+    Events of every schedule the user is in, served from the user's calendar index.
+    :param window: (start, end) to only include events that may have occurrences within it
+    """
     filters = filters or {}
     subscription_qs = ScheduleEventSubscription.objects.filter(event_id=OuterRef('id'),
                                                                schedule_user__user=user)
@@ -48,9 +78,12 @@ def schedule_event_list(*, user: User, filters=None):
     subscribed_qs = ScheduleTagSubscription.objects.filter(schedule_user__user=user,
                                                            schedule_tag=OuterRef('tag'))
 
-    qs = ScheduleEvent.objects.filter(
-        schedule__scheduleuser__user=user
-    ).annotate(reminders=Subquery(subscription_qs.values('reminders')),
+    # Filtered at once, the window has to apply to the user's own entries
+    entries = (schedule_calendar_window(user=user, window_start=window[0], window_end=window[1],
+                                        prefix='schedulecalendarentry__')
+               if window else Q(schedulecalendarentry__user=user))
+
+    qs = ScheduleEvent.objects.filter(entries).annotate(reminders=Subquery(subscription_qs.values('reminders')),
                user_tags=Subquery(subscription_qs.values('tags')),
                locked=Subquery(subscription_qs.values('locked')),
                subscribed=Exists(subscribed_qs)).all()
@@ -58,6 +91,248 @@ def schedule_event_list(*, user: User, filters=None):
     return ScheduleEventBaseFilter(filters, qs).qs
 
 
+def schedule_calendar_feed_start() -> datetime.datetime:
+    """Events that ended before this are left out of the calendar feed, moves once a day"""
+    today = datetime.datetime.combine(timezone.now().date(), datetime.time(), tzinfo=datetime.timezone.utc)
+
+    return today - datetime.timedelta(days=settings.FLOWBACK_SCHEDULE_CALENDAR_FEED_DAYS)
+
+
+def schedule_calendar_feed_etag(*, user: User) -> str:
+    """
+    ETag of the user's calendar feed. Every change to the feed inserts, deletes or bumps (see ScheduleEvent.post_save)
+    calendar entries, so the amount of entries and their latest update are enough to tell feeds apart.
+    """
+    feed_start = schedule_calendar_feed_start()
+    entries = ScheduleCalendarEntry.objects.filter(schedule_calendar_window(user=user, window_start=feed_start))
+    state = entries.aggregate(count=Count('id'), updated_at=Max('updated_at'))
+
+    return quote_etag(hashlib.md5(f'{user.id}:{feed_start.isoformat()}:{state["count"]}:'
+                                  f'{state["updated_at"] and state["updated_at"].isoformat()}'.encode()).hexdigest())
+
+
+ICAL_FREQUENCIES = {ScheduleEvent.Frequency.DAILY: 'DAILY',
+                    ScheduleEvent.Frequency.WEEKLY: 'WEEKLY',
+                    ScheduleEvent.Frequency.MONTHLY: 'MONTHLY',
+                    ScheduleEvent.Frequency.YEARLY: 'YEARLY'}
+
+
+def _ical_date(value: datetime.datetime) -> str:
+    return value.astimezone(datetime.timezone.utc).strftime('%Y%m%dT%H%M%SZ')
+
+
+def _ical_text(value: str) -> str:
+    return (value.replace('\\', '\\\\').replace(';', '\\;').replace(',', '\\,')
+            .replace('\r\n', '\\n').replace('\n', '\\n'))
+
+
+def _ical_line(name: str, value: str) -> str:
+    # Lines are folded after 75 octets (RFC 5545 3.1), without splitting UTF-8 characters
+    line, lines, limit = f'{name}:{value}'.encode(), [], 75
+    while len(line) > limit:
+        cut = limit
+        while line[cut] & 0xC0 == 0x80:
+            cut -= 1
+
+        lines.append(line[:cut])
+        line, limit = line[cut:], 74
+
+    return b'\r\n '.join(lines + [line]).decode() + '\r\n'
+
+
+def schedule_calendar_feed(*, user: User, chunk_size: int = 500) -> Iterator[str]:
+    """
+    Streams the user's calendar as iCalendar (RFC 5545), one VEVENT per active event. Recurring events are sent with
+    an RRULE, calendar clients skip the days of month that don't exist just like schedule_event_occurrences does.
+    """
+    host = urlparse(settings.FLOWBACK_URL or '').hostname or 'flowback'
+    events = (ScheduleEvent.objects.filter(schedule_calendar_window(user=user,
+                                                                    window_start=schedule_calendar_feed_start(),
+                                                                    prefix='schedulecalendarentry__'),
+                                           active=True)
+              .order_by('start_date', 'id')
+              .values_list('id', 'title', 'description', 'start_date', 'end_date', 'repeat_frequency',
+                           'meeting_link', 'updated_at'))
+
+    yield ''.join(['BEGIN:VCALENDAR\r\n',
+                   'VERSION:2.0\r\n',
+                   'PRODID:-//Flowback//Schedule//EN\r\n',
+                   'CALSCALE:GREGORIAN\r\n',
+                   _ical_line('X-WR-CALNAME', 'Flowback')])
+
+    for event_id, title, description, start_date, end_date, repeat_frequency, meeting_link, updated_at \
+            in events.iterator(chunk_size=chunk_size):
+        lines = ['BEGIN:VEVENT\r\n',
+                 _ical_line('UID', f'schedule-event-{event_id}@{host}'),
+                 _ical_line('DTSTAMP', _ical_date(updated_at)),
+                 _ical_line('DTSTART', _ical_date(start_date))]
+
+        if end_date:
+            lines.append(_ical_line('DTEND', _ical_date(end_date)))
+        if repeat_frequency:
+            lines.append(_ical_line('RRULE', f'FREQ={ICAL_FREQUENCIES[repeat_frequency]}'))
+
+        lines.append(_ical_line('SUMMARY', _ical_text(title)))
+        if description:
+            lines.append(_ical_line('DESCRIPTION', _ical_text(description)))
+        if meeting_link:
+            lines.append(_ical_line('URL', meeting_link))
+
+        lines.append('END:VEVENT\r\n')
+        yield ''.join(lines)
+
+    yield 'END:VCALENDAR\r\n'
+
+
+# Longest window schedule_event_occurrence_list expands, a daily event yields one occurrence per day
+SCHEDULE_EVENT_OCCURRENCE_WINDOW_LIMIT = datetime.timedelta(days=366)
+
+
+def _occurrence_numbers(first: np.ndarray, counts: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+    # Flattens the occurrence numbers first[i] ... first[i] + counts[i] - 1 of every event i
+    index = np.repeat(np.arange(len(counts)), counts)
+    offsets = np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts)
+
+    return index, first[index] + offsets
+
+
+def schedule_event_occurrences(*,
+                               start_dates: np.ndarray,
+                               durations: np.ndarray,
+                               frequencies: np.ndarray,
+                               window_start: np.datetime64,
+                               window_end: np.datetime64) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Expands every occurrence of many (recurring) events within a window at once, in UTC.
+    Occurrences overlapping the window are included, occurrences without a duration when they start within it.
+
+    Monthly and yearly events repeat on the day of month of their start date. Months (or years) lacking that day are
+    skipped, e.g. a monthly event on the 31st skips April and a yearly event on February 29th skips common years.
+
+    :param start_dates: datetime64 start of the first occurrence per event
+    :param durations: timedelta64 duration of the occurrences per event (end_date - start_date, 0 without end_date)
+    :param frequencies: ScheduleEvent.Frequency per event, 0 for events that don't repeat
+    :return: Event index and datetime64[us] start of every occurrence, ordered by start and event index
+    """
+    start_dates, durations = start_dates.astype('M8[us]'), durations.astype('m8[us]')
+    window_start, window_end = np.datetime64(window_start, 'us'), np.datetime64(window_end, 'us')
+    last_start = window_end - np.timedelta64(1, 'us')
+    by_month = np.isin(frequencies, [ScheduleEvent.Frequency.MONTHLY, ScheduleEvent.Frequency.YEARLY])
+
+    # Events repeating by a fixed amount of days, events without repeat are a single occurrence
+    fixed = np.flatnonzero(~by_month)
+    days = np.select([frequencies[fixed] == ScheduleEvent.Frequency.DAILY,
+                      frequencies[fixed] == ScheduleEvent.Frequency.WEEKLY], [1, 7], 0)
+    period = np.maximum(days, 1) * np.timedelta64(1, 'D').astype('m8[us]').astype(np.int64)
+
+    first = np.maximum((window_start - durations[fixed] - start_dates[fixed]).astype(np.int64) // period, 0)
+    last = (last_start - start_dates[fixed]).astype(np.int64) // period
+    first, last = np.where(days > 0, first, 0), np.where(days > 0, last, np.minimum(last, 0))
+
+    index, numbers = _occurrence_numbers(first, np.maximum(last - first + 1, 0))
+    fixed_index = fixed[index]
+    fixed_starts = start_dates[fixed_index] + (numbers * period[index]).astype('m8[us]')
+
+    # Events repeating by calendar months (twelve for yearly events), on the day of month they started
+    calendar = np.flatnonzero(by_month)
+    step = np.where(frequencies[calendar] == ScheduleEvent.Frequency.YEARLY, 12, 1)
+    months = start_dates[calendar].astype('M8[M]')
+    month_offsets = start_dates[calendar] - months.astype('M8[us]')
+    month_days = (start_dates[calendar].astype('M8[D]') - months.astype('M8[D]')).astype(np.int64) + 1
+    months = months.astype(np.int64)
+
+    first = np.maximum(((window_start - durations[calendar]).astype('M8[M]').astype(np.int64) - months) // step, 0)
+    last = (last_start.astype('M8[M]').astype(np.int64) - months) // step
+
+    index, numbers = _occurrence_numbers(first, np.maximum(last - first + 1, 0))
+    occurrence_months = (months[index] + numbers * step[index]).astype('M8[M]')
+    days_in_month = ((occurrence_months + 1).astype('M8[D]') - occurrence_months.astype('M8[D]')).astype(np.int64)
+
+    exists = month_days[index] <= days_in_month
+    index, occurrence_months = index[exists], occurrence_months[exists]
+    calendar_index = calendar[index]
+    calendar_starts = occurrence_months.astype('M8[us]') + month_offsets[index]
+
+    # Both are trimmed down to the occurrences that overlap the window
+    index = np.concatenate([fixed_index, calendar_index])
+    starts = np.concatenate([fixed_starts, calendar_starts])
+    ends = starts + durations[index]
+
+    overlapping = (starts < window_end) & ((ends > window_start) | (starts >= window_start))
+    index, starts = index[overlapping], starts[overlapping]
+    order = np.lexsort((index, starts))
+
+    return index[order], starts[order]
+
+
+class ScheduleEventOccurrences:
+    """
+    Lazily sliced occurrences of schedule_event_occurrence_list, slices only fetch the events they contain.
+    Items are dicts of the event, start_date and end_date of the occurrence.
+    """
+    def __init__(self, queryset: QuerySet, event_ids: np.ndarray, start_dates: np.ndarray, durations: np.ndarray):
+        self.queryset = queryset
+        self.event_ids = event_ids
+        self.start_dates = start_dates
+        self.durations = durations
+
+    def __len__(self):
+        return len(self.event_ids)
+
+    def __getitem__(self, item):
+        if not isinstance(item, slice):
+            return self[item:item + 1][0]
+
+        event_ids = self.event_ids[item].tolist()
+        events = (self.queryset.select_related('tag', 'content_type', 'schedule__content_type')
+                  .prefetch_related('assignees').in_bulk(set(event_ids)))
+
+        return [dict(event=events[event_id],
+                     start_date=start_date.replace(tzinfo=datetime.timezone.utc),
+                     end_date=(start_date + duration).replace(tzinfo=datetime.timezone.utc)
+                     if events[event_id].end_date else None)
+                for event_id, start_date, duration in zip(event_ids,
+                                                          self.start_dates[item].tolist(),
+                                                          self.durations[item].tolist())]
+
+
+def schedule_event_occurrence_list(*,
+                                   user: User,
+                                   window_start: datetime.datetime,
+                                   window_end: datetime.datetime,
+                                   filters=None) -> ScheduleEventOccurrences:
+    """
+    Every occurrence of the user's (recurring) events between window_start and window_end, ordered by start date.
+    """
+    if window_end <= window_start:
+        raise ValidationError('Window end must be after window start')
+
+    if window_end - window_start > SCHEDULE_EVENT_OCCURRENCE_WINDOW_LIMIT:
+        raise ValidationError(f'Window may span at most {SCHEDULE_EVENT_OCCURRENCE_WINDOW_LIMIT.days} days')
+
+    # Events that end before the window or start after it are left out by the calendar index already
+    qs = schedule_event_list(user=user, filters=filters, window=(window_start, window_end))
+
+    rows = list(qs.order_by().values_list('id', 'start_date', 'end_date', 'repeat_frequency').distinct())
+    event_ids = np.array([row[0] for row in rows], dtype=np.int64)
+    start_dates = np.array([row[1].astimezone(datetime.timezone.utc).replace(tzinfo=None) for row in rows],
+                           dtype='M8[us]')
+    durations = np.array([row[2] - row[1] if row[2] else datetime.timedelta() for row in rows], dtype='m8[us]')
+    frequencies = np.array([row[3] or 0 for row in rows], dtype=np.int64)
+
+    index, occurrence_starts = schedule_event_occurrences(
+        start_dates=start_dates,
+        durations=durations,
+        frequencies=frequencies,
+        window_start=np.datetime64(window_start.astimezone(datetime.timezone.utc).replace(tzinfo=None), 'us'),
+        window_end=np.datetime64(window_end.astimezone(datetime.timezone.utc).replace(tzinfo=None), 'us'))
+
+    return ScheduleEventOccurrences(queryset=qs,
+                                    event_ids=event_ids[index],
+                                    start_dates=occurrence_starts,
+                                    durations=durations[index])
+
+
 class ScheduleBaseFilter(django_filters.FilterSet):
     ids = NumberInFilter(field_name='id')
     origin_name = django_filters.CharFilter(field_name='content_type__model', lookup_expr='iexact')
@@ -3,7 +3,7 @@ import datetime
 from django.core.exceptions import ValidationError
 
 from flowback.common.services import model_update
-from flowback.schedule.models import Schedule, ScheduleEvent, ScheduleUser
+from flowback.schedule.models import Schedule, ScheduleEvent, ScheduleUser, ScheduleCalendarToken
 
 
 def schedule_event_create(*,
@@ -154,3 +154,15 @@ def schedule_unsubscribe_to_new_tags(*, user,
     schedule_user.subscribe_to_new_notification_tags = False
     schedule_user.reminders = None
     schedule_user.save()
+
+
+def schedule_calendar_token_create(*, user) -> ScheduleCalendarToken:
+    """Issues a new calendar feed token for the user, revoking the previous one"""
+    token, created = ScheduleCalendarToken.objects.update_or_create(
+        user=user, defaults=dict(key=ScheduleCalendarToken.generate_key())
+    )
+    return token
+
+
+def schedule_calendar_token_delete(*, user) -> None:
+    ScheduleCalendarToken.objects.filter(user=user).delete()
@@ -1,27 +1,119 @@
+import datetime
+import logging
+from itertools import batched
+
 from celery import shared_task
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
 from django.utils import timezone
-from django_celery_beat.models import PeriodicTask
 
-from flowback.schedule.models import ScheduleEvent
+from flowback.common.instrumentation import instrumented_task, task_rows
+from flowback.schedule.models import Schedule, ScheduleEvent, ScheduleTag
+from flowback.schedule.notify import notify_schedule_event_occurrences
+
+logger = logging.getLogger(__name__)
+
+SCHEDULE_MEMBERSHIP_SYNC_CACHE_PREFIX = 'schedule_membership_sync'
 
 
 @shared_task
-def event_notify(event_id: int):
+@instrumented_task
+def schedule_event_sweep(batch_size: int = 500):
+    """
+    Notifies subscribers in bulk about every recurring event occurrence starting within
+    FLOWBACK_SCHEDULE_EVENT_LOOKAHEAD seconds, then advances next_occurrence_at to the occurrence after it.
+    Events are claimed with SELECT ... FOR UPDATE SKIP LOCKED, concurrent sweeps never notify the same occurrence.
+    """
+    notified = 0
+
+    while True:
+        with transaction.atomic():
+            now = timezone.now()
+            horizon = now + datetime.timedelta(seconds=settings.FLOWBACK_SCHEDULE_EVENT_LOOKAHEAD)
+            events = list(ScheduleEvent.objects.select_for_update(skip_locked=True, of=('self',))
+                          .filter(active=True, next_occurrence_at__lte=horizon)
+                          .select_related('content_type', 'schedule__content_type')
+                          .order_by('next_occurrence_at')[:batch_size])
+
+            notified += len(notify_schedule_event_occurrences(events=events, now=now))
+
+            # Occurrences that ended while nobody swept are skipped rather than caught up on one by one
+            for event in events:
+                event.next_occurrence_at = event.next_occurrence(max(
+                    event.next_occurrence_at + datetime.timedelta(microseconds=1), now - event.duration))
+
+            ScheduleEvent.objects.bulk_update(events, fields=['next_occurrence_at'])
+            task_rows(len(events))
+
+        # Events advanced past missed occurrences may still be due, as may events with a period within the lookahead
+        if len(events) < batch_size and not any(event.next_occurrence_at and event.next_occurrence_at <= horizon
+                                                for event in events):
+            return f"{notified} event notifications created."
+
+
+def schedule_tag_fan_out_schedule(*, tag_id: int):
     """
-    :param event_id:  ScheduleEvent id
+    Enqueues the fan-out of a new tag once the surrounding transaction has been committed.
+    """
+    transaction.on_commit(lambda: schedule_tag_fan_out.delay(tag_id=tag_id))
+
+
+@shared_task
+@instrumented_task
+def schedule_tag_fan_out(tag_id: int, batch_size: int = 1000):
     """
-    event = ScheduleEvent.objects.get(id=event_id)
+    Subscribes every schedule user following new tags to a tag, see ScheduleTag.fan_out.
+    """
+    tag = ScheduleTag.objects.filter(id=tag_id).first()
+    if tag is None:
+        return "Tag no longer exists."
+
+    subscribed = tag.fan_out(batch_size=batch_size)
+    task_rows(subscribed)
+
+    return f"{subscribed} users subscribed to the tag."
+
+
+def schedule_membership_sync_progress(schedule_id: int) -> dict | None:
+    """
+    Progress of the latest schedule_membership_sync of a schedule, None if it never ran (or has expired).
+    """
+    return cache.get(f'{SCHEDULE_MEMBERSHIP_SYNC_CACHE_PREFIX}:{schedule_id}')
+
+
+@shared_task
+@instrumented_task
+def schedule_membership_sync(schedule_id: int, batch_size: int = 1000):
+    """
+    Adds the members of a schedule's origin (see ScheduleModel.schedule_user_ids) to the schedule and removes
+    everyone else, batch_size users at a time. Progress is reported after every batch,
+    see schedule_membership_sync_progress.
+    """
+    schedule = Schedule.objects.get(id=schedule_id)
+    user_ids = schedule.created_by.schedule_user_ids
+    if user_ids is None:
+        return "Schedule origin has no members to sync."
+
+    user_ids = set(user_ids)
+    current_user_ids = set(schedule.scheduleuser_set.values_list('user_id', flat=True))
+    missing, extra = sorted(user_ids - current_user_ids), sorted(current_user_ids - user_ids)
+    progress = dict(state='running', total=len(missing) + len(extra), done=0, added=0, removed=0)
+
+    def report(**changes):
+        progress.update(changes, updated_at=timezone.now().isoformat())
+        cache.set(f'{SCHEDULE_MEMBERSHIP_SYNC_CACHE_PREFIX}:{schedule_id}', progress, timeout=24 * 3600)
+        logger.info("Schedule %s membership sync: %s/%s users, %s added, %s removed",
+                    schedule_id, progress['done'], progress['total'], progress['added'], progress['removed'])
+
+    report()
+    for chunk in batched(missing, batch_size):
+        report(done=progress['done'] + len(chunk), added=progress['added'] + schedule.add_users(chunk))
 
-    # Skip notify if scheduled at a later date
-    if event.start_date > timezone.now():
-        return
+    for chunk in batched(extra, batch_size):
+        report(done=progress['done'] + len(chunk), removed=progress['removed'] + schedule.remove_users(chunk))
 
-    # Stop notifying if scheduled after end_date
-    if (not event
-        or (not event.repeat_frequency
-            and event.end_date
-            and event.end_date < timezone.now())):
-        PeriodicTask.objects.filter(name=f"schedule_event_{event_id}").delete()
+    report(state='done')
+    task_rows(progress['total'])
 
-    if event.repeat_frequency:
-        event.regenerate_notifications()
+    return f"{progress['added']} users added, {progress['removed']} users removed."
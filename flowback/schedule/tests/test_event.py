@@ -4,24 +4,38 @@ Schedule Event Test Suite
 This test suite covers:
 - Schedule Event APIs (list, subscribe, unsubscribe)
 - Schedule Event Selectors (schedule_event_list)
+- Schedule Event Occurrences (schedule_event_occurrences, schedule_event_occurrence_list)
+- Schedule Event Sweeper (ScheduleEvent.next_occurrence, schedule_event_sweep)
+- Schedule Calendar (ScheduleCalendarEntry, schedule calendar feed API)
 - Schedule Event Services (event subscription services)
 - Schedule Event Serializers (FilterSerializer, InputSerializer, OutputSerializer)
 """
 
-from datetime import timedelta
+import time
+from datetime import datetime, timedelta, timezone as dt_timezone
+
+import numpy as np
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
 from django.utils import timezone
+from django_celery_beat.models import PeriodicTask
 from rest_framework import status
-from rest_framework.test import APITestCase
+from rest_framework.test import APITestCase, APIRequestFactory, force_authenticate
 
 from flowback.common.tests import generate_request
-from flowback.schedule.models import ScheduleEventSubscription, ScheduleEvent
-from flowback.schedule.selectors import schedule_event_list
-from flowback.schedule.services import schedule_event_subscribe, schedule_event_unsubscribe
+from flowback.notification.models import Notification
+from flowback.schedule.models import ScheduleEventSubscription, ScheduleEvent, ScheduleCalendarEntry
+from flowback.schedule.selectors import schedule_event_list, schedule_event_occurrences
+from flowback.schedule.services import (schedule_event_subscribe, schedule_event_unsubscribe,
+                                        schedule_calendar_token_create)
+from flowback.schedule.tasks import schedule_event_sweep
 from flowback.schedule.tests.factories import (ScheduleEventFactory, ScheduleUserFactory,
                                                ScheduleTagFactory, ScheduleEventSubscriptionFactory,
                                                ScheduleTagSubscriptionFactory)
-from flowback.schedule.views import (ScheduleEventListAPI,
-                                     ScheduleEventSubscribeAPI, ScheduleEventUnsubscribeAPI)
+from flowback.schedule.views import (ScheduleEventListAPI, ScheduleEventOccurrenceListAPI,
+                                     ScheduleEventSubscribeAPI, ScheduleEventUnsubscribeAPI, ScheduleCalendarFeedAPI,
+                                     ScheduleCalendarTokenFeedAPI, ScheduleCalendarTokenCreateAPI,
+                                     ScheduleCalendarTokenDeleteAPI)
 from flowback.user.tests.factories import UserFactory
 from flowback.group.tests.factories import GroupFactory, GroupUserFactory
 
@@ -498,3 +512,362 @@ class ScheduleEventSerializerTest(APITestCase):
             user=self.user1
         )
         self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+
+class ScheduleEventOccurrenceTest(APITestCase):
+    """Test the recurring event occurrence expansion"""
+
+    def setUp(self):
+        self.user = UserFactory.create()
+        self.group = GroupFactory.create()
+        ScheduleUserFactory.create(user=self.user, schedule=self.group.schedule)
+        self.tag = ScheduleTagFactory.create(schedule=self.group.schedule)
+
+    def event(self, start_date: datetime, duration: timedelta = timedelta(hours=1), **kwargs):
+        return ScheduleEventFactory.create(schedule=self.group.schedule,
+                                           tag=self.tag,
+                                           start_date=start_date,
+                                           end_date=start_date + duration,
+                                           **kwargs)
+
+    @staticmethod
+    def reference_occurrences(start_date: datetime, duration: timedelta, frequency: int,
+                              window_start: datetime, window_end: datetime) -> list[datetime]:
+        """One occurrence at a time, the way a calendar would be read"""
+        occurrences = []
+        for k in range(10000):
+            if frequency in (ScheduleEvent.Frequency.MONTHLY, ScheduleEvent.Frequency.YEARLY):
+                months = start_date.month - 1 + k * (12 if frequency == ScheduleEvent.Frequency.YEARLY else 1)
+                try:
+                    occurrence = start_date.replace(year=start_date.year + months // 12, month=months % 12 + 1)
+                except ValueError:
+                    continue  # The month lacks the day of month
+
+            else:
+                days = {ScheduleEvent.Frequency.DAILY: 1, ScheduleEvent.Frequency.WEEKLY: 7}.get(frequency)
+                if days is None and k > 0:
+                    break
+
+                occurrence = start_date + timedelta(days=k * (days or 0))
+
+            if occurrence >= window_end:
+                break
+
+            if occurrence + duration > window_start or occurrence >= window_start:
+                occurrences.append(occurrence)
+
+        return occurrences
+
+    def test_schedule_event_occurrence_list_api(self):
+        utc = dt_timezone.utc
+        monthly = self.event(datetime(2025, 1, 31, 10, tzinfo=utc), repeat_frequency=ScheduleEvent.Frequency.MONTHLY)
+        yearly = self.event(datetime(2024, 2, 29, 9, tzinfo=utc), repeat_frequency=ScheduleEvent.Frequency.YEARLY)
+        weekly = self.event(datetime(2024, 12, 31, 23, tzinfo=utc),
+                            duration=timedelta(hours=3),
+                            repeat_frequency=ScheduleEvent.Frequency.WEEKLY)
+        single = self.event(datetime(2025, 3, 1, 12, tzinfo=utc))
+        self.event(datetime(2024, 3, 1, 12, tzinfo=utc))  # Ended before the window
+        self.event(datetime(2025, 3, 1, 12, tzinfo=utc), active=False)
+
+        response = generate_request(api=ScheduleEventOccurrenceListAPI,
+                                    data=dict(window_start='2025-01-01T00:00:00Z',
+                                              window_end='2025-07-01T00:00:00Z',
+                                              limit=1000),
+                                    user=self.user)
+        self.assertEqual(response.status_code, status.HTTP_200_OK, response.data)
+
+        occurrences = {}
+        for result in response.data['results']:
+            occurrences.setdefault(result['event_id'], []).append((result['start_date'], result['end_date']))
+
+        # Months without a 31st are skipped, February 29th doesn't exist in 2025
+        self.assertEqual(occurrences[monthly.id], [('2025-01-31T10:00:00Z', '2025-01-31T11:00:00Z'),
+                                                   ('2025-03-31T10:00:00Z', '2025-03-31T11:00:00Z'),
+                                                   ('2025-05-31T10:00:00Z', '2025-05-31T11:00:00Z')])
+        self.assertNotIn(yearly.id, occurrences)
+        self.assertEqual(occurrences[single.id], [('2025-03-01T12:00:00Z', '2025-03-01T13:00:00Z')])
+
+        # The weekly occurrence that started before the window runs into it
+        self.assertEqual(occurrences[weekly.id][:2], [('2024-12-31T23:00:00Z', '2025-01-01T02:00:00Z'),
+                                                      ('2025-01-07T23:00:00Z', '2025-01-08T02:00:00Z')])
+        self.assertEqual(len(occurrences[weekly.id]), 26)
+
+        self.assertEqual(len(occurrences), 3)
+        self.assertEqual(response.data['count'], 3 + 1 + 26)
+        starts = [result['start_date'] for result in response.data['results']]
+        self.assertEqual(starts, sorted(starts))
+
+    def test_schedule_event_occurrence_list_api_window(self):
+        for window_end in ('2025-01-01T00:00:00Z', '2026-01-03T00:00:00Z'):
+            response = generate_request(api=ScheduleEventOccurrenceListAPI,
+                                        data=dict(window_start='2025-01-01T00:00:00Z', window_end=window_end),
+                                        user=self.user)
+            self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_schedule_event_occurrences_benchmark(self):
+        """10k recurring events expanded over a year, checked against a one occurrence at a time expansion"""
+        rng = np.random.default_rng(0)
+        size = 10000
+        window_start, window_end = np.datetime64('2025-01-01T00:00', 'us'), np.datetime64('2026-01-01T00:00', 'us')
+
+        start_dates = (np.datetime64('2023-01-01T00:00', 'us')
+                       + rng.integers(0, 3 * 365 * 24 * 60, size).astype('m8[m]').astype('m8[us]'))
+        durations = rng.integers(0, 4 * 24 * 60, size).astype('m8[m]').astype('m8[us]')
+        frequencies = rng.integers(0, 5, size)
+
+        start = time.perf_counter()
+        index, starts = schedule_event_occurrences(start_dates=start_dates,
+                                                   durations=durations,
+                                                   frequencies=frequencies,
+                                                   window_start=window_start,
+                                                   window_end=window_end)
+        elapsed = time.perf_counter() - start
+        print(f'schedule_event_occurrences: {size} events, {len(index)} occurrences in {elapsed * 1000:.2f}ms')
+
+        to_datetime = lambda value: value.astype(datetime).replace(tzinfo=dt_timezone.utc)
+        for i in range(0, size, 25):
+            expected = self.reference_occurrences(to_datetime(start_dates[i]),
+                                                  durations[i].astype(timedelta),
+                                                  int(frequencies[i]),
+                                                  to_datetime(window_start),
+                                                  to_datetime(window_end))
+            self.assertEqual([to_datetime(value) for value in starts[index == i]], expected)
+
+
+class ScheduleEventSweepTest(APITestCase):
+    """Test the recurring event sweeper"""
+
+    def setUp(self):
+        self.user = UserFactory.create()
+        self.group = GroupFactory.create()
+        self.schedule_user = ScheduleUserFactory.create(user=self.user, schedule=self.group.schedule)
+        self.tag = ScheduleTagFactory.create(schedule=self.group.schedule)
+
+    def event(self, start_date: datetime, duration: timedelta = timedelta(hours=1), **kwargs):
+        event = ScheduleEventFactory.create(schedule=self.group.schedule,
+                                            tag=self.tag,
+                                            start_date=start_date,
+                                            end_date=start_date + duration,
+                                            **kwargs)
+        ScheduleEventSubscriptionFactory.create(event=event, schedule_user=self.schedule_user)
+        event.refresh_from_db()
+
+        return event
+
+    def test_schedule_event_next_occurrence(self):
+        rng = np.random.default_rng(0)
+        utc = dt_timezone.utc
+
+        for i in range(200):
+            start_date = datetime(2023, 1, 1, tzinfo=utc) + timedelta(minutes=int(rng.integers(0, 3 * 365 * 24 * 60)))
+            after = datetime(2024, 1, 1, tzinfo=utc) + timedelta(minutes=int(rng.integers(0, 3 * 365 * 24 * 60)))
+            frequency = int(rng.integers(1, 5))
+            event = ScheduleEvent(start_date=start_date, repeat_frequency=frequency)
+
+            expected = ScheduleEventOccurrenceTest.reference_occurrences(start_date, timedelta(), frequency,
+                                                                         after, after + timedelta(days=9 * 366))
+            self.assertEqual(event.next_occurrence(after), expected[0])
+
+        # February 29th only comes around in leap years
+        event = ScheduleEvent(start_date=datetime(2024, 2, 29, 9, tzinfo=utc),
+                              repeat_frequency=ScheduleEvent.Frequency.YEARLY)
+        self.assertEqual(event.next_occurrence(datetime(2024, 3, 1, tzinfo=utc)), datetime(2028, 2, 29, 9, tzinfo=utc))
+        self.assertIsNone(ScheduleEvent(start_date=datetime(2024, 2, 29, 9, tzinfo=utc))
+                          .next_occurrence(datetime(2024, 3, 1, tzinfo=utc)))
+
+    def test_schedule_event_sweep(self):
+        now = timezone.now()
+        daily = self.event(now - timedelta(days=3, minutes=-30), repeat_frequency=ScheduleEvent.Frequency.DAILY)
+        ongoing = self.event(now - timedelta(days=7, minutes=30), repeat_frequency=ScheduleEvent.Frequency.WEEKLY)
+        later = self.event(now + timedelta(days=2), repeat_frequency=ScheduleEvent.Frequency.MONTHLY)
+        single = self.event(now + timedelta(minutes=30))
+
+        # Recurring events no longer get a beat entry of their own
+        self.assertFalse(PeriodicTask.objects.filter(name__startswith='schedule_event_').exists())
+        self.assertEqual(daily.next_occurrence_at, daily.start_date + timedelta(days=3))
+        self.assertEqual(ongoing.next_occurrence_at, ongoing.start_date + timedelta(days=7))
+        self.assertEqual(later.next_occurrence_at, later.start_date)
+        self.assertIsNone(single.next_occurrence_at)
+
+        with self.settings(FLOWBACK_SCHEDULE_EVENT_LOOKAHEAD=3600):
+            schedule_event_sweep()
+
+        def notifications(event: ScheduleEvent) -> list[tuple[str, datetime]]:
+            return list(Notification.objects.filter(user=self.user,
+                                                    notification_object__channel=event.notification_channel)
+                        .order_by('notification_object__timestamp')
+                        .values_list('notification_object__tag', 'notification_object__timestamp'))
+
+        occurrence = daily.start_date + timedelta(days=3)
+        self.assertEqual(notifications(daily), [('start', occurrence), ('end', occurrence + timedelta(hours=1))])
+        self.assertEqual(daily.notification_channel.notificationobject_set.first().data['start_date'],
+                         occurrence.strftime('%Y-%m-%d %H:%M:%S'))
+
+        # The ongoing occurrence already started, only its end is left to notify
+        occurrence = ongoing.start_date + timedelta(days=7)
+        self.assertEqual(notifications(ongoing), [('end', occurrence + timedelta(hours=1))])
+        self.assertEqual(notifications(later), [])
+
+        for event, next_occurrence_at in ((daily, daily.start_date + timedelta(days=4)),
+                                          (ongoing, ongoing.start_date + timedelta(days=14)),
+                                          (later, later.start_date)):
+            event.refresh_from_db()
+            self.assertEqual(event.next_occurrence_at, next_occurrence_at)
+
+        # Nothing is left within the lookahead, neither is anything notified twice
+        count = Notification.objects.count()
+        schedule_event_sweep()
+        self.assertEqual(Notification.objects.count(), count)
+
+    def test_schedule_event_sweep_skips_missed_occurrences(self):
+        now = timezone.now()
+        event = self.event(now - timedelta(days=30, minutes=-10), repeat_frequency=ScheduleEvent.Frequency.DAILY)
+
+        # A sweeper that was down for a month picks up where the calendar is, not where it left off
+        ScheduleEvent.objects.filter(id=event.id).update(next_occurrence_at=event.start_date)
+        schedule_event_sweep()
+
+        event.refresh_from_db()
+        self.assertEqual(event.next_occurrence_at, event.start_date + timedelta(days=31))
+        self.assertEqual(Notification.objects.filter(user=self.user).count(), 2)
+
+    def test_schedule_event_sweep_queries(self):
+        now = timezone.now()
+
+        def sweep_queries(size: int) -> int:
+            for i in range(size):
+                self.event(now + timedelta(minutes=i + 1), repeat_frequency=ScheduleEvent.Frequency.WEEKLY)
+
+            with CaptureQueriesContext(connection) as context:
+                schedule_event_sweep(batch_size=1000)
+
+            return len(context.captured_queries)
+
+        self.assertEqual(sweep_queries(5), sweep_queries(50))
+        self.assertEqual(Notification.objects.filter(user=self.user).count(), 2 * 55)
+
+
+class ScheduleCalendarTest(APITestCase):
+    """Test the personal calendar index and the iCalendar feed"""
+
+    def setUp(self):
+        self.user = UserFactory.create()
+        self.group = GroupFactory.create()
+        self.tag = ScheduleTagFactory.create(schedule=self.group.schedule)
+        self.start_date = timezone.now().replace(microsecond=0) + timedelta(days=1)
+
+    def event(self, **kwargs) -> ScheduleEvent:
+        return ScheduleEventFactory.create(schedule=self.group.schedule,
+                                           tag=self.tag,
+                                           created_by=self.group,
+                                           **dict(dict(start_date=self.start_date,
+                                                       end_date=self.start_date + timedelta(hours=1)), **kwargs))
+
+    def entries(self):
+        return ScheduleCalendarEntry.objects.filter(user=self.user)
+
+    def feed(self, etag: str = None):
+        request = APIRequestFactory().get('', **(dict(HTTP_IF_NONE_MATCH=etag) if etag else {}))
+        force_authenticate(request, user=self.user)
+
+        return ScheduleCalendarFeedAPI.as_view()(request)
+
+    def test_schedule_calendar_entries(self):
+        event = self.event()
+        ScheduleUserFactory.create(user=self.user, schedule=self.group.schedule)
+        self.assertEqual(list(self.entries().values_list('event_id', 'start_date', 'until')),
+                         [(event.id, event.start_date, event.end_date)])
+
+        repeating = self.event(end_date=None, repeat_frequency=ScheduleEvent.Frequency.WEEKLY)
+        self.assertIsNone(self.entries().get(event=repeating).until)
+
+        event.start_date, event.end_date = event.start_date + timedelta(days=1), None
+        event.save()
+        self.assertEqual(self.entries().values_list('start_date', 'until').get(event=event),
+                         (event.start_date, event.start_date))
+
+        repeating.delete()
+        self.assertEqual(list(self.entries().values_list('event_id', flat=True)), [event.id])
+
+        self.group.schedule.remove_user(user=self.user)
+        self.assertFalse(self.entries().exists())
+
+        # Listing events goes through the index
+        ScheduleUserFactory.create(user=self.user, schedule=self.group.schedule)
+        self.assertEqual(list(schedule_event_list(user=self.user).values_list('id', flat=True)), [event.id])
+
+    def test_schedule_calendar_feed_api(self):
+        ScheduleUserFactory.create(user=self.user, schedule=self.group.schedule)
+        event = self.event(title='Weekly, sync; planning',
+                           description='Ønskeliste ' * 20,
+                           repeat_frequency=ScheduleEvent.Frequency.WEEKLY)
+        self.event(title='Inactive', active=False)
+        self.event(title='Long gone',
+                   start_date=self.start_date - timedelta(days=400),
+                   end_date=self.start_date - timedelta(days=399))
+
+        response = self.feed()
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response['Content-Type'], 'text/calendar; charset=utf-8')
+
+        content = b''.join(response.streaming_content).decode()
+        lines = content.split('\r\n')
+        self.assertEqual((lines[0], lines[-2], lines[-1]), ('BEGIN:VCALENDAR', 'END:VCALENDAR', ''))
+        self.assertEqual(content.count('BEGIN:VEVENT'), 1)
+        self.assertIn(f'DTSTART:{self.start_date.astimezone(dt_timezone.utc):%Y%m%dT%H%M%SZ}', lines)
+        self.assertIn('RRULE:FREQ=WEEKLY', lines)
+        self.assertIn('SUMMARY:Weekly\\, sync\\; planning', lines)
+        self.assertTrue(all(len(line.encode()) <= 75 for line in lines))
+
+        # Folded lines are joined back by dropping the CRLF and the space after it
+        self.assertIn('DESCRIPTION:' + 'Ønskeliste ' * 19 + 'Ønskeliste', content.replace('\r\n ', ''))
+
+        etag = response['ETag']
+        response = self.feed(etag=etag)
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+
+        event.title = 'Renamed'
+        event.save(update_fields=['title', 'updated_at'])
+
+        response = self.feed(etag=etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertNotEqual(response['ETag'], etag)
+        self.assertIn('SUMMARY:Renamed', b''.join(response.streaming_content).decode())
+
+    def test_schedule_calendar_feed_etag_queries(self):
+        ScheduleUserFactory.create(user=self.user, schedule=self.group.schedule)
+        for i in range(5):
+            self.event(title=f'Event {i}')
+
+        etag = self.feed()['ETag']
+        with CaptureQueriesContext(connection) as context:
+            self.assertEqual(self.feed(etag=etag).status_code, status.HTTP_304_NOT_MODIFIED)
+
+        # Unchanged feeds are answered from a single aggregate over the index
+        self.assertEqual(len(context.captured_queries), 1)
+
+    def test_schedule_calendar_token_feed_api(self):
+        ScheduleUserFactory.create(user=self.user, schedule=self.group.schedule)
+        self.event(title='Planning')
+
+        def feed(key: str, etag: str = None):
+            request = APIRequestFactory().get('', **(dict(HTTP_IF_NONE_MATCH=etag) if etag else {}))
+            return ScheduleCalendarTokenFeedAPI.as_view()(request, token=key)
+
+        response = generate_request(api=ScheduleCalendarTokenCreateAPI, user=self.user)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        key = response.data['token']
+
+        response = feed(key)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertIn('SUMMARY:Planning', b''.join(response.streaming_content).decode())
+        self.assertEqual(feed(key, etag=response['ETag']).status_code, status.HTTP_304_NOT_MODIFIED)
+
+        # Rotating the token revokes the previous URL
+        rotated = schedule_calendar_token_create(user=self.user).key
+        self.assertEqual(feed(key).status_code, status.HTTP_403_FORBIDDEN)
+        self.assertEqual(feed(rotated).status_code, status.HTTP_200_OK)
+
+        response = generate_request(api=ScheduleCalendarTokenDeleteAPI, user=self.user)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(feed(rotated).status_code, status.HTTP_403_FORBIDDEN)
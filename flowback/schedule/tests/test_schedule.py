@@ -5,25 +5,36 @@ This test suite covers:
 - Schedule APIs (list)
 - Schedule Selectors (schedule_list)
 - Schedule Serializers (FilterSerializer, OutputSerializer)
+- Schedule Membership Sync (Schedule.add_users, Schedule.remove_users, schedule_membership_sync, tag fan-out)
 
 Note: Schedule Event Create, Update, Delete APIs are not tested as they are not included in the URL patterns.
 """
 
 import json
 from datetime import timedelta
+from django.core.management import call_command
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
 from django.utils import timezone
 from rest_framework import status
 from rest_framework.test import APITestCase
 
-from flowback.common.tests import generate_request
-from flowback.schedule.models import ScheduleUser, ScheduleEventSubscription, ScheduleTagSubscription
+from flowback.common.tests import generate_request, fake
+from flowback.group.models import GroupUser
+from flowback.notification.models import NotificationSubscription
+from flowback.schedule.models import (ScheduleUser, ScheduleEventSubscription, ScheduleTagSubscription,
+                                      ScheduleCalendarEntry)
 from flowback.schedule.selectors import schedule_list
+from flowback.schedule.tasks import (schedule_membership_sync, schedule_membership_sync_progress,
+                                     schedule_tag_fan_out)
 from flowback.schedule.tests.factories import (ScheduleEventFactory, ScheduleUserFactory,
                                                ScheduleTagFactory, ScheduleEventSubscriptionFactory,
                                                ScheduleTagSubscriptionFactory)
 from flowback.schedule.views import ScheduleListAPI
 from flowback.user.tests.factories import UserFactory
-from flowback.group.tests.factories import GroupFactory
+from flowback.group.tests.factories import GroupFactory, GroupUserFactory
+
+
 class ScheduleAPITest(APITestCase):
     """Test Schedule List APIs"""
 
@@ -170,3 +181,98 @@ class ScheduleSerializerTest(APITestCase):
         expected_fields = ['id', 'origin_name', 'origin_id', 'default_tag']
         for field in expected_fields:
             self.assertIn(field, result)
+
+
+class ScheduleMembershipSyncTest(APITestCase):
+    """Test the bulk schedule membership sync and the fan-out of new tags"""
+
+    def setUp(self):
+        fake.unique.clear()  # Keeps the unique name pool from running dry in full test runs
+        self.group = GroupFactory.create()
+        self.schedule = self.group.schedule
+
+    def test_schedule_add_users(self):
+        users = UserFactory.create_batch(25)
+        ScheduleUserFactory.create(user=users[0], schedule=self.schedule)
+        event = ScheduleEventFactory.create(schedule=self.schedule, created_by=self.group)
+
+        with CaptureQueriesContext(connection) as context:
+            self.assertEqual(self.schedule.add_users([user.id for user in users], batch_size=10), 24)
+
+        # One lookup and one insert per chunk, the calendar index is filled with another read and insert
+        self.assertEqual(len(context.captured_queries), 12)
+        self.assertEqual(self.schedule.add_users([user.id for user in users]), 0)
+        self.assertEqual(ScheduleUser.objects.filter(schedule=self.schedule, user__in=users).count(), 25)
+        self.assertEqual(ScheduleCalendarEntry.objects.filter(event=event, user__in=users).count(), 25)
+
+    def test_schedule_remove_users(self):
+        tag = ScheduleTagFactory.create(schedule=self.schedule)
+        schedule_users = ScheduleUserFactory.create_batch(3, schedule=self.schedule)
+        event = ScheduleEventFactory.create(schedule=self.schedule, tag=tag, created_by=self.group)
+        for schedule_user in schedule_users:
+            ScheduleTagSubscriptionFactory.create(schedule_user=schedule_user, schedule_tag=tag)
+
+        self.assertEqual(ScheduleEventSubscription.objects.filter(event=event).count(), 3)
+        self.assertEqual(self.schedule.remove_users([schedule_user.user_id for schedule_user in schedule_users[:2]],
+                                                    batch_size=1), 2)
+
+        self.assertEqual(list(ScheduleUser.objects.filter(schedule=self.schedule, id__in=[s.id for s in schedule_users])
+                              .values_list('id', flat=True)), [schedule_users[2].id])
+        self.assertEqual(list(ScheduleTagSubscription.objects.filter(schedule_tag=tag)
+                              .values_list('schedule_user_id', flat=True)), [schedule_users[2].id])
+        self.assertEqual(list(ScheduleEventSubscription.objects.filter(event=event)
+                              .values_list('schedule_user_id', flat=True)), [schedule_users[2].id])
+        self.assertEqual(list(NotificationSubscription.objects.filter(channel=event.notification_channel)
+                              .values_list('user_id', flat=True)), [schedule_users[2].user_id])
+
+    def test_schedule_tag_fan_out(self):
+        following = ScheduleUserFactory.create_batch(3, schedule=self.schedule,
+                                                     subscribe_to_new_notification_tags=True, reminders=[120])
+        other = ScheduleUserFactory.create(schedule=self.schedule)
+
+        # Fan-out is deferred until the tag is committed
+        with self.captureOnCommitCallbacks() as callbacks:
+            tag = ScheduleTagFactory.create(schedule=self.schedule)
+
+        self.assertEqual(len(callbacks), 1)
+        self.assertFalse(ScheduleTagSubscription.objects.filter(schedule_tag=tag).exists())
+
+        event = ScheduleEventFactory.create(schedule=self.schedule, tag=tag, created_by=self.group)
+        past_event = ScheduleEventFactory.create(schedule=self.schedule, tag=tag, created_by=self.group,
+                                                 start_date=timezone.now() - timedelta(days=2),
+                                                 end_date=timezone.now() - timedelta(days=1))
+
+        schedule_tag_fan_out(tag_id=tag.id, batch_size=2)
+        schedule_tag_fan_out(tag_id=tag.id, batch_size=2)
+
+        self.assertEqual(sorted(ScheduleTagSubscription.objects.filter(schedule_tag=tag)
+                                .values_list('schedule_user_id', 'reminders')),
+                         [(schedule_user.id, [120]) for schedule_user in following])
+        self.assertEqual(set(ScheduleEventSubscription.objects.filter(event=event)
+                             .values_list('schedule_user_id', flat=True)),
+                         {schedule_user.id for schedule_user in following})
+        self.assertFalse(ScheduleEventSubscription.objects.filter(event=past_event).exists())
+        self.assertFalse(ScheduleTagSubscription.objects.filter(schedule_user=other).exists())
+
+    def test_schedule_membership_sync(self):
+        members = GroupUserFactory.create_batch(5, group=self.group)
+        left = GroupUserFactory.create(group=self.group)
+        outsider = ScheduleUserFactory.create(schedule=self.schedule)
+
+        # Membership changes that bypassed the signals
+        ScheduleUser.objects.filter(schedule=self.schedule, user__in=[member.user for member in members[:3]]).delete()
+        GroupUser.objects.filter(id=left.id).update(active=False)
+
+        self.assertEqual(schedule_membership_sync(schedule_id=self.schedule.id, batch_size=2),
+                         "3 users added, 2 users removed.")
+
+        self.assertEqual(set(ScheduleUser.objects.filter(schedule=self.schedule).values_list('user_id', flat=True)),
+                         set(self.group.schedule_user_ids))
+        self.assertFalse(ScheduleUser.objects.filter(id=outsider.id).exists())
+
+        progress = schedule_membership_sync_progress(self.schedule.id)
+        self.assertEqual((progress['state'], progress['total'], progress['done'],
+                          progress['added'], progress['removed']), ('done', 5, 5, 3, 2))
+
+        call_command('schedule_membership_sync', self.schedule.id, stdout=open('/dev/null', 'w'))
+        self.assertEqual(schedule_membership_sync_progress(self.schedule.id)['total'], 0)
@@ -6,16 +6,21 @@ This test suite covers:
 - Schedule Tag APIs (subscribe, unsubscribe)
 - Schedule Services (all subscription services)
 - Schedule Subscription Serializers (FilterSerializer, InputSerializer)
+- Tag Subscription Fan-out (ScheduleEventSubscription.bulk_subscribe, bulk_unsubscribe)
 """
 
 import json
+import time
 from datetime import timedelta
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
 from django.utils import timezone
 from rest_framework import status
 from rest_framework.test import APITestCase
 
 from flowback.common.tests import generate_request
-from flowback.schedule.models import ScheduleUser, ScheduleEventSubscription, ScheduleTagSubscription
+from flowback.notification.models import NotificationChannel, NotificationSubscription, NotificationSubscriptionTag
+from flowback.schedule.models import ScheduleUser, ScheduleEvent, ScheduleEventSubscription, ScheduleTagSubscription
 from flowback.schedule.services import (schedule_tag_subscribe, schedule_tag_unsubscribe,
                                         schedule_subscribe_to_new_tags, schedule_unsubscribe_to_new_tags)
 from flowback.schedule.tests.factories import (ScheduleEventFactory, ScheduleUserFactory,
@@ -270,3 +275,109 @@ class ScheduleSubscriptionSerializerTest(APITestCase):
             user=self.user1
         )
         self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+
+class ScheduleTagSubscriptionFanOutTest(APITestCase):
+    """Test the set-based fan-out of tag subscriptions to events"""
+
+    def setUp(self):
+        self.user = UserFactory.create()
+        self.group = GroupFactory.create()
+        self.schedule_user = ScheduleUserFactory.create(user=self.user, schedule=self.group.schedule)
+        self.tag = ScheduleTagFactory.create(schedule=self.group.schedule, name='meeting')
+
+    def events(self, size: int, tag=None) -> list[ScheduleEvent]:
+        start_date = timezone.now() + timedelta(days=1)
+        events = ScheduleEvent.objects.bulk_create([ScheduleEvent(schedule=self.group.schedule,
+                                                                  tag=tag or self.tag,
+                                                                  title=f'Event {i}',
+                                                                  start_date=start_date + timedelta(hours=i),
+                                                                  created_by=self.group) for i in range(size)])
+        NotificationChannel.objects.bulk_create([NotificationChannel(content_object=event) for event in events])
+
+        return events
+
+    def notification_subscriptions(self, **filters):
+        return NotificationSubscription.objects.filter(user=self.user,
+                                                       channel__content_type__model='scheduleevent',
+                                                       **filters)
+
+    def test_schedule_tag_subscribe_fan_out_queries(self):
+        size = 1000
+        self.events(size)
+        locked = ScheduleEventSubscriptionFactory.create(event=ScheduleEventFactory(schedule=self.group.schedule,
+                                                                                    tag=self.tag),
+                                                         schedule_user=self.schedule_user,
+                                                         tags=['mine'],
+                                                         locked=True)
+
+        start = time.perf_counter()
+        with CaptureQueriesContext(connection) as context:
+            ScheduleTagSubscriptionFactory.create(schedule_user=self.schedule_user,
+                                                  schedule_tag=self.tag,
+                                                  reminders=[60])
+
+        elapsed = time.perf_counter() - start
+        print(f'Tag subscription fan-out: {size} events in {len(context.captured_queries)} queries, '
+              f'{elapsed * 1000:.2f}ms')
+        self.assertLessEqual(len(context.captured_queries), 20)
+
+        subscriptions = ScheduleEventSubscription.objects.filter(schedule_user=self.schedule_user)
+        self.assertEqual(subscriptions.filter(locked=False, reminders=[60]).count(), size)
+        self.assertEqual(self.notification_subscriptions().count(), size + 1)
+        self.assertEqual(NotificationSubscriptionTag.objects.filter(subscription__in=self.notification_subscriptions(),
+                                                                    name='start',
+                                                                    reminders=[60]).count(), size)
+        self.assertEqual(NotificationSubscriptionTag.objects.filter(subscription__in=self.notification_subscriptions(),
+                                                                    name='end',
+                                                                    reminders__isnull=True).count(), size + 1)
+
+        # The locked subscription keeps its settings
+        locked.refresh_from_db()
+        self.assertTrue(locked.locked)
+        self.assertEqual(locked.tags, ['mine'])
+
+        with CaptureQueriesContext(connection) as context:
+            ScheduleTagSubscription.objects.get(schedule_user=self.schedule_user, schedule_tag=self.tag).delete()
+
+        # Django deletes the rows a hundred at a time
+        print(f'Tag unsubscription: {size} events in {len(context.captured_queries)} queries')
+        self.assertLessEqual(len(context.captured_queries), 20 + 2 * size // 100)
+        self.assertEqual(list(subscriptions.values_list('id', flat=True)), [locked.id])
+        self.assertEqual(self.notification_subscriptions().count(), 1)
+
+    def test_schedule_subscribe_events_unlocks(self):
+        event = ScheduleEventFactory.create(schedule=self.group.schedule, tag=self.tag,
+                                            start_date=timezone.now() + timedelta(days=1))
+        ScheduleEventSubscriptionFactory.create(event=event, schedule_user=self.schedule_user, tags=['mine'],
+                                                locked=True)
+
+        # Subscribing directly overwrites the locked subscription, unlike tag subscriptions
+        self.group.schedule.subscribe_events(user=self.user, event_ids=[event.id], user_tags=['theirs'],
+                                             reminders=[120], locked=False)
+
+        self.assertEqual(list(ScheduleEventSubscription.objects.filter(event=event)
+                              .values_list('tags', 'reminders', 'locked')),
+                         [(['theirs'], [120], False)])
+
+    def test_schedule_event_tag_migration(self):
+        other_tag = ScheduleTagFactory.create(schedule=self.group.schedule, name='deadline')
+        other_user = UserFactory.create()
+        other_schedule_user = ScheduleUserFactory.create(user=other_user, schedule=self.group.schedule)
+        ScheduleTagSubscriptionFactory.create(schedule_user=self.schedule_user, schedule_tag=self.tag)
+        ScheduleTagSubscriptionFactory.create(schedule_user=other_schedule_user, schedule_tag=other_tag, reminders=[30])
+
+        event = ScheduleEventFactory.create(schedule=self.group.schedule, tag=self.tag)
+        ScheduleTagSubscription.objects.get(schedule_user=self.schedule_user).delete()
+        ScheduleTagSubscriptionFactory.create(schedule_user=self.schedule_user, schedule_tag=self.tag)
+        self.assertTrue(ScheduleEventSubscription.objects.filter(event=event, schedule_user=self.schedule_user).exists())
+
+        event.tag = other_tag
+        event.save(update_fields=['tag'])
+
+        self.assertEqual(list(ScheduleEventSubscription.objects.filter(event=event)
+                              .values_list('schedule_user_id', 'reminders', 'locked')),
+                         [(other_schedule_user.id, [30], False)])
+        self.assertFalse(self.notification_subscriptions().exists())
+        self.assertTrue(NotificationSubscription.objects.filter(user=other_user, channel=event.notification_channel)
+                        .exists())
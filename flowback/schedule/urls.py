@@ -2,6 +2,11 @@ from django.urls import path
 
 from flowback.schedule.views import (ScheduleListAPI,
                                       ScheduleEventListAPI,
+                                      ScheduleEventOccurrenceListAPI,
+                                      ScheduleCalendarFeedAPI,
+                                      ScheduleCalendarTokenFeedAPI,
+                                      ScheduleCalendarTokenCreateAPI,
+                                      ScheduleCalendarTokenDeleteAPI,
                                       ScheduleSubscribeAPI,
                                       ScheduleUnsubscribeAPI,
                                       ScheduleEventSubscribeAPI,
@@ -13,6 +18,11 @@ from flowback.schedule.views import (ScheduleListAPI,
 schedule_patterns = [
     path('list', ScheduleListAPI.as_view(), name='schedule_list'),
     path('event/list', ScheduleEventListAPI.as_view(), name='schedule_event_list'),
+    path('event/occurrences', ScheduleEventOccurrenceListAPI.as_view(), name='schedule_event_occurrence_list'),
+    path('calendar.ics', ScheduleCalendarFeedAPI.as_view(), name='schedule_calendar_feed'),
+    path('calendar/<str:token>.ics', ScheduleCalendarTokenFeedAPI.as_view(), name='schedule_calendar_token_feed'),
+    path('calendar/token', ScheduleCalendarTokenCreateAPI.as_view(), name='schedule_calendar_token_create'),
+    path('calendar/token/delete', ScheduleCalendarTokenDeleteAPI.as_view(), name='schedule_calendar_token_delete'),
     path('<int:schedule_id>/subscribe', ScheduleSubscribeAPI.as_view(), name='schedule_subscribe'),
     path('<int:schedule_id>/unsubscribe', ScheduleUnsubscribeAPI.as_view(), name='schedule_unsubscribe'),
     path('<int:schedule_id>/event/subscribe', ScheduleEventSubscribeAPI.as_view(), name='schedule_event_subscribe'),
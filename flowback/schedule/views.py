@@ -1,10 +1,18 @@
+from django.http import StreamingHttpResponse
+from django.utils.cache import get_conditional_response
 from rest_framework import serializers, status
+from rest_framework.permissions import IsAuthenticated
 from rest_framework.response import Response
 from rest_framework.views import APIView
 
 from flowback.common.pagination import get_paginated_response, LimitOffsetPagination
 from flowback.group.serializers import GroupUserSerializer
-from flowback.schedule.selectors import schedule_list, schedule_event_list
+from flowback.schedule.authentication import ScheduleCalendarTokenAuthentication
+from flowback.schedule.selectors import (schedule_list,
+                                         schedule_event_list,
+                                         schedule_event_occurrence_list,
+                                         schedule_calendar_feed,
+                                         schedule_calendar_feed_etag)
 from flowback.common.fields import CharacterSeparatedField
 from flowback.schedule.services import (schedule_event_subscribe,
                                         schedule_event_unsubscribe,
@@ -14,7 +22,9 @@ from flowback.schedule.services import (schedule_event_subscribe,
                                         schedule_unsubscribe_to_new_tags,
                                         schedule_event_create,
                                         schedule_event_update,
-                                        schedule_event_delete)
+                                        schedule_event_delete,
+                                        schedule_calendar_token_create,
+                                        schedule_calendar_token_delete)
 
 
 class ScheduleListAPI(APIView):
@@ -124,6 +134,102 @@ class ScheduleEventListAPI(APIView):
                                       view=self)
 
 
+class ScheduleEventOccurrenceListAPI(APIView):
+    class Pagination(LimitOffsetPagination):
+        default_limit = 100
+        max_limit = 1000
+
+    class FilterSerializer(serializers.Serializer):
+        window_start = serializers.DateTimeField()
+        window_end = serializers.DateTimeField(help_text='The window may span at most 366 days')
+        ids = serializers.CharField(required=False, help_text='comma-separated list of integers')
+        schedule_origin_name = serializers.CharField(required=False)
+        schedule_origin_id = serializers.CharField(required=False, help_text='comma-separated list of integers')
+        origin_name = serializers.CharField(required=False)
+        origin_ids = serializers.CharField(required=False, help_text='comma-separated list of integers')
+        schedule_ids = serializers.CharField(required=False, help_text='comma-separated list of integers')
+        active = serializers.BooleanField(required=False, allow_null=True, default=True)
+        tag_ids = serializers.CharField(required=False, help_text='comma-separated list of integers')
+        assignee_user_ids = serializers.CharField(required=False, help_text='comma-separated list of integers')
+        repeat_frequency__isnull = serializers.BooleanField(required=False, allow_null=True, default=None)
+        subscribed = serializers.BooleanField(required=False, allow_null=True, default=None)
+
+    class OutputSerializer(serializers.Serializer):
+        event_id = serializers.IntegerField(source='event.id')
+        start_date = serializers.DateTimeField(help_text='Start of this occurrence')
+        end_date = serializers.DateTimeField(allow_null=True, help_text='End of this occurrence')
+        schedule_id = serializers.IntegerField(source='event.schedule_id')
+        title = serializers.CharField(source='event.title')
+        description = serializers.CharField(source='event.description', allow_null=True)
+        meeting_link = serializers.CharField(source='event.meeting_link', allow_null=True)
+        repeat_frequency = serializers.IntegerField(source='event.repeat_frequency', allow_null=True)
+
+        tag_id = serializers.IntegerField(source='event.tag.id', allow_null=True)
+        tag_name = serializers.CharField(source='event.tag.name', allow_null=True)
+        origin_name = serializers.CharField(source='event.content_type.model')
+        origin_id = serializers.IntegerField(source='event.object_id')
+        schedule_origin_name = serializers.CharField(source='event.schedule.content_type.model')
+        schedule_origin_id = serializers.IntegerField(source='event.schedule.object_id')
+        assignees = GroupUserSerializer(source='event.assignees', many=True)
+        subscribed = serializers.BooleanField(source='event.subscribed')
+
+    def get(self, request):
+        serializer = self.FilterSerializer(data=request.query_params)
+        serializer.is_valid(raise_exception=True)
+
+        filters = serializer.validated_data
+        occurrences = schedule_event_occurrence_list(user=request.user,
+                                                     window_start=filters.pop('window_start'),
+                                                     window_end=filters.pop('window_end'),
+                                                     filters=filters)
+
+        return get_paginated_response(pagination_class=self.Pagination,
+                                      serializer_class=self.OutputSerializer,
+                                      queryset=occurrences,
+                                      request=request,
+                                      view=self)
+
+
+class ScheduleCalendarFeedAPI(APIView):
+    def get(self, request):
+        etag = schedule_calendar_feed_etag(user=request.user)
+
+        # Calendar clients poll with If-None-Match, unchanged feeds are answered without reading the events
+        if response := get_conditional_response(request, etag=etag):
+            return response
+
+        response = StreamingHttpResponse(schedule_calendar_feed(user=request.user),
+                                         content_type='text/calendar; charset=utf-8')
+        response['ETag'] = etag
+        response['Cache-Control'] = 'private, no-cache'
+        response['Content-Disposition'] = 'attachment; filename="calendar.ics"'
+        return response
+
+
+class ScheduleCalendarTokenFeedAPI(ScheduleCalendarFeedAPI):
+    # Calendar apps subscribe to the URL, the token in it authenticates the user instead of the Authorization header
+    authentication_classes = [ScheduleCalendarTokenAuthentication]
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request, token: str):
+        return super().get(request)
+
+
+class ScheduleCalendarTokenCreateAPI(APIView):
+    class OutputSerializer(serializers.Serializer):
+        token = serializers.CharField(source='key')
+
+    def post(self, request):
+        token = schedule_calendar_token_create(user=request.user)
+        return Response(self.OutputSerializer(token).data, status=status.HTTP_200_OK)
+
+
+class ScheduleCalendarTokenDeleteAPI(APIView):
+    def post(self, request):
+        schedule_calendar_token_delete(user=request.user)
+        return Response(status=status.HTTP_200_OK)
+
+
 class ScheduleSubscribeAPI(APIView):
     class InputSerializer(serializers.Serializer):
         reminders = CharacterSeparatedField(child=serializers.IntegerField(),
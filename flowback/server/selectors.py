@@ -1,5 +1,7 @@
 from rest_framework.exceptions import PermissionDenied
 
+from backend.celery import app
+from flowback.common.instrumentation import task_metrics_exposition
 from flowback.user.models import User, Report
 
 
@@ -7,4 +9,14 @@ def reports_list(fetched_by: User):
     if not (fetched_by.is_staff or fetched_by.is_superuser):
         raise PermissionDenied('Only server staff members can view reports')
 
-    return Report.objects.all().order_by('-created_at')
\ No newline at end of file
+    return Report.objects.all().order_by('-created_at')
+
+
+def task_metrics(fetched_by: User) -> str:
+    if not (fetched_by.is_staff or fetched_by.is_superuser):
+        raise PermissionDenied('Only server staff members can view task metrics')
+
+    # Imports the tasks module of every app, listing tasks that haven't been loaded by this process yet
+    app.loader.import_default_modules()
+
+    return task_metrics_exposition()
@@ -1,11 +1,67 @@
+import os
+import pstats
+import tempfile
+
+from django.core.cache import cache
+from django.test import override_settings
 from rest_framework.test import APITestCase
 
 from flowback.common.tests import generate_request
-from flowback.server.views import ServerConfigListAPI
+from flowback.poll.models import Poll
+from flowback.poll.tasks import poll_counter_reconcile, poll_phase_job_sweep, poll_prediction_bet_count
+from flowback.poll.tests.factories import PollFactory
+from flowback.server.views import ServerConfigListAPI, ServerTaskMetricsAPI
+from flowback.user.tests.factories import UserFactory
 
 
 # Create your tests here.
 class ServerTest(APITestCase):
     def test_get_public_config(self):
         response = generate_request(api=ServerConfigListAPI)
-        print(response.data)
\ No newline at end of file
+        print(response.data)
+
+    @override_settings(FLOWBACK_TASK_TRACE_MEMORY=True)
+    def test_task_metrics(self):
+        cache.clear()
+        poll = PollFactory()
+        Poll.objects.filter(id=poll.id).update(proposal_count=3)
+
+        self.assertEqual(poll_counter_reconcile(), 1)
+        self.assertRaises(Poll.DoesNotExist, poll_prediction_bet_count, poll_id=-1)
+        poll_phase_job_sweep()
+
+        response = generate_request(api=ServerTaskMetricsAPI, user=UserFactory(is_superuser=True))
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response['Content-Type'].startswith('text/plain'))
+
+        lines = response.content.decode().splitlines()
+        reconcile = 'task="flowback.poll.tasks.poll_counter_reconcile"'
+        self.assertIn(f'flowback_task_runs_total{{{reconcile},state="success"}} 1', lines)
+        self.assertIn(f'flowback_task_duration_seconds_bucket{{{reconcile},le="+Inf"}} 1', lines)
+        self.assertIn(f'flowback_task_db_queries_total{{{reconcile}}} 1', lines)
+        self.assertIn(f'flowback_task_rows_total{{{reconcile}}} 1', lines)
+        self.assertTrue(any(line.startswith(f'flowback_task_peak_memory_bytes{{{reconcile}}}') for line in lines))
+        self.assertIn('flowback_task_runs_total{task="flowback.poll.tasks.poll_prediction_bet_count",'
+                      'state="failure"} 1', lines)
+        self.assertIn('flowback_task_runs_total{task="flowback.poll.tasks.poll_phase_job_sweep",'
+                      'state="success"} 1', lines)
+        self.assertIn('flowback_task_runs_total{task="flowback.schedule.tasks.schedule_event_sweep",'
+                      'state="success"} 0', lines)
+
+        response = generate_request(api=ServerTaskMetricsAPI, user=UserFactory())
+        self.assertEqual(response.status_code, 403)
+
+    def test_task_profile(self):
+        PollFactory()
+
+        with tempfile.TemporaryDirectory() as profile_dir:
+            with override_settings(FLOWBACK_TASK_PROFILE_THRESHOLD=10 ** -9, FLOWBACK_TASK_PROFILE_DIR=profile_dir):
+                poll_counter_reconcile()
+
+            with override_settings(FLOWBACK_TASK_PROFILE_THRESHOLD=3600, FLOWBACK_TASK_PROFILE_DIR=profile_dir):
+                poll_counter_reconcile()
+
+            profiles = os.listdir(profile_dir)
+            self.assertEqual(len(profiles), 1)
+            self.assertTrue(profiles[0].startswith('flowback.poll.tasks.poll_counter_reconcile-'))
+            self.assertTrue(pstats.Stats(os.path.join(profile_dir, profiles[0])).total_calls > 0)
@@ -1,6 +1,7 @@
 from django.urls import path
 
-from flowback.server.views import ServerConfigListAPI, ServerReportListAPI
+from flowback.server.views import ServerConfigListAPI, ServerReportListAPI, ServerTaskMetricsAPI
 
 server_patterns = [path('config', ServerConfigListAPI.as_view(), name='server_config'),
-                   path('reports', ServerReportListAPI.as_view(), name='server_reports')]
+                   path('reports', ServerReportListAPI.as_view(), name='server_reports'),
+                   path('metrics/tasks', ServerTaskMetricsAPI.as_view(), name='server_task_metrics')]
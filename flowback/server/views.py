@@ -1,10 +1,11 @@
+from django.http import HttpResponse
 from rest_framework.permissions import AllowAny
 from rest_framework.response import Response
 from rest_framework import serializers, status
 from rest_framework.views import APIView
 
 from flowback.common.pagination import get_paginated_response, LimitOffsetPagination
-from flowback.server.selectors import reports_list
+from flowback.server.selectors import reports_list, task_metrics
 from flowback.server.services import get_public_config
 
 
@@ -52,3 +53,11 @@ class ServerReportListAPI(APIView):
                                       queryset=reports,
                                       request=request,
                                       view=self)
+
+
+class ServerTaskMetricsAPI(APIView):
+    """
+    Background task metrics in the Prometheus text exposition format, for server staff members
+    """
+    def get(self, request):
+        return HttpResponse(task_metrics(fetched_by=request.user), content_type='text/plain; version=0.0.4')
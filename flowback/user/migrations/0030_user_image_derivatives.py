@@ -0,0 +1,18 @@
+# Generated by Django 4.2.17 on 2026-10-19 09:28
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('user', '0029_userbookmark_userbookmark_unique_bookmark'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='user',
+            name='image_derivatives',
+            field=models.JSONField(blank=True, default=dict),
+        ),
+    ]
@@ -0,0 +1,21 @@
+from django.db import migrations
+
+
+def reset_image_derivatives(apps, schema_editor):
+    """
+    Derivatives were named after the image name without its extension, forget them so that
+    the image_derivatives_backfill command regenerates them under their current names
+    """
+    User = apps.get_model('user', 'user')
+    User.objects.exclude(image_derivatives={}).update(image_derivatives={})
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('user', '0030_user_image_derivatives'),
+    ]
+
+    operations = [
+        migrations.RunPython(reset_image_derivatives, migrations.RunPython.noop)
+    ]
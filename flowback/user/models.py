@@ -15,6 +15,7 @@ from rest_framework.authtoken.models import Token
 from flowback.chat.models import MessageChannelParticipant
 from flowback.common.models import BaseModel
 from flowback.common.validators import FieldNotBlankValidator
+from flowback.files.models import ImageDerivativeModel
 from flowback.kanban.models import Kanban
 from flowback.notification.models import NotifiableModel, NotificationChannel
 from flowback.schedule.models import ScheduleModel
@@ -55,7 +56,7 @@ class CustomUserManager(BaseUserManager):
         return user
 
 
-class User(AbstractBaseUser, PermissionsMixin, NotifiableModel, ScheduleModel):
+class User(AbstractBaseUser, PermissionsMixin, NotifiableModel, ScheduleModel, ImageDerivativeModel):
     class PublicStatus(models.TextChoices):
         PUBLIC = 'public', _('Public')  # Everyone can see/access
         GROUP_ONLY = 'group_only', _('Group Only')  # Only users in the same group can see/access
@@ -82,6 +83,8 @@ class User(AbstractBaseUser, PermissionsMixin, NotifiableModel, ScheduleModel):
 
     kanban = models.ForeignKey('kanban.Kanban', on_delete=models.SET_NULL, null=True, blank=True)
 
+    IMAGE_DERIVATIVE_FIELDS = ('profile_image', 'banner_image')
+
     USERNAME_FIELD = 'email'
     REQUIRED_FIELDS = ['username']
 
@@ -6,8 +6,9 @@ from rest_framework.exceptions import ValidationError
 
 from flowback.common.filters import NumberInFilter
 from flowback.group.models import Group, GroupUser, GroupThread, GroupThreadVote
+from flowback.group.selectors.feed import group_feed_timeline
 from flowback.poll.models import Poll, PollVoting
-from flowback.kanban.selectors import kanban_entry_list
+from flowback.kanban.selectors import kanban_entry_list, kanban_board, KanbanBoard
 from flowback.user.models import User, UserChatInvite, UserBookmark
 from backend.settings import env
 
@@ -53,6 +54,10 @@ def user_kanban_entry_list(*, fetched_by: User, filters=None):
     return kanban_entry_list(user=fetched_by, filters=filters)
 
 
+def user_kanban_board(*, fetched_by: User, since_version: int = None) -> KanbanBoard:
+    return kanban_board(kanban_id=fetched_by.kanban_id, user=fetched_by, since_version=since_version)
+
+
 def user_list(*, fetched_by: User, filters=None):
     # Block access to this api for members, unless group admin or higher.
     if env('FLOWBACK_GROUP_ADMIN_USER_LIST_ACCESS_ONLY') \
@@ -187,6 +192,70 @@ def user_home_feed(*, fetched_by: User, filters=None):
     return qs
 
 
+def user_home_timeline(*, fetched_by: User, limit: int, filters=None, **kwargs) -> list[dict]:
+    """
+    Keyset paginated variant of user_home_feed (see group_feed_timeline for kwargs), reading from the precomputed
+    group feeds instead of scanning every poll and thread. Returns the same values along with the feed_created_at
+    and feed_entry_id of the feed entry, and takes the same filters as user_home_feed except for order_by.
+    """
+    filters = {key: value for key, value in (filters or {}).items() if value is not None and key != 'order_by'}
+    related_fields = ['id',
+                      'created_by',
+                      'created_at',
+                      'updated_at',
+                      'group_id',
+                      'work_group_id',
+                      'title',
+                      'description',
+                      'related_model',
+                      'group_joined',
+                      'user_vote',
+                      'pinned',
+                      'bookmarked']
+
+    joined_groups = Group.objects.filter(id=OuterRef('created_by__group_id'), groupuser__user__in=[fetched_by])
+    group_thread_vote = GroupThreadVote.objects.filter(thread_id=OuterRef('id'),
+                                                       created_by__user=fetched_by).values('vote')
+    poll_user_vote = PollVoting.objects.filter(poll_id=OuterRef('id'), created_by__user=fetched_by)
+
+    threads = GroupThread.objects.annotate(
+        related_model=models.Value('thread', models.CharField()),
+        group_id=F('created_by__group_id'),
+        bookmarked=Exists(UserBookmark.objects.filter(user=fetched_by,
+                                                      content_type__model='groupthread',
+                                                      object_id=OuterRef('id'))),
+        group_joined=Exists(joined_groups),
+        user_vote=Subquery(group_thread_vote)).values(*related_fields)
+
+    polls = Poll.objects.annotate(
+        related_model=models.Value('poll', models.CharField()),
+        group_id=F('created_by__group_id'),
+        bookmarked=Exists(UserBookmark.objects.filter(user=fetched_by,
+                                                      content_type__model='poll',
+                                                      object_id=OuterRef('id'))),
+        group_joined=Exists(joined_groups),
+        user_vote=Exists(poll_user_vote)).values(*related_fields)
+
+    # Visibility comes from the feeds, the filters narrow the feed entries down to the matching objects
+    entry_filters = None
+    if filters:
+        entry_filters = (Q(related_model='thread', object_id__in=UserHomeFeedFilter(filters, threads).qs.values('id'))
+                         | Q(related_model='poll', object_id__in=UserHomeFeedFilter(filters, polls).qs.values('id')))
+
+    entries = group_feed_timeline(fetched_by=fetched_by, limit=limit, filters=entry_filters, **kwargs)
+
+    object_ids = dict(poll=[], thread=[])
+    for entry in entries:
+        object_ids[entry['related_model']].append(entry['object_id'])
+
+    rows = {(row['related_model'], row['id']): row for row in [*threads.filter(id__in=object_ids['thread']),
+                                                               *polls.filter(id__in=object_ids['poll'])]}
+
+    # Entries removed in between the feed read and hydration are skipped
+    return [dict(rows[key], feed_created_at=entry['feed_created_at'], feed_entry_id=entry['feed_entry_id'])
+            for entry in entries if (key := (entry['related_model'], entry['object_id'])) in rows]
+
+
 class UserChatInviteFilter(django_filters.FilterSet):
     user_id = django_filters.NumberFilter(field_name="user_id", lookup_expr="exact")
     message_channel_id = django_filters.NumberFilter(field_name="message_channel_id", lookup_expr="exact")
@@ -1,9 +1,13 @@
 from rest_framework import serializers
 
+from flowback.files.serializers import ImageDerivativeField
 from flowback.user.models import User
 
 
 class BasicUserSerializer(serializers.ModelSerializer):
+    profile_image = ImageDerivativeField(size=64)
+    banner_image = ImageDerivativeField(size=1024)
+
     class Meta:
         model = User
         fields = ('id', 'username', 'profile_image', 'banner_image', 'public_status', 'chat_status')
@@ -0,0 +1,157 @@
+import time
+from urllib.parse import parse_qs, urlparse
+
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APITestCase
+
+from flowback.common.tests import generate_request, fake
+from flowback.group.models import GroupFeedEntry, GroupUser
+from flowback.group.tasks import group_feed_entry_update, group_feed_rebuild
+from flowback.group.tests.factories import GroupFactory, GroupThreadFactory, GroupUserFactory, WorkGroupUserFactory
+from flowback.poll.tests.factories import PollFactory
+from flowback.user.selectors import user_home_feed, user_home_timeline
+from flowback.user.tests.factories import UserFactory
+from flowback.user.views.home import UserHomeTimelineAPI
+
+
+class UserHomeTimelineTest(APITestCase):
+    def setUp(self):
+        fake.unique.clear()  # The benchmark exhausts the unique name pool otherwise
+
+        self.group_public = GroupFactory(public=True)
+        self.group_private = GroupFactory(public=False)
+
+        self.group_user_public = GroupUserFactory(group=self.group_public)
+        self.group_user_private = GroupUserFactory(group=self.group_private)
+        self.work_group_user_private = WorkGroupUserFactory(group_user__group=self.group_private,
+                                                            work_group__group=self.group_private)
+
+        GroupThreadFactory.create_batch(size=3, created_by=self.group_user_public, public=True)
+        GroupThreadFactory.create_batch(size=2, created_by=self.group_user_public)
+        PollFactory.create_batch(size=3, created_by=self.group_user_public, public=True)
+
+        GroupThreadFactory.create_batch(size=3, created_by=self.group_user_private, pinned=True)
+        PollFactory.create_batch(size=3, created_by=self.group_user_private)
+        PollFactory.create_batch(size=2,
+                                 created_by=self.group_user_private,
+                                 work_group=self.work_group_user_private.work_group)
+
+        # Rebuilt in several chunks per model
+        group_feed_rebuild(batch_size=4)
+
+    def timeline_keys(self, user, limit=4, **filters):
+        keys, cursor = [], None
+
+        while True:
+            response = generate_request(api=UserHomeTimelineAPI,
+                                        user=user,
+                                        data=dict(limit=limit, cursor=cursor, **filters) if cursor
+                                        else dict(limit=limit, **filters))
+            self.assertEqual(response.status_code, 200, response.data)
+            self.assertNotIn('count', response.data)
+            keys += [(x['related_model'], x['id']) for x in response.data['results']]
+
+            if response.data['next'] is None:
+                return keys
+
+            cursor = parse_qs(urlparse(response.data['next']).query)['cursor'][0]
+
+    def test_user_home_timeline_matches_home_feed(self):
+        for user in (self.group_user_public.user,
+                     self.group_user_private.user,
+                     self.work_group_user_private.group_user.user,
+                     GroupUser.objects.get(user=self.group_private.created_by).user,
+                     UserFactory()):
+            home_feed = [(x['related_model'], x['id']) for x in user_home_feed(fetched_by=user)]
+            self.assertEqual(self.timeline_keys(user=user), home_feed)
+
+    def test_user_home_timeline_filters(self):
+        user = self.work_group_user_private.group_user.user
+        poll = PollFactory(created_by=self.group_user_private, title='Timeline filter poll')
+        group_feed_rebuild()
+
+        for filters in (dict(related_model='poll'),
+                        dict(related_model='thread', pinned=True),
+                        dict(title__icontains='timeline filter'),
+                        dict(group_ids=str(self.group_public.id)),
+                        dict(work_group_ids=str(self.work_group_user_private.work_group_id)),
+                        dict(id=poll.id, related_model='poll'),
+                        dict(user_vote=False, created_at__lt=poll.created_at.isoformat())):
+            home_feed = [(x['related_model'], x['id'])
+                         for x in user_home_feed(fetched_by=user, filters=filters.copy())]
+            self.assertTrue(home_feed, filters)
+            self.assertEqual(self.timeline_keys(user=user, **filters), home_feed, filters)
+
+        self.assertEqual(self.timeline_keys(user=user, title__icontains='timeline filter'), [('poll', poll.id)])
+
+    def test_user_home_timeline_visibility(self):
+        self.assertEqual(len(self.timeline_keys(user=self.group_user_private.user)), 12)  # 6 private + 6 public
+        self.assertEqual(len(self.timeline_keys(user=self.work_group_user_private.group_user.user)), 14)
+        self.assertEqual(len(self.timeline_keys(user=self.group_user_public.user)), 8)
+
+    def test_user_home_timeline_previous(self):
+        user = self.work_group_user_private.group_user.user
+
+        first = generate_request(api=UserHomeTimelineAPI, user=user, data=dict(limit=5))
+        second = generate_request(api=UserHomeTimelineAPI, user=user,
+                                  data=dict(limit=5, cursor=parse_qs(urlparse(first.data['next']).query)['cursor'][0]))
+        self.assertIsNone(first.data['previous'])
+
+        previous = generate_request(api=UserHomeTimelineAPI, user=user,
+                                    data=dict(limit=5,
+                                              cursor=parse_qs(urlparse(second.data['previous']).query)['cursor'][0]))
+        self.assertEqual(previous.data['results'], first.data['results'])
+
+    def test_user_home_timeline_invalid_cursor(self):
+        response = generate_request(api=UserHomeTimelineAPI,
+                                    user=self.group_user_public.user,
+                                    data=dict(cursor='invalid'))
+        self.assertEqual(response.status_code, 400)
+
+    def test_group_feed_entry_update(self):
+        poll = PollFactory(created_by=self.group_user_public, public=True)
+
+        with self.captureOnCommitCallbacks() as callbacks:
+            poll.save()
+        self.assertEqual(len(callbacks), 1)
+
+        group_feed_entry_update(related_model='poll', object_id=poll.id)
+        group_feed_entry_update(related_model='poll', object_id=poll.id)  # Idempotent
+        self.assertEqual(GroupFeedEntry.objects.filter(related_model='poll', object_id=poll.id).count(), 1)
+
+        poll.active = False
+        poll.save()
+        group_feed_entry_update(related_model='poll', object_id=poll.id)
+        self.assertFalse(GroupFeedEntry.objects.filter(related_model='poll', object_id=poll.id).exists())
+
+        thread = GroupThreadFactory(created_by=self.group_user_public)
+        group_feed_entry_update(related_model='thread', object_id=thread.id)
+        thread_id = thread.id
+        thread.delete()
+        group_feed_entry_update(related_model='thread', object_id=thread_id)
+        self.assertFalse(GroupFeedEntry.objects.filter(related_model='thread', object_id=thread_id).exists())
+
+    def test_user_home_timeline_benchmark(self):
+        user = UserFactory()
+
+        for i in range(50):
+            group_user = GroupUserFactory(group__name=f'benchmark {i}', user=user)
+            for j in range(4):
+                GroupThreadFactory(created_by=group_user, title=f'benchmark thread {i}-{j}')
+            for j in range(2):
+                PollFactory(created_by=group_user, title=f'benchmark poll {i}-{j}')
+
+        group_feed_rebuild()
+
+        results = {}
+        for name, fn in (('user_home_feed', lambda: [(x['related_model'], x['id'])
+                                                      for x in user_home_feed(fetched_by=user)[:25]]),
+                         ('user_home_timeline', lambda: [(x['related_model'], x['id'])
+                                                          for x in user_home_timeline(fetched_by=user, limit=25)])):
+            with CaptureQueriesContext(connection) as queries:
+                start = time.perf_counter()
+                results[name] = fn()
+                print(f'{name}: {(time.perf_counter() - start) * 1000:.2f}ms, {len(queries)} queries')
+
+        self.assertEqual(results['user_home_timeline'], results['user_home_feed'])
@@ -17,10 +17,11 @@ from flowback.user.views.user import (UserCreateApi,
                                       UserChatChannelUpdateAPI, UserNotificationSubscribeAPI, UserBookmarkCreateAPI,
                                       UserBookmarkDeleteAPI)
 from flowback.user.views.kanban import (UserKanbanEntryListAPI,
+                                        UserKanbanBoardAPI,
                                         UserKanbanEntryCreateAPI,
                                         UserKanbanEntryUpdateAPI,
                                         UserKanbanEntryDeleteAPI)
-from flowback.user.views.home import UserHomeFeedAPI
+from flowback.user.views.home import UserHomeFeedAPI, UserHomeTimelineAPI
 
 user_patterns = [
     path('login', views.obtain_auth_token, name='login'),
@@ -37,6 +38,7 @@ user_patterns = [
          name='user_notification_subscribe'),
 
     path('user/kanban/entry/list', UserKanbanEntryListAPI.as_view(), name='user_kanban_entry'),
+    path('user/kanban/board', UserKanbanBoardAPI.as_view(), name='user_kanban_board'),
     path('user/kanban/entry/create', UserKanbanEntryCreateAPI.as_view(), name='user_kanban_entry_create'),
     path('user/kanban/entry/update', UserKanbanEntryUpdateAPI.as_view(), name='user_kanban_entry_update'),
     path('user/kanban/entry/delete', UserKanbanEntryDeleteAPI.as_view(), name='user_kanban_entry_delete'),
@@ -46,6 +48,7 @@ user_patterns = [
     path('user/schedule/event/delete', UserScheduleEventDeleteAPI.as_view(), name='user_schedule_event_delete'),
 
     path('user/home', UserHomeFeedAPI.as_view(), name='user_home_feed'),
+    path('user/home/timeline', UserHomeTimelineAPI.as_view(), name='user_home_timeline'),
     path('user/chat', UserGetChatChannelAPI.as_view(), name='user_get_chat_channel'),
     path('user/chat/leave', UserLeaveChatChannelAPI.as_view(), name='user_leave_chat_channel'),
     path('user/chat/invite/list', UserChatInviteListAPI.as_view(), name='user_chat_invite_list'),
@@ -3,9 +3,9 @@ from rest_framework import serializers
 from rest_framework.views import APIView
 
 from flowback.common.filters import NumberInFilter
-from flowback.common.pagination import get_paginated_response, LimitOffsetPagination
+from flowback.common.pagination import get_paginated_response, CursorPagination, LimitOffsetPagination
 from flowback.group.serializers import GroupUserSerializer
-from flowback.user.selectors import user_home_feed
+from flowback.user.selectors import user_home_feed, user_home_timeline
 
 
 @extend_schema(tags=['user'])
@@ -59,3 +59,33 @@ class UserHomeFeedAPI(APIView):
                                       queryset=home_feed,
                                       request=request,
                                       view=self)
+
+
+@extend_schema(tags=['user'])
+class UserHomeTimelineAPI(APIView):
+    """
+    Home feed served from the precomputed group feeds, with the filters of the home feed (always newest first).
+    Paginate by following the returned `next` and `previous` links, there is no count.
+    """
+    class Pagination(CursorPagination):
+        default_limit = 25
+        max_limit = 100
+        ordering = ('-feed_created_at', '-feed_entry_id')
+
+    class FilterSerializer(UserHomeFeedAPI.FilterSerializer):
+        order_by = None
+
+    class OutputSerializer(UserHomeFeedAPI.OutputSerializer):
+        pass
+
+    def get(self, request):
+        serializer = self.FilterSerializer(data=request.query_params)
+        serializer.is_valid(raise_exception=True)
+
+        def fetch(**kwargs):
+            return user_home_timeline(fetched_by=request.user, filters=serializer.validated_data, **kwargs)
+
+        paginator = self.Pagination()
+        timeline = paginator.paginate_rows(fetch, request, ordering=paginator.ordering, view=self)
+
+        return paginator.get_paginated_response(self.OutputSerializer(timeline, many=True).data)
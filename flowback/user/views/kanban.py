@@ -3,10 +3,11 @@ from rest_framework import status
 from rest_framework.response import Response
 
 from flowback.common.pagination import get_paginated_response
-from flowback.user.selectors import user_kanban_entry_list
+from flowback.user.selectors import user_kanban_entry_list, user_kanban_board
 from flowback.user.services import user_kanban_entry_create, user_kanban_entry_update, user_kanban_entry_delete
 
-from flowback.kanban.views import KanbanEntryListApi, KanbanEntryCreateAPI, KanbanEntryUpdateAPI, KanbanEntryDeleteAPI
+from flowback.kanban.views import (KanbanEntryListApi, KanbanBoardApi, KanbanEntryCreateAPI, KanbanEntryUpdateAPI,
+                                   KanbanEntryDeleteAPI)
 
 
 @extend_schema(tags=['user/kanban'])
@@ -23,6 +24,16 @@ class UserKanbanEntryListAPI(KanbanEntryListApi):
                                       view=self)
 
 
+@extend_schema(tags=['user/kanban'])
+class UserKanbanBoardAPI(KanbanBoardApi):
+    def get(self, request):
+        serializer = self.FilterSerializer(data=request.query_params)
+        serializer.is_valid(raise_exception=True)
+
+        board = user_kanban_board(fetched_by=request.user, **serializer.validated_data)
+        return self.board_response(request, board)
+
+
 @extend_schema(tags=['user/kanban'])
 class UserKanbanEntryCreateAPI(KanbanEntryCreateAPI):
     def post(self, request):
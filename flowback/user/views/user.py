@@ -8,6 +8,7 @@ from tutorial.quickstart.serializers import UserSerializer
 
 from backend.settings import DEBUG_REGISTER_BYPASS_EMAIL_VERIFICATION
 from flowback.common.pagination import LimitOffsetPagination, get_paginated_response
+from flowback.files.serializers import ImageDerivativeField
 from rest_framework.response import Response
 from rest_framework.views import APIView
 
@@ -104,6 +105,9 @@ class UserListApi(APIView):
         username__icontains = serializers.CharField(required=False)
 
     class OutputSerializer(serializers.ModelSerializer):
+        profile_image = ImageDerivativeField(size=64)
+        banner_image = ImageDerivativeField(size=1024)
+
         class Meta:
             model = User
             fields = ('id', 'username', 'profile_image',
@@ -129,8 +133,8 @@ class UserGetApi(APIView):
     class OutputSerializer(serializers.Serializer):
         id = serializers.IntegerField()
         username = serializers.CharField()
-        profile_image = serializers.ImageField()
-        banner_image = serializers.ImageField()
+        profile_image = ImageDerivativeField(size=256)
+        banner_image = ImageDerivativeField(size=1024)
 
         bio = serializers.CharField(required=False)
         website = serializers.CharField(required=False)